@@ -1,11 +1,20 @@
+from functools import wraps
+
 from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList
 from django.contrib.auth.admin import UserAdmin
+from django.core.exceptions import ValidationError
+from django.db import router
+from django.db.models import Max, Min, Q, QuerySet
 from django.utils.html import format_html
 from django.utils import timezone
 from .models import (
-    Usuario, Mercado, Producto, ProductoContratado, 
-    Resultado, TokenVerificacionEmail, SesionSeguridad
+    Usuario, Mercado, Producto, ProductoContratado, MovimientoCapital, ResultadoBacktest,
+    Resultado, TokenVerificacionEmail, TokenRecuperacionPassword, SesionSeguridad
 )
+from .analitica import cambios, libro
+from .db.routers import en_replica
+from .db.shards import ListaShards, consultar_shards, contar_shards, shards, shards_para_id, sharding_activo
 
 # --- Mixin de Seguridad para Fintech ---
 class SoloSuperusuarioBorraMixin:
@@ -16,6 +25,136 @@ class SoloSuperusuarioBorraMixin:
     def has_delete_permission(self, request, obj=None):
         return request.user.is_superuser
 
+
+class ListadoEnReplicaMixin:
+    """
+    Los listados (GET) se leen de una réplica si hay alguna configurada.
+    Las acciones (POST) siguen en la primaria.
+    """
+    def changelist_view(self, request, extra_context=None):
+        if request.method != 'GET':
+            return super().changelist_view(request, extra_context)
+        with en_replica():
+            return super().changelist_view(request, extra_context)
+
+
+class UsuarioSeparadoAdminMixin:
+    """
+    Para modelos que pueden vivir en otra base de datos que Usuario
+    (auditoría o shards): no se puede hacer JOIN con Usuario, así que los
+    usuarios se cargan en una segunda consulta y la búsqueda por email o
+    nombre de usuario resuelve antes sus ids.
+    """
+    list_select_related = ()
+    raw_id_fields = ['usuario']
+    max_usuarios_busqueda = 1000
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).prefetch_related('usuario')
+
+    def get_search_results(self, request, queryset, search_term):
+        resultados, duplicados = super().get_search_results(request, queryset, search_term)
+        if search_term:
+            ids = list(
+                Usuario.objects.filter(Q(email__icontains=search_term) | Q(username__icontains=search_term))
+                .values_list('pk', flat=True)[:self.max_usuarios_busqueda]
+            )
+            if ids:
+                resultados = resultados | queryset.filter(usuario_id__in=ids)
+        return resultados, duplicados
+
+
+class ChangeListShards(ChangeList):
+    """Cuando cabe en una página, el listado tampoco se limita a 'default'"""
+
+    def get_results(self, request):
+        super().get_results(request)
+        if sharding_activo() and isinstance(self.result_list, QuerySet):
+            self.result_list = consultar_shards(self.queryset)
+
+
+class ShardAdminMixin:
+    """
+    Modelos repartidos entre shards (appKairos/db/shards.py). Sin sharding
+    no cambia nada. Con él:
+    - El listado consulta todos los shards y mezcla los resultados en el
+      orden pedido; cada página pide a cada shard solo las filas necesarias.
+    - El detalle busca el objeto empezando por el shard que indica su id.
+    - Las acciones se aplican shard a shard sobre los seleccionados.
+    """
+    show_full_result_count = False
+
+    def get_changelist(self, request, **kwargs):
+        return ChangeListShards
+
+    def get_paginator(self, request, queryset, per_page, orphans=0, allow_empty_first_page=True):
+        if sharding_activo():
+            queryset = ListaShards(queryset)
+        return super().get_paginator(request, queryset, per_page, orphans, allow_empty_first_page)
+
+    def get_object(self, request, object_id, from_field=None):
+        if not sharding_activo():
+            return super().get_object(request, object_id, from_field)
+        queryset = self.get_queryset(request)
+        modelo = queryset.model
+        campo = modelo._meta.pk if from_field is None else modelo._meta.get_field(from_field)
+        try:
+            valor = campo.to_python(object_id)
+        except (ValidationError, ValueError):
+            return None
+        for alias in shards_para_id(valor):
+            try:
+                return queryset.using(alias).get(**{campo.name: valor})
+            except modelo.DoesNotExist:
+                continue
+        return None
+
+    def get_actions(self, request):
+        acciones = super().get_actions(request)
+        if not sharding_activo():
+            return acciones
+        return {
+            nombre: (self._en_cada_shard(funcion), nombre, descripcion)
+            for nombre, (funcion, nombre, descripcion) in acciones.items()
+        }
+
+    @staticmethod
+    def _en_cada_shard(funcion):
+        @wraps(funcion)
+        def envoltura(modeladmin, request, queryset):
+            respuesta = None
+            for alias in shards():
+                parcial = queryset.using(alias)
+                if parcial.exists():
+                    respuesta = funcion(modeladmin, request, parcial) or respuesta
+            return respuesta
+        return envoltura
+
+class AnioResultadoFilter(admin.SimpleListFilter):
+    """
+    Año del resultado filtrado por rango de `fecha` y no por `anio`: con la
+    tabla particionada por fecha solo se leen las particiones de ese año.
+    """
+    title = 'año'
+    parameter_name = 'anio'
+
+    def lookups(self, request, model_admin):
+        queryset = model_admin.get_queryset(request)
+        extremos = [
+            queryset.using(alias).aggregate(primera=Min('fecha'), ultima=Max('fecha'))
+            for alias in (shards() if sharding_activo() else [queryset.db])
+        ]
+        fechas = [fecha for extremo in extremos for fecha in extremo.values() if fecha]
+        if not fechas:
+            return []
+        return [(str(anio), str(anio)) for anio in range(max(fechas).year, min(fechas).year - 1, -1)]
+
+    def queryset(self, request, queryset):
+        if self.value() and self.value().isdigit():
+            return queryset.filter(fecha__year=int(self.value()))
+        return queryset
+
+
 @admin.register(Usuario)
 class UsuarioAdmin(UserAdmin):
     """
@@ -107,7 +246,10 @@ class MercadoAdmin(admin.ModelAdmin):
 
 @admin.register(Producto)
 class ProductoAdmin(admin.ModelAdmin):
-    list_display = ['nombre', 'codigo', 'mostrar_mercados', 'activo', 'fecha_creacion', 'cantidad_contrataciones']
+    list_display = [
+        'nombre', 'codigo', 'mostrar_mercados', 'valor_liquidativo', 'activo', 'fecha_creacion',
+        'cantidad_contrataciones'
+    ]
     list_filter = ['activo', 'mercados', 'fecha_creacion']
     search_fields = ['nombre', 'codigo', 'descripcion']
     filter_horizontal = ['mercados']
@@ -117,15 +259,16 @@ class ProductoAdmin(admin.ModelAdmin):
         ('Información Básica', {
             'fields': ('nombre', 'codigo', 'descripcion', 'activo')
         }),
-        ('Mercados', {
-            'fields': ('mercados',)
+        ('Mercados y Estrategia', {
+            'fields': ('mercados', 'estrategia')
         }),
         ('Información Adicional', {
-            'fields': ('fecha_creacion',)
+            'fields': ('valor_liquidativo', 'fecha_creacion')
         }),
     )
     
-    readonly_fields = ['fecha_creacion']
+    # El valor liquidativo lo fija su serie (comando revalorizar)
+    readonly_fields = ['valor_liquidativo', 'fecha_creacion']
     
     def mostrar_mercados(self, obj):
         mercados = obj.mercados.all()
@@ -135,41 +278,68 @@ class ProductoAdmin(admin.ModelAdmin):
     mostrar_mercados.short_description = 'Mercados'
     
     def cantidad_contrataciones(self, obj):
-        count = obj.contrataciones.filter(estado='activo').count()
+        # Los contratos pueden estar en cualquier shard
+        count = contar_shards(ProductoContratado.objects.filter(producto=obj, estado='activo'))
         return format_html('<strong>{}</strong> contratación(es)', count)
     cantidad_contrataciones.short_description = 'Contrataciones Activas'
 
 
+@admin.register(ResultadoBacktest)
+class ResultadoBacktestAdmin(admin.ModelAdmin):
+    """Resultados de los barridos del comando backtest. Solo se consultan"""
+    list_display = [
+        'producto', 'estrategia', 'parametros', 'rendimiento_total', 'ratio_sharpe',
+        'drawdown_maximo', 'operaciones', 'mejor', 'fecha_calculo'
+    ]
+    list_select_related = ['producto']
+    list_filter = ['mejor', 'estrategia', 'resolucion', 'producto']
+    ordering = ['-fecha_calculo', '-ratio_sharpe']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(ProductoContratado)
-class ProductoContratadoAdmin(SoloSuperusuarioBorraMixin, admin.ModelAdmin):
+class ProductoContratadoAdmin(ShardAdminMixin, UsuarioSeparadoAdminMixin, ListadoEnReplicaMixin,
+                              SoloSuperusuarioBorraMixin, admin.ModelAdmin):
     """
     Gestiona los contratos. Protegido: Staff no puede borrar contratos, solo cancelar.
     """
     list_display = [
-        'usuario', 'producto', 'monto_invertido_formato', 
+        'usuario', 'producto', 'monto_invertido_formato', 'capital_formato',
         'estado_badge', 'fecha_contratacion'
     ]
+    list_select_related = ['producto']
     list_filter = ['estado', 'fecha_contratacion', 'producto']
-    search_fields = ['usuario__email', 'usuario__username', 'producto__nombre']
+    search_fields = ['producto__nombre']  # + email del usuario (UsuarioSeparadoAdminMixin)
     ordering = ['-fecha_contratacion']
     
     fieldsets = (
         ('Información de Contratación', {
-            'fields': ('usuario', 'producto', 'monto_invertido', 'capital_actual', 'estado')
+            'fields': ('usuario', 'producto', 'monto_invertido', 'participaciones', 'capital_actual', 'estado')
         }),
         ('Fechas', {
             'fields': ('fecha_contratacion', 'fecha_inicio', 'fecha_fin', 'fecha_actualizacion')
         }),
     )
     
-    readonly_fields = ['fecha_contratacion', 'fecha_actualizacion']
+    # El capital es participaciones × valor liquidativo del producto (JOIN en la consulta)
+    readonly_fields = ['capital_actual', 'fecha_contratacion', 'fecha_actualizacion']
     
     actions = ['activar_productos', 'cancelar_productos']
     
     def monto_invertido_formato(self, obj):
-        return format_html('€ <strong>{:,.2f}</strong>', obj.monto_invertido)
+        return format_html('€ <strong>{}</strong>', f'{obj.monto_invertido:,.2f}')
     monto_invertido_formato.short_description = 'Monto Invertido'
     
+    def capital_formato(self, obj):
+        return format_html('€ <strong>{}</strong>', f'{obj.capital_actual:,.2f}')
+    capital_formato.short_description = 'Capital Actual'
+    capital_formato.admin_order_field = 'capital_actual'
+    
     def estado_badge(self, obj):
         colors = {
             'activo': 'green', 'inactivo': 'red',
@@ -188,24 +358,30 @@ class ProductoContratadoAdmin(SoloSuperusuarioBorraMixin, admin.ModelAdmin):
     activar_productos.short_description = "Activar productos seleccionados"
     
     def cancelar_productos(self, request, queryset):
-        # Preferible cancelar a borrar
-        count = queryset.update(estado='cancelado', fecha_fin=timezone.now())
+        # Preferible cancelar a borrar. El capital sale del contrato: retirada en su libro
+        ahora = timezone.now()
+        libro.retirar(queryset.exclude(estado='cancelado'), fecha=ahora, observaciones='Cancelación')
+        count = queryset.update(estado='cancelado', fecha_fin=ahora)
         self.message_user(request, f'{count} producto(s) cancelado(s).')
     cancelar_productos.short_description = "Cancelar productos seleccionados"
 
 
 @admin.register(Resultado)
-class ResultadoAdmin(SoloSuperusuarioBorraMixin, admin.ModelAdmin):
+class ResultadoAdmin(ShardAdminMixin, UsuarioSeparadoAdminMixin, ListadoEnReplicaMixin,
+                     SoloSuperusuarioBorraMixin, admin.ModelAdmin):
     """
     Track Record Financiero. Protegido: El staff NO puede borrar historial.
+    El cambio mensual y su porcentaje no se editan: tras cada corrección se
+    recalculan en bloque los de la serie (appKairos/analitica/cambios.py).
     """
     list_display = [
         'usuario', 'producto_info', 'mes', 'anio', 
         'capital_formato', 'cambio_formato', 'porcentaje_formato', 'fecha_registro'
     ]
-    list_filter = ['anio', 'mes', 'fecha_registro', 'producto_contratado__producto']
-    search_fields = ['usuario__email', 'usuario__username', 'producto_contratado__producto__nombre']
-    ordering = ['-anio', '-fecha_registro']
+    list_select_related = ['producto_contratado__producto']
+    list_filter = [AnioResultadoFilter, 'fecha_registro', 'producto_contratado__producto']
+    search_fields = ['producto_contratado__producto__nombre']  # + email del usuario (UsuarioSeparadoAdminMixin)
+    ordering = ['-fecha', '-pk']
     
     fieldsets = (
         ('Usuario y Producto', {
@@ -222,7 +398,29 @@ class ResultadoAdmin(SoloSuperusuarioBorraMixin, admin.ModelAdmin):
         }),
     )
     
-    readonly_fields = ['fecha_registro']
+    # mes y año se derivan de la fecha; los cambios, del resultado anterior
+    readonly_fields = ['mes', 'anio', 'cambio_mensual', 'porcentaje_cambio', 'fecha_registro']
+    
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        usuarios, fechas = {obj.usuario_id}, [obj.fecha]
+        if change:
+            # El resultado puede haber salido de otra serie o de otra fecha
+            usuarios.add(form.initial.get('usuario', obj.usuario_id))
+            fechas.append(form.initial.get('fecha', obj.fecha))
+        cambios.recalcular(obj._state.db, usuarios=usuarios, desde=min(fechas))
+    
+    def delete_model(self, request, obj):
+        alias = obj._state.db
+        super().delete_model(request, obj)
+        cambios.recalcular(alias, usuarios=[obj.usuario_id], desde=obj.fecha)
+    
+    def delete_queryset(self, request, queryset):
+        alias = queryset._db or router.db_for_write(queryset.model)
+        usuarios = set(queryset.order_by().values_list('usuario_id', flat=True).distinct())
+        desde = queryset.order_by().aggregate(desde=Min('fecha'))['desde']
+        super().delete_queryset(request, queryset)
+        cambios.recalcular(alias, usuarios=usuarios, desde=desde)
     
     def producto_info(self, obj):
         if obj.producto_contratado:
@@ -231,15 +429,15 @@ class ResultadoAdmin(SoloSuperusuarioBorraMixin, admin.ModelAdmin):
     producto_info.short_description = 'Producto'
     
     def capital_formato(self, obj):
-        return format_html('€ <strong>{:,.2f}</strong>', obj.capital_mes)
+        return format_html('€ <strong>{}</strong>', f'{obj.capital_mes:,.2f}')
     capital_formato.short_description = 'Capital'
     
     def cambio_formato(self, obj):
         color = 'green' if obj.cambio_mensual >= 0 else 'red'
         signo = '+' if obj.cambio_mensual >= 0 else ''
         return format_html(
-            '<span style="color: {};">{} € {:,.2f}</span>',
-            color, signo, obj.cambio_mensual
+            '<span style="color: {};">{} € {}</span>',
+            color, signo, f'{obj.cambio_mensual:,.2f}'
         )
     cambio_formato.short_description = 'Cambio Mensual'
     
@@ -247,17 +445,41 @@ class ResultadoAdmin(SoloSuperusuarioBorraMixin, admin.ModelAdmin):
         color = 'green' if obj.porcentaje_cambio >= 0 else 'red'
         signo = '+' if obj.porcentaje_cambio >= 0 else ''
         return format_html(
-            '<span style="color: {};">{} {:.2f}%</span>',
-            color, signo, obj.porcentaje_cambio
+            '<span style="color: {};">{} {}%</span>',
+            color, signo, f'{obj.porcentaje_cambio:.2f}'
         )
     porcentaje_formato.short_description = 'Porcentaje'
 
 
+@admin.register(MovimientoCapital)
+class MovimientoCapitalAdmin(ShardAdminMixin, UsuarioSeparadoAdminMixin, ListadoEnReplicaMixin,
+                             SoloSuperusuarioBorraMixin, admin.ModelAdmin):
+    """
+    Libro de capital de los contratos. Solo se consulta: un movimiento no se
+    corrige, se compensa con otro (appKairos/analitica/libro.py).
+    """
+    list_display = ['usuario', 'producto_contratado', 'tipo', 'importe_formato', 'fecha', 'fecha_registro']
+    list_filter = ['tipo', 'fecha']
+    search_fields = ['observaciones']  # + email del usuario (UsuarioSeparadoAdminMixin)
+    ordering = ['-fecha', '-pk']
+    raw_id_fields = ['usuario', 'producto_contratado']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def importe_formato(self, obj):
+        return format_html('€ <strong>{}</strong>', f'{obj.importe:,.2f}')
+    importe_formato.short_description = 'Importe'
+
+
 @admin.register(TokenVerificacionEmail)
-class TokenVerificacionEmailAdmin(admin.ModelAdmin):
+class TokenVerificacionEmailAdmin(UsuarioSeparadoAdminMixin, admin.ModelAdmin):
     list_display = ['usuario', 'token_corto', 'fecha_creacion', 'expira_en', 'usado', 'estado_token']
     list_filter = ['usado', 'fecha_creacion', 'expira_en']
-    search_fields = ['usuario__email', 'token']
+    search_fields = ['token']  # + email del usuario (UsuarioSeparadoAdminMixin)
     ordering = ['-fecha_creacion']
     readonly_fields = ['fecha_creacion']
     
@@ -275,8 +497,13 @@ class TokenVerificacionEmailAdmin(admin.ModelAdmin):
     estado_token.short_description = 'Estado'
 
 
+@admin.register(TokenRecuperacionPassword)
+class TokenRecuperacionPasswordAdmin(TokenVerificacionEmailAdmin):
+    pass
+
+
 @admin.register(SesionSeguridad)
-class SesionSeguridadAdmin(admin.ModelAdmin):
+class SesionSeguridadAdmin(UsuarioSeparadoAdminMixin, ListadoEnReplicaMixin, admin.ModelAdmin):
     """
     LOGS DE SEGURIDAD.
     Nadie puede agregar o editar logs.
@@ -287,7 +514,7 @@ class SesionSeguridadAdmin(admin.ModelAdmin):
         'estado_badge', 'requirio_2fa', 'fecha_intento'
     ]
     list_filter = ['exitoso', 'requirio_2fa', 'fecha_intento']
-    search_fields = ['usuario__email', 'ip_address']
+    search_fields = ['ip_address']  # + email del usuario (UsuarioSeparadoAdminMixin)
     ordering = ['-fecha_intento']
     readonly_fields = ['fecha_intento', 'usuario', 'ip_address', 'user_agent', 'exitoso', 'requirio_2fa', 'motivo_fallo']
     
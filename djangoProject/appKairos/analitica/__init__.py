@@ -0,0 +1,9 @@
+"""
+Métricas de las series de resultados mantenidas de forma incremental:
+cada Resultado insertado actualiza su estado persistido en O(1) y las
+vistas leen una fila en lugar de recorrer el historial: drawdown y
+máximo alcanzado (drawdown.py), media y volatilidad móviles (moviles.py).
+Además: el libro de capital y sus rentabilidades (libro.py), el recálculo
+de cambios (cambios.py) y la proyección Monte Carlo de la calculadora
+(calculadora.py).
+"""
@@ -0,0 +1,106 @@
+"""
+Calculadora de crecimiento: proyección Monte Carlo de un depósito
+
+Remuestrea con reemplazo (bootstrap) los rendimientos mensuales históricos
+de un producto, tomados de sus Resultado en todos los shards, y simula de
+una vez todos los caminos como una matriz caminos × meses:
+
+    calculadora.proyectar(producto, importe=1000, meses=60)
+    # {'meses': [0, ..., 60], 'percentiles': {'p5': [...], ..., 'p95': [...]}, ...}
+
+- El capital de cada camino es importe × producto de (1 + rendimiento), así
+  que las bandas son lineales en el importe, y las de los primeros meses no
+  dependen del horizonte. Se simulan y cachean una vez por producto, para
+  un euro y MESES_MAX meses; cada petición solo recorta y escala. Mover el
+  importe o el horizonte en la interfaz no vuelve a simular.
+- La clave de caché incluye la versión de la tabla de Resultado (caché de
+  querysets), de modo que un resultado nuevo deja obsoletas las
+  proyecciones en todos los procesos sin invalidarlas a mano.
+- La semilla es el producto: todos los workers dan la misma proyección.
+"""
+import numpy as np
+
+from ..cache import obtener_cache
+from ..cache.querysets import PREFIJO_TABLA
+from ..models import Resultado
+from ..series import serie_shards
+
+
+ESPACIO = 'calculadora'
+CAMINOS = 20000
+MESES_MAX = 360
+PERCENTILES = (5, 25, 50, 75, 95)
+# Meses de historial mínimos para remuestrear
+HISTORIAL_MINIMO = 3
+TTL = 3600
+
+
+def rendimientos_mensuales(producto):
+    """
+    Rendimiento de cada mes del producto (fracción), la media de los de sus
+    contratos. El resultado inicial de cada contrato, sin cambio, no cuenta.
+    """
+    serie = serie_shards(
+        Resultado.objects.filter(
+            producto_contratado__producto=producto
+        ).exclude(porcentaje_cambio=0, cambio_mensual=0).order_by('fecha'),
+        'fecha', 'porcentaje_cambio', arrays=True
+    )
+    if not len(serie['fecha']):
+        return np.empty(0)
+    _, meses = np.unique(serie['fecha'].astype('datetime64[M]'), return_inverse=True)
+    return np.bincount(meses, weights=serie['porcentaje_cambio']) / np.bincount(meses) / 100
+
+
+def simular(rendimientos, meses, caminos=CAMINOS, semilla=None):
+    """
+    Bandas de capital de un euro mes a mes: (percentiles × meses + 1,
+    fracción de caminos por debajo de lo invertido en cada mes)
+    """
+    generador = np.random.default_rng(semilla)
+    factores = (1 + np.asarray(rendimientos, dtype=np.float32))[
+        generador.integers(0, len(rendimientos), size=(caminos, meses), dtype=np.int32)
+    ]
+    capital = np.cumprod(factores, axis=1, out=factores)
+    bandas = np.ones((len(PERCENTILES), meses + 1))
+    bandas[:, 1:] = np.percentile(capital, PERCENTILES, axis=0)
+    perdida = np.zeros(meses + 1)
+    perdida[1:] = np.mean(capital < 1, axis=0)
+    return bandas, perdida
+
+
+def _version_resultados():
+    return obtener_cache().version(PREFIJO_TABLA + Resultado._meta.db_table)
+
+
+def proyectar(producto, importe, meses):
+    """
+    Percentiles del capital de un depósito mes a mes, o None si el producto
+    no tiene historial suficiente. importe en euros; meses de 1 a MESES_MAX.
+    """
+    if not 1 <= meses <= MESES_MAX:
+        raise ValueError(f'El horizonte debe estar entre 1 y {MESES_MAX} meses.')
+    if not 0 < importe < float('inf'):
+        raise ValueError('El importe debe ser un número mayor que cero.')
+
+    espacio = obtener_cache().espacio(ESPACIO)
+    version = _version_resultados()
+    historial = espacio.get_or_set(
+        f'rendimientos:{producto.pk}:{version}', lambda: rendimientos_mensuales(producto), ttl=TTL
+    )
+    if len(historial) < HISTORIAL_MINIMO:
+        return None
+    bandas, perdida = espacio.get_or_set(
+        f'bandas:{producto.pk}:{version}',
+        lambda: simular(historial, MESES_MAX, semilla=producto.pk),
+        ttl=TTL,
+    )
+    return {
+        'meses': list(range(meses + 1)),
+        'percentiles': {
+            f'p{percentil}': np.round(banda[:meses + 1] * importe, 2).tolist()
+            for percentil, banda in zip(PERCENTILES, bandas)
+        },
+        'probabilidad_perdida': round(float(perdida[meses]), 4),
+        'historial_meses': len(historial),
+    }
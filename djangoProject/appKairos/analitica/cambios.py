@@ -0,0 +1,164 @@
+"""
+Recálculo en bloque de cambio_mensual y porcentaje_cambio
+
+Cada Resultado se compara con el anterior de su serie, la de su usuario y
+su contrato (o la de los totales del usuario si no tiene contrato),
+ordenada por (fecha, id). En lugar de traer el mes anterior fila a fila
+(Resultado.calcular_cambios), una sola sentencia lo toma con LAG() y
+corrige todas las filas de un lote de usuarios:
+
+    cambios.recalcular(alias, usuarios=[usuario.pk], desde=date(2024, 1, 1))
+    cambios.recalcular(alias, contrato=contrato.pk)
+    cambios.recalcular(alias)                     # todo el shard, por lotes
+
+- Con `desde` solo se reescriben las filas desde esa fecha, pero la ventana
+  empieza en el resultado anterior de cada serie para tener su capital.
+- Solo se escriben las filas cuyo valor cambia.
+- ResultadoQuerySet lo ejecuta tras update() y bulk_create() (importaciones,
+  cierres) y ResultadoAdmin tras las correcciones; también está el comando
+  recalcular_cambios. Necesita PostgreSQL o SQLite 3.33+ (UPDATE ... FROM).
+- Como son escrituras sin señales, deja pendientes las métricas afectadas
+  (drawdown.py, moviles.py).
+"""
+from django.db import connections
+from django.db.models import Max, Min
+
+from ..cache.querysets import invalidar_tablas
+from ..models import EstadisticasMoviles, EstadoDrawdown, Resultado
+
+
+TAMANO_LOTE = 500
+
+
+def _sql(connection, filtro, nuevas):
+    columna = {
+        campo: connection.ops.quote_name(Resultado._meta.get_field(campo).column)
+        for campo in ('id', 'usuario', 'producto_contratado', 'fecha',
+                      'capital_mes', 'cambio_mensual', 'porcentaje_cambio')
+    }
+    tabla = connection.ops.quote_name(Resultado._meta.db_table)
+    filtro = ' AND '.join(condicion.format(**columna) for condicion in filtro)
+    nuevas = ' AND '.join(nuevas) or '1 = 1'
+    # Sin WITH delante del UPDATE: el módulo sqlite3 no daría el número de filas
+    return f"""
+        UPDATE {tabla}
+        SET {columna['cambio_mensual']} = nuevos.cambio,
+            {columna['porcentaje_cambio']} = nuevos.porcentaje
+        FROM (
+            SELECT fila,
+                   CASE WHEN anterior > 0 THEN capital - anterior ELSE 0 END AS cambio,
+                   CASE WHEN anterior > 0
+                        THEN ROUND((capital - anterior) * 100.0 / anterior, 2)
+                        ELSE 0 END AS porcentaje
+            FROM (
+                SELECT {columna['id']} AS fila, {columna['fecha']} AS fecha,
+                       {columna['capital_mes']} AS capital,
+                       LAG({columna['capital_mes']}) OVER (
+                           PARTITION BY {columna['usuario']}, {columna['producto_contratado']}
+                           ORDER BY {columna['fecha']}, {columna['id']}
+                       ) AS anterior
+                FROM {tabla}
+                WHERE {filtro}
+            ) AS ventana
+            WHERE {nuevas}
+        ) AS nuevos
+        WHERE {tabla}.{columna['id']} = nuevos.fila
+          AND ({tabla}.{columna['cambio_mensual']} <> nuevos.cambio
+               OR {tabla}.{columna['porcentaje_cambio']} <> nuevos.porcentaje)
+    """
+
+
+def _inicio_ventana(filas, desde):
+    """
+    Fecha desde la que leer para que cada serie incluya su resultado
+    anterior a `desde`: la menor de las últimas fechas previas
+    """
+    anterior = filas.filter(fecha__lt=desde).values('usuario_id', 'producto_contratado_id').annotate(
+        ultima=Max('fecha')
+    ).aggregate(inicio=Min('ultima'))['inicio']
+    return anterior or desde
+
+
+def _lotes(alias, usuarios, desde, hasta, tamano_lote):
+    if usuarios is None:
+        filas = Resultado.objects.using(alias).all()
+        if desde:
+            filas = filas.filter(fecha__gte=desde)
+        if hasta:
+            filas = filas.filter(fecha__lte=hasta)
+        usuarios = filas.order_by('usuario_id').values_list('usuario_id', flat=True).distinct().iterator()
+    lote = []
+    for usuario_id in usuarios:
+        lote.append(usuario_id)
+        if len(lote) == tamano_lote:
+            yield lote
+            lote = []
+    if lote:
+        yield lote
+
+
+def recalcular(alias, usuarios=None, contrato=None, desde=None, hasta=None, tamano_lote=TAMANO_LOTE):
+    """
+    Recalcula los cambios de los resultados del contrato, o de los usuarios
+    indicados (todos los del shard si no se indican), con fecha entre
+    `desde` y `hasta`. Devuelve el número de filas modificadas.
+    """
+    if contrato is not None:
+        lotes = [None]
+    else:
+        lotes = _lotes(alias, sorted(set(usuarios)) if usuarios is not None else None, desde, hasta, tamano_lote)
+
+    connection = connections[alias]
+    total = 0
+    for lote in lotes:
+        filas = Resultado.objects.using(alias)
+        if contrato is not None:
+            filas = filas.filter(producto_contratado_id=contrato)
+            ambito, parametros = ['{producto_contratado} = %s'], [contrato]
+        else:
+            filas = filas.filter(usuario_id__in=lote)
+            ambito = ['{usuario} IN (' + ', '.join(['%s'] * len(lote)) + ')']
+            parametros = list(lote)
+
+        filtro, nuevas = list(ambito), []
+        if desde:
+            filtro.append('{fecha} >= %s')
+            parametros.append(_inicio_ventana(filas, desde))
+        if hasta:
+            filtro.append('{fecha} <= %s')
+            parametros.append(hasta)
+        if desde:
+            nuevas.append('fecha >= %s')
+            parametros.append(desde)
+
+        with connection.cursor() as cursor:
+            cursor.execute(_sql(connection, filtro, nuevas), parametros)
+            modificadas = cursor.rowcount
+        if modificadas > 0:
+            total += modificadas
+            # porcentaje_cambio ha cambiado: las estadísticas móviles ya no valen
+            estadisticas = EstadisticasMoviles.objects.using(alias).filter(pendiente=False)
+            if contrato is not None:
+                estadisticas = estadisticas.filter(producto_contratado_id=contrato)
+            else:
+                estadisticas = estadisticas.filter(usuario_id__in=lote)
+            estadisticas.update(pendiente=True)
+    if total:
+        invalidar_tablas([Resultado._meta.db_table], using=alias)
+    return total
+
+
+def tras_edicion(alias, usuarios, desde=None):
+    """
+    Tras una escritura en bloque que ha cambiado capitales o fechas de los
+    resultados de esos usuarios: recalcula sus cambios y deja pendientes
+    su drawdown y sus estadísticas móviles
+    """
+    usuarios = sorted(set(usuarios))
+    if not usuarios:
+        return 0
+    for inicio in range(0, len(usuarios), TAMANO_LOTE):
+        lote = usuarios[inicio:inicio + TAMANO_LOTE]
+        for modelo in (EstadoDrawdown, EstadisticasMoviles):
+            modelo.objects.using(alias).filter(usuario_id__in=lote, pendiente=False).update(pendiente=True)
+    return recalcular(alias, usuarios=usuarios, desde=desde)
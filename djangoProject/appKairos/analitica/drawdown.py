@@ -0,0 +1,149 @@
+"""
+Drawdown incremental por contrato y por usuario
+
+EstadoDrawdown guarda para cada serie de resultados (la de un contrato y la
+de todos los resultados del usuario) el máximo alcanzado y el drawdown
+actual y máximo, así que leer la métrica es consultar una fila, sea cual
+sea la longitud del historial:
+
+    drawdown.estado(usuario).drawdown_maximo             # Decimal('12.5000') (%)
+    drawdown.estado(usuario, contrato).drawdown_actual
+
+- Un Resultado con fecha igual o posterior a la última procesada se aplica
+  en O(1) al guardarse (señal post_save).
+- Un Resultado con fecha anterior se recalcula desde cero al momento. Las
+  ediciones y los borrados (p. ej. borrar_historial_view) solo marcan el
+  estado como pendiente: la siguiente lectura lo recalcula con la serie
+  completa, vectorizada con NumPy.
+- La serie es la de los resultados ordenados por (fecha, id), como la
+  muestra el dashboard, y el estado vive en el mismo shard que ellos. La
+  del usuario son sus totales del cierre mensual, o todos sus resultados
+  si aún no tiene ninguno (ResultadoQuerySet.del_usuario).
+"""
+from decimal import ROUND_HALF_UP, Decimal
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Q
+
+from ..db.shards import shard_de
+from ..dinero import Dinero
+from ..models import EstadoDrawdown, Resultado
+
+
+PRECISION = Decimal('0.0001')
+
+
+def _porcentaje(maximo, capital):
+    """Caída en % de capital respecto a maximo (ambos en céntimos)"""
+    if maximo <= 0:
+        return Decimal(0)
+    return (Decimal(maximo - capital) * 100 / Decimal(maximo)).quantize(PRECISION, rounding=ROUND_HALF_UP)
+
+
+def _totales(resultado, alias):
+    """Otros resultados totales (sin contrato) del usuario"""
+    return Resultado.objects.using(alias).filter(
+        usuario_id=resultado.usuario_id, producto_contratado__isnull=True
+    ).exclude(pk=resultado.pk)
+
+
+def _contratos(resultado, alias):
+    """
+    Series a las que pertenece un resultado: la de su contrato y la total,
+    salvo que el usuario ya tenga totales; un total, solo a la total
+    """
+    contrato_id = resultado.producto_contratado_id
+    if not contrato_id:
+        return [None]
+    return [contrato_id] if _totales(resultado, alias).exists() else [contrato_id, None]
+
+
+def _resultados(estado, alias):
+    filas = Resultado.objects.using(alias).filter(usuario_id=estado.usuario_id)
+    if estado.producto_contratado_id:
+        return filas.filter(producto_contratado_id=estado.producto_contratado_id)
+    return filas.del_usuario()
+
+
+def aplicar(estado, capital, fecha):
+    """Añade al final de la serie un capital en céntimos"""
+    maximo = capital if not estado.resultados else max(estado.maximo.centimos, capital)
+    estado.maximo = Dinero.de_centimos(maximo)
+    estado.drawdown_actual = _porcentaje(maximo, capital)
+    estado.drawdown_maximo = max(estado.drawdown_maximo, estado.drawdown_actual)
+    estado.ultima_fecha = fecha
+    estado.resultados += 1
+
+
+def recalcular(estado, alias):
+    """Rehace el estado con la serie completa"""
+    serie = _resultados(estado, alias).order_by('fecha', 'pk').serie('fecha', 'capital_mes', arrays=True)
+    capitales = serie['capital_mes']
+    estado.maximo = Dinero(0)
+    estado.drawdown_actual = estado.drawdown_maximo = Decimal(0)
+    estado.ultima_fecha = None
+    estado.resultados = len(capitales)
+    estado.pendiente = False
+    if not len(capitales):
+        return
+
+    maximos = np.maximum.accumulate(capitales)
+    positivos = maximos > 0
+    caidas = np.zeros(len(capitales))
+    caidas[positivos] = (maximos[positivos] - capitales[positivos]) / maximos[positivos]
+    # Los porcentajes guardados se calculan exactos, con enteros
+    peor = int(np.argmax(caidas))
+    estado.maximo = Dinero.de_centimos(maximos[-1])
+    estado.drawdown_actual = _porcentaje(int(maximos[-1]), int(capitales[-1]))
+    estado.drawdown_maximo = _porcentaje(int(maximos[peor]), int(capitales[peor]))
+    estado.ultima_fecha = serie['fecha'][-1].item()
+
+
+def _bloquear(alias, usuario_id, contrato_id):
+    return EstadoDrawdown.objects.using(alias).select_for_update().get_or_create(
+        usuario_id=usuario_id, producto_contratado_id=contrato_id
+    )
+
+
+def registrar(resultado, alias):
+    """Actualiza los estados afectados por un Resultado recién insertado"""
+    fecha = Resultado._meta.get_field('fecha').to_python(resultado.fecha)
+    capital = resultado.capital_mes.centimos
+    # El primer total sustituye en la serie del usuario a los resultados de sus contratos
+    primer_total = not resultado.producto_contratado_id and not _totales(resultado, alias).exists()
+    for contrato_id in _contratos(resultado, alias):
+        with transaction.atomic(using=alias):
+            estado, creado = _bloquear(alias, resultado.usuario_id, contrato_id)
+            if (creado or estado.pendiente or primer_total
+                    or (estado.ultima_fecha and fecha < estado.ultima_fecha)):
+                # Sin estado previo (datos anteriores), fuera de orden o serie nueva
+                recalcular(estado, alias)
+            else:
+                aplicar(estado, capital, fecha)
+            estado.save(using=alias)
+
+
+def marcar_pendiente(usuario_id, contrato_id, alias):
+    """La siguiente lectura recalculará las series del contrato y del usuario"""
+    EstadoDrawdown.objects.using(alias).filter(
+        Q(producto_contratado_id=contrato_id) | Q(producto_contratado__isnull=True),
+        usuario_id=usuario_id, pendiente=False
+    ).update(pendiente=True)
+
+
+def estado(usuario, contrato=None):
+    """EstadoDrawdown de la serie del usuario o de uno de sus contratos, al día"""
+    alias = shard_de(usuario)
+    usuario_id = getattr(usuario, 'pk', usuario)
+    contrato_id = getattr(contrato, 'pk', contrato)
+    actual = EstadoDrawdown.objects.using(alias).filter(
+        usuario_id=usuario_id, producto_contratado_id=contrato_id
+    ).first()
+    if actual is not None and not actual.pendiente:
+        return actual
+    with transaction.atomic(using=alias):
+        actual, _ = _bloquear(alias, usuario_id, contrato_id)
+        recalcular(actual, alias)
+        actual.save(using=alias)
+    return actual
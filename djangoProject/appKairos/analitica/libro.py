@@ -0,0 +1,296 @@
+"""
+Libro de capital por contrato
+
+MovimientoCapital guarda, solo insertando, lo que pasa con el capital de
+cada contrato: aportaciones y retiradas del usuario (sus flujos de caja) y
+valoraciones del capital. El saldo a cualquier fecha se reconstruye
+reproduciéndolos:
+
+    libro.aportar(contrato, contrato.monto_invertido)
+    libro.saldo(contrato, date(2025, 3, 31))          # Dinero('1030.00')
+    libro.rendimientos(usuario)                       # {'twr': 3.0, 'mwr': 12.68, ...}
+
+- Una valoración fija el saldo del contrato; una aportación lo sube y una
+  retirada lo baja. El orden es (fecha, id).
+- InstantaneaSaldo guarda el saldo y lo aportado neto de un contrato al
+  final de un día (guardar_instantaneas), así que solo se reproduce lo
+  posterior a la más cercana. Insertar un movimiento con fecha ya cubierta
+  borra las instantáneas afectadas; la próxima ejecución las rehace.
+- Rentabilidad ponderada por tiempo (TWR): encadena lo que cambia el saldo
+  total en cada valoración, sin contar aportaciones ni retiradas. Ponderada
+  por dinero (MWR): la TIR anual de los flujos del usuario más el saldo
+  final. Las dos se calculan con NumPy sobre las columnas del libro.
+"""
+from datetime import datetime
+
+import numpy as np
+from django.db.models import F, OuterRef, Q, Subquery
+from django.utils import timezone
+
+from ..db.shards import shard_de
+from ..dinero import Dinero
+from ..models import InstantaneaSaldo, MovimientoCapital
+
+
+TAMANO_LOTE = 1000
+DIAS_POR_ANIO = 365.25
+
+
+def _fecha(fecha):
+    if fecha is None:
+        return timezone.localdate()
+    if isinstance(fecha, datetime):
+        return timezone.localtime(fecha).date() if timezone.is_aware(fecha) else fecha.date()
+    return fecha
+
+
+def aportar(contrato, importe, fecha=None, observaciones=None):
+    """Registra dinero que el usuario pone en el contrato"""
+    return MovimientoCapital.objects.using(contrato._state.db).create(
+        usuario_id=contrato.usuario_id, producto_contratado=contrato, tipo='aportacion',
+        importe=importe, fecha=_fecha(fecha), observaciones=observaciones,
+    )
+
+
+def retirar(contratos, fecha=None, observaciones=None):
+    """
+    Registra la retirada de todo el capital_actual de esos contratos (al
+    cancelarlos). Devuelve los movimientos creados.
+    """
+    por_alias = {}
+    for contrato in contratos:
+        por_alias.setdefault(contrato._state.db, []).append(MovimientoCapital(
+            usuario_id=contrato.usuario_id, producto_contratado_id=contrato.pk, tipo='retirada',
+            importe=contrato.capital_actual, fecha=_fecha(fecha), observaciones=observaciones,
+        ))
+    return [
+        movimiento
+        for alias, filas in por_alias.items()
+        for movimiento in MovimientoCapital.objects.using(alias).bulk_create(filas, batch_size=TAMANO_LOTE)
+    ]
+
+
+# ----------------------------------------------------------------------
+# Reproducción del libro
+# ----------------------------------------------------------------------
+
+def _flujos(tipos, importes):
+    """Flujo de cada movimiento en céntimos: + aportación, - retirada, 0 valoración"""
+    return np.where(tipos == 'aportacion', importes, np.where(tipos == 'retirada', -importes, 0))
+
+
+def reproducir(contratos, tipos, importes, iniciales=None):
+    """
+    Columnas del libro en orden (fecha, id) → (saldo de su contrato tras
+    cada movimiento, cuánto cambia con él el saldo total), en céntimos.
+    `iniciales` son los saldos {contrato_id: céntimos} antes de la primera
+    fila (los de las instantáneas).
+    """
+    iniciales = iniciales or {}
+    n = len(contratos)
+    if not n:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+
+    # Cada contrato en un tramo contiguo, conservando el orden del libro
+    orden = np.argsort(contratos, kind='stable')
+    contrato = contratos[orden]
+    tipo = tipos[orden]
+    importe = importes[orden]
+    flujo = _flujos(tipo, importe)
+    valoracion = tipo == 'valoracion'
+    inicio = np.r_[True, contrato[1:] != contrato[:-1]]
+    inicial = np.array(
+        [iniciales.get(int(pk), 0) for pk in contrato[inicio]], dtype=np.int64
+    )[np.cumsum(inicio) - 1]
+
+    # Ancla de cada fila: su última valoración o el principio de su tramo.
+    # El saldo es el del ancla más los flujos desde ella.
+    posicion = np.arange(n)
+    ancla = np.maximum.accumulate(np.where(valoracion | inicio, posicion, 0))
+    acumulado = np.cumsum(flujo)
+    base = np.where(valoracion, importe, inicial)
+    saldo = base[ancla] + acumulado - acumulado[ancla] + flujo[ancla]
+    cambio = saldo - np.where(inicio, inicial, np.r_[0, saldo[:-1]])
+
+    saldos = np.empty(n, dtype=np.int64)
+    cambios = np.empty(n, dtype=np.int64)
+    saldos[orden] = saldo
+    cambios[orden] = cambio
+    return saldos, cambios
+
+
+def _columnas(movimientos):
+    return movimientos.order_by('fecha', 'pk').serie(
+        'fecha', 'producto_contratado', 'tipo', 'importe', arrays=True
+    )
+
+
+def _ultima_instantanea(alias, fecha):
+    return InstantaneaSaldo.objects.using(alias).filter(
+        producto_contratado_id=OuterRef('producto_contratado_id'), fecha__lte=fecha
+    ).order_by('-fecha').values('fecha')[:1]
+
+
+def al_dia(movimientos, fecha):
+    """
+    {contrato_id: [saldo, aportado neto, movimientos]} (céntimos) al final
+    de `fecha` de los contratos de esos movimientos: su instantánea más
+    reciente y lo que haya después en el libro
+    """
+    alias = movimientos.db
+    estado = {
+        contrato_id: [saldo.centimos, aportado.centimos, cantidad]
+        for contrato_id, saldo, aportado, cantidad in InstantaneaSaldo.objects.using(alias).filter(
+            producto_contratado_id__in=movimientos.order_by().values('producto_contratado_id'),
+            fecha=Subquery(_ultima_instantanea(alias, fecha)),
+        ).values_list('producto_contratado_id', 'saldo', 'aportado_neto', 'movimientos')
+    }
+    posteriores = movimientos.filter(fecha__lte=fecha).alias(
+        desde=Subquery(_ultima_instantanea(alias, fecha))
+    ).filter(Q(desde__isnull=True) | Q(fecha__gt=F('desde')))
+
+    columnas = _columnas(posteriores)
+    contratos = columnas['producto_contratado']
+    if not len(contratos):
+        return estado
+    saldos, _ = reproducir(
+        contratos, columnas['tipo'], columnas['importe'], {pk: fila[0] for pk, fila in estado.items()}
+    )
+    ids, indices = np.unique(contratos, return_inverse=True)
+    aportado = np.bincount(indices, weights=_flujos(columnas['tipo'], columnas['importe']))
+    cantidades = np.bincount(indices)
+    # El último saldo de cada contrato: np.unique da los índices de la primera
+    # aparición, así que se busca en las filas invertidas
+    ultimas = len(contratos) - 1 - np.unique(contratos[::-1], return_index=True)[1]
+    for pk, saldo, suma, cantidad in zip(ids.tolist(), saldos[ultimas].tolist(), aportado.tolist(), cantidades.tolist()):
+        fila = estado.setdefault(pk, [0, 0, 0])
+        fila[0] = saldo
+        fila[1] += int(suma)
+        fila[2] += cantidad
+    return estado
+
+
+def saldo(contrato, fecha=None):
+    """Saldo del contrato al final de `fecha` (hoy por defecto) según su libro"""
+    movimientos = MovimientoCapital.objects.using(contrato._state.db).filter(producto_contratado_id=contrato.pk)
+    estado = al_dia(movimientos, _fecha(fecha)).get(contrato.pk)
+    return Dinero.de_centimos(estado[0] if estado else 0)
+
+
+def guardar_instantaneas(alias, fecha, tamano_lote=TAMANO_LOTE):
+    """
+    Guarda (o rehace) la instantánea de `fecha` de cada contrato con
+    movimientos hasta entonces, por lotes de contratos. Devuelve cuántas.
+    """
+    libro = MovimientoCapital.objects.using(alias).filter(fecha__lte=fecha)
+    contratos = list(libro.order_by('producto_contratado_id').values_list(
+        'producto_contratado_id', flat=True
+    ).distinct())
+    guardadas = 0
+    for inicio in range(0, len(contratos), tamano_lote):
+        movimientos = libro.filter(producto_contratado_id__in=contratos[inicio:inicio + tamano_lote])
+        usuarios = dict(movimientos.order_by().values_list('producto_contratado_id', 'usuario_id').distinct())
+        instantaneas = [
+            InstantaneaSaldo(
+                usuario_id=usuarios[pk], producto_contratado_id=pk, fecha=fecha,
+                saldo=Dinero.de_centimos(saldo_), aportado_neto=Dinero.de_centimos(aportado),
+                movimientos=cantidad,
+            )
+            for pk, (saldo_, aportado, cantidad) in sorted(al_dia(movimientos, fecha).items())
+        ]
+        InstantaneaSaldo.objects.using(alias).bulk_create(
+            instantaneas, update_conflicts=True, unique_fields=['producto_contratado', 'fecha'],
+            update_fields=['saldo', 'aportado_neto', 'movimientos'],
+        )
+        guardadas += len(instantaneas)
+    return guardadas
+
+
+# ----------------------------------------------------------------------
+# Rentabilidades
+# ----------------------------------------------------------------------
+
+def tir(flujos, anios):
+    """
+    Tasa anual r con Σ flujo · (1 + r)^-años = 0, o None si los flujos no
+    cambian de signo o no pasa el tiempo. Evalúa el valor actual en una
+    rejilla de tasas de una vez y la estrecha alrededor del cambio de signo.
+    """
+    flujos = np.asarray(flujos, dtype=np.float64)
+    anios = np.asarray(anios, dtype=np.float64)
+    if not (flujos > 0).any() or not (flujos < 0).any() or not np.ptp(anios):
+        return None
+
+    factores = np.geomspace(1e-3, 1e3, 257)  # 1 + r, de -99.9% a +99900%
+    with np.errstate(over='ignore', invalid='ignore'):
+        for _ in range(8):
+            valores = (flujos[None, :] * factores[:, None] ** -anios[None, :]).sum(axis=1)
+            signos = np.sign(valores)
+            cambios = np.flatnonzero(
+                np.isfinite(valores[:-1]) & np.isfinite(valores[1:]) & (signos[:-1] != signos[1:])
+            )
+            if not len(cambios):
+                return None
+            # Con varios cambios de signo, la tasa más cercana a cero
+            i = cambios[np.argmin(np.abs(np.log(factores[cambios])))]
+            factores = np.linspace(factores[i], factores[i + 1], 65)
+    return float(factores[32] - 1)
+
+
+def medir(columnas, iniciales=None, desde=None, hasta=None):
+    """
+    TWR y MWR en % de unas columnas del libro (fecha, producto_contratado,
+    tipo, importe) que empiezan con los saldos `iniciales` en `desde`
+    """
+    iniciales = iniciales or {}
+    fechas, tipos, importes = columnas['fecha'], columnas['tipo'], columnas['importe']
+    _, cambios = reproducir(columnas['producto_contratado'], tipos, importes, iniciales)
+
+    inicial = sum(iniciales.values())
+    totales = inicial + np.cumsum(cambios)
+    anteriores = np.r_[inicial, totales[:-1]]
+    cuentan = (tipos == 'valoracion') & (anteriores > 0)
+    twr = float(np.prod(totales[cuentan] / anteriores[cuentan])) - 1 if cuentan.any() else 0.0
+    final = int(totales[-1]) if len(totales) else inicial
+
+    # Para el usuario aportar es un pago (negativo) y el saldo final, un cobro
+    flujos = -_flujos(tipos, importes).astype(np.float64)
+    fechas_flujo = fechas
+    if inicial and desde is not None:
+        flujos = np.r_[-inicial, flujos]
+        fechas_flujo = np.r_[np.datetime64(desde, 'D'), fechas_flujo]
+    if len(fechas_flujo):
+        fin = np.datetime64(hasta, 'D') if hasta is not None else fechas_flujo[-1]
+        flujos = np.r_[flujos, final]
+        fechas_flujo = np.r_[fechas_flujo, fin]
+        anios = (fechas_flujo - fechas_flujo[0]).astype(np.float64) / DIAS_POR_ANIO
+        mwr = tir(flujos, anios)
+    else:
+        mwr = None
+
+    return {
+        'twr': round(twr * 100, 4),
+        'mwr': None if mwr is None else round(mwr * 100, 4),
+        'saldo': Dinero.de_centimos(final),
+        'aportado_neto': Dinero.de_centimos(int(_flujos(tipos, importes).sum())),
+    }
+
+
+def rendimientos(usuario, desde=None, hasta=None, contrato=None):
+    """
+    TWR y MWR (en %) del usuario, o de uno de sus contratos, entre `desde`
+    (por defecto el primer movimiento) y `hasta` (por defecto hoy), con el
+    saldo final y lo aportado neto en el periodo
+    """
+    usuario_id = getattr(usuario, 'pk', usuario)
+    hasta = _fecha(hasta)
+    movimientos = MovimientoCapital.objects.using(shard_de(usuario_id)).filter(
+        usuario_id=usuario_id, fecha__lte=hasta
+    )
+    if contrato is not None:
+        movimientos = movimientos.filter(producto_contratado_id=getattr(contrato, 'pk', contrato))
+    iniciales = {}
+    if desde is not None:
+        iniciales = {pk: fila[0] for pk, fila in al_dia(movimientos, desde).items()}
+        movimientos = movimientos.filter(fecha__gt=desde)
+    return medir(_columnas(movimientos), iniciales, desde, hasta)
@@ -0,0 +1,216 @@
+"""
+Estadísticas móviles por contrato y por producto
+
+EstadisticasMoviles guarda, para cada contrato, la media y la volatilidad
+de porcentaje_cambio en los últimos 3, 6 y 12 resultados como acumuladores
+de Welford (n, media, M2) por ventana:
+
+    moviles.estadisticas(contrato).volatilidad(6)
+    moviles.por_producto(producto)      # {3: (media, volatilidad), 6: ..., 12: ...}
+
+- Un Resultado de un contrato con fecha igual o posterior a la última
+  procesada se aplica en O(1): se añade a cada ventana y, si ya estaba
+  llena, se quita el valor que sale (guardado en `ultimos`).
+- Con fecha anterior se recalcula al momento; las ediciones y los borrados
+  dejan el estado pendiente para la siguiente lectura, como el drawdown.
+- Las estadísticas por producto combinan los acumuladores de todos sus
+  contratos con una agregación por shard, sin leer resultados.
+- Añadir y quitar valores acumula redondeos de coma flotante: el comando
+  reconciliar_estadisticas recalcula todos los contratos de forma
+  vectorizada (recalcular_shard) y corrige las diferencias.
+"""
+from decimal import Decimal
+
+import numpy as np
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import F, Sum
+
+from ..db.shards import shard_de, shards, sharding_activo
+from ..models import VENTANAS_MOVILES, EstadisticasMoviles, Resultado
+
+
+VENTANA_MAYOR = max(VENTANAS_MOVILES)
+
+
+def _anadir(n, media, m2, valor):
+    n += 1
+    delta = valor - media
+    media += delta / n
+    return n, media, m2 + delta * (valor - media)
+
+
+def _quitar(n, media, m2, valor):
+    if n <= 1:
+        return 0, 0.0, 0.0
+    media_nueva = (n * media - valor) / (n - 1)
+    return n - 1, media_nueva, max(m2 - (valor - media) * (valor - media_nueva), 0.0)
+
+
+def _acumuladores(estadisticas, ventana):
+    return tuple(getattr(estadisticas, f'{nombre}_{ventana}') for nombre in ('n', 'media', 'm2'))
+
+
+def _fijar(estadisticas, ventana, n, media, m2):
+    setattr(estadisticas, f'n_{ventana}', n)
+    setattr(estadisticas, f'media_{ventana}', media)
+    setattr(estadisticas, f'm2_{ventana}', m2)
+
+
+def aplicar(estadisticas, valor, fecha):
+    """Añade un porcentaje de cambio al final de la serie del contrato"""
+    ultimos = list(estadisticas.ultimos)
+    for ventana in VENTANAS_MOVILES:
+        n, media, m2 = _acumuladores(estadisticas, ventana)
+        if n == ventana:
+            n, media, m2 = _quitar(n, media, m2, ultimos[-ventana])
+        _fijar(estadisticas, ventana, *_anadir(n, media, m2, valor))
+    estadisticas.ultimos = (ultimos + [valor])[-VENTANA_MAYOR:]
+    estadisticas.ultima_fecha = fecha
+
+
+def _de_valores(estadisticas, valores):
+    """Acumuladores calculados directamente a partir de la serie completa"""
+    for ventana in VENTANAS_MOVILES:
+        cola = valores[-ventana:]
+        media = float(cola.mean()) if len(cola) else 0.0
+        _fijar(estadisticas, ventana, len(cola), media, float(((cola - media) ** 2).sum()))
+    estadisticas.ultimos = valores[-VENTANA_MAYOR:].tolist()
+
+
+def recalcular(estadisticas, alias):
+    """Rehace las estadísticas del contrato con todos sus resultados"""
+    serie = Resultado.objects.using(alias).filter(
+        producto_contratado_id=estadisticas.producto_contratado_id
+    ).order_by('fecha', 'pk').serie('fecha', 'porcentaje_cambio', arrays=True)
+    _de_valores(estadisticas, serie['porcentaje_cambio'])
+    estadisticas.ultima_fecha = serie['fecha'][-1].item() if len(serie['fecha']) else None
+    estadisticas.pendiente = False
+
+
+def _guardado(resultado):
+    """
+    porcentaje_cambio redondeado a los decimales del campo, como lo guarda la
+    base de datos y lo lee recalcular(); la instancia puede traerlo sin redondear
+    """
+    campo = Resultado._meta.get_field('porcentaje_cambio')
+    return float(Decimal(resultado.porcentaje_cambio).quantize(Decimal(1).scaleb(-campo.decimal_places)))
+
+
+def registrar(resultado, alias):
+    """Actualiza las estadísticas del contrato de un Resultado recién insertado"""
+    if not resultado.producto_contratado_id:
+        return
+    fecha = Resultado._meta.get_field('fecha').to_python(resultado.fecha)
+    with transaction.atomic(using=alias):
+        filas = EstadisticasMoviles.objects.using(alias).select_for_update()
+        estadisticas = filas.filter(producto_contratado_id=resultado.producto_contratado_id).first()
+        if estadisticas is None:
+            # Primera vez (o datos anteriores a la tabla): desde cero
+            estadisticas, _ = filas.get_or_create(
+                producto_contratado_id=resultado.producto_contratado_id,
+                defaults={
+                    'usuario_id': resultado.usuario_id,
+                    'producto_id': resultado.producto_contratado.producto_id,
+                },
+            )
+            recalcular(estadisticas, alias)
+        elif estadisticas.pendiente or (estadisticas.ultima_fecha and fecha < estadisticas.ultima_fecha):
+            recalcular(estadisticas, alias)
+        else:
+            aplicar(estadisticas, _guardado(resultado), fecha)
+        estadisticas.save(using=alias)
+
+
+def marcar_pendiente(contrato_id, alias):
+    if contrato_id:
+        EstadisticasMoviles.objects.using(alias).filter(
+            producto_contratado_id=contrato_id, pendiente=False
+        ).update(pendiente=True)
+
+
+def estadisticas(contrato):
+    """EstadisticasMoviles del contrato, al día"""
+    alias = contrato._state.db or shard_de(contrato.usuario_id)
+    actual = EstadisticasMoviles.objects.using(alias).filter(producto_contratado_id=contrato.pk).first()
+    if actual is not None and not actual.pendiente:
+        return actual
+    with transaction.atomic(using=alias):
+        actual, _ = EstadisticasMoviles.objects.using(alias).select_for_update().get_or_create(
+            producto_contratado_id=contrato.pk,
+            defaults={'usuario_id': contrato.usuario_id, 'producto_id': contrato.producto_id},
+        )
+        recalcular(actual, alias)
+        actual.save(using=alias)
+    return actual
+
+
+def por_producto(producto):
+    """
+    {ventana: (media, volatilidad)} de los porcentajes de todos los contratos
+    del producto, combinando sus acumuladores (fórmula de Chan)
+    """
+    producto_id = getattr(producto, 'pk', producto)
+    totales = {ventana: [0, 0.0, 0.0, 0.0] for ventana in VENTANAS_MOVILES}
+    for alias in shards() if sharding_activo() else [DEFAULT_DB_ALIAS]:
+        filas = EstadisticasMoviles.objects.using(alias).filter(producto_id=producto_id)
+        for pendiente in filas.filter(pendiente=True):
+            with transaction.atomic(using=alias):
+                recalcular(pendiente, alias)
+                pendiente.save(using=alias)
+        sumas = filas.aggregate(**{
+            clave: expresion
+            for ventana in VENTANAS_MOVILES
+            for clave, expresion in (
+                (f'total_n_{ventana}', Sum(f'n_{ventana}')),
+                (f'total_suma_{ventana}', Sum(F(f'n_{ventana}') * F(f'media_{ventana}'))),
+                (f'total_m2_{ventana}', Sum(f'm2_{ventana}')),
+                (f'total_cuadrados_{ventana}', Sum(F(f'n_{ventana}') * F(f'media_{ventana}') * F(f'media_{ventana}'))),
+            )
+        })
+        for ventana, total in totales.items():
+            for indice, nombre in enumerate(('n', 'suma', 'm2', 'cuadrados')):
+                total[indice] += sumas[f'total_{nombre}_{ventana}'] or 0
+
+    resultado = {}
+    for ventana, (n, suma, m2, cuadrados) in totales.items():
+        if not n:
+            resultado[ventana] = (None, None)
+            continue
+        media = suma / n
+        m2_total = max(m2 + cuadrados - n * media * media, 0.0)
+        resultado[ventana] = (media, (m2_total / (n - 1)) ** 0.5 if n > 1 else None)
+    return resultado
+
+
+def recalcular_shard(alias):
+    """
+    {contrato_id: campos} con las estadísticas de todos los contratos con
+    resultados del shard, calculadas de una vez con NumPy
+    """
+    serie = Resultado.objects.using(alias).filter(producto_contratado__isnull=False).order_by(
+        'producto_contratado_id', 'fecha', 'pk'
+    ).serie('producto_contratado', 'fecha', 'porcentaje_cambio', arrays=True)
+    contratos, valores = serie['producto_contratado'], serie['porcentaje_cambio']
+    if not len(contratos):
+        return {}
+
+    inicios = np.flatnonzero(np.r_[True, contratos[1:] != contratos[:-1]])
+    fines = np.r_[inicios[1:], len(contratos)]
+    campos = {
+        int(contrato): {'ultima_fecha': fecha.item(), 'pendiente': False}
+        for contrato, fecha in zip(contratos[fines - 1], serie['fecha'][fines - 1])
+    }
+    for ventana in VENTANAS_MOVILES:
+        # Matriz (contratos x ventana) con la cola de cada serie; NaN donde no hay valor
+        indices = fines[:, None] - ventana + np.arange(ventana)[None, :]
+        validos = indices >= inicios[:, None]
+        cola = np.where(validos, valores[np.clip(indices, 0, None)], np.nan)
+        n = validos.sum(axis=1)
+        medias = np.nansum(cola, axis=1) / n
+        m2 = np.nansum((cola - medias[:, None]) ** 2, axis=1)
+        for contrato, n_i, media, m2_i in zip(contratos[fines - 1].tolist(), n.tolist(), medias.tolist(), m2.tolist()):
+            campos[contrato].update({f'n_{ventana}': n_i, f'media_{ventana}': media, f'm2_{ventana}': m2_i})
+        if ventana == VENTANA_MAYOR:
+            for contrato, fila, validos_fila in zip(contratos[fines - 1].tolist(), cola, validos):
+                campos[contrato]['ultimos'] = fila[validos_fila].tolist()
+    return campos
@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class MyappConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'appKairos'
+
+    def ready(self):
+        # Registra los receptores de señales (invalidación de caché, etc.)
+        from . import signals
+        signals.conectar_invalidacion_tablas()
+        # PRAGMA de producción en cada conexión SQLite
+        from .db import sqlite  # noqa: F401
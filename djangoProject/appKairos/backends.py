@@ -1,6 +1,8 @@
 from django.contrib.auth.backends import ModelBackend
 from django.contrib.auth import get_user_model
 
+from . import hashing
+
 Usuario = get_user_model()
 
 
@@ -19,8 +21,8 @@ class EmailBackend(ModelBackend):
         except Usuario.DoesNotExist:
             return None
         
-        # Verificar contraseña
-        if user.check_password(password):
+        # Verificar contraseña (en el pool de hashing, con rehash si procede)
+        if hashing.verificar_usuario(user, password):
             return user
         return None
     
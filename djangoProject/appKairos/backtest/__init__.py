@@ -0,0 +1,23 @@
+"""
+Backtesting de las estrategias de los productos sobre las cotizaciones
+locales de sus mercados (appKairos.cotizaciones)
+
+    from appKairos.backtest.productos import backtest_producto, ultimo_backtest
+
+    resultados = backtest_producto(producto, desde=date(2015, 1, 1))  # barrido y guardado
+    ultimo_backtest(producto)   # el mejor del último barrido, para la ficha del producto
+
+Señales y P&L son operaciones con arrays sobre todas las barras a la vez
+(estrategias.py, motor.py); el barrido de parámetros se reparte en un pool
+de procesos con los precios en memoria compartida. El paquete no importa
+modelos salvo en productos.py, de modo que los trabajadores no necesitan
+inicializar Django. Lo usa el comando backtest.
+"""
+from .estrategias import ESTRATEGIAS, REJILLAS
+from .motor import COSTE, barrido, combinaciones, evaluar, metricas, precios, simular
+
+
+__all__ = [
+    'ESTRATEGIAS', 'REJILLAS', 'COSTE',
+    'barrido', 'combinaciones', 'evaluar', 'metricas', 'precios', 'simular',
+]
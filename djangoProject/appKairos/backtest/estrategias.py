@@ -0,0 +1,95 @@
+"""
+Estrategias de los productos, vectorizadas con NumPy
+
+Cada estrategia recibe los cierres (array T × mercados, NaN antes de que un
+mercado tenga cotizaciones) y sus parámetros, y devuelve la posición decidida
+al cierre de cada barra: 1 comprado, -1 vendido, 0 fuera. El motor la aplica
+desde la barra siguiente.
+
+REJILLAS tiene los parámetros que prueba por defecto cada estrategia en un
+barrido; valida() descarta las combinaciones que no tienen sentido.
+"""
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+
+def _desplazar(valores, n):
+    """Valores de n barras antes (NaN en las n primeras)"""
+    desplazados = np.full_like(valores, np.nan)
+    if n < len(valores):
+        desplazados[n:] = valores[:len(valores) - n]
+    return desplazados
+
+
+def _media_movil(valores, ventana):
+    """Media de las últimas ventana barras (NaN si falta alguna)"""
+    acumulada = np.cumsum(np.nan_to_num(valores), axis=0)
+    huecos = np.cumsum(np.isnan(valores), axis=0)
+    media = np.full_like(valores, np.nan)
+    if ventana > len(valores):
+        return media
+    ceros = np.zeros((1,) + valores.shape[1:])
+    acumulada = np.concatenate([ceros, acumulada])
+    huecos = np.concatenate([ceros, huecos])
+    media[ventana - 1:] = (acumulada[ventana:] - acumulada[:-ventana]) / ventana
+    media[ventana - 1:][(huecos[ventana:] - huecos[:-ventana]) > 0] = np.nan
+    return media
+
+
+def _extremos_previos(valores, ventana):
+    """(máximo, mínimo) de las ventana barras anteriores a cada una"""
+    maximos = np.full_like(valores, np.nan)
+    minimos = np.full_like(valores, np.nan)
+    if ventana < len(valores):
+        ventanas = sliding_window_view(valores[:-1], ventana, axis=0)
+        maximos[ventana:] = ventanas.max(axis=-1)
+        minimos[ventana:] = ventanas.min(axis=-1)
+    return maximos, minimos
+
+
+def _mantener(senales):
+    """Arrastra la última señal distinta de cero hasta la siguiente"""
+    filas = np.arange(len(senales))[:, None]
+    ultima = np.maximum.accumulate(np.where(senales != 0, filas, 0), axis=0)
+    return np.take_along_axis(senales, ultima, axis=0)
+
+
+def momentum(cierres, ventana=20, umbral=0.0):
+    """M.P.T: a favor de la variación de las últimas ventana barras si supera el umbral"""
+    variacion = cierres / _desplazar(cierres, ventana) - 1
+    return np.where(variacion > umbral, 1, np.where(variacion < -umbral, -1, 0))
+
+
+def ruptura(cierres, ventana=20):
+    """GoldenRoad: canal de Donchian; entra al romper el máximo o el mínimo previo y mantiene"""
+    maximos, minimos = _extremos_previos(cierres, ventana)
+    return _mantener(np.where(cierres > maximos, 1, np.where(cierres < minimos, -1, 0)))
+
+
+def tendencia(cierres, rapida=20, lenta=100):
+    """MultiMarkets: cruce de medias; comprado con la rápida por encima de la lenta y vendido al revés"""
+    diferencia = _media_movil(cierres, rapida) - _media_movil(cierres, lenta)
+    return np.where(diferencia > 0, 1, np.where(diferencia < 0, -1, 0))
+
+
+ESTRATEGIAS = {
+    'momentum': momentum,
+    'ruptura': ruptura,
+    'tendencia': tendencia,
+}
+
+REJILLAS = {
+    'momentum': {'ventana': [5, 10, 20, 40, 60, 120], 'umbral': [0.0, 0.01, 0.02]},
+    'ruptura': {'ventana': [10, 20, 40, 55, 100]},
+    'tendencia': {'rapida': [5, 10, 20, 50], 'lenta': [20, 50, 100, 200]},
+}
+
+
+def valida(estrategia, parametros):
+    """La combinación tiene sentido (p. ej. la media rápida es más corta que la lenta)"""
+    ventanas = [valor for nombre, valor in parametros.items() if nombre != 'umbral']
+    if not all(ventana >= 1 for ventana in ventanas) or parametros.get('umbral', 0) < 0:
+        return False
+    if estrategia == 'tendencia':
+        return parametros['rapida'] < parametros['lenta']
+    return True
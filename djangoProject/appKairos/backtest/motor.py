@@ -0,0 +1,144 @@
+"""
+Motor de backtesting: precios alineados, P&L vectorizado y barridos de parámetros
+
+- precios() lee de las cotizaciones locales los cierres de varios mercados y
+  los alinea en un array T × mercados (la última cotización se arrastra en
+  las barras en que un mercado no cotiza).
+- simular() aplica las posiciones desde la barra siguiente a la señal, con un
+  coste proporcional a cada cambio de posición, y reparte la cartera a partes
+  iguales entre los mercados.
+- barrido() evalúa una rejilla de parámetros. Con varios trabajadores usa un
+  pool de procesos que leen los cierres de un bloque de memoria compartida,
+  sin copiarlos ni serializarlos en cada tarea; solo viajan los parámetros y
+  las métricas.
+"""
+import itertools
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from .. import cotizaciones
+from .estrategias import ESTRATEGIAS, valida
+
+
+# Coste de cada cambio de posición, en fracción del capital del mercado
+COSTE = 0.0002
+
+
+def precios(codigos, resolucion='dia', desde=None, hasta=None):
+    """(fechas, cierres T × mercados, códigos con cotizaciones)"""
+    series = {}
+    for codigo in codigos:
+        barras = cotizaciones.barras(codigo, resolucion, desde, hasta)
+        if len(barras):
+            series[codigo] = barras
+    if not series:
+        return np.empty(0, dtype='M8[s]'), np.empty((0, 0)), []
+
+    fechas = np.unique(np.concatenate([barras['fecha'] for barras in series.values()]))
+    cierres = np.full((len(fechas), len(series)), np.nan)
+    for columna, barras in enumerate(series.values()):
+        cierres[np.searchsorted(fechas, barras['fecha']), columna] = barras['cierre']
+    filas = np.arange(len(fechas))[:, None]
+    ultimas = np.maximum.accumulate(np.where(np.isnan(cierres), 0, filas), axis=0)
+    return fechas, np.take_along_axis(cierres, ultimas, axis=0), list(series)
+
+
+def simular(cierres, posiciones, coste=COSTE):
+    """(rendimientos de la cartera por barra, número de cambios de posición)"""
+    rendimientos = np.zeros_like(cierres)
+    rendimientos[1:] = cierres[1:] / cierres[:-1] - 1
+    rendimientos = np.nan_to_num(rendimientos, nan=0.0, posinf=0.0, neginf=0.0)
+
+    # La posición decidida al cierre de t se mantiene durante la barra t + 1
+    aplicadas = np.zeros_like(cierres)
+    aplicadas[1:] = posiciones[:-1]
+    cambios = np.abs(np.diff(aplicadas, axis=0, prepend=0))
+    por_mercado = aplicadas * rendimientos - coste * cambios
+    return por_mercado.mean(axis=1), int(np.count_nonzero(cambios))
+
+
+def metricas(rendimientos, fechas, operaciones=0):
+    """Rendimiento total y anual, volatilidad, Sharpe y drawdown máximo (en %, salvo el Sharpe)"""
+    curva = np.cumprod(1 + rendimientos)
+    anios = (fechas[-1] - fechas[0]) / np.timedelta64(365 * 86400 + 21600, 's') if len(fechas) > 1 else 0
+    periodos_anio = (len(fechas) - 1) / anios if anios else 0
+    desviacion = rendimientos.std()
+    drawdowns = 1 - curva / np.maximum.accumulate(curva)
+    final = curva[-1] if len(curva) else 1.0
+    return {
+        'rendimiento_total': round(float(final - 1) * 100, 4),
+        'rendimiento_anual': round(float(final ** (1 / anios) - 1) * 100, 4) if anios and final > 0 else None,
+        'volatilidad': round(float(desviacion * np.sqrt(periodos_anio)) * 100, 4),
+        'ratio_sharpe': round(float(rendimientos.mean() / desviacion * np.sqrt(periodos_anio)), 4) if desviacion else 0.0,
+        'drawdown_maximo': round(float(drawdowns.max()) * 100, 4) if len(curva) else 0.0,
+        'operaciones': operaciones,
+    }
+
+
+def evaluar(estrategia, parametros, fechas, cierres, coste=COSTE):
+    """Métricas de una combinación de parámetros"""
+    rendimientos, operaciones = simular(cierres, ESTRATEGIAS[estrategia](cierres, **parametros), coste)
+    return metricas(rendimientos, fechas, operaciones)
+
+
+def combinaciones(estrategia, rejilla):
+    """Combinaciones válidas de una rejilla {parámetro: [valores]}"""
+    nombres = list(rejilla)
+    todas = (dict(zip(nombres, valores)) for valores in itertools.product(*rejilla.values()))
+    return [parametros for parametros in todas if valida(estrategia, parametros)]
+
+
+# ============================================================================
+# POOL DE PROCESOS CON LOS PRECIOS EN MEMORIA COMPARTIDA
+# ============================================================================
+
+_compartidos = {}
+
+
+def _inicializar_proceso(nombre, forma, fechas):
+    """Abre en el trabajador el bloque de memoria compartida con los cierres"""
+    memoria = shared_memory.SharedMemory(name=nombre)
+    _compartidos.update(
+        memoria=memoria,
+        fechas=fechas,
+        cierres=np.ndarray(forma, dtype=np.float64, buffer=memoria.buf),
+    )
+
+
+def _evaluar_en_proceso(tarea):
+    estrategia, parametros, coste = tarea
+    return evaluar(estrategia, parametros, _compartidos['fechas'], _compartidos['cierres'], coste)
+
+
+def barrido(estrategia, rejilla, fechas, cierres, coste=COSTE, trabajadores=None):
+    """
+    Evalúa todas las combinaciones válidas de la rejilla y devuelve
+    [(parámetros, métricas)] en el orden de la rejilla.
+    trabajadores: procesos del pool (None: los núcleos disponibles, hasta 4;
+    1 o una sola combinación: en el proceso actual)
+    """
+    parametros = combinaciones(estrategia, rejilla)
+    if trabajadores is None:
+        trabajadores = min(4, os.cpu_count() or 1)
+    trabajadores = min(trabajadores, len(parametros))
+    if trabajadores <= 1:
+        return [(combinacion, evaluar(estrategia, combinacion, fechas, cierres, coste)) for combinacion in parametros]
+
+    cierres = np.ascontiguousarray(cierres, dtype=np.float64)
+    memoria = shared_memory.SharedMemory(create=True, size=max(cierres.nbytes, 1))
+    try:
+        np.ndarray(cierres.shape, dtype=np.float64, buffer=memoria.buf)[:] = cierres
+        with ProcessPoolExecutor(
+            max_workers=trabajadores,
+            initializer=_inicializar_proceso,
+            initargs=(memoria.name, cierres.shape, fechas),
+        ) as pool:
+            tareas = [(estrategia, combinacion, coste) for combinacion in parametros]
+            resultados = list(pool.map(_evaluar_en_proceso, tareas, chunksize=max(1, len(tareas) // (trabajadores * 4))))
+    finally:
+        memoria.close()
+        memoria.unlink()
+    return list(zip(parametros, resultados))
@@ -0,0 +1,81 @@
+"""
+Backtesting de un producto: barrido de su estrategia y guardado de resultados
+"""
+import numpy as np
+from django.conf import settings
+from django.utils import timezone
+
+from ..models import ResultadoBacktest
+from .estrategias import ESTRATEGIAS, REJILLAS
+from .motor import COSTE, barrido, precios, simular
+
+
+def curva_mensual(fechas, rendimientos):
+    """Capital en base 100 al cierre de cada mes: {'fechas': ['AAAA-MM', ...], 'capital': [...]}"""
+    capital = 100 * np.cumprod(1 + rendimientos)
+    meses = fechas.astype('M8[M]')
+    ultimas = np.r_[meses[1:] != meses[:-1], True]
+    return {
+        'fechas': meses[ultimas].astype(str).tolist(),
+        'capital': np.round(capital[ultimas], 2).tolist(),
+    }
+
+
+def backtest_producto(producto, resolucion='dia', desde=None, hasta=None, rejilla=None,
+                      coste=COSTE, trabajadores=None, guardar=True):
+    """
+    Prueba la estrategia del producto con cada combinación de su rejilla
+    (REJILLAS, con los valores de rejilla sustituyendo a los de por defecto)
+    sobre las cotizaciones de sus mercados. Devuelve los ResultadoBacktest
+    (guardados salvo con guardar=False); el de mejor Sharpe lleva mejor=True
+    y su curva de capital.
+    """
+    estrategia = producto.estrategia
+    rejilla = {**REJILLAS[estrategia], **(rejilla or {})}
+    desconocidos = set(rejilla) - set(REJILLAS[estrategia])
+    if desconocidos:
+        raise ValueError(f"La estrategia {estrategia} no tiene los parámetros: {', '.join(sorted(desconocidos))}")
+
+    codigos = list(producto.mercados.order_by('codigo').values_list('codigo', flat=True))
+    fechas, cierres, mercados = precios(codigos, resolucion, desde, hasta)
+    if len(fechas) < 2:
+        raise ValueError(f'No hay cotizaciones ({resolucion}) de los mercados de {producto.codigo} en el periodo.')
+
+    if trabajadores is None:
+        trabajadores = getattr(settings, 'BACKTEST_TRABAJADORES', None)
+    evaluadas = barrido(estrategia, rejilla, fechas, cierres, coste=coste, trabajadores=trabajadores)
+    if not evaluadas:
+        raise ValueError(f'Ninguna combinación de la rejilla es válida para la estrategia {estrategia}.')
+
+    posicion_mejor = max(range(len(evaluadas)), key=lambda posicion: evaluadas[posicion][1]['ratio_sharpe'])
+    parametros_mejor = evaluadas[posicion_mejor][0]
+    rendimientos, _ = simular(cierres, ESTRATEGIAS[estrategia](cierres, **parametros_mejor), coste)
+
+    ahora = timezone.now()
+    comunes = {
+        'producto': producto,
+        'estrategia': estrategia,
+        'mercados': mercados,
+        'resolucion': resolucion,
+        'desde': fechas[0].astype('M8[D]').item(),
+        'hasta': fechas[-1].astype('M8[D]').item(),
+        'fecha_calculo': ahora,
+    }
+    resultados = [
+        ResultadoBacktest(
+            parametros=parametros,
+            mejor=posicion == posicion_mejor,
+            curva=curva_mensual(fechas, rendimientos) if posicion == posicion_mejor else None,
+            **comunes,
+            **medidas,
+        )
+        for posicion, (parametros, medidas) in enumerate(evaluadas)
+    ]
+    if guardar:
+        ResultadoBacktest.objects.bulk_create(resultados)
+    return resultados
+
+
+def ultimo_backtest(producto):
+    """Mejor combinación del último barrido del producto, o None"""
+    return ResultadoBacktest.objects.filter(producto=producto, mejor=True).order_by('-fecha_calculo').first()
@@ -0,0 +1,52 @@
+"""
+Subsistema de caché de appKairos
+
+    from appKairos.cache import obtener_cache
+
+    catalogo = obtener_cache().espacio('catalogo')
+    productos = catalogo.get_or_set('activos', lambda: list(Producto.objects.filter(activo=True)), ttl=300)
+    catalogo.invalidar()  # tras editar productos (las señales ya lo hacen para el catálogo)
+
+    # Resultados de consultas, invalidados por versión de tabla
+    Producto.objects.filter(activo=True).cacheado()
+
+Configuración en settings: CACHES['default'] es el nivel compartido (SQLite
+WAL por defecto, Redis/Memcached con CACHE_URL) y CACHE_LOCAL_* ajustan el LRU
+en memoria de cada proceso. Con CACHE_BUS_ACTIVO las invalidaciones viajan
+por el bus de appKairos/cache/bus.py.
+"""
+import threading
+
+from django.conf import settings
+
+from .lru import LRUCache
+from .multinivel import CacheMultinivel, Espacio
+from .querysets import QuerySetCacheable
+
+
+__all__ = ['LRUCache', 'CacheMultinivel', 'Espacio', 'QuerySetCacheable', 'obtener_cache']
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def obtener_cache():
+    """Devuelve la caché multinivel del proceso, creándola la primera vez"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = CacheMultinivel(
+                    alias=getattr(settings, 'CACHE_COMPARTIDA_ALIAS', 'default'),
+                    max_entradas=getattr(settings, 'CACHE_LOCAL_MAX_ENTRADAS', 1000),
+                    ttl_local=getattr(settings, 'CACHE_LOCAL_TTL', 60),
+                    ttl_versiones=getattr(settings, 'CACHE_VERSIONES_TTL', 5),
+                )
+                if getattr(settings, 'CACHE_BUS_ACTIVO', False):
+                    from .bus import BusInvalidacion
+                    _cache.bus = BusInvalidacion(
+                        _cache,
+                        alias_bd=getattr(settings, 'CACHE_BUS_ALIAS_BD', 'default'),
+                        intervalo=getattr(settings, 'CACHE_BUS_INTERVALO', 2.0),
+                    )
+    return _cache
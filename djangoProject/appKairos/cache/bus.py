@@ -0,0 +1,175 @@
+"""
+Bus de invalidación de caché entre procesos
+
+Cuando cambia un modelo (señales en appKairos/signals.py) se sube la versión
+de su espacio de nombres en la tabla VersionCache. Cada worker mantiene en
+memoria las versiones conocidas y las refresca en segundo plano:
+
+- PostgreSQL: LISTEN/NOTIFY. La notificación viaja con el COMMIT y los
+  workers la reciben en milisegundos.
+- Resto de bases de datos (o si LISTEN falla): un hilo consulta cada
+  CACHE_BUS_INTERVALO segundos las filas de VersionCache modificadas.
+
+En ambos casos las peticiones nunca consultan la base de datos para saber
+si la caché está vigente: leen la versión que ya tiene el proceso.
+"""
+from datetime import timedelta
+import logging
+import os
+import select
+import threading
+import time
+
+from django.db import connections, transaction
+from django.db.models import F
+from django.db.models.functions import Now
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+CANAL = 'kairos_cache'
+
+
+class BusInvalidacion:
+
+    def __init__(self, cache, alias_bd='default', intervalo=2.0, escuchar=True):
+        self.cache = cache
+        self.alias_bd = alias_bd
+        self.intervalo = intervalo
+        # Sin escucha (tests, comandos que solo publican) no se arranca el hilo
+        self.escuchar = escuchar
+        self._versiones = {}
+        self._lock = threading.Lock()
+        self._hilo = None
+        self._pid = None
+        self._parar = threading.Event()
+        self._ultima_lectura = None
+        self.modo = None  # 'notify' o 'sondeo' una vez iniciado
+
+    # ------------------------------------------------------------------
+    # Versiones locales
+    # ------------------------------------------------------------------
+
+    def version(self, espacio):
+        """Versión conocida por el proceso; solo va a la BD la primera vez que se ve un espacio"""
+        version = self._versiones.get(espacio)
+        if version is None:
+            version = self._leer_o_crear(espacio)
+            self._aplicar(espacio, version)
+        return version
+
+    def _aplicar(self, espacio, version):
+        with self._lock:
+            actual = self._versiones.get(espacio)
+            if actual is not None and actual >= version:
+                return
+            self._versiones[espacio] = version
+        self.cache.establecer_version(espacio, version)
+
+    def _leer_o_crear(self, espacio):
+        from appKairos.models import VersionCache
+        # La versión inicial se toma del reloj para no repetir números de
+        # versión ya usados en el nivel compartido si la tabla se recrea
+        objeto, _ = VersionCache.objects.using(self.alias_bd).get_or_create(
+            espacio=espacio, defaults={'version': time.time_ns()}
+        )
+        return objeto.version
+
+    # ------------------------------------------------------------------
+    # Publicación
+    # ------------------------------------------------------------------
+
+    def publicar(self, espacio):
+        """
+        Sube la versión del espacio. Dentro de una transacción el cambio (y la
+        notificación en PostgreSQL) solo se hace visible al hacer COMMIT.
+        """
+        from appKairos.models import VersionCache
+        gestor = VersionCache.objects.using(self.alias_bd)
+        # update() no rellena los campos auto_now, y sondear() filtra por fecha_actualizacion
+        subir = {'version': F('version') + 1, 'fecha_actualizacion': Now()}
+        with transaction.atomic(using=self.alias_bd):
+            actualizadas = gestor.filter(espacio=espacio).update(**subir)
+            if not actualizadas:
+                _, creada = gestor.get_or_create(
+                    espacio=espacio, defaults={'version': time.time_ns(), 'fecha_actualizacion': Now()}
+                )
+                if not creada:
+                    # Otro proceso la creó a la vez: se sube igualmente
+                    gestor.filter(espacio=espacio).update(**subir)
+            version = gestor.filter(espacio=espacio).values_list('version', flat=True).get()
+
+            conexion = connections[self.alias_bd]
+            if conexion.vendor == 'postgresql':
+                with conexion.cursor() as cursor:
+                    cursor.execute('SELECT pg_notify(%s, %s)', [CANAL, f'{espacio}:{version}'])
+
+        transaction.on_commit(lambda: self._aplicar(espacio, version), using=self.alias_bd)
+        return version
+
+    # ------------------------------------------------------------------
+    # Escucha en segundo plano
+    # ------------------------------------------------------------------
+
+    def iniciar(self):
+        """Arranca el hilo de escucha del proceso actual (idempotente, seguro tras fork)"""
+        if not self.escuchar or self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._versiones = {}
+        self._ultima_lectura = None
+        self._parar.clear()
+        self._hilo = threading.Thread(target=self._bucle, name='kairos-cache-bus', daemon=True)
+        self._hilo.start()
+
+    def detener(self):
+        self._parar.set()
+
+    def _bucle(self):
+        while not self._parar.is_set():
+            try:
+                if connections[self.alias_bd].vendor == 'postgresql':
+                    self.modo = 'notify'
+                    self._escuchar_postgresql()
+                else:
+                    self.modo = 'sondeo'
+                    self.sondear()
+                    self._parar.wait(self.intervalo)
+            except Exception:
+                logger.exception('Error en el bus de invalidación de caché; se reintenta')
+                self._parar.wait(self.intervalo)
+            finally:
+                connections[self.alias_bd].close()
+
+    def sondear(self):
+        """Aplica las versiones cambiadas desde la última lectura (una consulta)"""
+        from appKairos.models import VersionCache
+        inicio = timezone.now()
+        filas = VersionCache.objects.using(self.alias_bd)
+        if self._ultima_lectura is not None:
+            # Margen para no perder cambios confirmados justo durante la lectura anterior
+            filas = filas.filter(fecha_actualizacion__gte=self._ultima_lectura - timedelta(seconds=self.intervalo))
+        for espacio, version in filas.values_list('espacio', 'version'):
+            self._aplicar(espacio, version)
+        self._ultima_lectura = inicio
+
+    def _escuchar_postgresql(self):
+        conexion = connections[self.alias_bd]
+        conexion.ensure_connection()
+        bruta = conexion.connection
+        bruta.autocommit = True
+        with bruta.cursor() as cursor:
+            cursor.execute(f'LISTEN {CANAL}')
+        # Recuperar lo publicado mientras no se escuchaba
+        self._ultima_lectura = None
+        self.sondear()
+
+        while not self._parar.is_set():
+            if select.select([bruta], [], [], self.intervalo) == ([], [], []):
+                continue
+            bruta.poll()
+            while bruta.notifies:
+                aviso = bruta.notifies.pop(0)
+                espacio, _, version = aviso.payload.rpartition(':')
+                self._aplicar(espacio, int(version))
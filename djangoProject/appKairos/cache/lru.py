@@ -0,0 +1,65 @@
+"""
+Caché LRU en memoria del proceso, acotada en número de entradas y con TTL por clave
+"""
+from collections import OrderedDict
+import threading
+import time
+
+
+_AUSENTE = object()
+
+
+class LRUCache:
+    """
+    Diccionario LRU seguro entre hilos. Los valores se guardan tal cual (sin
+    copiar ni serializar): quien los lea no debe modificarlos.
+    """
+
+    def __init__(self, max_entradas=1000):
+        self.max_entradas = max_entradas
+        self._datos = OrderedDict()  # clave -> (expira, valor)
+        self._lock = threading.Lock()
+        self.expulsiones = 0
+
+    def get(self, clave, default=None):
+        with self._lock:
+            entrada = self._datos.get(clave, _AUSENTE)
+            if entrada is _AUSENTE:
+                return default
+            expira, valor = entrada
+            if expira is not None and expira <= time.monotonic():
+                del self._datos[clave]
+                return default
+            self._datos.move_to_end(clave)
+            return valor
+
+    def set(self, clave, valor, ttl=None):
+        expira = time.monotonic() + ttl if ttl is not None else None
+        with self._lock:
+            self._datos[clave] = (expira, valor)
+            self._datos.move_to_end(clave)
+            while len(self._datos) > self.max_entradas:
+                self._datos.popitem(last=False)
+                self.expulsiones += 1
+
+    def delete(self, clave):
+        with self._lock:
+            return self._datos.pop(clave, _AUSENTE) is not _AUSENTE
+
+    def borrar_prefijo(self, prefijo):
+        """Elimina todas las claves que empiezan por el prefijo; devuelve cuántas"""
+        with self._lock:
+            claves = [clave for clave in self._datos if clave.startswith(prefijo)]
+            for clave in claves:
+                del self._datos[clave]
+            return len(claves)
+
+    def clear(self):
+        with self._lock:
+            self._datos.clear()
+
+    def __len__(self):
+        return len(self._datos)
+
+    def __contains__(self, clave):
+        return self.get(clave, _AUSENTE) is not _AUSENTE
@@ -0,0 +1,255 @@
+"""
+Caché de dos niveles: LRU en memoria del proceso (L1) delante de una caché
+de Django compartida entre procesos (L2: SQLite WAL, Redis o Memcached)
+"""
+from contextlib import contextmanager
+import hashlib
+import threading
+import time
+
+from django.core.cache import caches
+
+from .lru import LRUCache
+
+
+_AUSENTE = object()
+
+
+class CacheMultinivel:
+    """
+    - TTL por clave en ambos niveles; en L1 se acota con ttl_local para que un
+      worker nunca sirva datos más antiguos que eso tras un cambio en L2.
+    - Espacios de nombres versionados: invalidar(espacio) sube la versión y
+      todas sus claves quedan obsoletas de golpe, sin recorrerlas.
+    - get_or_set() con "single-flight": si varios hilos o procesos piden a la
+      vez una clave ausente, solo uno la calcula y el resto espera su resultado.
+    - Métricas de aciertos por nivel, fallos, expulsiones y cálculos.
+    """
+
+    def __init__(self, alias='default', max_entradas=1000, ttl_local=60,
+                 ttl_versiones=5, ttl_calculo=30, prefijo='kairos'):
+        self.alias = alias
+        self.local = LRUCache(max_entradas)
+        self.ttl_local = ttl_local
+        self.ttl_versiones = ttl_versiones
+        self.ttl_calculo = ttl_calculo
+        self.prefijo = prefijo
+        # Bus de invalidación entre procesos (appKairos.cache.bus), si está activo
+        self.bus = None
+        self._versiones = {}  # espacio -> (versión, momento de lectura)
+        self._vuelos = {}     # clave -> [Lock, nº de hilos interesados]
+        self._lock = threading.Lock()
+        self._contadores = dict.fromkeys(
+            ('aciertos_l1', 'aciertos_l2', 'fallos', 'escrituras', 'calculos', 'esperas', 'invalidaciones'), 0
+        )
+
+    @property
+    def compartida(self):
+        # caches[...] devuelve una instancia por hilo
+        return caches[self.alias]
+
+    def _contar(self, contador, cantidad=1):
+        with self._lock:
+            self._contadores[contador] += cantidad
+
+    # ------------------------------------------------------------------
+    # Claves y versiones de espacios de nombres
+    # ------------------------------------------------------------------
+
+    def _clave(self, clave, espacio=None):
+        if len(clave) > 150:
+            clave = hashlib.sha1(clave.encode()).hexdigest()
+        if espacio is None:
+            return f'{self.prefijo}:{clave}'
+        return f'{self.prefijo}:{espacio}:{self.version(espacio)}:{clave}'
+
+    def _clave_version(self, espacio):
+        return f'{self.prefijo}:version:{espacio}'
+
+    def version(self, espacio):
+        """
+        Versión actual del espacio. Sin bus se memoriza ttl_versiones segundos
+        para no consultar L2 en cada acceso; es el retraso máximo con el que un
+        worker ve la invalidación hecha por otro.
+        """
+        memo = self._versiones.get(espacio)
+        if self.bus is not None:
+            # Con bus, el hilo de escucha mantiene las versiones al día: sin
+            # caducidad. Solo los procesos que leen de la caché lo arrancan.
+            self.bus.iniciar()
+            return memo[0] if memo is not None else self.bus.version(espacio)
+
+        ahora = time.monotonic()
+        if memo is not None and ahora - memo[1] < self.ttl_versiones:
+            return memo[0]
+
+        clave = self._clave_version(espacio)
+        version = self.compartida.get(clave)
+        if version is None:
+            # Se parte de un valor único para no reutilizar versiones si L2 se vacía
+            version = time.time_ns()
+            if not self.compartida.add(clave, version, None):
+                version = self.compartida.get(clave, version)
+        self._versiones[espacio] = (version, ahora)
+        return version
+
+    def invalidar(self, espacio):
+        """Deja obsoletas todas las claves del espacio en todos los procesos"""
+        if self.bus is not None:
+            self._contar('invalidaciones')
+            return self.bus.publicar(espacio)
+
+        clave = self._clave_version(espacio)
+        try:
+            version = self.compartida.incr(clave)
+        except ValueError:
+            version = time.time_ns()
+            self.compartida.set(clave, version, None)
+        self.establecer_version(espacio, version)
+        self._contar('invalidaciones')
+        return version
+
+    def establecer_version(self, espacio, version):
+        """Fija la versión local del espacio y descarta sus entradas en L1"""
+        anterior = self._versiones.get(espacio)
+        self._versiones[espacio] = (version, time.monotonic())
+        if anterior is None or anterior[0] != version:
+            self.local.borrar_prefijo(f'{self.prefijo}:{espacio}:')
+
+    # ------------------------------------------------------------------
+    # Operaciones básicas
+    # ------------------------------------------------------------------
+
+    def get(self, clave, default=None, espacio=None):
+        completa = self._clave(clave, espacio)
+        valor = self.local.get(completa, _AUSENTE)
+        if valor is not _AUSENTE:
+            self._contar('aciertos_l1')
+            return valor
+
+        valor = self.compartida.get(completa, _AUSENTE)
+        if valor is not _AUSENTE:
+            self._contar('aciertos_l2')
+            self.local.set(completa, valor, self.ttl_local)
+            return valor
+
+        self._contar('fallos')
+        return default
+
+    def set(self, clave, valor, ttl=None, espacio=None):
+        """ttl en segundos; None = sin caducidad en L2 (L1 siempre acota con ttl_local)"""
+        completa = self._clave(clave, espacio)
+        self.compartida.set(completa, valor, ttl)
+        ttl_local = self.ttl_local if ttl is None else min(ttl, self.ttl_local)
+        self.local.set(completa, valor, ttl_local)
+        self._contar('escrituras')
+
+    def delete(self, clave, espacio=None):
+        completa = self._clave(clave, espacio)
+        self.local.delete(completa)
+        self.compartida.delete(completa)
+
+    def clear(self):
+        """Vacía L1 y L2 (afecta a todo lo que comparta el alias de caché)"""
+        self.local.clear()
+        self.compartida.clear()
+        self._versiones.clear()
+
+    # ------------------------------------------------------------------
+    # Single-flight
+    # ------------------------------------------------------------------
+
+    @contextmanager
+    def _cerrojo_local(self, clave):
+        with self._lock:
+            entrada = self._vuelos.setdefault(clave, [threading.Lock(), 0])
+            entrada[1] += 1
+        try:
+            with entrada[0]:
+                yield
+        finally:
+            with self._lock:
+                entrada[1] -= 1
+                if entrada[1] == 0:
+                    del self._vuelos[clave]
+
+    def get_or_set(self, clave, funcion, ttl=None, espacio=None):
+        """
+        Devuelve el valor cacheado o lo calcula con funcion(). Solo un hilo
+        por proceso (cerrojo local) y un proceso por clave (cerrojo en L2
+        mediante add()) ejecutan funcion() a la vez.
+        """
+        valor = self.get(clave, _AUSENTE, espacio)
+        if valor is not _AUSENTE:
+            return valor
+
+        completa = self._clave(clave, espacio)
+        with self._cerrojo_local(completa):
+            valor = self.get(clave, _AUSENTE, espacio)
+            if valor is not _AUSENTE:
+                self._contar('esperas')
+                return valor
+
+            cerrojo = f'{completa}:calculando'
+            if not self.compartida.add(cerrojo, 1, self.ttl_calculo):
+                # Otro proceso está calculando la clave: esperar su resultado
+                limite = time.monotonic() + self.ttl_calculo
+                while time.monotonic() < limite:
+                    time.sleep(0.05)
+                    valor = self.compartida.get(completa, _AUSENTE)
+                    if valor is not _AUSENTE:
+                        self._contar('esperas')
+                        self.local.set(completa, valor, self.ttl_local)
+                        return valor
+                cerrojo = None
+
+            try:
+                valor = funcion()
+                self.set(clave, valor, ttl, espacio)
+                self._contar('calculos')
+            finally:
+                if cerrojo is not None:
+                    self.compartida.delete(cerrojo)
+        return valor
+
+    # ------------------------------------------------------------------
+    # Métricas
+    # ------------------------------------------------------------------
+
+    def metricas(self):
+        with self._lock:
+            datos = dict(self._contadores)
+        datos['entradas_l1'] = len(self.local)
+        datos['expulsiones_l1'] = self.local.expulsiones
+        consultas = datos['aciertos_l1'] + datos['aciertos_l2'] + datos['fallos']
+        datos['tasa_aciertos'] = (datos['aciertos_l1'] + datos['aciertos_l2']) / consultas if consultas else 0
+        return datos
+
+    def espacio(self, nombre):
+        return Espacio(self, nombre)
+
+
+class Espacio:
+    """Vista de la caché restringida a un espacio de nombres versionado"""
+
+    def __init__(self, cache, nombre):
+        self.cache = cache
+        self.nombre = nombre
+
+    def get(self, clave, default=None):
+        return self.cache.get(clave, default, espacio=self.nombre)
+
+    def set(self, clave, valor, ttl=None):
+        self.cache.set(clave, valor, ttl, espacio=self.nombre)
+
+    def delete(self, clave):
+        self.cache.delete(clave, espacio=self.nombre)
+
+    def get_or_set(self, clave, funcion, ttl=None):
+        return self.cache.get_or_set(clave, funcion, ttl, espacio=self.nombre)
+
+    def invalidar(self):
+        return self.cache.invalidar(self.nombre)
+
+    def version(self):
+        return self.cache.version(self.nombre)
@@ -0,0 +1,168 @@
+"""
+Caché de resultados de querysets con invalidación por versión de tabla
+
+Los modelos que usan QuerySetCacheable como manager pueden cachear sus
+consultas de forma explícita:
+
+    productos = Producto.objects.filter(activo=True).cacheado()[:3]
+
+- La clave es el SQL compilado y sus parámetros, junto con la versión de
+  cada tabla que aparece en la consulta (también en subconsultas). Dos
+  peticiones con la misma consulta comparten resultado.
+- Guardar, borrar, update() o bulk_create() sobre un modelo cacheable sube,
+  al confirmar la transacción, la versión de su tabla (espacio
+  'tabla:<db_table>' del bus de invalidación) y todas las consultas que la
+  leen quedan obsoletas.
+- Dentro de una transacción nunca se usa la caché: la consulta debe ver
+  los cambios aún no confirmados.
+- Si la consulta toca una tabla de un modelo no cacheable, cuyos cambios
+  no se notifican, se ejecuta contra la base de datos.
+- TTL por modelo en settings.CACHE_QUERYSETS_TTL ('app.Modelo': segundos).
+"""
+from functools import lru_cache
+import hashlib
+import pickle
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connections, models, transaction
+from django.db.models.query import NamedValuesListIterable
+from django.db.models.sql.query import Query
+
+
+PREFIJO_TABLA = 'tabla:'
+
+
+@lru_cache(maxsize=None)
+def tablas_cacheables():
+    """Tablas cuyos cambios se notifican: modelos con QuerySetCacheable y sus M2M"""
+    tablas = set()
+    for modelo in apps.get_models():
+        if not es_cacheable(modelo):
+            continue
+        tablas.add(modelo._meta.db_table)
+        for campo in modelo._meta.local_many_to_many:
+            tablas.add(campo.remote_field.through._meta.db_table)
+    return frozenset(tablas)
+
+
+def es_cacheable(modelo):
+    clase = getattr(modelo._default_manager, '_queryset_class', None)
+    return clase is not None and issubclass(clase, QuerySetCacheable)
+
+
+def invalidar_tablas(tablas, using=None):
+    """
+    Sube la versión de las tablas indicadas en todos los procesos al
+    confirmar la transacción de la base de datos `using` (al momento si no
+    hay ninguna). Antes del COMMIT, una lectura .cacheado() concurrente
+    guardaría las filas antiguas con la versión nueva.
+    """
+    from . import obtener_cache
+    tablas = list(tablas)
+
+    def subir_versiones():
+        cache = obtener_cache()
+        for tabla in tablas:
+            cache.invalidar(PREFIJO_TABLA + tabla)
+
+    transaction.on_commit(subir_versiones, using=using)
+
+
+def _tablas_consulta(query, tablas=None):
+    """Tablas de la consulta, incluidas las de subconsultas en WHERE y anotaciones"""
+    if tablas is None:
+        tablas = set()
+    for alias in query.alias_map.values():
+        tablas.add(alias.table_name)
+
+    pendientes = [query.where, *query.annotations.values()]
+    while pendientes:
+        nodo = pendientes.pop()
+        if isinstance(nodo, Query):
+            _tablas_consulta(nodo, tablas)
+            continue
+        interna = getattr(nodo, 'query', None)
+        if isinstance(interna, Query):
+            _tablas_consulta(interna, tablas)
+        pendientes.extend(getattr(nodo, 'children', ()))
+        pendientes.extend(
+            valor for valor in (getattr(nodo, 'lhs', None), getattr(nodo, 'rhs', None))
+            if valor is not None and hasattr(valor, 'resolve_expression')
+        )
+        if hasattr(nodo, 'get_source_expressions'):
+            pendientes.extend(e for e in nodo.get_source_expressions() if e is not None)
+    return tablas
+
+
+class QuerySetCacheable(models.QuerySet):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._ttl_cache = None
+
+    def _clone(self):
+        clon = super()._clone()
+        clon._ttl_cache = self._ttl_cache
+        return clon
+
+    def cacheado(self, ttl=None):
+        """Marca el queryset para servir su resultado desde la caché (ttl en segundos)"""
+        if ttl is None:
+            ttl = getattr(settings, 'CACHE_QUERYSETS_TTL', {}).get(
+                self.model._meta.label, getattr(settings, 'CACHE_QUERYSETS_TTL_DEFECTO', 60)
+            )
+        clon = self._chain()
+        clon._ttl_cache = ttl
+        return clon
+
+    def _clave_cache(self):
+        """Clave del resultado, o None si la consulta no se debe cachear"""
+        if (connections[self.db].in_atomic_block
+                or self.query.select_for_update
+                or self._iterable_class is NamedValuesListIterable):
+            return None
+
+        tablas = _tablas_consulta(self.query)
+        if not tablas <= tablas_cacheables():
+            return None
+
+        from . import obtener_cache
+        cache = obtener_cache()
+        try:
+            sql, parametros = self.query.get_compiler(using=self.db).as_sql()
+        except Exception:
+            # EmptyResultSet y similares: que lo resuelva el ORM
+            return None
+        versiones = sorted((tabla, cache.version(PREFIJO_TABLA + tabla)) for tabla in tablas)
+        firma = repr((self.db, self._iterable_class.__name__, self._fields, sql, parametros, versiones))
+        return 'qs:' + hashlib.sha1(firma.encode()).hexdigest()
+
+    def _fetch_all(self):
+        if self._result_cache is None and self._ttl_cache is not None:
+            clave = self._clave_cache()
+            if clave is not None:
+                from . import obtener_cache
+                # Se guarda serializado para que cada petición obtenga sus
+                # propias instancias aunque el valor venga del LRU en memoria
+                datos = obtener_cache().get_or_set(
+                    clave,
+                    lambda: pickle.dumps(list(self._iterable_class(self)), pickle.HIGHEST_PROTOCOL),
+                    ttl=self._ttl_cache,
+                )
+                self._result_cache = pickle.loads(datos)
+        super()._fetch_all()
+
+    # Escrituras que no emiten señales por instancia
+
+    def update(self, **kwargs):
+        filas = super().update(**kwargs)
+        invalidar_tablas([self.model._meta.db_table], using=self.db)
+        return filas
+
+    update.alters_data = True
+
+    def bulk_create(self, *args, **kwargs):
+        objetos = super().bulk_create(*args, **kwargs)
+        invalidar_tablas([self.model._meta.db_table], using=self.db)
+        return objetos
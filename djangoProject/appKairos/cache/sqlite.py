@@ -0,0 +1,175 @@
+"""
+Backend de caché de Django sobre un fichero SQLite en modo WAL
+
+Sirve de nivel compartido entre los workers de gunicorn de una misma
+máquina sin depender de servicios externos (Redis/Memcached). WAL permite
+lecturas concurrentes mientras otro proceso escribe.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'appKairos.cache.sqlite.SQLiteCache',
+            'LOCATION': '/ruta/a/kairos_cache.sqlite3',
+        }
+    }
+"""
+import os
+import pickle
+import random
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._ruta = str(location)
+        self._local = threading.local()
+
+    # ------------------------------------------------------------------
+    # Conexión
+    # ------------------------------------------------------------------
+
+    def _conexion(self):
+        """Una conexión por hilo y proceso (las conexiones no sobreviven a un fork)"""
+        conexion = getattr(self._local, 'conexion', None)
+        if conexion is not None and self._local.pid == os.getpid():
+            return conexion
+
+        directorio = os.path.dirname(self._ruta)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+        conexion = sqlite3.connect(self._ruta, timeout=5, isolation_level=None, check_same_thread=False)
+        conexion.execute('PRAGMA journal_mode=WAL')
+        conexion.execute('PRAGMA synchronous=NORMAL')
+        conexion.execute(
+            'CREATE TABLE IF NOT EXISTS cache ('
+            ' clave TEXT PRIMARY KEY,'
+            ' valor BLOB NOT NULL,'
+            ' expira REAL'
+            ')'
+        )
+        self._local.conexion = conexion
+        self._local.pid = os.getpid()
+        return conexion
+
+    @staticmethod
+    def _serializar(valor):
+        return pickle.dumps(valor, pickle.HIGHEST_PROTOCOL)
+
+    @staticmethod
+    def _vigente(expira):
+        return expira is None or expira > time.time()
+
+    # ------------------------------------------------------------------
+    # API de BaseCache
+    # ------------------------------------------------------------------
+
+    def get(self, key, default=None, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        fila = self._conexion().execute(
+            'SELECT valor, expira FROM cache WHERE clave = ?', (key,)
+        ).fetchone()
+        if fila is None or not self._vigente(fila[1]):
+            return default
+        return pickle.loads(fila[0])
+
+    def get_many(self, keys, version=None):
+        claves = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not claves:
+            return {}
+        marcadores = ','.join('?' * len(claves))
+        filas = self._conexion().execute(
+            f'SELECT clave, valor, expira FROM cache WHERE clave IN ({marcadores})', list(claves)
+        ).fetchall()
+        return {
+            claves[clave]: pickle.loads(valor)
+            for clave, valor, expira in filas if self._vigente(expira)
+        }
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._conexion().execute(
+            'INSERT OR REPLACE INTO cache (clave, valor, expira) VALUES (?, ?, ?)',
+            (key, self._serializar(value), self.get_backend_timeout(timeout))
+        )
+        self._quizas_purgar()
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Solo escribe si la clave no existe o ha expirado (atómico, sirve como cerrojo)"""
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute(
+            'INSERT INTO cache (clave, valor, expira) VALUES (?, ?, ?) '
+            'ON CONFLICT(clave) DO UPDATE SET valor = excluded.valor, expira = excluded.expira '
+            'WHERE cache.expira IS NOT NULL AND cache.expira <= ?',
+            (key, self._serializar(value), self.get_backend_timeout(timeout), time.time())
+        )
+        return cursor.rowcount > 0
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute(
+            'UPDATE cache SET expira = ? WHERE clave = ? AND (expira IS NULL OR expira > ?)',
+            (self.get_backend_timeout(timeout), key, time.time())
+        )
+        return cursor.rowcount > 0
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        cursor = self._conexion().execute('DELETE FROM cache WHERE clave = ?', (key,))
+        return cursor.rowcount > 0
+
+    def has_key(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        fila = self._conexion().execute(
+            'SELECT expira FROM cache WHERE clave = ?', (key,)
+        ).fetchone()
+        return fila is not None and self._vigente(fila[0])
+
+    def incr(self, key, delta=1, version=None):
+        clave = self.make_and_validate_key(key, version=version)
+        conexion = self._conexion()
+        conexion.execute('BEGIN IMMEDIATE')
+        try:
+            fila = conexion.execute(
+                'SELECT valor, expira FROM cache WHERE clave = ?', (clave,)
+            ).fetchone()
+            if fila is None or not self._vigente(fila[1]):
+                raise ValueError(f"Key '{key}' not found")
+            nuevo = pickle.loads(fila[0]) + delta
+            conexion.execute(
+                'UPDATE cache SET valor = ? WHERE clave = ?', (self._serializar(nuevo), clave)
+            )
+            conexion.execute('COMMIT')
+        except BaseException:
+            conexion.execute('ROLLBACK')
+            raise
+        return nuevo
+
+    def clear(self):
+        self._conexion().execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # La conexión se mantiene abierta entre peticiones; es local a cada hilo
+        pass
+
+    # ------------------------------------------------------------------
+    # Limpieza
+    # ------------------------------------------------------------------
+
+    def _quizas_purgar(self):
+        """Cada ~100 escrituras borra expirados y, si sobra, las entradas más antiguas"""
+        if random.random() > 0.01:
+            return
+        conexion = self._conexion()
+        conexion.execute('DELETE FROM cache WHERE expira IS NOT NULL AND expira <= ?', (time.time(),))
+        total = conexion.execute('SELECT COUNT(*) FROM cache').fetchone()[0]
+        if total > self._max_entries:
+            sobrantes = max(total - self._max_entries, total // self._cull_frequency)
+            conexion.execute(
+                'DELETE FROM cache WHERE rowid IN (SELECT rowid FROM cache ORDER BY rowid LIMIT ?)',
+                (sobrantes,)
+            )
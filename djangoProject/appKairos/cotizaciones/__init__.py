@@ -0,0 +1,62 @@
+"""
+Cotizaciones OHLC de los mercados (Mercado.codigo), guardadas en local
+
+    from appKairos import cotizaciones
+
+    barras = cotizaciones.barras('SP500', 'dia', desde=date(2024, 1, 1))
+    barras['cierre']                      # float64, vista del fichero sin copiar
+    cotizaciones.rendimiento('SP500', date(2024, 1, 1), date(2024, 12, 31))  # %
+
+Los datos se cargan con el comando importar_cotizaciones (CSV de barras de
+1 minuto, agregadas a hora, día y mes) en settings.COTIZACIONES_DIR; el
+formato de los ficheros se describe en almacen.py. Los precios son float64:
+son datos de mercado para gráficas y comparativas, no importes (Dinero).
+"""
+import threading
+
+import numpy as np
+from django.conf import settings
+
+from .almacen import BARRA, RESOLUCIONES, AlmacenCotizaciones, remuestrear
+from .importacion import importar, leer_csv
+
+
+__all__ = [
+    'BARRA', 'RESOLUCIONES', 'AlmacenCotizaciones', 'remuestrear', 'importar', 'leer_csv',
+    'obtener_almacen', 'barras', 'rendimiento',
+]
+
+_almacenes = {}
+_almacenes_lock = threading.Lock()
+
+
+def obtener_almacen():
+    """Almacén del proceso para settings.COTIZACIONES_DIR, creándolo la primera vez"""
+    directorio = str(settings.COTIZACIONES_DIR)
+    almacen = _almacenes.get(directorio)
+    if almacen is None:
+        with _almacenes_lock:
+            almacen = _almacenes.setdefault(directorio, AlmacenCotizaciones(directorio))
+    return almacen
+
+
+def barras(codigo, resolucion='dia', desde=None, hasta=None):
+    """Barras de un mercado entre dos fechas (ver AlmacenCotizaciones.barras)"""
+    return obtener_almacen().barras(codigo, resolucion, desde, hasta)
+
+
+def rendimiento(codigo, desde, hasta=None, resolucion='dia'):
+    """
+    Variación en % del cierre de un mercado entre desde y hasta: del último
+    cierre anterior a desde (o la apertura de la primera barra, si no lo hay)
+    al último cierre hasta hasta. None si no hay cotizaciones en el periodo.
+    """
+    almacen = obtener_almacen()
+    periodo = almacen.barras(codigo, resolucion, desde, hasta)
+    if not len(periodo):
+        return None
+    anteriores = almacen.barras(codigo, resolucion, hasta=np.datetime64(desde, 's') - np.timedelta64(1, 's'))
+    base = anteriores['cierre'][-1] if len(anteriores) else periodo['apertura'][0]
+    if not base:
+        return None
+    return round(float(periodo['cierre'][-1] / base - 1) * 100, 2)
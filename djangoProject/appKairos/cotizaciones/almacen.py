@@ -0,0 +1,205 @@
+"""
+Almacén binario de barras OHLC, de solo anexado y leído con mmap
+
+Cada serie (código de Mercado y resolución) es un fichero de registros de
+tamaño fijo (BARRA) en orden de fecha, más un índice pequeño con la fecha de
+la primera barra de cada bloque de BLOQUE barras:
+
+    <directorio>/<codigo>/<resolucion>.ohlc       # barras
+    <directorio>/<codigo>/<resolucion>.idx.npy    # índice por bloques
+
+- Leer un rango busca en el índice (en memoria) el bloque de cada extremo y
+  dentro del bloque la posición exacta; el resultado es un corte del memmap,
+  sin copiar datos: solo se leen del disco las páginas que se usan.
+- Escribir solo añade barras posteriores a la última. La excepción es la
+  última barra de una resolución agregada (hora, día, mes), que sigue
+  abierta mientras llegan minutos de su periodo y se reescribe en su sitio.
+- Un solo escritor a la vez (el comando importar_cotizaciones); los lectores
+  pueden ser muchos procesos. Si el índice no corresponde a las barras (un
+  anexado interrumpido) se rehace al leer.
+"""
+import os
+import re
+import threading
+from pathlib import Path
+
+import numpy as np
+
+
+BARRA = np.dtype([
+    ('fecha', 'M8[s]'),
+    ('apertura', '<f8'),
+    ('maximo', '<f8'),
+    ('minimo', '<f8'),
+    ('cierre', '<f8'),
+    ('volumen', '<f8'),
+])
+
+# Resoluciones de menor a mayor, con su unidad de datetime64
+RESOLUCIONES = {'minuto': 'm', 'hora': 'h', 'dia': 'D', 'mes': 'M'}
+
+BLOQUE = 1024
+
+_CODIGO = re.compile(r'^[A-Za-z0-9][A-Za-z0-9._-]*$')
+
+
+def vacias():
+    """Array de barras vacío"""
+    return np.empty(0, dtype=BARRA)
+
+
+def remuestrear(barras, resolucion):
+    """
+    Agrega barras en orden de fecha a una resolución mayor: apertura de la
+    primera, máximo, mínimo, cierre de la última y volumen sumado. La fecha de
+    cada barra es el inicio de su periodo (el día o el mes, a las 00:00).
+    """
+    if not len(barras):
+        return vacias()
+    periodos = barras['fecha'].astype(f"M8[{RESOLUCIONES[resolucion]}]")
+    inicios = np.flatnonzero(np.r_[True, periodos[1:] != periodos[:-1]])
+    finales = np.r_[inicios[1:], len(barras)] - 1
+
+    agregadas = np.empty(len(inicios), dtype=BARRA)
+    agregadas['fecha'] = periodos[inicios].astype('M8[s]')
+    agregadas['apertura'] = barras['apertura'][inicios]
+    agregadas['maximo'] = np.maximum.reduceat(barras['maximo'], inicios)
+    agregadas['minimo'] = np.minimum.reduceat(barras['minimo'], inicios)
+    agregadas['cierre'] = barras['cierre'][finales]
+    agregadas['volumen'] = np.add.reduceat(barras['volumen'], inicios)
+    return agregadas
+
+
+class AlmacenCotizaciones:
+    """Series OHLC de un directorio; una instancia por proceso (obtener_almacen())"""
+
+    def __init__(self, directorio):
+        self.directorio = Path(directorio)
+        self._lock = threading.Lock()
+        # (codigo, resolucion) -> (número de barras, memmap, índice)
+        self._abiertas = {}
+
+    def _rutas(self, codigo, resolucion):
+        if not _CODIGO.match(codigo or ''):
+            raise ValueError(f'Código de mercado no válido: {codigo!r}')
+        if resolucion not in RESOLUCIONES:
+            raise ValueError(f"Resolución no válida: {resolucion!r} (use {', '.join(RESOLUCIONES)})")
+        carpeta = self.directorio / codigo
+        return carpeta / f'{resolucion}.ohlc', carpeta / f'{resolucion}.idx.npy'
+
+    def _abrir(self, codigo, resolucion):
+        """(memmap de solo lectura con todas las barras, índice), o (None, None) si no hay"""
+        datos, ruta_indice = self._rutas(codigo, resolucion)
+        try:
+            n = datos.stat().st_size // BARRA.itemsize
+        except FileNotFoundError:
+            n = 0
+        clave = (codigo, resolucion)
+        with self._lock:
+            abierta = self._abiertas.get(clave)
+            if abierta is not None and abierta[0] == n:
+                return abierta[1], abierta[2]
+            if not n:
+                self._abiertas.pop(clave, None)
+                return None, None
+
+            barras = np.memmap(datos, dtype=BARRA, mode='r', shape=(n,))
+            try:
+                indice = np.load(ruta_indice)
+            except (FileNotFoundError, ValueError):
+                indice = None
+            if indice is None or len(indice) != -(-n // BLOQUE):
+                indice = np.array(barras['fecha'][::BLOQUE])
+            self._abiertas[clave] = (n, barras, indice)
+            return barras, indice
+
+    @staticmethod
+    def _posicion(barras, indice, fecha, lado):
+        """Posición de fecha en barras: busca el bloque en el índice y luego dentro de él"""
+        bloque = int(np.searchsorted(indice, fecha, side='right')) - 1
+        if bloque < 0:
+            return 0
+        inicio = bloque * BLOQUE
+        fechas = barras['fecha'][inicio:inicio + BLOQUE]
+        return inicio + int(np.searchsorted(fechas, fecha, side=lado))
+
+    def barras(self, codigo, resolucion='dia', desde=None, hasta=None):
+        """
+        Barras que empiezan entre desde y hasta (ambos incluidos; date,
+        datetime o datetime64). Es una vista del fichero: no copiarla salvo
+        que se vaya a modificar.
+        """
+        todas, indice = self._abrir(codigo, resolucion)
+        if todas is None:
+            return vacias()
+        inicio, fin = 0, len(todas)
+        if desde is not None:
+            inicio = self._posicion(todas, indice, np.datetime64(desde, 's'), 'left')
+        if hasta is not None:
+            fin = self._posicion(todas, indice, np.datetime64(hasta, 's'), 'right')
+        return todas[inicio:max(inicio, fin)]
+
+    def ultima(self, codigo, resolucion='dia'):
+        """Última barra guardada, o None"""
+        todas, _ = self._abrir(codigo, resolucion)
+        return None if todas is None else todas[-1]
+
+    def agregar(self, codigo, resolucion, barras, fusionar_ultima=False):
+        """
+        Añade barras en orden de fecha y devuelve las que se han guardado.
+
+        Las anteriores a la última guardada se descartan (reimportar un fichero
+        no duplica). Una barra con la misma fecha que la última se descarta o,
+        con fusionar_ultima, se combina con ella en su sitio: así se completa
+        el día o el mes en curso con minutos nuevos.
+        """
+        barras = np.asarray(barras, dtype=BARRA)
+        if len(barras) and not (np.diff(barras['fecha']) > np.timedelta64(0, 's')).all():
+            raise ValueError('Las barras deben estar en orden de fecha y sin fechas repetidas.')
+        datos, ruta_indice = self._rutas(codigo, resolucion)
+        ultima = self.ultima(codigo, resolucion)
+
+        fusionada = None
+        if ultima is not None:
+            if fusionar_ultima and len(barras) and barras['fecha'][0] == ultima['fecha']:
+                fusionada = remuestrear(np.concatenate([np.array([ultima], dtype=BARRA), barras[:1]]), resolucion)
+            barras = barras[barras['fecha'] > ultima['fecha']]
+        if not len(barras) and fusionada is None:
+            return vacias()
+
+        datos.parent.mkdir(parents=True, exist_ok=True)
+        with open(datos, 'r+b' if fusionada is not None else 'ab') as fichero:
+            if fusionada is not None:
+                fichero.seek(-BARRA.itemsize, os.SEEK_END)
+                fichero.write(fusionada.tobytes())
+            fichero.seek(0, os.SEEK_END)
+            fichero.write(np.ascontiguousarray(barras).tobytes())
+            fichero.flush()
+            os.fsync(fichero.fileno())
+
+        # _abrir() rehace el índice si las barras nuevas empiezan un bloque
+        todas, indice = self._abrir(codigo, resolucion)
+        if not ruta_indice.exists() or len(barras):
+            temporal = ruta_indice.with_name(ruta_indice.name + '.tmp')
+            with open(temporal, 'wb') as fichero:
+                np.save(fichero, indice)
+            os.replace(temporal, ruta_indice)
+
+        if fusionada is not None:
+            return np.concatenate([fusionada, barras])
+        return barras
+
+    def mercados(self):
+        """Códigos con alguna serie guardada"""
+        if not self.directorio.is_dir():
+            return []
+        return sorted(carpeta.name for carpeta in self.directorio.iterdir() if carpeta.is_dir())
+
+    def borrar(self, codigo, resolucion=None):
+        """Borra una serie (o todas las del mercado); se vuelven a importar desde el CSV"""
+        resoluciones = [resolucion] if resolucion else list(RESOLUCIONES)
+        with self._lock:
+            for nombre in resoluciones:
+                for ruta in self._rutas(codigo, nombre):
+                    ruta.unlink(missing_ok=True)
+                self._abiertas.pop((codigo, nombre), None)
@@ -0,0 +1,75 @@
+"""
+Importación de cotizaciones desde CSV
+
+Columnas por posición: fecha, apertura, máximo, mínimo, cierre y, opcional,
+volumen. La cabecera se detecta sola; el separador puede ser coma, punto y
+coma o tabulador. Las fechas en ISO ('2024-01-02 09:30') o con puntos, como
+las exporta MetaTrader ('2024.01.02 09:30'), y en UTC.
+"""
+import numpy as np
+
+from .almacen import BARRA, RESOLUCIONES, remuestrear, vacias
+
+
+SEPARADORES = ('\t', ';', ',')
+
+
+def _separador(linea):
+    for separador in SEPARADORES:
+        if separador in linea:
+            return separador
+    raise ValueError('No se reconoce el separador de columnas del CSV.')
+
+
+def leer_csv(ruta):
+    """Barras de un CSV, ordenadas por fecha y sin fechas repetidas (gana la última)"""
+    with open(ruta, encoding='utf-8-sig') as fichero:
+        primera = fichero.readline()
+    separador = _separador(primera)
+    try:
+        float(primera.split(separador)[1])
+        cabecera = 0
+    except (IndexError, ValueError):
+        cabecera = 1
+
+    filas = np.loadtxt(ruta, delimiter=separador, dtype=str, skiprows=cabecera, ndmin=2, encoding='utf-8-sig')
+    if not len(filas):
+        return vacias()
+    if filas.shape[1] < 5:
+        raise ValueError(f'{ruta}: se esperan al menos 5 columnas (fecha, apertura, máximo, mínimo, cierre).')
+
+    barras = np.empty(len(filas), dtype=BARRA)
+    try:
+        barras['fecha'] = np.char.replace(np.char.strip(filas[:, 0]), '.', '-', count=2).astype('M8[s]')
+        for posicion, campo in enumerate(('apertura', 'maximo', 'minimo', 'cierre'), start=1):
+            barras[campo] = filas[:, posicion].astype(float)
+        barras['volumen'] = filas[:, 5].astype(float) if filas.shape[1] > 5 else 0
+    except ValueError as error:
+        raise ValueError(f'{ruta}: {error}') from None
+
+    # Orden estable para que, a igual fecha, la última fila sea la última
+    barras = barras[np.argsort(barras['fecha'], kind='stable')]
+    ultimas = np.r_[barras['fecha'][1:] != barras['fecha'][:-1], True]
+    return barras[ultimas]
+
+
+def importar(almacen, codigo, barras, resolucion='minuto', agregadas=None):
+    """
+    Guarda barras de una resolución y las agrega a las mayores (por defecto,
+    todas). Solo se agregan las barras que eran nuevas, así que reimportar el
+    mismo fichero no cuenta dos veces el volumen del día en curso.
+
+    Devuelve {resolución: barras guardadas o actualizadas}.
+    """
+    orden = list(RESOLUCIONES)
+    if agregadas is None:
+        agregadas = orden[orden.index(resolucion) + 1:]
+    for nombre in agregadas:
+        if orden.index(nombre) <= orden.index(resolucion):
+            raise ValueError(f'No se puede agregar {resolucion!r} a {nombre!r}, que no es mayor.')
+
+    nuevas = almacen.agregar(codigo, resolucion, barras)
+    guardadas = {resolucion: len(nuevas)}
+    for nombre in agregadas:
+        guardadas[nombre] = len(almacen.agregar(codigo, nombre, remuestrear(nuevas, nombre), fusionar_ultima=True))
+    return guardadas
@@ -0,0 +1,5 @@
+"""
+Acceso a base de datos de appKairos: enrutado a réplicas de lectura, a la
+base de datos de auditoría y a los shards de usuario (routers.py, shards.py)
+y stickiness de lectura tras escritura (middleware.py)
+"""
@@ -0,0 +1,122 @@
+"""
+Backend SQLite con un único escritor por proceso
+
+SQLite admite un solo escritor a la vez. Con el backend estándar, dos hilos
+que escriben a la vez compiten por el bloqueo del fichero y el perdedor
+reintenta hasta busy_timeout o falla con "database is locked"; además una
+transacción que empezó leyendo no puede pasar a escribir si otra confirmó
+entre medias.
+
+Aquí las escrituras hacen cola en un cerrojo del proceso (uno por fichero):
+
+- Cada transacción (atomic) empieza con BEGIN IMMEDIATE tras tomar el
+  cerrojo, y lo suelta en COMMIT/ROLLBACK. También las de solo lectura.
+- Las sentencias de escritura sueltas (autocommit) lo toman solo mientras
+  se ejecutan.
+
+Entre procesos distintos sigue actuando busy_timeout (ver appKairos.db.sqlite).
+Se activa con SQLITE_ESCRITOR_UNICO=True.
+"""
+from contextlib import contextmanager
+import os
+import re
+import threading
+
+from django.db.backends.sqlite3 import base as sqlite3
+
+
+_ESCRITURA = re.compile(
+    r'^\s*(INSERT|UPDATE|DELETE|REPLACE|CREATE|DROP|ALTER|WITH\b.*\b(INSERT|UPDATE|DELETE)\b)',
+    re.IGNORECASE | re.DOTALL,
+)
+
+_cerrojos = {}
+_cerrojos_lock = threading.Lock()
+
+
+def cerrojo_escritura(clave):
+    """Cerrojo compartido por todas las conexiones del proceso al mismo fichero"""
+    with _cerrojos_lock:
+        return _cerrojos.setdefault(clave, threading.Lock())
+
+
+class CursorEscritor(sqlite3.SQLiteCursorWrapper):
+    bd = None  # DatabaseWrapper dueño del cursor
+
+    def execute(self, query, params=None):
+        with self.bd.escritura(query):
+            return super().execute(query, params)
+
+    def executemany(self, query, param_list):
+        with self.bd.escritura(query):
+            return super().executemany(query, param_list)
+
+
+class DatabaseWrapper(sqlite3.DatabaseWrapper):
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._escribiendo = False
+
+    @property
+    def cerrojo(self):
+        nombre = str(self.settings_dict['NAME'])
+        return cerrojo_escritura(nombre if self.is_in_memory_db() else os.path.abspath(nombre))
+
+    def _adquirir(self):
+        espera = self.settings_dict['OPTIONS'].get('timeout', 5)
+        if not self.cerrojo.acquire(timeout=espera):
+            raise self.Database.OperationalError('database is locked (cola de escritura)')
+        self._escribiendo = True
+
+    def _liberar(self):
+        if self._escribiendo:
+            self._escribiendo = False
+            self.cerrojo.release()
+
+    @contextmanager
+    def escritura(self, sql):
+        """Toma el cerrojo para una sentencia de escritura fuera de transacción"""
+        tomado = False
+        if not self._escribiendo and _ESCRITURA.match(sql):
+            self._adquirir()
+            tomado = True
+        try:
+            yield
+        finally:
+            # Si el módulo sqlite3 abrió una transacción implícita, se mantiene hasta COMMIT
+            if tomado and not self.connection.in_transaction:
+                self._liberar()
+
+    def create_cursor(self, name=None):
+        cursor = self.connection.cursor(factory=CursorEscritor)
+        cursor.bd = self
+        return cursor
+
+    def _start_transaction_under_autocommit(self):
+        if not self._escribiendo:
+            self._adquirir()
+        try:
+            self.cursor().execute('BEGIN IMMEDIATE')
+        except Exception:
+            self._liberar()
+            raise
+
+    def _terminar(self, metodo):
+        try:
+            return metodo()
+        finally:
+            if self.connection is None or not self.connection.in_transaction:
+                self._liberar()
+
+    def _commit(self):
+        return self._terminar(super()._commit)
+
+    def _rollback(self):
+        return self._terminar(super()._rollback)
+
+    def _close(self):
+        try:
+            return super()._close()
+        finally:
+            self._liberar()
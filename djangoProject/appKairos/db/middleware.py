@@ -0,0 +1,39 @@
+"""
+Lectura tras escritura con réplicas
+
+Tras una petición que escribe (POST, PUT, PATCH, DELETE) el navegador recibe
+una cookie firmada durante DATABASE_REPLICA_STICKY_SEGUNDOS. Mientras la
+tenga, sus peticiones leen de la primaria aunque la vista sea de solo
+lectura, así ve sus propios cambios aunque la réplica vaya con retraso.
+"""
+from django.conf import settings
+
+from .routers import pegado_a_primaria, replicas
+
+
+COOKIE_PRIMARIA = 'kairos_primaria'
+METODOS_SEGUROS = ('GET', 'HEAD', 'OPTIONS', 'TRACE')
+
+
+class ReplicaStickyMiddleware:
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        segundos = getattr(settings, 'DATABASE_REPLICA_STICKY_SEGUNDOS', 10)
+        pegado = request.get_signed_cookie(COOKIE_PRIMARIA, default=None, max_age=segundos) is not None
+        escribe = request.method not in METODOS_SEGUROS
+
+        with pegado_a_primaria(pegado or escribe):
+            response = self.get_response(request)
+
+        if escribe:
+            response.set_signed_cookie(
+                COOKIE_PRIMARIA, '1', max_age=segundos,
+                httponly=True, samesite='Lax', secure=request.is_secure(),
+            )
+        return response
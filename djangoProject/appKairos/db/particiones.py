@@ -0,0 +1,233 @@
+"""
+Particionado por fecha de Resultado en PostgreSQL
+
+Opcional: settings.RESULTADO_PARTICIONES = 'anual' o 'mensual'. La
+migración 0008 (o el comando particiones_resultado --convertir, si se
+activa más tarde) convierte la tabla en una tabla particionada por rango
+de `fecha`:
+
+- Una partición por año o por mes (appKairos_resultado_p2025,
+  appKairos_resultado_p2025_03) creadas por adelantado, y una partición
+  DEFAULT para que una inserción nunca falle si el cron se retrasa.
+- Las consultas con rango de fechas (fecha__gte, fecha__year, el filtro de
+  año del admin) solo leen las particiones afectadas (partition pruning).
+- Archivar años antiguos es un DETACH PARTITION: la partición queda como
+  tabla suelta que se puede volcar y borrar, sin DELETE masivo ni vacuum.
+
+PostgreSQL exige que la clave primaria y las restricciones UNIQUE incluyan
+la columna de partición: la clave primaria pasa a ser (id, fecha). Django
+sigue usando id, que es único porque lo genera una sola secuencia.
+"""
+from datetime import date
+import re
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+
+GRANULARIDADES = ('anual', 'mensual')
+COLUMNA = 'fecha'
+
+
+def granularidad():
+    """'anual', 'mensual' o '' si el particionado no está activado"""
+    valor = getattr(settings, 'RESULTADO_PARTICIONES', '')
+    if valor and valor not in GRANULARIDADES:
+        raise ImproperlyConfigured(f'RESULTADO_PARTICIONES debe ser una de {GRANULARIDADES} o vacío')
+    return valor
+
+
+def periodos_adelante():
+    return getattr(settings, 'RESULTADO_PARTICIONES_ADELANTE', 12)
+
+
+# ----------------------------------------------------------------------
+# Periodos
+# ----------------------------------------------------------------------
+
+def inicio_periodo(fecha, gran):
+    return date(fecha.year, 1, 1) if gran == 'anual' else date(fecha.year, fecha.month, 1)
+
+
+def siguiente_periodo(inicio, gran):
+    if gran == 'anual' or inicio.month == 12:
+        return date(inicio.year + 1, 1, 1)
+    return date(inicio.year, inicio.month + 1, 1)
+
+
+def sufijo(inicio, gran):
+    return f'p{inicio.year}' if gran == 'anual' else f'p{inicio.year}_{inicio.month:02d}'
+
+
+def periodos(gran, desde, hasta):
+    """(sufijo, inicio, fin) de cada periodo entre las fechas desde y hasta, ambas incluidas"""
+    inicio = inicio_periodo(desde, gran)
+    while inicio <= hasta:
+        fin = siguiente_periodo(inicio, gran)
+        yield sufijo(inicio, gran), inicio, fin
+        inicio = fin
+
+
+def fin_adelante(gran, adelante, hoy=None):
+    """Último día cubierto si se crean `adelante` periodos tras el actual"""
+    inicio = inicio_periodo(hoy or date.today(), gran)
+    for _ in range(adelante):
+        inicio = siguiente_periodo(inicio, gran)
+    return inicio
+
+
+def anio_de_particion(tabla, nombre):
+    """Año de una partición creada aquí, o None (DEFAULT u otra)"""
+    encaje = re.fullmatch(re.escape(tabla) + r'_p(\d{4})(?:_\d{2})?', nombre)
+    return int(encaje.group(1)) if encaje else None
+
+
+# ----------------------------------------------------------------------
+# SQL
+# ----------------------------------------------------------------------
+
+def sql_crear_particiones(conexion, tabla, gran, desde, hasta, padre=None):
+    """Sentencias (sql, parámetros) que crean las particiones que falten entre desde y hasta"""
+    q = conexion.ops.quote_name
+    padre = padre or tabla
+    return [
+        (
+            f'CREATE TABLE IF NOT EXISTS {q(f"{tabla}_{nombre}")} PARTITION OF {q(padre)} '
+            f'FOR VALUES FROM (%s) TO (%s)',
+            [inicio, fin],
+        )
+        for nombre, inicio, fin in periodos(gran, desde, hasta)
+    ]
+
+
+def sql_restricciones(conexion, tabla, restricciones):
+    """
+    Vuelve a crear en la tabla particionada las restricciones e índices que
+    tenía la original (introspección de Django), con los mismos nombres.
+    La clave primaria y los UNIQUE se amplían con la columna de partición.
+    """
+    q = conexion.ops.quote_name
+    sentencias = []
+    for nombre, datos in sorted(restricciones.items()):
+        columnas = list(datos['columns'] or [])
+        if not columnas or datos.get('check'):
+            # Los CHECK ya los copia LIKE ... INCLUDING CONSTRAINTS
+            continue
+        if datos['primary_key'] or datos['unique']:
+            if COLUMNA not in columnas:
+                columnas.append(COLUMNA)
+            tipo = 'PRIMARY KEY' if datos['primary_key'] else 'UNIQUE'
+            sentencias.append(
+                f'ALTER TABLE {q(tabla)} ADD CONSTRAINT {q(nombre)} {tipo} '
+                f'({", ".join(q(c) for c in columnas)})'
+            )
+        elif datos['foreign_key']:
+            destino, columna_destino = datos['foreign_key']
+            sentencias.append(
+                f'ALTER TABLE {q(tabla)} ADD CONSTRAINT {q(nombre)} FOREIGN KEY '
+                f'({", ".join(q(c) for c in columnas)}) REFERENCES {q(destino)} ({q(columna_destino)}) '
+                f'DEFERRABLE INITIALLY DEFERRED'
+            )
+        elif datos['index']:
+            ordenes = datos.get('orders') or []
+            partes = [
+                q(columna) + (' DESC' if i < len(ordenes) and ordenes[i] == 'DESC' else '')
+                for i, columna in enumerate(columnas)
+            ]
+            metodo = '' if datos.get('type') in (None, 'idx', 'btree') else f' USING {datos["type"]}'
+            sentencias.append(f'CREATE INDEX {q(nombre)} ON {q(tabla)}{metodo} ({", ".join(partes)})')
+    return sentencias
+
+
+# ----------------------------------------------------------------------
+# Operaciones
+# ----------------------------------------------------------------------
+
+def esta_particionada(conexion, tabla):
+    if conexion.vendor != 'postgresql':
+        return False
+    with conexion.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [conexion.ops.quote_name(tabla)])
+        fila = cursor.fetchone()
+    return fila is not None and fila[0] == 'p'
+
+
+def particiones(conexion, tabla):
+    """[(nombre, límites)] de las particiones de la tabla"""
+    with conexion.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname, pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i '
+            'JOIN pg_class c ON c.oid = i.inhrelid WHERE i.inhparent = to_regclass(%s) '
+            'ORDER BY c.relname',
+            [conexion.ops.quote_name(tabla)]
+        )
+        return cursor.fetchall()
+
+
+def crear_particiones(conexion, tabla, gran, adelante, hoy=None):
+    """Crea las particiones desde el periodo actual hasta `adelante` periodos después"""
+    hoy = hoy or date.today()
+    sentencias = sql_crear_particiones(conexion, tabla, gran, hoy, fin_adelante(gran, adelante, hoy))
+    with conexion.cursor() as cursor:
+        for sql, parametros in sentencias:
+            cursor.execute(sql, parametros)
+    return len(sentencias)
+
+
+def particionar(conexion, tabla, gran, adelante, hoy=None):
+    """
+    Convierte la tabla en particionada copiando sus filas. Debe ejecutarse
+    dentro de una transacción (la de la migración): si algo falla, la
+    tabla original queda intacta. Devuelve False si ya lo estaba.
+    """
+    if esta_particionada(conexion, tabla):
+        return False
+    q = conexion.ops.quote_name
+    hoy = hoy or date.today()
+    nueva = f'{tabla}_particionada'
+
+    with conexion.cursor() as cursor:
+        restricciones = conexion.introspection.get_constraints(cursor, tabla)
+        cursor.execute(f'SELECT MIN({q(COLUMNA)}), MAX(id) FROM {q(tabla)}')
+        primera, max_id = cursor.fetchone()
+        # Último valor de la secuencia, que puede estar adelantado (rangos de shard)
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [q(tabla)])
+        secuencia = cursor.fetchone()[0]
+        ultimo = 0
+        if secuencia:
+            cursor.execute(f'SELECT last_value FROM {secuencia}')
+            ultimo = cursor.fetchone()[0]
+
+        cursor.execute(
+            f'CREATE TABLE {q(nueva)} (LIKE {q(tabla)} INCLUDING DEFAULTS INCLUDING IDENTITY '
+            f'INCLUDING CONSTRAINTS) PARTITION BY RANGE ({q(COLUMNA)})'
+        )
+        for sql, parametros in sql_crear_particiones(
+            conexion, tabla, gran, min(primera or hoy, hoy), fin_adelante(gran, adelante, hoy), padre=nueva
+        ):
+            cursor.execute(sql, parametros)
+        cursor.execute(f'CREATE TABLE {q(f"{tabla}_pdefault")} PARTITION OF {q(nueva)} DEFAULT')
+
+        cursor.execute(f'INSERT INTO {q(nueva)} OVERRIDING SYSTEM VALUE SELECT * FROM {q(tabla)}')
+        cursor.execute(f'DROP TABLE {q(tabla)}')
+        cursor.execute(f'ALTER TABLE {q(nueva)} RENAME TO {q(tabla)}')
+        for sql in sql_restricciones(conexion, tabla, restricciones):
+            cursor.execute(sql)
+
+        valor = max(max_id or 0, ultimo or 0)
+        if valor:
+            cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s)", [q(tabla), valor])
+    return True
+
+
+def archivar(conexion, tabla, hasta_anio):
+    """Separa de la tabla las particiones de los años <= hasta_anio; devuelve sus nombres"""
+    q = conexion.ops.quote_name
+    separadas = []
+    with conexion.cursor() as cursor:
+        for nombre, _ in particiones(conexion, tabla):
+            anio = anio_de_particion(tabla, nombre)
+            if anio is not None and anio <= hasta_anio:
+                cursor.execute(f'ALTER TABLE {q(tabla)} DETACH PARTITION {q(nombre)}')
+                separadas.append(nombre)
+    return separadas
@@ -0,0 +1,275 @@
+"""
+Pool de conexiones a base de datos
+
+Genérico: recibe una fábrica que abre conexiones DB-API, así que se puede
+probar con conexiones simuladas. Lo usa el backend
+appKairos.db.backends.postgresql_pool (un pool por alias y proceso).
+
+- minimo/maximo: conexiones que se mantienen abiertas y tope absoluto.
+- timeout: segundos que se espera una conexión libre antes de fallar con
+  PoolAgotado, en lugar de abrir conexiones sin límite durante un pico.
+- verificar_tras: una conexión inactiva más de estos segundos se comprueba
+  (SELECT 1) antes de entregarla; si falla se descarta y se abre otra.
+- max_vida / max_inactiva: se reciclan conexiones viejas o que sobran.
+"""
+from collections import deque
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class PoolAgotado(Exception):
+    """No hubo conexión libre en el tiempo de espera"""
+
+
+def verificar_select_1(conexion):
+    """Comprobación de salud por defecto"""
+    try:
+        with conexion.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not getattr(conexion, 'autocommit', True):
+            conexion.rollback()
+        return True
+    except Exception:
+        return False
+
+
+def reiniciar_transaccion(conexion):
+    """Deja la conexión sin transacción abierta antes de volver al pool"""
+    if not getattr(conexion, 'autocommit', True):
+        conexion.rollback()
+
+
+class _Entrada:
+    __slots__ = ('conexion', 'creada', 'usada')
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+        self.creada = self.usada = time.monotonic()
+
+
+class PoolConexiones:
+
+    def __init__(self, fabrica, minimo=1, maximo=10, timeout=5.0, verificar_tras=30.0,
+                 max_vida=3600.0, max_inactiva=600.0,
+                 verificar=verificar_select_1, reiniciar=reiniciar_transaccion):
+        if minimo < 0 or maximo < 1 or minimo > maximo:
+            raise ValueError('Se requiere 0 <= minimo <= maximo y maximo >= 1')
+        self.fabrica = fabrica
+        self.minimo = minimo
+        self.maximo = maximo
+        self.timeout = timeout
+        self.verificar_tras = verificar_tras
+        self.max_vida = max_vida
+        self.max_inactiva = max_inactiva
+        self.verificar = verificar
+        self.reiniciar = reiniciar
+
+        self._libres = deque()
+        self._en_uso = {}  # id(conexion) -> _Entrada
+        self._total = 0    # libres + en uso + abriéndose
+        self._cond = threading.Condition()
+        self._cerrado = False
+        self._contadores = dict.fromkeys(
+            ('creadas', 'cerradas', 'entregas', 'esperas', 'timeouts', 'verificaciones_fallidas'), 0
+        )
+        self._espera_total = 0.0
+        self._esperando = 0
+
+    # ------------------------------------------------------------------
+    # Entrega y devolución
+    # ------------------------------------------------------------------
+
+    def obtener(self):
+        """Devuelve una conexión sana; espera hasta timeout si el pool está lleno"""
+        inicio = time.monotonic()
+        limite = inicio + self.timeout
+        while True:
+            entrada = self._reservar(limite)
+            if entrada is None:
+                entrada = self._abrir()
+            elif not self._sana(entrada):
+                self._descartar(entrada)
+                continue
+
+            with self._cond:
+                entrada.usada = time.monotonic()
+                self._en_uso[id(entrada.conexion)] = entrada
+                self._contadores['entregas'] += 1
+                self._espera_total += entrada.usada - inicio
+            return entrada.conexion
+
+    def devolver(self, conexion, descartar=False):
+        """Devuelve la conexión al pool (o la cierra si está rota o es vieja)"""
+        with self._cond:
+            entrada = self._en_uso.pop(id(conexion), None)
+        if entrada is None:
+            # No es del pool (p. ej. tras cerrar el pool): se cierra sin más
+            self._cerrar_conexion(conexion)
+            return
+
+        if not descartar:
+            try:
+                self.reiniciar(conexion)
+            except Exception:
+                descartar = True
+        ahora = time.monotonic()
+        if descartar or self._cerrado or getattr(conexion, 'closed', False) or ahora - entrada.creada > self.max_vida:
+            self._descartar(entrada)
+            return
+
+        entrada.usada = ahora
+        with self._cond:
+            self._libres.append(entrada)
+            sobrantes = self._recortar_inactivas(ahora)
+            self._cond.notify()
+        for vieja in sobrantes:
+            self._cerrar_conexion(vieja.conexion)
+
+    def _reservar(self, limite):
+        """Toma una conexión libre o reserva hueco para abrir una (devuelve None)"""
+        with self._cond:
+            if self._cerrado:
+                raise PoolAgotado('El pool está cerrado')
+            esperado = False
+            try:
+                while True:
+                    if self._libres:
+                        # LIFO: la más reciente, con menos probabilidad de estar caída
+                        return self._libres.pop()
+                    if self._total < self.maximo:
+                        self._total += 1
+                        return None
+                    restante = limite - time.monotonic()
+                    if restante <= 0:
+                        self._contadores['timeouts'] += 1
+                        raise PoolAgotado(
+                            f'Sin conexiones libres tras {self.timeout}s ({self.maximo} en uso)'
+                        )
+                    if not esperado:
+                        esperado = True
+                        self._esperando += 1
+                        self._contadores['esperas'] += 1
+                    self._cond.wait(restante)
+            finally:
+                if esperado:
+                    self._esperando -= 1
+
+    def _abrir(self):
+        try:
+            conexion = self.fabrica()
+        except Exception:
+            with self._cond:
+                self._total -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._contadores['creadas'] += 1
+        return _Entrada(conexion)
+
+    def _sana(self, entrada):
+        ahora = time.monotonic()
+        if ahora - entrada.creada > self.max_vida:
+            return False
+        if ahora - entrada.usada < self.verificar_tras:
+            return True
+        if self.verificar(entrada.conexion):
+            return True
+        with self._cond:
+            self._contadores['verificaciones_fallidas'] += 1
+        logger.info('Conexión del pool descartada: no superó la comprobación de salud')
+        return False
+
+    def _descartar(self, entrada):
+        self._cerrar_conexion(entrada.conexion)
+        with self._cond:
+            self._total -= 1
+            self._cond.notify()
+
+    def _recortar_inactivas(self, ahora):
+        """Con el lock tomado: saca las libres inactivas que exceden el mínimo"""
+        sobrantes = []
+        while (self._libres and self._total > self.minimo
+               and ahora - self._libres[0].usada > self.max_inactiva):
+            sobrantes.append(self._libres.popleft())
+            self._total -= 1
+        return sobrantes
+
+    def _cerrar_conexion(self, conexion):
+        try:
+            conexion.close()
+        except Exception:
+            pass
+        with self._cond:
+            self._contadores['cerradas'] += 1
+
+    # ------------------------------------------------------------------
+    # Ciclo de vida y métricas
+    # ------------------------------------------------------------------
+
+    def calentar(self):
+        """Abre conexiones hasta tener el mínimo libres o en uso"""
+        while True:
+            with self._cond:
+                if self._cerrado or self._total >= self.minimo:
+                    return
+                self._total += 1
+            entrada = self._abrir()
+            with self._cond:
+                self._libres.appendleft(entrada)
+                self._cond.notify()
+
+    def cerrar(self):
+        """Cierra las conexiones libres; las que están en uso se cierran al devolverse"""
+        with self._cond:
+            self._cerrado = True
+            libres = list(self._libres)
+            self._libres.clear()
+            self._total -= len(libres)
+            self._cond.notify_all()
+        for entrada in libres:
+            self._cerrar_conexion(entrada.conexion)
+
+    def metricas(self):
+        with self._cond:
+            datos = dict(self._contadores)
+            datos.update(
+                minimo=self.minimo,
+                maximo=self.maximo,
+                total=self._total,
+                libres=len(self._libres),
+                en_uso=len(self._en_uso),
+                esperando=self._esperando,
+                espera_media_ms=(self._espera_total / datos['entregas'] * 1000) if datos['entregas'] else 0,
+            )
+        return datos
+
+
+# ----------------------------------------------------------------------
+# Registro de pools por alias (uno por proceso)
+# ----------------------------------------------------------------------
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def obtener_pool(alias, crear):
+    """Pool del alias en este proceso; crear() lo construye la primera vez (y tras un fork)"""
+    clave = (alias, os.getpid())
+    pool = _pools.get(clave)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(clave)
+            if pool is None:
+                pool = _pools[clave] = crear()
+    return pool
+
+
+def metricas_pools():
+    """Métricas de todos los pools del proceso, por alias"""
+    pid = os.getpid()
+    return {alias: pool.metricas() for (alias, dueno), pool in list(_pools.items()) if dueno == pid}
@@ -0,0 +1,277 @@
+"""
+Routers de base de datos
+
+AuditoriaRouter: los modelos de auditoría (SesionSeguridad y tokens) viven en
+settings.DATABASE_AUDITORIA, una base de datos aparte, para que sus ráfagas de
+escritura no compartan WAL, vacuum ni conexiones con los datos financieros.
+
+ShardRouter: contratos y resultados repartidos entre shards por usuario
+(ver shards.py).
+
+ReplicaRouter: réplicas de lectura.
+
+Las escrituras van siempre a 'default'. Las lecturas también, salvo dentro
+de una vista o bloque marcado como de solo lectura:
+
+    @solo_lectura
+    def index_view(request): ...
+
+    with en_replica():
+        informe = list(Resultado.objects.filter(...))
+
+En ese caso se reparten entre las réplicas sanas de settings.DATABASE_REPLICAS.
+Se vuelve a 'default' si no hay réplicas sanas o si la petición está "pegada"
+a la primaria porque el usuario escribió hace poco (ver middleware.py).
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import logging
+import random
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .shards import (
+    MODELOS_CATALOGO, MODELOS_SHARD, es_catalogo, es_de_shard, es_usuario,
+    shard_de, shards, sharding_activo,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Lecturas permitidas en réplica en el contexto actual (hilo o tarea async)
+_en_replica = ContextVar('kairos_en_replica', default=False)
+# La petición actual debe leer de la primaria (lectura tras escritura)
+_pegado_primaria = ContextVar('kairos_pegado_primaria', default=False)
+
+
+def replicas():
+    return list(getattr(settings, 'DATABASE_REPLICAS', []))
+
+
+# ----------------------------------------------------------------------
+# Salud de las réplicas
+# ----------------------------------------------------------------------
+
+_salud = {}  # alias -> (sana, momento de la comprobación)
+_salud_lock = threading.Lock()
+
+
+def _comprobar(alias):
+    """SELECT 1 y, en PostgreSQL, retraso de replicación por debajo del máximo"""
+    conexion = connections[alias]
+    try:
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'postgresql':
+                cursor.execute(
+                    'SELECT COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)'
+                )
+                retraso = float(cursor.fetchone()[0])
+                return retraso <= getattr(settings, 'DATABASE_REPLICA_RETRASO_MAX', 30)
+            cursor.execute('SELECT 1')
+            return True
+    except Exception:
+        logger.warning('Réplica %s no disponible; se lee de la primaria', alias, exc_info=True)
+        conexion.close()
+        return False
+
+
+def replica_sana(alias):
+    """Resultado de la última comprobación, repetida cada DATABASE_REPLICA_SALUD_TTL segundos"""
+    ttl = getattr(settings, 'DATABASE_REPLICA_SALUD_TTL', 10)
+    ahora = time.monotonic()
+    memo = _salud.get(alias)
+    if memo is not None and ahora - memo[1] < ttl:
+        return memo[0]
+    sana = _comprobar(alias)
+    with _salud_lock:
+        _salud[alias] = (sana, ahora)
+    return sana
+
+
+def elegir_replica():
+    """Alias de una réplica sana al azar, o 'default' si no hay ninguna"""
+    sanas = [alias for alias in replicas() if replica_sana(alias)]
+    return random.choice(sanas) if sanas else DEFAULT_DB_ALIAS
+
+
+# ----------------------------------------------------------------------
+# Contexto de solo lectura
+# ----------------------------------------------------------------------
+
+@contextmanager
+def en_replica():
+    """Las lecturas del bloque pueden ir a una réplica"""
+    marca = _en_replica.set(True)
+    try:
+        yield
+    finally:
+        _en_replica.reset(marca)
+
+
+@contextmanager
+def pegado_a_primaria(activo=True):
+    """Las lecturas del bloque van a la primaria aunque se pida réplica"""
+    marca = _pegado_primaria.set(activo)
+    try:
+        yield
+    finally:
+        _pegado_primaria.reset(marca)
+
+
+def solo_lectura(vista):
+    """Decorador de vistas: sus lecturas pueden servirse desde una réplica"""
+    @wraps(vista)
+    def envoltura(request, *args, **kwargs):
+        with en_replica():
+            return vista(request, *args, **kwargs)
+    return envoltura
+
+
+# ----------------------------------------------------------------------
+# Routers
+# ----------------------------------------------------------------------
+
+MODELOS_AUDITORIA = frozenset({
+    'appKairos.sesionseguridad',
+    'appKairos.tokenverificacionemail',
+    'appKairos.tokenrecuperacionpassword',
+})
+
+
+def alias_auditoria():
+    return getattr(settings, 'DATABASE_AUDITORIA', DEFAULT_DB_ALIAS)
+
+
+def es_auditoria(modelo):
+    return modelo._meta.label_lower in MODELOS_AUDITORIA
+
+
+class AuditoriaRouter:
+    """
+    Sin DATABASE_AUDITORIA propia no interviene. Con ella, los modelos de
+    auditoría se leen, escriben y migran solo allí; su clave foránea a
+    Usuario no tiene restricción en BD y se resuelve contra 'default'.
+    """
+
+    def db_for_read(self, model, **hints):
+        alias = alias_auditoria()
+        if alias == DEFAULT_DB_ALIAS:
+            return None
+        if es_auditoria(model):
+            return alias
+        # Usuario accedido desde un log o token (token.usuario): está en 'default'
+        instancia = hints.get('instance')
+        if instancia is not None and es_auditoria(type(instancia)):
+            return DEFAULT_DB_ALIAS
+        return None
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if alias_auditoria() != DEFAULT_DB_ALIAS and (es_auditoria(type(obj1)) or es_auditoria(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        alias = alias_auditoria()
+        if alias == DEFAULT_DB_ALIAS:
+            return None
+        propio = model_name is not None and f'{app_label}.{model_name}' in MODELOS_AUDITORIA
+        if db == alias:
+            return propio
+        if propio:
+            return False
+        return None
+
+
+class ShardRouter:
+    """
+    Sin DATABASE_SHARDS (o con uno solo) no interviene. Con varios, los
+    modelos de shard se leen y escriben en el shard de su usuario, que se
+    deduce de la instancia de la pista: el usuario (usuario.resultados) o
+    una fila con usuario_id. Sin pista se devuelve None ('default').
+    """
+
+    def _shard_de_instancia(self, hints):
+        instancia = hints.get('instance')
+        if instancia is None:
+            return None
+        modelo = type(instancia)
+        if es_usuario(modelo):
+            return shard_de(instancia.pk)
+        if es_de_shard(modelo):
+            if instancia.usuario_id is not None:
+                return shard_de(instancia.usuario_id)
+            return instancia._state.db
+        return None
+
+    def db_for_read(self, model, **hints):
+        if not sharding_activo():
+            return None
+        if es_de_shard(model):
+            return self._shard_de_instancia(hints)
+        instancia = hints.get('instance')
+        if not es_catalogo(model) and instancia is not None and es_de_shard(type(instancia)):
+            # contrato.usuario: el usuario está en 'default', no en el shard
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        if not sharding_activo():
+            return None
+        if es_de_shard(model):
+            return self._shard_de_instancia(hints)
+        instancia = hints.get('instance')
+        if instancia is not None and (es_catalogo(model) or es_de_shard(type(instancia))):
+            # El catálogo se escribe en 'default' y desde ahí se replica
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        if sharding_activo() and (es_de_shard(type(obj1)) or es_de_shard(type(obj2))):
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 'default' lo tiene todo; el resto de shards, solo sus modelos y el catálogo
+        if db == DEFAULT_DB_ALIAS or db not in shards():
+            return None
+        if model_name is None:
+            return False
+        modelo = f'{app_label}.{model_name}'
+        return modelo in MODELOS_SHARD or modelo in MODELOS_CATALOGO
+
+
+class ReplicaRouter:
+    """
+    Devuelve None cuando no decide, para que se apliquen los routers
+    siguientes de DATABASE_ROUTERS o el comportamiento por defecto.
+    """
+
+    def db_for_read(self, model, **hints):
+        if not _en_replica.get() or _pegado_primaria.get() or not replicas():
+            return None
+        return elegir_replica()
+
+    def db_for_write(self, model, **hints):
+        # Las instancias leídas de una réplica se guardan en la primaria
+        instancia = hints.get('instance')
+        if instancia is not None and instancia._state.db in replicas():
+            return DEFAULT_DB_ALIAS
+        return None
+
+    def allow_relation(self, obj1, obj2, **hints):
+        grupo = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in grupo and obj2._state.db in grupo:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Las réplicas reciben el esquema por replicación
+        if db in replicas():
+            return False
+        return None
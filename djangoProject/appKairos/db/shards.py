@@ -0,0 +1,263 @@
+"""
+Particionado horizontal por usuario (sharding)
+
+Todo lo que posee un usuario cuelga de Usuario, así que sus contratos y
+resultados se reparten entre las bases de datos de settings.DATABASE_SHARDS
+según un hash estable de su id. Con un solo shard (o ninguno) no interviene.
+
+- Usuario, los logs y los tokens siguen en 'default' (o en la base de datos
+  de auditoría): es el directorio global contra el que se hace login.
+- El catálogo (Producto, Mercado, ValorLiquidativo) se escribe en 'default'
+  y se replica en todos los shards (signals.py), para que los JOIN de
+  contratos y resultados con sus productos se resuelvan dentro de cada shard.
+- Las consultas de un usuario se dirigen a su shard:
+
+      ProductoContratado.objects.para_usuario(usuario)
+      usuario.resultados.all()        # el router usa la instancia
+
+  Una consulta sin usuario va a 'default'; para recorrer todos los shards
+  (admin, informes) se usa consultar_shards() / contar_shards().
+- Cada shard numera sus filas a partir de indice * RANGO_IDS (comando
+  preparar_shards), así el id de una fila dice en qué shard buscarla.
+
+El número de shards no puede cambiar sin redistribuir los datos:
+python manage.py preparar_shards --mover.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import hashlib
+import heapq
+import itertools
+
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import DEFAULT_DB_ALIAS, connections, models
+
+
+MODELOS_SHARD = frozenset({
+    'appKairos.productocontratado',
+    'appKairos.resultado',
+    'appKairos.estadodrawdown',
+    'appKairos.estadisticasmoviles',
+    'appKairos.movimientocapital',
+    'appKairos.instantaneasaldo',
+})
+
+MODELOS_CATALOGO = frozenset({
+    'appKairos.mercado',
+    'appKairos.producto',
+    'appKairos.producto_mercados',
+    'appKairos.valorliquidativo',
+})
+
+# Ids reservados a cada shard: el shard i usa [i * RANGO_IDS, (i + 1) * RANGO_IDS)
+RANGO_IDS = 10 ** 12
+
+
+def shards():
+    return list(getattr(settings, 'DATABASE_SHARDS', []))
+
+
+def sharding_activo():
+    return len(shards()) > 1
+
+
+def es_de_shard(modelo):
+    return modelo._meta.label_lower in MODELOS_SHARD
+
+
+def es_catalogo(modelo):
+    return modelo._meta.label_lower in MODELOS_CATALOGO
+
+
+def es_usuario(modelo):
+    return modelo._meta.label == settings.AUTH_USER_MODEL
+
+
+def shard_de(usuario):
+    """
+    Alias del shard de un usuario (instancia o id). Se usa blake2b y no
+    hash(), que cambia entre procesos.
+    """
+    lista = shards()
+    if len(lista) <= 1:
+        return lista[0] if lista else DEFAULT_DB_ALIAS
+    usuario_id = getattr(usuario, 'pk', usuario)
+    resumen = hashlib.blake2b(str(usuario_id).encode(), digest_size=8).digest()
+    return lista[int.from_bytes(resumen, 'big') % len(lista)]
+
+
+def shard_de_id(pk):
+    """Shard en el que se creó la fila con ese id, o None si está fuera de rango"""
+    lista = shards()
+    indice = int(pk) // RANGO_IDS
+    return lista[indice] if 0 <= indice < len(lista) else None
+
+
+def shards_para_id(pk):
+    """Todos los shards, empezando por el que indica el id"""
+    lista = shards()
+    try:
+        probable = shard_de_id(pk)
+    except (TypeError, ValueError):
+        probable = None
+    if probable is None:
+        return lista
+    return [probable] + [alias for alias in lista if alias != probable]
+
+
+class QuerySetShard(models.QuerySet):
+    """QuerySet de los modelos que pertenecen a un usuario"""
+
+    def para_usuario(self, usuario):
+        """Filas del usuario, leídas de su shard"""
+        return self.using(shard_de(usuario)).filter(usuario=usuario)
+
+    def create(self, **kwargs):
+        # Sin base de datos explícita, create() usaría 'default'
+        usuario = kwargs.get('usuario', kwargs.get('usuario_id'))
+        if self._db is None and usuario is not None and sharding_activo():
+            return self.using(shard_de(usuario)).create(**kwargs)
+        return super().create(**kwargs)
+
+
+# ----------------------------------------------------------------------
+# Consultas repartidas entre shards
+# ----------------------------------------------------------------------
+
+class _Descendente:
+    """Invierte la comparación de un valor para mezclar en orden descendente"""
+    __slots__ = ('valor',)
+
+    def __init__(self, valor):
+        self.valor = valor
+
+    def __lt__(self, otro):
+        return otro.valor < self.valor
+
+    def __eq__(self, otro):
+        return self.valor == otro.valor
+
+
+def _valor(fila, ruta):
+    if isinstance(fila, dict):
+        return fila.get(ruta)
+    if '__' not in ruta and ruta != 'pk':
+        # Claves foráneas por su columna, sin cargar el objeto relacionado
+        try:
+            ruta = fila._meta.get_field(ruta).attname
+        except FieldDoesNotExist:
+            pass
+        return getattr(fila, ruta)
+    for parte in ruta.split('__'):
+        if fila is None:
+            return None
+        fila = getattr(fila, parte)
+    return fila.pk if isinstance(fila, models.Model) else fila
+
+
+def _clave_orden(queryset):
+    """Función clave equivalente al ORDER BY del queryset, o None si no está ordenado"""
+    query = queryset.query
+    if query.order_by:
+        orden = query.order_by
+    elif query.default_ordering:
+        orden = query.get_meta().ordering
+    else:
+        orden = ()
+
+    campos = []
+    for elemento in orden:
+        if isinstance(elemento, str):
+            if elemento == '?':
+                return None
+            campos.append((elemento.lstrip('-'), elemento.startswith('-')))
+        elif hasattr(elemento, 'expression') and hasattr(elemento.expression, 'name'):
+            campos.append((elemento.expression.name, elemento.descending))
+        else:
+            return None
+    if not campos:
+        return None
+
+    def clave(fila):
+        partes = []
+        for ruta, descendente in campos:
+            valor = _valor(fila, ruta)
+            par = (valor is None, valor)
+            partes.append(_Descendente(par) if descendente else par)
+        return tuple(partes)
+    return clave
+
+
+def _ejecutar(consultas, paralelo):
+    if not paralelo:
+        return [list(consulta) for consulta in consultas]
+
+    def evaluar(consulta):
+        try:
+            return list(consulta)
+        finally:
+            # Conexión propia del hilo del executor
+            connections[consulta.db].close()
+
+    with ThreadPoolExecutor(max_workers=len(consultas)) as executor:
+        return list(executor.map(evaluar, consultas))
+
+
+def consultar_shards(queryset, inicio=0, fin=None, paralelo=None):
+    """
+    Ejecuta el queryset en todos los shards y mezcla los resultados en su
+    orden. inicio/fin equivalen a queryset[inicio:fin]: cada shard solo
+    devuelve sus primeras `fin` filas.
+
+    Los shards se consultan en paralelo salvo dentro de una transacción,
+    cuyos cambios no verían las conexiones de otros hilos.
+    """
+    lista = shards() if sharding_activo() else [queryset.db]
+    if len(lista) == 1:
+        return list(queryset.using(lista[0])[inicio:fin])
+
+    consultas = [queryset.using(alias) for alias in lista]
+    if fin is not None:
+        consultas = [consulta[:fin] for consulta in consultas]
+    if paralelo is None:
+        paralelo = not any(connections[alias].in_atomic_block for alias in lista)
+    parciales = _ejecutar(consultas, paralelo)
+
+    clave = _clave_orden(queryset)
+    mezcla = heapq.merge(*parciales, key=clave) if clave else itertools.chain(*parciales)
+    return list(itertools.islice(mezcla, inicio, fin))
+
+
+def contar_shards(queryset):
+    """count() sumado en todos los shards"""
+    if not sharding_activo():
+        return queryset.count()
+    return sum(queryset.using(alias).count() for alias in shards())
+
+
+class ListaShards:
+    """Queryset repartido entre shards, con la interfaz que necesita Paginator"""
+
+    def __init__(self, queryset):
+        self.queryset = queryset
+        self._total = None
+
+    @property
+    def ordered(self):
+        return self.queryset.ordered
+
+    def count(self):
+        if self._total is None:
+            self._total = contar_shards(self.queryset)
+        return self._total
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, indice):
+        if isinstance(indice, slice):
+            return consultar_shards(self.queryset, indice.start or 0, indice.stop)
+        return consultar_shards(self.queryset, indice, indice + 1)[0]
+
+    def __iter__(self):
+        return iter(consultar_shards(self.queryset))
@@ -0,0 +1,46 @@
+"""
+Perfil de producción para SQLite
+
+Cada conexión SQLite nueva recibe los PRAGMA de settings.SQLITE_PERFIL
+(señal connection_created). Los valores por defecto están pensados para un
+único servidor con varios workers:
+
+- journal_mode=WAL: los lectores no bloquean al escritor ni al revés.
+- synchronous=NORMAL: seguro con WAL y mucho más rápido que FULL.
+- busy_timeout: espera a que se libere el bloqueo en vez de fallar con
+  "database is locked" al primer intento.
+- cache_size / mmap_size: páginas en memoria y lectura mapeada del fichero.
+
+Para serializar además las escrituras dentro de cada proceso, ver el
+backend appKairos.db.backends.sqlite_escritor.
+"""
+import re
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+
+_NOMBRE_PRAGMA = re.compile(r'^[a-z_]+$')
+# Ajustes que no tienen sentido en una base de datos en memoria
+_SOLO_FICHERO = {'journal_mode', 'mmap_size'}
+
+
+def aplicar_perfil(conexion, perfil):
+    """Ejecuta los PRAGMA del perfil sobre una conexión SQLite de Django"""
+    en_memoria = conexion.is_in_memory_db()
+    with conexion.cursor() as cursor:
+        for nombre, valor in perfil.items():
+            if not _NOMBRE_PRAGMA.match(nombre):
+                raise ValueError(f'PRAGMA no válido en SQLITE_PERFIL: {nombre!r}')
+            if en_memoria and nombre in _SOLO_FICHERO:
+                continue
+            cursor.execute(f'PRAGMA {nombre} = {valor}')
+
+
+@receiver(connection_created)
+def perfil_sqlite(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        perfil = getattr(settings, 'SQLITE_PERFIL', None)
+        if perfil:
+            aplicar_perfil(connection, perfil)
@@ -0,0 +1,229 @@
+"""
+Importes monetarios en céntimos enteros
+
+Los importes se guardan como BigIntegerField con el número de céntimos
+(CampoDinero) y en Python se manejan como Dinero, un valor inmutable que
+envuelve ese entero:
+
+    contrato.monto_invertido                  # Dinero('1250.40')
+    contrato.monto_invertido.centimos         # 125040
+    contrato.monto_invertido = Decimal('99')  # se convierte a Dinero('99.00')
+
+- Los números (int, Decimal, str, float) siempre se interpretan como euros;
+  los céntimos solo se leen y escriben de forma explícita (de_centimos,
+  .centimos). Así filter(monto_invertido__gte=1000) busca 1000 €.
+- Sumar, restar y comparar es aritmética entera, sin redondeos. Multiplicar
+  o dividir por un número redondea al céntimo (ROUND_HALF_UP); dividir
+  Dinero entre Dinero da la proporción como Decimal.
+- a_numpy() pasa una secuencia de importes a un array int64 de céntimos sin
+  pérdida, y a_euros() lo convierte a float64 solo al final (gráficas).
+"""
+from decimal import ROUND_HALF_UP, Decimal, InvalidOperation
+from functools import total_ordering
+
+import numpy as np
+from django import forms
+from django.core import exceptions
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+
+CENTIMOS_POR_UNIDAD = 100
+_CENTIMO = Decimal('0.01')
+
+
+def _a_decimal(valor):
+    if isinstance(valor, Decimal):
+        return valor
+    if isinstance(valor, float):
+        # str() evita arrastrar el error binario: 0.1 -> Decimal('0.1')
+        return Decimal(str(valor))
+    if isinstance(valor, (int, str)):
+        return Decimal(valor)
+    raise TypeError(f'No se puede interpretar {valor!r} como importe')
+
+
+def _a_centimos(valor):
+    """Céntimos de un importe en euros (número o Dinero)"""
+    if isinstance(valor, Dinero):
+        return valor.centimos
+    if isinstance(valor, int) and not isinstance(valor, bool):
+        return valor * CENTIMOS_POR_UNIDAD
+    importe = _a_decimal(valor)
+    if not importe.is_finite():
+        raise ValueError(f'Importe no válido: {valor!r}')
+    return int((importe * CENTIMOS_POR_UNIDAD).to_integral_value(rounding=ROUND_HALF_UP))
+
+
+@total_ordering
+class Dinero:
+    """Importe en euros con precisión de céntimo, guardado como entero"""
+    __slots__ = ('centimos',)
+
+    def __init__(self, importe=0):
+        object.__setattr__(self, 'centimos', _a_centimos(importe))
+
+    @classmethod
+    def de_centimos(cls, centimos):
+        dinero = cls.__new__(cls)
+        object.__setattr__(dinero, 'centimos', int(centimos))
+        return dinero
+
+    def __setattr__(self, nombre, valor):
+        raise AttributeError('Dinero es inmutable')
+
+    def __reduce__(self):
+        return (Dinero.de_centimos, (self.centimos,))
+
+    @property
+    def importe(self):
+        """Importe en euros como Decimal con dos decimales"""
+        return Decimal(self.centimos).scaleb(-2)
+
+    # Representación --------------------------------------------------------
+
+    def __str__(self):
+        return str(self.importe)
+
+    def __repr__(self):
+        return f"Dinero('{self.importe}')"
+
+    def __format__(self, especificacion):
+        return format(self.importe, especificacion)
+
+    def __float__(self):
+        return self.centimos / CENTIMOS_POR_UNIDAD
+
+    def __bool__(self):
+        return self.centimos != 0
+
+    def __hash__(self):
+        # Igual que el Decimal equivalente, con el que compara igual
+        return hash(self.importe)
+
+    # Comparación -----------------------------------------------------------
+
+    def __eq__(self, otro):
+        if isinstance(otro, Dinero):
+            return self.centimos == otro.centimos
+        if isinstance(otro, (int, float, Decimal)):
+            return self.importe == otro
+        return NotImplemented
+
+    def __lt__(self, otro):
+        if isinstance(otro, Dinero):
+            return self.centimos < otro.centimos
+        if isinstance(otro, (int, float, Decimal)):
+            return self.importe < otro
+        return NotImplemented
+
+    # Aritmética ------------------------------------------------------------
+
+    def __add__(self, otro):
+        try:
+            return Dinero.de_centimos(self.centimos + _a_centimos(otro))
+        except TypeError:
+            return NotImplemented
+
+    __radd__ = __add__
+
+    def __sub__(self, otro):
+        try:
+            return Dinero.de_centimos(self.centimos - _a_centimos(otro))
+        except TypeError:
+            return NotImplemented
+
+    def __rsub__(self, otro):
+        try:
+            return Dinero.de_centimos(_a_centimos(otro) - self.centimos)
+        except TypeError:
+            return NotImplemented
+
+    def __neg__(self):
+        return Dinero.de_centimos(-self.centimos)
+
+    def __abs__(self):
+        return Dinero.de_centimos(abs(self.centimos))
+
+    def __mul__(self, factor):
+        if isinstance(factor, Dinero):
+            return NotImplemented
+        try:
+            return Dinero(Decimal(self.centimos) * _a_decimal(factor) / CENTIMOS_POR_UNIDAD)
+        except TypeError:
+            return NotImplemented
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, otro):
+        if isinstance(otro, Dinero):
+            return Decimal(self.centimos) / Decimal(otro.centimos)
+        try:
+            return Dinero(Decimal(self.centimos) / _a_decimal(otro) / CENTIMOS_POR_UNIDAD)
+        except TypeError:
+            return NotImplemented
+
+
+def a_numpy(importes):
+    """Array int64 de céntimos de una secuencia de Dinero (o importes en euros)"""
+    return np.fromiter((_a_centimos(importe) for importe in importes), dtype=np.int64)
+
+
+def a_euros(centimos):
+    """Array float64 en euros de un array de céntimos, para gráficas"""
+    return np.asarray(centimos, dtype=np.int64) / CENTIMOS_POR_UNIDAD
+
+
+def de_numpy(centimos):
+    """Lista de Dinero de un array de céntimos"""
+    return [Dinero.de_centimos(valor) for valor in np.asarray(centimos, dtype=np.int64).tolist()]
+
+
+class _AtributoDinero(DeferredAttribute):
+    """Convierte a Dinero cualquier valor asignado al campo"""
+
+    def __set__(self, instancia, valor):
+        instancia.__dict__[self.field.attname] = self.field.to_python(valor)
+
+
+class CampoDinero(models.BigIntegerField):
+    """
+    Importe en euros guardado como número entero de céntimos. En Python el
+    valor es siempre un Dinero (o None).
+    """
+    descriptor_class = _AtributoDinero
+    description = 'Importe en céntimos'
+
+    def from_db_value(self, valor, expresion, conexion):
+        # SUM() de PostgreSQL devuelve numeric: también se acepta Decimal
+        return None if valor is None else Dinero.de_centimos(valor)
+
+    def to_python(self, valor):
+        if valor is None or isinstance(valor, Dinero):
+            return valor
+        try:
+            return Dinero(valor)
+        except (TypeError, ValueError, InvalidOperation):
+            raise exceptions.ValidationError(
+                'El valor "%(value)s" no es un importe válido.',
+                code='invalid',
+                params={'value': valor},
+            )
+
+    def get_prep_value(self, valor):
+        valor = models.Field.get_prep_value(self, valor)
+        if valor is None:
+            return None
+        return self.to_python(valor).centimos
+
+    def value_to_string(self, obj):
+        # Serialización (dumpdata) en euros, como lo lee to_python()
+        valor = self.value_from_object(obj)
+        return '' if valor is None else str(valor)
+
+    def formfield(self, **kwargs):
+        return models.Field.formfield(self, **{
+            'form_class': forms.DecimalField,
+            'decimal_places': 2,
+            **kwargs,
+        })
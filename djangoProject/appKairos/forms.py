@@ -3,6 +3,7 @@ from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.core.exceptions import ValidationError
 from django.utils.translation import gettext_lazy as _
 from .models import Usuario, ProductoContratado
+from . import hashing
 import re
 
 
@@ -136,7 +137,9 @@ class RegistroUsuarioForm(UserCreationForm):
     
     def save(self, commit=True):
         """Guarda el usuario con el email como identificador"""
-        user = super().save(commit=False)
+        # Se salta UserCreationForm.save() para calcular el hash en el pool de hashing
+        user = forms.ModelForm.save(self, commit=False)
+        hashing.establecer_password(user, self.cleaned_data['password1'])
         user.email = self.cleaned_data['email']
         user.telefono = self.cleaned_data.get('telefono', '')
         if commit:
@@ -0,0 +1,66 @@
+"""
+Hashers de contraseñas con coste calibrado para el servidor
+
+Los parámetros (iteraciones de PBKDF2, factor de trabajo de scrypt, coste
+de Argon2) se leen de settings, donde llegan desde el .env generado por
+`manage.py calibrar_hashers`. Cada hasher conserva el nombre de algoritmo
+de Django, así que los hashes existentes siguen siendo válidos; cuando los
+parámetros cambian, must_update() devuelve True y el hash se recalcula de
+forma transparente en el siguiente login correcto (ver hashing.verificar_usuario).
+"""
+from django.conf import settings
+from django.contrib.auth.hashers import (
+    PBKDF2PasswordHasher, ScryptPasswordHasher, Argon2PasswordHasher
+)
+
+
+def _parametro(nombre, por_defecto):
+    return getattr(settings, nombre, None) or por_defecto
+
+
+class PBKDF2CalibradoHasher(PBKDF2PasswordHasher):
+    """PBKDF2-SHA256 con PASSWORD_PBKDF2_ITERACIONES iteraciones"""
+
+    @property
+    def iterations(self):
+        return _parametro('PASSWORD_PBKDF2_ITERACIONES', PBKDF2PasswordHasher.iterations)
+
+
+class ScryptCalibradoHasher(ScryptPasswordHasher):
+    """scrypt con PASSWORD_SCRYPT_N / _R / _P"""
+
+    @property
+    def work_factor(self):
+        return _parametro('PASSWORD_SCRYPT_N', ScryptPasswordHasher.work_factor)
+
+    @property
+    def block_size(self):
+        return _parametro('PASSWORD_SCRYPT_R', ScryptPasswordHasher.block_size)
+
+    @property
+    def parallelism(self):
+        return _parametro('PASSWORD_SCRYPT_P', ScryptPasswordHasher.parallelism)
+
+    @property
+    def maxmem(self):
+        # OpenSSL limita scrypt a 32 MiB por defecto; se deja margen para
+        # verificar también hashes calculados con el doble de memoria
+        memoria = 128 * self.work_factor * self.block_size * self.parallelism
+        return max(64 * 1024 * 1024, 2 * memoria)
+
+
+class Argon2CalibradoHasher(Argon2PasswordHasher):
+    """Argon2id con PASSWORD_ARGON2_TIEMPO / _MEMORIA_KIB / _PARALELISMO (requiere argon2-cffi)"""
+
+    @property
+    def time_cost(self):
+        return _parametro('PASSWORD_ARGON2_TIEMPO', Argon2PasswordHasher.time_cost)
+
+    @property
+    def memory_cost(self):
+        return _parametro('PASSWORD_ARGON2_MEMORIA_KIB', Argon2PasswordHasher.memory_cost)
+
+    @property
+    def parallelism(self):
+        return _parametro('PASSWORD_ARGON2_PARALELISMO', Argon2PasswordHasher.parallelism)
+
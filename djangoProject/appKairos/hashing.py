@@ -0,0 +1,242 @@
+"""
+Servicio de hashing de contraseñas con un pool de trabajadores acotado
+
+El hashing (PBKDF2 por defecto) es lo más costoso en CPU que hace la
+aplicación. Todas las operaciones de hash pasan por un único pool por
+proceso con un número fijo de trabajadores, de modo que una avalancha de
+logins nunca ocupa más de HASHING_TRABAJADORES núcleos y el resto de
+peticiones sigue atendiéndose.
+
+- Vistas síncronas (WSGI): hacer_hash(), verificar(), verificar_usuario()...
+  envían el trabajo al pool y esperan el resultado.
+- Vistas asíncronas (ASGI): las variantes con prefijo "a" (ahacer_hash(),
+  averificar_usuario()...) devuelven awaitables y no bloquean el bucle de eventos.
+
+Solo se envía al pool el cálculo puro del hash; cualquier acceso a la base
+de datos (p. ej. guardar un rehash) se hace en el hilo que llama.
+"""
+import asyncio
+import atexit
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import hashers
+
+
+# ============================================================================
+# FUNCIONES EJECUTADAS EN LOS TRABAJADORES
+# ============================================================================
+
+def _inicializar_proceso():
+    """Prepara Django en procesos hijo creados con 'spawn'"""
+    import django
+    from django.apps import apps
+    if not apps.ready:
+        os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'djangoProject.settings')
+        django.setup()
+
+
+def _calcular_hash(password):
+    return hashers.make_password(password)
+
+
+def _comprobar_hash(password, encoded):
+    return hashers.check_password(password, encoded)
+
+
+# ============================================================================
+# POOL
+# ============================================================================
+
+class PoolHashing:
+    """
+    Pool de trabajadores para hashing con métricas de profundidad de cola
+    tipo: 'hilos' (por defecto; hashlib libera el GIL durante PBKDF2/scrypt)
+          o 'procesos' (para hashers puramente Python)
+    """
+
+    def __init__(self, trabajadores, tipo='hilos'):
+        if tipo not in ('hilos', 'procesos'):
+            raise ValueError(f'Tipo de pool desconocido: {tipo}')
+        self.trabajadores = trabajadores
+        self.tipo = tipo
+        if tipo == 'procesos':
+            self._ejecutor = ProcessPoolExecutor(
+                max_workers=trabajadores, initializer=_inicializar_proceso
+            )
+        else:
+            self._ejecutor = ThreadPoolExecutor(
+                max_workers=trabajadores, thread_name_prefix='kairos-hash'
+            )
+        self._lock = threading.Lock()
+        self._pendientes = 0
+        self._completadas = 0
+        self._max_pendientes = 0
+
+    def enviar(self, funcion, *args):
+        """Encola una tarea y devuelve un concurrent.futures.Future"""
+        with self._lock:
+            self._pendientes += 1
+            self._max_pendientes = max(self._max_pendientes, self._pendientes)
+        futuro = self._ejecutor.submit(funcion, *args)
+        futuro.add_done_callback(self._tarea_terminada)
+        return futuro
+
+    def _tarea_terminada(self, futuro):
+        with self._lock:
+            self._pendientes -= 1
+            self._completadas += 1
+
+    def metricas(self):
+        """
+        pendientes: tareas enviadas aún sin terminar (en cola + en ejecución)
+        en_cola: tareas esperando un trabajador libre
+        """
+        with self._lock:
+            return {
+                'tipo': self.tipo,
+                'trabajadores': self.trabajadores,
+                'pendientes': self._pendientes,
+                'en_cola': max(0, self._pendientes - self.trabajadores),
+                'completadas': self._completadas,
+                'max_pendientes': self._max_pendientes,
+            }
+
+    def cerrar(self, esperar=True):
+        self._ejecutor.shutdown(wait=esperar)
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def obtener_pool():
+    """Devuelve el pool del proceso, creándolo la primera vez"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = PoolHashing(
+                    trabajadores=getattr(settings, 'HASHING_TRABAJADORES', None) or min(4, os.cpu_count() or 1),
+                    tipo=getattr(settings, 'HASHING_EJECUTOR', 'hilos'),
+                )
+                atexit.register(_pool.cerrar, False)
+    return _pool
+
+
+def metricas():
+    """Métricas del pool (profundidad de cola, tareas completadas...)"""
+    return obtener_pool().metricas()
+
+
+def necesita_rehash(encoded):
+    """Indica si un hash debe recalcularse con el hasher/parámetros preferidos"""
+    try:
+        hasher = hashers.identify_hasher(encoded)
+    except ValueError:
+        return False
+    preferido = hashers.get_hasher('default')
+    return hasher.algorithm != preferido.algorithm or preferido.must_update(encoded)
+
+
+# ============================================================================
+# API SÍNCRONA
+# ============================================================================
+
+def hacer_hash(password):
+    """Equivalente a make_password() ejecutado en el pool"""
+    return obtener_pool().enviar(_calcular_hash, password).result()
+
+
+def hacer_hashes(passwords):
+    """Calcula varios hashes en paralelo (p. ej. los códigos de respaldo 2FA)"""
+    pool = obtener_pool()
+    futuros = [pool.enviar(_calcular_hash, password) for password in passwords]
+    return [futuro.result() for futuro in futuros]
+
+
+def verificar(password, encoded):
+    """Equivalente a check_password() sin rehash, ejecutado en el pool"""
+    if password is None or not encoded:
+        return False
+    return obtener_pool().enviar(_comprobar_hash, password, encoded).result()
+
+
+def buscar_coincidencia(password, encodeds):
+    """
+    Devuelve el índice del primer hash de la lista que coincide con la
+    contraseña, o None. Las comprobaciones se hacen en paralelo.
+    """
+    pool = obtener_pool()
+    futuros = [pool.enviar(_comprobar_hash, password, encoded) for encoded in encodeds]
+    coincidencia = None
+    for idx, futuro in enumerate(futuros):
+        if futuro.result() and coincidencia is None:
+            coincidencia = idx
+    return coincidencia
+
+
+def establecer_password(usuario, password):
+    """Equivalente a usuario.set_password() con el hash calculado en el pool"""
+    usuario.password = hacer_hash(password)
+    usuario._password = password
+
+
+def verificar_usuario(usuario, password):
+    """
+    Equivalente a usuario.check_password(): si la contraseña es correcta y el
+    hash está desactualizado, lo recalcula y guarda.
+    """
+    correcto = verificar(password, usuario.password)
+    if correcto and necesita_rehash(usuario.password):
+        establecer_password(usuario, password)
+        usuario._password = None
+        usuario.save(update_fields=['password'])
+    return correcto
+
+
+# ============================================================================
+# API ASÍNCRONA (vistas ASGI)
+# ============================================================================
+
+async def _esperar(funcion, *args):
+    return await asyncio.wrap_future(obtener_pool().enviar(funcion, *args))
+
+
+async def ahacer_hash(password):
+    return await _esperar(_calcular_hash, password)
+
+
+async def ahacer_hashes(passwords):
+    return list(await asyncio.gather(*(ahacer_hash(password) for password in passwords)))
+
+
+async def averificar(password, encoded):
+    if password is None or not encoded:
+        return False
+    return await _esperar(_comprobar_hash, password, encoded)
+
+
+async def abuscar_coincidencia(password, encodeds):
+    resultados = await asyncio.gather(*(averificar(password, encoded) for encoded in encodeds))
+    for idx, correcto in enumerate(resultados):
+        if correcto:
+            return idx
+    return None
+
+
+async def aestablecer_password(usuario, password):
+    usuario.password = await ahacer_hash(password)
+    usuario._password = password
+
+
+async def averificar_usuario(usuario, password):
+    correcto = await averificar(password, usuario.password)
+    if correcto and necesita_rehash(usuario.password):
+        await aestablecer_password(usuario, password)
+        usuario._password = None
+        await sync_to_async(usuario.save)(update_fields=['password'])
+    return correcto
@@ -0,0 +1,90 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from appKairos.backtest import COSTE
+from appKairos.backtest.productos import backtest_producto
+from appKairos.cotizaciones import RESOLUCIONES
+from appKairos.models import Producto
+
+
+def _valores(argumento):
+    """NOMBRE=V1,V2,... → (nombre, [valores numéricos])"""
+    nombre, _, valores = argumento.partition('=')
+    try:
+        return nombre.strip(), [
+            int(valor) if valor.strip().lstrip('-').isdigit() else float(valor) for valor in valores.split(',')
+        ]
+    except ValueError:
+        raise CommandError(f'Parámetro no válido: {argumento!r} (use NOMBRE=V1,V2,...).')
+
+
+class Command(BaseCommand):
+    help = (
+        'Simula la estrategia de cada producto sobre las cotizaciones de sus mercados '
+        'con todas las combinaciones de su rejilla de parámetros, en un pool de '
+        'procesos, y guarda los resultados; el de mejor Sharpe se muestra en la '
+        'ficha del producto.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('codigos', nargs='*', help='Códigos de producto. Por defecto, todos los activos')
+        parser.add_argument(
+            '--resolucion',
+            choices=list(RESOLUCIONES),
+            default='dia',
+            help='Resolución de las barras (por defecto dia)'
+        )
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primera fecha (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Última fecha (AAAA-MM-DD)')
+        parser.add_argument(
+            '--parametro',
+            action='append',
+            default=[],
+            metavar='NOMBRE=V1,V2,...',
+            help='Valores de un parámetro de la estrategia en lugar de los de su rejilla (repetible)'
+        )
+        parser.add_argument(
+            '--coste',
+            type=float,
+            default=COSTE * 100,
+            help=f'Coste de cada cambio de posición en %% (por defecto {COSTE * 100:g})'
+        )
+        parser.add_argument(
+            '--trabajadores',
+            type=int,
+            help='Procesos del pool (1: sin pool). Por defecto, BACKTEST_TRABAJADORES'
+        )
+
+    def handle(self, *args, **options):
+        productos = Producto.objects.prefetch_related('mercados')
+        if options['codigos']:
+            productos = productos.filter(codigo__in=options['codigos'])
+            faltan = set(options['codigos']) - set(productos.values_list('codigo', flat=True))
+            if faltan:
+                raise CommandError(f"No existen productos con código: {', '.join(sorted(faltan))}")
+        else:
+            productos = productos.filter(activo=True)
+        rejilla = dict(_valores(argumento) for argumento in options['parametro'])
+
+        for producto in productos:
+            try:
+                resultados = backtest_producto(
+                    producto,
+                    resolucion=options['resolucion'],
+                    desde=options['desde'],
+                    hasta=options['hasta'],
+                    rejilla=rejilla,
+                    coste=options['coste'] / 100,
+                    trabajadores=options['trabajadores'],
+                )
+            except ValueError as error:
+                self.stdout.write(self.style.WARNING(f'  {producto.codigo}: {error}'))
+                continue
+            mejor = next(resultado for resultado in resultados if resultado.mejor)
+            parametros = ', '.join(f'{nombre}={valor}' for nombre, valor in mejor.parametros.items())
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {producto.codigo} ({producto.estrategia}): {len(resultados)} combinación(es) · '
+                f'mejor {parametros} · {mejor.rendimiento_total:.2f}% '
+                f'(Sharpe {mejor.ratio_sharpe:.2f}, DD {mejor.drawdown_maximo:.2f}%)'
+            ))
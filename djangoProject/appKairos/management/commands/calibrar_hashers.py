@@ -0,0 +1,152 @@
+import hashlib
+import os
+import secrets
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+
+class Command(BaseCommand):
+    help = (
+        'Mide en este servidor el coste de PBKDF2, scrypt y Argon2 (si está instalado) '
+        'y propone los parámetros que cumplen el presupuesto de latencia y memoria. '
+        'Imprime las variables para el .env que leen los hashers de appKairos.hashers.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--objetivo-ms',
+            type=float,
+            default=250,
+            help='Latencia objetivo de un hash en milisegundos (por defecto 250)'
+        )
+        parser.add_argument(
+            '--memoria-mb',
+            type=int,
+            default=64,
+            help='Memoria máxima por hash para scrypt/Argon2 en MiB (por defecto 64)'
+        )
+        parser.add_argument(
+            '--hashers',
+            default='pbkdf2,scrypt,argon2',
+            help='Lista separada por comas de hashers a calibrar'
+        )
+        parser.add_argument(
+            '--repeticiones',
+            type=int,
+            default=3,
+            help='Mediciones por configuración; se usa la mediana (por defecto 3)'
+        )
+        parser.add_argument(
+            '--salida',
+            help='Fichero donde escribir las variables de entorno resultantes'
+        )
+
+    def handle(self, *args, **options):
+        objetivo = options['objetivo_ms'] / 1000
+        memoria = options['memoria_mb'] * 1024 * 1024
+        if objetivo <= 0 or memoria <= 0:
+            raise CommandError('--objetivo-ms y --memoria-mb deben ser positivos.')
+        self.repeticiones = max(1, options['repeticiones'])
+
+        calibradores = {
+            'pbkdf2': self.calibrar_pbkdf2,
+            'scrypt': self.calibrar_scrypt,
+            'argon2': self.calibrar_argon2,
+        }
+        pedidos = [nombre.strip() for nombre in options['hashers'].split(',') if nombre.strip()]
+        desconocidos = set(pedidos) - set(calibradores)
+        if desconocidos:
+            raise CommandError(f'Hashers desconocidos: {", ".join(sorted(desconocidos))}')
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Calibrando para {options["objetivo_ms"]:.0f} ms y {options["memoria_mb"]} MiB por hash...'
+        ))
+
+        variables = {}
+        for nombre in pedidos:
+            resultado = calibradores[nombre](objetivo, memoria)
+            if resultado is None:
+                self.stdout.write(f'  {nombre}: no disponible en este servidor')
+                continue
+            parametros, segundos = resultado
+            variables.update(parametros)
+            detalle = ', '.join(f'{clave}={valor}' for clave, valor in parametros.items())
+            self.stdout.write(self.style.SUCCESS(f'✓ {nombre}: {detalle} ({segundos * 1000:.0f} ms)'))
+            if segundos > objetivo:
+                self.stdout.write(self.style.WARNING(
+                    f'  {nombre} supera el objetivo incluso con el coste mínimo aceptable'
+                ))
+
+        lineas = [f'{clave}={valor}' for clave, valor in variables.items()]
+        self.stdout.write('\nAñade al .env (y elige el algoritmo con PASSWORD_HASHER):\n')
+        self.stdout.write('\n'.join(lineas))
+
+        if options['salida']:
+            with open(options['salida'], 'w') as fichero:
+                fichero.write('\n'.join(lineas) + '\n')
+            self.stdout.write(self.style.SUCCESS(f'\n✓ Parámetros guardados en {options["salida"]}'))
+
+    def medir(self, funcion):
+        """Mediana de varias ejecuciones de funcion()"""
+        tiempos = []
+        for _ in range(self.repeticiones):
+            inicio = time.perf_counter()
+            funcion()
+            tiempos.append(time.perf_counter() - inicio)
+        tiempos.sort()
+        return tiempos[len(tiempos) // 2]
+
+    def calibrar_pbkdf2(self, objetivo, memoria):
+        """El coste de PBKDF2 es lineal en las iteraciones: se extrapola desde una medición"""
+        password, sal = secrets.token_bytes(16), secrets.token_bytes(16)
+        base = 100_000
+        segundos = self.medir(lambda: hashlib.pbkdf2_hmac('sha256', password, sal, base))
+        iteraciones = max(100_000, int(base * objetivo / segundos) // 1000 * 1000)
+        segundos = self.medir(lambda: hashlib.pbkdf2_hmac('sha256', password, sal, iteraciones))
+        return {'PASSWORD_PBKDF2_ITERACIONES': iteraciones}, segundos
+
+    def calibrar_scrypt(self, objetivo, memoria):
+        """Mayor N (potencia de 2) que cabe en memoria y en el objetivo, con r=8 y p=1"""
+        password, sal = secrets.token_bytes(16), secrets.token_bytes(16)
+        r, p = 8, 1
+        mejor = None
+        n = 2 ** 12
+        while 128 * n * r * p <= memoria:
+            segundos = self.medir(lambda: hashlib.scrypt(
+                password, salt=sal, n=n, r=r, p=p, maxmem=2 * 128 * n * r * p, dklen=64
+            ))
+            if segundos > objetivo and mejor is not None:
+                break
+            mejor = ({'PASSWORD_SCRYPT_N': n, 'PASSWORD_SCRYPT_R': r, 'PASSWORD_SCRYPT_P': p}, segundos)
+            if segundos > objetivo:
+                break
+            n *= 2
+        return mejor
+
+    def calibrar_argon2(self, objetivo, memoria):
+        """Usa toda la memoria permitida y sube time_cost hasta alcanzar el objetivo"""
+        try:
+            from argon2 import low_level
+        except ImportError:
+            return None
+
+        password, sal = secrets.token_bytes(16), secrets.token_bytes(16)
+        memoria_kib = min(memoria // 1024, 1024 * 1024)
+        paralelismo = min(os.cpu_count() or 1, 8)
+        mejor = None
+        for tiempo in range(1, 11):
+            segundos = self.medir(lambda: low_level.hash_secret_raw(
+                password, sal, time_cost=tiempo, memory_cost=memoria_kib,
+                parallelism=paralelismo, hash_len=32, type=low_level.Type.ID
+            ))
+            if segundos > objetivo and mejor is not None:
+                break
+            mejor = ({
+                'PASSWORD_ARGON2_TIEMPO': tiempo,
+                'PASSWORD_ARGON2_MEMORIA_KIB': memoria_kib,
+                'PASSWORD_ARGON2_PARALELISMO': paralelismo,
+            }, segundos)
+            if segundos > objetivo:
+                break
+        return mejor
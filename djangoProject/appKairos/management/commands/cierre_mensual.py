@@ -0,0 +1,163 @@
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, timedelta
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from appKairos.db.shards import shards, sharding_activo
+from appKairos.dinero import Dinero
+from appKairos.models import ProductoContratado, Resultado, ValorLiquidativo, capital_por_participaciones
+
+
+OBSERVACION = 'Cierre mensual'
+
+
+def fin_de_mes(anio, mes):
+    siguiente = date(anio + 1, 1, 1) if mes == 12 else date(anio, mes + 1, 1)
+    return siguiente - timedelta(days=1)
+
+
+def _iniciar_proceso():
+    # Con 'spawn' (macOS, Windows) el proceso empieza sin Django cargado
+    import django
+    django.setup()
+
+
+def valor_liquidativo_en(fecha):
+    """
+    Valor liquidativo del producto de cada contrato en una fecha: el último
+    de su serie hasta ese día, o el actual si la serie empieza después
+    """
+    ultimo = ValorLiquidativo.objects.filter(
+        producto_id=OuterRef('producto_id'), fecha__lte=fecha
+    ).order_by('-fecha').values('valor')[:1]
+    return Coalesce(Subquery(ultimo), F('producto__valor_liquidativo'))
+
+
+def cerrar_lote(alias, usuarios, fecha, tamano_lote):
+    """
+    Crea los resultados del cierre de esos usuarios: uno por contrato
+    activo con su capital al valor liquidativo de la fecha de cierre y uno
+    total por usuario. Omite los que ya existen, así que repetir el cierre
+    no duplica filas. Devuelve (resultados de contratos, totales) creados.
+    """
+    # Cerrar un mes pasado no debe guardar la valoración de hoy
+    contratos = ProductoContratado.objects.using(alias).filter(
+        usuario_id__in=usuarios, estado='activo', fecha_inicio__date__lte=fecha
+    ).annotate(
+        capital_cierre=capital_por_participaciones(valor_liquidativo_en(fecha))
+    ).order_by('usuario_id', 'pk').values_list('pk', 'usuario_id', 'capital_cierre')
+    existentes = set(Resultado.objects.using(alias).filter(
+        usuario_id__in=usuarios, fecha=fecha
+    ).values_list('usuario_id', 'producto_contratado_id'))
+
+    filas, totales = [], {}
+    for contrato_id, usuario_id, capital in contratos:
+        totales[usuario_id] = totales.get(usuario_id, Dinero(0)) + capital
+        if (usuario_id, contrato_id) not in existentes:
+            filas.append(Resultado(
+                usuario_id=usuario_id, producto_contratado_id=contrato_id,
+                fecha=fecha, capital_mes=capital, observaciones=OBSERVACION,
+            ))
+    nuevos_totales = [
+        Resultado(usuario_id=usuario_id, fecha=fecha, capital_mes=capital, observaciones=OBSERVACION)
+        for usuario_id, capital in totales.items()
+        if (usuario_id, None) not in existentes
+    ]
+
+    with transaction.atomic(using=alias):
+        # bulk_create de ResultadoQuerySet rellena después los cambios con
+        # el resultado anterior de cada serie (analitica/cambios.py)
+        Resultado.objects.using(alias).bulk_create(
+            filas + nuevos_totales, batch_size=tamano_lote, ignore_conflicts=True
+        )
+    return len(filas), len(nuevos_totales)
+
+
+class Command(BaseCommand):
+    help = (
+        'Cierre mensual: guarda como Resultado el capital de cada contrato activo '
+        'al valor liquidativo de fin de mes, con el cambio respecto al mes anterior, y un resultado total por '
+        'usuario (sin contrato). Los usuarios se reparten en lotes entre varios procesos. '
+        'Se puede repetir sin riesgo: no duplica los resultados que ya existen.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mes',
+            help='Mes a cerrar (AAAA-MM). Por defecto, el mes anterior al actual'
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            help='Alias de base de datos (repetible). Por defecto, todos los shards'
+        )
+        parser.add_argument(
+            '--procesos',
+            type=int,
+            help='Procesos en paralelo (por defecto, uno por CPU; uno solo con SQLite)'
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=1000,
+            help='Usuarios por lote y filas por INSERT (por defecto 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if options['tamano_lote'] <= 0:
+            raise CommandError('--tamano-lote debe ser mayor que cero.')
+        if options['procesos'] is not None and options['procesos'] <= 0:
+            raise CommandError('--procesos debe ser mayor que cero.')
+        fecha = self.fecha_cierre(options['mes'])
+
+        alias = options['database'] or (shards() if sharding_activo() else [DEFAULT_DB_ALIAS])
+        for nombre in alias:
+            contratos, totales = self.cerrar(nombre, fecha, options)
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {nombre}: {contratos} resultado(s) de contratos y {totales} total(es) de usuario'
+            ))
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Cierre de {fecha:%Y-%m} completado.'))
+
+    @staticmethod
+    def fecha_cierre(mes):
+        if mes is None:
+            primero = timezone.localdate().replace(day=1)
+            anterior = primero - timedelta(days=1)
+            return fin_de_mes(anterior.year, anterior.month)
+        try:
+            anio, numero = (int(parte) for parte in mes.split('-'))
+            return fin_de_mes(anio, numero)
+        except ValueError:
+            raise CommandError('--mes debe tener el formato AAAA-MM.')
+
+    def cerrar(self, alias, fecha, options):
+        usuarios = list(ProductoContratado.objects.using(alias).filter(
+            estado='activo', fecha_inicio__date__lte=fecha
+        ).order_by('usuario_id').values_list('usuario_id', flat=True).distinct())
+        lotes = [
+            usuarios[inicio:inicio + options['tamano_lote']]
+            for inicio in range(0, len(usuarios), options['tamano_lote'])
+        ]
+
+        procesos = options['procesos']
+        if procesos is None:
+            # SQLite admite un solo escritor a la vez
+            procesos = 1 if connections[alias].vendor == 'sqlite' else os.cpu_count() or 1
+        procesos = min(procesos, len(lotes))
+
+        if procesos <= 1:
+            parciales = [cerrar_lote(alias, lote, fecha, options['tamano_lote']) for lote in lotes]
+        else:
+            # Cada proceso abre sus propias conexiones; las del padre no se heredan abiertas
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=procesos, initializer=_iniciar_proceso) as ejecutor:
+                parciales = list(ejecutor.map(
+                    cerrar_lote, [alias] * len(lotes), lotes, [fecha] * len(lotes),
+                    [options['tamano_lote']] * len(lotes),
+                ))
+        return sum(contratos for contratos, _ in parciales), sum(totales for _, totales in parciales)
@@ -0,0 +1,45 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from appKairos.analitica import libro
+from appKairos.db.shards import shards, sharding_activo
+
+
+class Command(BaseCommand):
+    help = (
+        'Guarda una instantánea del saldo y lo aportado neto de cada contrato con '
+        'libro de capital a una fecha, reproduciendo solo los movimientos posteriores '
+        'a su instantánea anterior. Pensado para ejecutarse periódicamente (p. ej. '
+        'tras el cierre mensual); repetirlo para la misma fecha la rehace.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--fecha',
+            type=date.fromisoformat,
+            help='Fecha de la instantánea (AAAA-MM-DD). Por defecto, hoy'
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            help='Alias de base de datos (repetible). Por defecto, todos los shards'
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=libro.TAMANO_LOTE,
+            help=f'Contratos por lote (por defecto {libro.TAMANO_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['tamano_lote'] <= 0:
+            raise CommandError('--tamano-lote debe ser mayor que cero.')
+        fecha = options['fecha'] or timezone.localdate()
+
+        alias = options['database'] or (shards() if sharding_activo() else [DEFAULT_DB_ALIAS])
+        for nombre in alias:
+            guardadas = libro.guardar_instantaneas(nombre, fecha, tamano_lote=options['tamano_lote'])
+            self.stdout.write(self.style.SUCCESS(f'✓ {nombre}: {guardadas} instantánea(s) a {fecha}'))
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from appKairos import cotizaciones
+from appKairos.models import Mercado
+
+
+class Command(BaseCommand):
+    help = (
+        'Importa barras OHLC de ficheros CSV (fecha, apertura, máximo, mínimo, cierre '
+        '[, volumen]) al almacén de cotizaciones de un mercado y las agrega a las '
+        'resoluciones mayores. Solo añade barras posteriores a las guardadas, así que '
+        'se puede repetir con ficheros que se solapan.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('ficheros', nargs='+', help='Ficheros CSV, en orden de fecha')
+        parser.add_argument(
+            '--mercado',
+            required=True,
+            help='Código del mercado (Mercado.codigo), p. ej. SP500'
+        )
+        parser.add_argument(
+            '--resolucion',
+            choices=list(cotizaciones.RESOLUCIONES),
+            default='minuto',
+            help='Resolución de las barras de los ficheros (por defecto minuto)'
+        )
+        parser.add_argument(
+            '--agregar',
+            action='append',
+            choices=list(cotizaciones.RESOLUCIONES),
+            help='Resolución mayor a la que agregar (repetible). Por defecto, todas'
+        )
+
+    def handle(self, *args, **options):
+        codigo = options['mercado']
+        if not Mercado.objects.filter(codigo=codigo).exists():
+            raise CommandError(f'No existe ningún mercado con código {codigo!r}.')
+
+        almacen = cotizaciones.obtener_almacen()
+        totales = {}
+        for ruta in options['ficheros']:
+            try:
+                guardadas = cotizaciones.importar(
+                    almacen, codigo, cotizaciones.leer_csv(ruta),
+                    resolucion=options['resolucion'], agregadas=options['agregar'],
+                )
+            except (OSError, ValueError) as error:
+                raise CommandError(str(error))
+            self.stdout.write(f"  {ruta}: {guardadas[options['resolucion']]} barra(s) nuevas")
+            for resolucion, numero in guardadas.items():
+                totales[resolucion] = totales.get(resolucion, 0) + numero
+
+        resumen = ' · '.join(f'{resolucion}: {numero}' for resolucion, numero in totales.items())
+        self.stdout.write(self.style.SUCCESS(f'✓ {codigo}: {resumen} barra(s) guardadas o actualizadas'))
@@ -35,18 +35,21 @@ class Command(BaseCommand):
                 'codigo': 'MPT',
                 'descripcion': 'Algoritmo multi-mercado que opera en oro, NASDAQ y S&P 500. Estrategia de momentum y aprovechamiento de volatilidad.',
                 'mercados': ['XAAUSD', 'NasdaQ', 'SP500'],
+                'estrategia': 'momentum',
             },
             {
                 'nombre': 'GoldenRoad',
                 'codigo': 'GOLDEN',
                 'descripcion': 'Especializado en oro (XAUUSD). Aprovecha patrones históricos y correlaciones con divisas.',
                 'mercados': ['XAAUSD'],
+                'estrategia': 'ruptura',
             },
             {
                 'nombre': 'MultiMarkets',
                 'codigo': 'MULTI',
                 'descripcion': 'Diversificación en índices NASDAQ y S&P 500. Estrategia de seguimiento de tendencias institucionales.',
                 'mercados': ['NasdaQ', 'SP500'],
+                'estrategia': 'tendencia',
             },
         ]
         
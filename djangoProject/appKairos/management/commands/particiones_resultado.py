@@ -0,0 +1,90 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, router, transaction
+
+from appKairos.db import particiones
+from appKairos.models import Resultado
+
+
+class Command(BaseCommand):
+    help = (
+        'Mantenimiento del particionado por fecha de Resultado en PostgreSQL '
+        '(RESULTADO_PARTICIONES): crea las particiones de los próximos periodos '
+        '(apto para cron), convierte la tabla si el particionado se activa después '
+        'de migrar y archiva años antiguos separando sus particiones.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            help='Alias de base de datos (repetible). Por defecto, todas las que tienen la tabla'
+        )
+        parser.add_argument(
+            '--adelante',
+            type=int,
+            default=particiones.periodos_adelante(),
+            help='Periodos futuros que deben existir (por defecto RESULTADO_PARTICIONES_ADELANTE)'
+        )
+        parser.add_argument(
+            '--convertir',
+            action='store_true',
+            help='Convierte la tabla en particionada si todavía no lo está'
+        )
+        parser.add_argument(
+            '--archivar-hasta',
+            type=int,
+            metavar='AÑO',
+            help='Separa (DETACH) las particiones de ese año y anteriores'
+        )
+        parser.add_argument(
+            '--listar',
+            action='store_true',
+            help='Solo muestra las particiones existentes'
+        )
+
+    def handle(self, *args, **options):
+        gran = particiones.granularidad()
+        if not gran:
+            raise CommandError('El particionado no está activado (RESULTADO_PARTICIONES).')
+        if options['adelante'] < 0:
+            raise CommandError('--adelante no puede ser negativo.')
+
+        alias = options['database'] or [
+            nombre for nombre in connections
+            if router.allow_migrate_model(nombre, Resultado)
+            and connections[nombre].vendor == 'postgresql'
+        ]
+        if not alias:
+            raise CommandError('Ninguna base de datos PostgreSQL contiene la tabla de resultados.')
+        for nombre in alias:
+            self.mantener(nombre, gran, options)
+
+    def mantener(self, alias, gran, options):
+        conexion = connections[alias]
+        tabla = Resultado._meta.db_table
+        if conexion.vendor != 'postgresql':
+            raise CommandError(f'{alias}: el particionado solo está disponible en PostgreSQL.')
+
+        with transaction.atomic(using=alias):
+            if not particiones.esta_particionada(conexion, tabla):
+                if not options['convertir']:
+                    raise CommandError(f'{alias}: la tabla no está particionada; use --convertir.')
+                particiones.particionar(conexion, tabla, gran, options['adelante'])
+                self.stdout.write(self.style.SUCCESS(f'✓ {alias}: tabla convertida a particionada ({gran})'))
+
+            if options['listar']:
+                for nombre, limites in particiones.particiones(conexion, tabla):
+                    self.stdout.write(f'  {nombre}: {limites}')
+                return
+
+            creadas = particiones.crear_particiones(conexion, tabla, gran, options['adelante'])
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {alias}: particiones aseguradas para {creadas} periodo(s) (actual + {options["adelante"]})'
+            ))
+
+            if options['archivar_hasta'] is not None:
+                separadas = particiones.archivar(conexion, tabla, options['archivar_hasta'])
+                for nombre in separadas:
+                    self.stdout.write(self.style.SUCCESS(f'✓ {alias}: {nombre} separada; ya se puede volcar y borrar'))
+                if not separadas:
+                    self.stdout.write(f'  {alias}: no hay particiones hasta {options["archivar_hasta"]}')
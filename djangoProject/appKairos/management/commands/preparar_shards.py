@@ -0,0 +1,152 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from appKairos.db.shards import RANGO_IDS, shard_de, shards
+from appKairos.models import (
+    EstadoDrawdown, InstantaneaSaldo, Mercado, MovimientoCapital, Producto, ProductoContratado, Resultado,
+    ValorLiquidativo
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Prepara los shards de usuario (DATABASE_SHARD_URLS): reserva a cada uno su rango '
+        'de ids, copia el catálogo desde default y, con --mover, lleva cada contrato, sus '
+        'resultados y su libro de capital al shard de su usuario. Se puede repetir sin riesgo.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--mover',
+            action='store_true',
+            help='Mueve las filas que están en un shard que no es el de su usuario'
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=500,
+            help='Contratos movidos por transacción (por defecto 500)'
+        )
+
+    def handle(self, *args, **options):
+        lista = shards()
+        if len(lista) <= 1:
+            raise CommandError('No hay sharding configurado (DATABASE_SHARD_URLS).')
+        if options['tamano_lote'] <= 0:
+            raise CommandError('--tamano-lote debe ser mayor que cero.')
+
+        for indice, alias in enumerate(lista):
+            for modelo in (ProductoContratado, Resultado, MovimientoCapital):
+                self.reservar_ids(alias, modelo, indice * RANGO_IDS)
+        self.stdout.write(self.style.SUCCESS(f'✓ Rangos de ids reservados en {len(lista)} shard(s)'))
+
+        destinos = [alias for alias in lista if alias != DEFAULT_DB_ALIAS]
+        for alias in destinos:
+            cantidad = self.copiar_catalogo(alias)
+            self.stdout.write(self.style.SUCCESS(f'✓ {alias}: {cantidad} fila(s) de catálogo copiadas'))
+
+        if options['mover']:
+            movidos = sum(self.mover(alias, options['tamano_lote']) for alias in lista)
+            self.stdout.write(self.style.SUCCESS(f'✓ {movidos} fila(s) movidas a su shard'))
+
+        self.stdout.write(self.style.SUCCESS('\n✓ Shards preparados.'))
+
+    def reservar_ids(self, alias, modelo, inicio):
+        """Hace que el siguiente id autogenerado del shard sea al menos `inicio`"""
+        if inicio == 0:
+            return
+        conexion = connections[alias]
+        tabla = modelo._meta.db_table
+        with conexion.cursor() as cursor:
+            if conexion.vendor == 'sqlite':
+                cursor.execute('SELECT seq FROM sqlite_sequence WHERE name = %s', [tabla])
+                fila = cursor.fetchone()
+                if fila is None:
+                    cursor.execute('INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)', [tabla, inicio - 1])
+                elif fila[0] < inicio - 1:
+                    cursor.execute('UPDATE sqlite_sequence SET seq = %s WHERE name = %s', [inicio - 1, tabla])
+            elif conexion.vendor == 'postgresql':
+                cursor.execute(
+                    f"SELECT setval(pg_get_serial_sequence(%s, 'id'), "
+                    f"GREATEST(%s, (SELECT COALESCE(MAX(id), 0) FROM {conexion.ops.quote_name(tabla)})))",
+                    [conexion.ops.quote_name(tabla), inicio - 1]
+                )
+            else:
+                self.stdout.write(self.style.WARNING(
+                    f'  {alias}: no se sabe reservar ids en {conexion.vendor}; '
+                    'el admin buscará los objetos en todos los shards'
+                ))
+
+    def copiar_catalogo(self, alias):
+        """Deja en el shard una copia exacta de mercados, productos, su relación y sus valores liquidativos"""
+        through = Producto.mercados.through
+        copiadas = 0
+        with transaction.atomic(using=alias):
+            for modelo in (Mercado, Producto, ValorLiquidativo):
+                ids = []
+                for objeto in modelo._base_manager.using(DEFAULT_DB_ALIAS).order_by('pk'):
+                    objeto.save_base(raw=True, using=alias)
+                    ids.append(objeto.pk)
+                modelo._base_manager.using(alias).exclude(pk__in=ids).delete()
+                copiadas += len(ids)
+
+            filas = [
+                through(producto_id=producto_id, mercado_id=mercado_id)
+                for producto_id, mercado_id in through.objects.using(DEFAULT_DB_ALIAS)
+                .values_list('producto_id', 'mercado_id')
+            ]
+            through.objects.using(alias).all().delete()
+            through.objects.using(alias).bulk_create(filas)
+        return copiadas + len(filas)
+
+    def mover(self, origen, tamano_lote):
+        """
+        Copia al shard correcto los contratos mal ubicados, con sus resultados
+        y su libro de capital, y los borra del origen
+        """
+        pendientes = [
+            (pk, usuario_id)
+            for pk, usuario_id in ProductoContratado.objects.using(origen)
+            .order_by('pk').values_list('pk', 'usuario_id')
+            if shard_de(usuario_id) != origen
+        ]
+        movidos = 0
+        for inicio in range(0, len(pendientes), tamano_lote):
+            lote = [pk for pk, _ in pendientes[inicio:inicio + tamano_lote]]
+            contratos = list(ProductoContratado.objects.using(origen).filter(pk__in=lote))
+            resultados = list(Resultado.objects.using(origen).filter(producto_contratado_id__in=lote))
+            movimientos = list(MovimientoCapital.objects.using(origen).filter(producto_contratado_id__in=lote))
+            movidos += self.copiar_y_borrar(origen, resultados, contratos, movimientos)
+
+        # Resultados totales, sin contrato
+        sueltos = [
+            resultado for resultado in
+            Resultado.objects.using(origen).filter(producto_contratado__isnull=True).order_by('pk')
+            if shard_de(resultado.usuario_id) != origen
+        ]
+        for inicio in range(0, len(sueltos), tamano_lote):
+            movidos += self.copiar_y_borrar(origen, sueltos[inicio:inicio + tamano_lote], [])
+
+        # Las métricas se recalculan en el shard de destino al leerlas y las
+        # instantáneas, en la próxima ejecución de guardar_instantaneas
+        for modelo in (EstadoDrawdown, InstantaneaSaldo):
+            modelo.objects.using(origen).filter(pk__in=[
+                pk for pk, usuario_id in modelo.objects.using(origen).values_list('pk', 'usuario_id')
+                if shard_de(usuario_id) != origen
+            ]).delete()
+        return movidos
+
+    def copiar_y_borrar(self, origen, resultados, contratos, movimientos=()):
+        por_destino = {}
+        for objeto in contratos + resultados + list(movimientos):
+            por_destino.setdefault(shard_de(objeto.usuario_id), []).append(objeto)
+        for destino, objetos in por_destino.items():
+            # Los contratos van antes que sus resultados y movimientos por la clave foránea
+            with transaction.atomic(using=destino):
+                for objeto in objetos:
+                    objeto.save_base(raw=True, using=destino)
+        with transaction.atomic(using=origen):
+            Resultado.objects.using(origen).filter(pk__in=[r.pk for r in resultados]).delete()
+            # Los movimientos se borran con sus contratos (CASCADE)
+            ProductoContratado.objects.using(origen).filter(pk__in=[c.pk for c in contratos]).delete()
+        return len(resultados) + len(contratos) + len(movimientos)
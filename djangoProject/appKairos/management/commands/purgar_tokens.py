@@ -0,0 +1,99 @@
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import router, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from appKairos.models import TokenVerificacionEmail, TokenRecuperacionPassword
+
+
+class Command(BaseCommand):
+    help = (
+        'Elimina tokens de verificación y recuperación usados o expirados. '
+        'Borra en lotes pequeños para poder ejecutarse desde cron con tráfico en vivo.'
+    )
+
+    modelos = (TokenVerificacionEmail, TokenRecuperacionPassword)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias-gracia',
+            type=int,
+            default=getattr(settings, 'TOKENS_DIAS_GRACIA', 7),
+            help='Días que se conservan los tokens tras usarse o expirar (por defecto 7)'
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=1000,
+            help='Número máximo de filas borradas por transacción (por defecto 1000)'
+        )
+        parser.add_argument(
+            '--pausa',
+            type=float,
+            default=0.05,
+            help='Segundos de espera entre lotes para no acaparar la base de datos'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Solo cuenta los tokens que se borrarían, sin borrar nada'
+        )
+
+    def handle(self, *args, **options):
+        if options['dias_gracia'] < 0:
+            raise CommandError('--dias-gracia no puede ser negativo.')
+        if options['tamano_lote'] <= 0:
+            raise CommandError('--tamano-lote debe ser mayor que cero.')
+
+        limite = timezone.now() - timedelta(days=options['dias_gracia'])
+        total = 0
+
+        for modelo in self.modelos:
+            if options['simular']:
+                cantidad = modelo.objects.filter(self.condicion_purga(limite)).count()
+                self.stdout.write(f'  {modelo._meta.verbose_name_plural}: {cantidad} token(s) a borrar')
+            else:
+                cantidad = self.purgar_modelo(modelo, limite, options['tamano_lote'], options['pausa'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'✓ {modelo._meta.verbose_name_plural}: {cantidad} token(s) borrado(s)'
+                ))
+            total += cantidad
+
+        verbo = 'se borrarían' if options['simular'] else 'borrados'
+        self.stdout.write(self.style.SUCCESS(f'\n✓ Purga completada: {total} token(s) {verbo}.'))
+
+    @staticmethod
+    def condicion_purga(limite):
+        """
+        Tokens usados hace más del periodo de gracia, o expirados antes del límite.
+        Se usa fecha_creacion para los usados porque no se guarda la fecha de uso.
+        """
+        return Q(usado=True, fecha_creacion__lt=limite) | Q(expira_en__lt=limite)
+
+    def purgar_modelo(self, modelo, limite, tamano_lote, pausa):
+        """
+        Borra por lotes de claves primarias: cada lote es una transacción corta,
+        así los bloqueos duran milisegundos y las vistas no quedan esperando.
+        """
+        borrados = 0
+        while True:
+            # Los tokens pueden vivir en la base de datos de auditoría
+            with transaction.atomic(using=router.db_for_write(modelo)):
+                ids = list(
+                    modelo.objects.filter(self.condicion_purga(limite))
+                    .order_by('pk')
+                    .values_list('pk', flat=True)[:tamano_lote]
+                )
+                if not ids:
+                    break
+                cantidad, _ = modelo.objects.filter(pk__in=ids).delete()
+            borrados += cantidad
+            if len(ids) < tamano_lote:
+                break
+            if pausa:
+                time.sleep(pausa)
+        return borrados
@@ -0,0 +1,61 @@
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from appKairos.analitica import cambios
+from appKairos.db.shards import shard_de, shards, sharding_activo
+from appKairos.models import ProductoContratado
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula en bloque el cambio mensual y el porcentaje de cambio de los '
+        'resultados (p. ej. tras una importación o una corrección con SQL), de '
+        'todos los usuarios o de un usuario, un contrato o un rango de fechas.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            help='Alias de base de datos (repetible). Por defecto, todos los shards'
+        )
+        parser.add_argument('--usuario', type=int, action='append', help='Id de usuario (repetible)')
+        parser.add_argument('--contrato', type=int, help='Id del producto contratado')
+        parser.add_argument('--desde', type=date.fromisoformat, help='Primera fecha a recalcular (AAAA-MM-DD)')
+        parser.add_argument('--hasta', type=date.fromisoformat, help='Última fecha a recalcular (AAAA-MM-DD)')
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=cambios.TAMANO_LOTE,
+            help=f'Usuarios por sentencia UPDATE (por defecto {cambios.TAMANO_LOTE})'
+        )
+
+    def handle(self, *args, **options):
+        if options['tamano_lote'] <= 0:
+            raise CommandError('--tamano-lote debe ser mayor que cero.')
+        if options['contrato'] and options['usuario']:
+            raise CommandError('Indique --usuario o --contrato, no ambos.')
+        if options['desde'] and options['hasta'] and options['desde'] > options['hasta']:
+            raise CommandError('--desde no puede ser posterior a --hasta.')
+
+        usuarios = options['usuario']
+        if options['database']:
+            alias = options['database']
+        elif usuarios and sharding_activo():
+            alias = sorted({shard_de(usuario) for usuario in usuarios})
+        elif options['contrato'] and sharding_activo():
+            alias = [
+                nombre for nombre in shards()
+                if ProductoContratado.objects.using(nombre).filter(pk=options['contrato']).exists()
+            ]
+        else:
+            alias = shards() if sharding_activo() else [DEFAULT_DB_ALIAS]
+
+        for nombre in alias:
+            filas = cambios.recalcular(
+                nombre, usuarios=usuarios, contrato=options['contrato'],
+                desde=options['desde'], hasta=options['hasta'], tamano_lote=options['tamano_lote'],
+            )
+            self.stdout.write(self.style.SUCCESS(f'✓ {nombre}: {filas} resultado(s) actualizados'))
@@ -0,0 +1,116 @@
+import math
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from appKairos.analitica import moviles
+from appKairos.db.shards import shards, sharding_activo
+from appKairos.models import VENTANAS_MOVILES, EstadisticasMoviles, ProductoContratado
+
+
+CAMPOS = ['ultimos', 'ultima_fecha', 'pendiente'] + [
+    f'{nombre}_{ventana}' for ventana in VENTANAS_MOVILES for nombre in ('n', 'media', 'm2')
+]
+
+
+class Command(BaseCommand):
+    help = (
+        'Recalcula de forma vectorizada las estadísticas móviles de todos los contratos '
+        'y las compara con las mantenidas al insertar resultados. Con --corregir '
+        'sustituye las que difieran y crea las que falten.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database',
+            action='append',
+            help='Alias de base de datos (repetible). Por defecto, todos los shards'
+        )
+        parser.add_argument(
+            '--corregir',
+            action='store_true',
+            help='Guarda los valores recalculados en las estadísticas que difieran'
+        )
+        parser.add_argument(
+            '--tolerancia',
+            type=float,
+            default=1e-6,
+            help='Diferencia relativa admitida en medias y M2 (por defecto 1e-6)'
+        )
+        parser.add_argument(
+            '--tamano-lote',
+            type=int,
+            default=1000,
+            help='Filas escritas por consulta al corregir (por defecto 1000)'
+        )
+
+    def handle(self, *args, **options):
+        if options['tamano_lote'] <= 0:
+            raise CommandError('--tamano-lote debe ser mayor que cero.')
+        alias = options['database'] or (shards() if sharding_activo() else [DEFAULT_DB_ALIAS])
+        total = 0
+        for nombre in alias:
+            total += self.reconciliar(nombre, options)
+        if total and not options['corregir']:
+            self.stdout.write(self.style.WARNING(f'{total} contrato(s) con diferencias; use --corregir.'))
+        else:
+            self.stdout.write(self.style.SUCCESS('\n✓ Estadísticas móviles reconciliadas.'))
+
+    def reconciliar(self, alias, options):
+        esperadas = moviles.recalcular_shard(alias)
+        guardadas = {e.producto_contratado_id: e for e in EstadisticasMoviles.objects.using(alias)}
+        contratos = ProductoContratado.objects.using(alias).values_list('pk', 'usuario_id', 'producto_id')
+
+        cambiadas, nuevas = [], []
+        for contrato_id, usuario_id, producto_id in contratos.iterator():
+            # Un contrato sin resultados tiene las ventanas vacías
+            campos = esperadas.get(contrato_id) or self.vacias()
+            actual = guardadas.get(contrato_id)
+            if actual is None:
+                nuevas.append(EstadisticasMoviles(
+                    producto_contratado_id=contrato_id, usuario_id=usuario_id, producto_id=producto_id, **campos
+                ))
+            elif self.difiere(actual, campos, options['tolerancia']):
+                for campo, valor in campos.items():
+                    setattr(actual, campo, valor)
+                cambiadas.append(actual)
+
+        if options['verbosity'] > 1:
+            for estadisticas in cambiadas:
+                self.stdout.write(f'  {alias}: contrato {estadisticas.producto_contratado_id} difiere')
+        if options['corregir'] and (cambiadas or nuevas):
+            with transaction.atomic(using=alias):
+                EstadisticasMoviles.objects.using(alias).bulk_update(
+                    cambiadas, CAMPOS, batch_size=options['tamano_lote']
+                )
+                EstadisticasMoviles.objects.using(alias).bulk_create(nuevas, batch_size=options['tamano_lote'])
+
+        verbo = 'corregidos' if options['corregir'] else 'con diferencias'
+        self.stdout.write(self.style.SUCCESS(
+            f'✓ {alias}: {len(esperadas)} contrato(s) con resultados; '
+            f'{len(cambiadas)} {verbo}, {len(nuevas)} sin estadísticas'
+        ))
+        return len(cambiadas) + len(nuevas)
+
+    @staticmethod
+    def vacias():
+        campos = {'ultimos': [], 'ultima_fecha': None, 'pendiente': False}
+        for ventana in VENTANAS_MOVILES:
+            campos.update({f'n_{ventana}': 0, f'media_{ventana}': 0.0, f'm2_{ventana}': 0.0})
+        return campos
+
+    @staticmethod
+    def difiere(actual, campos, tolerancia):
+        for campo, esperado in campos.items():
+            valor = getattr(actual, campo)
+            if campo == 'ultimos':
+                if len(valor) != len(esperado) or not all(
+                    math.isclose(a, b, rel_tol=tolerancia, abs_tol=tolerancia) for a, b in zip(valor, esperado)
+                ):
+                    return True
+            elif isinstance(esperado, float):
+                if not math.isclose(valor, esperado, rel_tol=tolerancia, abs_tol=tolerancia):
+                    return True
+            elif valor != esperado:
+                return True
+        return False
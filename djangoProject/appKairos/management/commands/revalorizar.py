@@ -0,0 +1,74 @@
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from appKairos.models import Producto
+from appKairos.revalorizacion import revalorizar
+
+
+class Command(BaseCommand):
+    help = (
+        'Aplica el rendimiento del periodo de cada producto escribiendo su valor liquidativo '
+        '(una fila por producto), registra los resultados de sus contratos activos y actualiza '
+        'el capital total de los usuarios. Con --simular muestra el informe sin guardar nada.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--rendimiento',
+            action='append',
+            required=True,
+            metavar='CODIGO=PORCENTAJE',
+            help='Rendimiento de un producto en %% (repetible), p. ej. KAI001=2.5'
+        )
+        parser.add_argument(
+            '--fecha',
+            type=date.fromisoformat,
+            help='Fecha de los resultados (AAAA-MM-DD). Por defecto, hoy'
+        )
+        parser.add_argument(
+            '--database',
+            action='append',
+            help='Alias de base de datos (repetible). Por defecto, todos los shards'
+        )
+        parser.add_argument(
+            '--simular',
+            action='store_true',
+            help='Ejecuta en una transacción que se deshace y solo muestra el informe'
+        )
+
+    def handle(self, *args, **options):
+        rendimientos, codigos = {}, {}
+        for argumento in options['rendimiento']:
+            codigo, _, porcentaje = argumento.partition('=')
+            try:
+                producto = Producto.objects.get(codigo=codigo.strip())
+                rendimientos[producto.pk] = Decimal(porcentaje)
+            except Producto.DoesNotExist:
+                raise CommandError(f'No existe ningún producto con código {codigo!r}.')
+            except InvalidOperation:
+                raise CommandError(f'Rendimiento no válido: {argumento!r} (use CODIGO=PORCENTAJE).')
+            codigos[producto.pk] = producto.codigo
+
+        fecha = options['fecha'] or timezone.localdate()
+        try:
+            informe = revalorizar(
+                rendimientos, fecha, alias=options['database'], simular=options['simular']
+            )
+        except ValueError as error:
+            raise CommandError(str(error))
+
+        for fila in informe:
+            self.stdout.write(
+                f"  {fila['alias']}: {codigos[fila['producto_id']]} "
+                f"{fila['valor_anterior']:.6f} → {fila['valor_liquidativo']:.6f} · "
+                f"{fila['contratos']} contrato(s), {fila['usuarios']} usuario(s) · "
+                f"{fila['capital_antes']:,.2f} € → {fila['capital_despues']:,.2f} €"
+            )
+        contratos = sum(fila['contratos'] for fila in informe)
+        if options['simular']:
+            self.stdout.write(self.style.WARNING(f'Simulación: {contratos} contrato(s); no se ha guardado nada.'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'\n✓ {contratos} contrato(s) revalorizados a {fecha}.'))
@@ -90,7 +90,7 @@ class Migration(migrations.Migration):
                 ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
                 ('activo', models.BooleanField(default=True)),
                 ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='contrataciones', to='appKairos.producto')),
-                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='productos_contratados', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='productos_contratados', to=settings.AUTH_USER_MODEL)),
             ],
             options={
                 'verbose_name': 'Producto Contratado',
@@ -106,7 +106,7 @@ class Migration(migrations.Migration):
                 ('fecha_creacion', models.DateTimeField(auto_now_add=True)),
                 ('fecha_expiracion', models.DateTimeField()),
                 ('usado', models.BooleanField(default=False)),
-                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='tokens_verificacion', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='tokens_verificacion', to=settings.AUTH_USER_MODEL)),
             ],
             options={
                 'verbose_name': 'Token de Verificación',
@@ -124,7 +124,7 @@ class Migration(migrations.Migration):
                 ('requirio_2fa', models.BooleanField(default=False)),
                 ('fecha_intento', models.DateTimeField(auto_now_add=True)),
                 ('motivo_fallo', models.CharField(blank=True, max_length=200, null=True)),
-                ('usuario', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sesiones_seguridad', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(db_constraint=False, blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='sesiones_seguridad', to=settings.AUTH_USER_MODEL)),
             ],
             options={
                 'verbose_name': 'Sesión de Seguridad',
@@ -144,7 +144,7 @@ class Migration(migrations.Migration):
                 ('fecha_registro', models.DateTimeField(auto_now_add=True)),
                 ('observaciones', models.TextField(blank=True, null=True)),
                 ('producto_contratado', models.ForeignKey(blank=True, help_text='Producto específico al que corresponde este resultado', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='resultados', to='appKairos.productocontratado')),
-                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='resultados', to=settings.AUTH_USER_MODEL)),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE, related_name='resultados', to=settings.AUTH_USER_MODEL)),
             ],
             options={
                 'verbose_name': 'Resultado',
@@ -0,0 +1,29 @@
+# Generated by Django 4.2.26 on 2026-10-19 03:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0003_tokenrecuperacionpassword_and_more'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tokenrecuperacionpassword',
+            index=models.Index(condition=models.Q(('usado', False)), fields=['usuario'], name='tokrec_usuario_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenrecuperacionpassword',
+            index=models.Index(condition=models.Q(('usado', False)), fields=['expira_en'], name='tokrec_expira_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenverificacionemail',
+            index=models.Index(condition=models.Q(('usado', False)), fields=['usuario'], name='tokver_usuario_pend_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tokenverificacionemail',
+            index=models.Index(condition=models.Q(('usado', False)), fields=['expira_en'], name='tokver_expira_pend_idx'),
+        ),
+    ]
@@ -0,0 +1,26 @@
+# Generated by Django 4.2.26 on 2026-10-19 03:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0004_tokens_indices_parciales'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VersionCache',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('espacio', models.CharField(max_length=100, unique=True)),
+                ('version', models.BigIntegerField()),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True, db_index=True)),
+            ],
+            options={
+                'verbose_name': 'Versión de Caché',
+                'verbose_name_plural': 'Versiones de Caché',
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 4.2.26 on 2026-10-19 04:05
+
+from django.conf import settings
+from django.db import migrations, models, router
+import django.db.models.deletion
+
+
+MODELOS_AUDITORIA = ('SesionSeguridad', 'TokenVerificacionEmail', 'TokenRecuperacionPassword')
+
+
+def quitar_fk_usuario(apps, schema_editor):
+    """
+    Quita la restricción de clave foránea hacia Usuario en las bases de datos
+    creadas antes de que 0001/0003 la declarasen con db_constraint=False
+    """
+    conexion = schema_editor.connection
+    for nombre in MODELOS_AUDITORIA:
+        modelo = apps.get_model('appKairos', nombre)
+        if not router.allow_migrate_model(conexion.alias, modelo):
+            continue
+        with conexion.cursor() as cursor:
+            restricciones = conexion.introspection.get_constraints(cursor, modelo._meta.db_table)
+        fks = [
+            nombre_fk for nombre_fk, datos in restricciones.items()
+            if datos['foreign_key'] and datos['columns'] == ['usuario_id']
+        ]
+        if not fks:
+            continue
+        if conexion.vendor == 'sqlite':
+            # SQLite no permite borrar restricciones: se reconstruye la tabla
+            schema_editor._remake_table(modelo)
+        else:
+            for nombre_fk in fks:
+                schema_editor.execute(schema_editor._delete_fk_sql(modelo, nombre_fk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0005_versioncache'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='sesionseguridad',
+            name='usuario',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='sesiones_seguridad', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tokenrecuperacionpassword',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='tokens_recuperacion', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='tokenverificacionemail',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='tokens_verificacion', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(quitar_fk_usuario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 4.2.26 on 2026-10-19 04:22
+
+from django.conf import settings
+from django.db import migrations, models, router
+import django.db.models.deletion
+
+
+MODELOS_SHARD = ('ProductoContratado', 'Resultado')
+
+
+def quitar_fk_usuario(apps, schema_editor):
+    """
+    Quita la restricción de clave foránea hacia Usuario en las bases de datos
+    creadas antes de que 0001 la declarase con db_constraint=False
+    """
+    conexion = schema_editor.connection
+    for nombre in MODELOS_SHARD:
+        modelo = apps.get_model('appKairos', nombre)
+        if not router.allow_migrate_model(conexion.alias, modelo):
+            continue
+        with conexion.cursor() as cursor:
+            restricciones = conexion.introspection.get_constraints(cursor, modelo._meta.db_table)
+        fks = [
+            nombre_fk for nombre_fk, datos in restricciones.items()
+            if datos['foreign_key'] and datos['columns'] == ['usuario_id']
+        ]
+        if not fks:
+            continue
+        if conexion.vendor == 'sqlite':
+            # SQLite no permite borrar restricciones: se reconstruye la tabla
+            schema_editor._remake_table(modelo)
+        else:
+            for nombre_fk in fks:
+                schema_editor.execute(schema_editor._delete_fk_sql(modelo, nombre_fk))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0006_modelos_auditoria_sin_fk'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='productocontratado',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='productos_contratados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='resultado',
+            name='usuario',
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='resultados', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.RunPython(quitar_fk_usuario, migrations.RunPython.noop),
+    ]
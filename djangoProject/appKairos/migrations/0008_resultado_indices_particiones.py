@@ -0,0 +1,39 @@
+# Generated by Django 4.2.26 on 2026-10-19 04:32
+
+from django.db import migrations, models, router
+
+from appKairos.db import particiones
+
+
+def particionar_resultado(apps, schema_editor):
+    """Solo en PostgreSQL y con RESULTADO_PARTICIONES activado"""
+    conexion = schema_editor.connection
+    modelo = apps.get_model('appKairos', 'Resultado')
+    gran = particiones.granularidad()
+    if conexion.vendor != 'postgresql' or not gran or not router.allow_migrate_model(conexion.alias, modelo):
+        return
+    particiones.particionar(conexion, modelo._meta.db_table, gran, particiones.periodos_adelante())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0007_contratos_resultados_sin_fk_usuario'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='resultado',
+            options={'verbose_name': 'Resultado', 'verbose_name_plural': 'Resultados'},
+        ),
+        migrations.AddIndex(
+            model_name='resultado',
+            index=models.Index(fields=['usuario', 'fecha'], name='appKairos_r_usuario_8e73fb_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='resultado',
+            index=models.Index(fields=['fecha'], name='appKairos_r_fecha_4d1a5a_idx'),
+        ),
+        # Deshacer la migración deja la tabla particionada, que es compatible
+        migrations.RunPython(particionar_resultado, migrations.RunPython.noop),
+    ]
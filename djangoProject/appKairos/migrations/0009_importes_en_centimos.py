@@ -0,0 +1,135 @@
+# Generated by Django 4.2.26 on 2026-10-19 04:39
+
+from decimal import Decimal
+
+import appKairos.dinero
+from django.db import migrations, models, router
+from django.db.models import F, Value
+from django.db.models.functions import Cast, Round
+
+
+# (modelo, campo, texto de ayuda, valor por defecto)
+CAMPOS_DINERO = (
+    ('usuario', 'capital_total', 'Capital total del usuario en euros', 0),
+    ('productocontratado', 'monto_invertido', 'Monto invertido inicial en euros', None),
+    ('productocontratado', 'capital_actual', 'Capital actual en euros', 0),
+    ('resultado', 'capital_mes', 'Capital en ese mes en euros', None),
+    ('resultado', 'cambio_mensual', 'Cambio respecto al mes anterior en euros', 0),
+)
+
+MESES = (
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre',
+)
+
+
+def _modelos(apps, schema_editor, nombre_modelo):
+    modelo = apps.get_model('appKairos', nombre_modelo)
+    alias = schema_editor.connection.alias
+    if router.allow_migrate_model(alias, modelo):
+        return modelo._base_manager.using(alias)
+    return None
+
+
+def euros_a_centimos(apps, schema_editor):
+    """Copia cada importe a su columna de céntimos con un UPDATE por campo"""
+    for nombre_modelo, campo, _, _ in CAMPOS_DINERO:
+        filas = _modelos(apps, schema_editor, nombre_modelo)
+        if filas is None:
+            continue
+        filas.update(**{
+            f'{campo}_centimos': Cast(
+                Round(F(campo) * Value(Decimal(100))), output_field=models.BigIntegerField()
+            )
+        })
+
+
+def centimos_a_euros(apps, schema_editor):
+    for nombre_modelo, campo, _, _ in CAMPOS_DINERO:
+        filas = _modelos(apps, schema_editor, nombre_modelo)
+        if filas is None:
+            continue
+        filas.update(**{
+            campo: Cast(
+                # 100.0: con un entero SQLite haría división entera
+                F(f'{campo}_centimos') / Value(100.0),
+                output_field=models.DecimalField(max_digits=12, decimal_places=2)
+            )
+        })
+
+
+def rellenar_mes_anio(apps, schema_editor):
+    """Al deshacer la migración, vuelve a calcular mes y año desde la fecha"""
+    filas = _modelos(apps, schema_editor, 'resultado')
+    if filas is None:
+        return
+    for numero, nombre in enumerate(MESES, start=1):
+        filas.filter(fecha__month=numero).update(mes=nombre)
+    for anio in filas.dates('fecha', 'year'):
+        filas.filter(fecha__year=anio.year).update(anio=anio.year)
+
+
+def _campos_dinero():
+    operaciones = []
+    # Columna nueva en céntimos junto a la decimal ...
+    for nombre_modelo, campo, ayuda, defecto in CAMPOS_DINERO:
+        operaciones.append(migrations.AddField(
+            model_name=nombre_modelo,
+            name=f'{campo}_centimos',
+            field=appKairos.dinero.CampoDinero(default=defecto or 0, help_text=ayuda),
+            preserve_default=defecto is not None,
+        ))
+    operaciones.append(migrations.RunPython(euros_a_centimos, centimos_a_euros))
+    # ... que sustituye a la decimal
+    for nombre_modelo, campo, _, defecto in CAMPOS_DINERO:
+        if defecto is None:
+            # Con valor por defecto para poder deshacer con filas existentes
+            operaciones.append(migrations.AlterField(
+                model_name=nombre_modelo,
+                name=campo,
+                field=models.DecimalField(decimal_places=2, default=0, max_digits=12),
+            ))
+        operaciones.append(migrations.RemoveField(model_name=nombre_modelo, name=campo))
+        operaciones.append(migrations.RenameField(
+            model_name=nombre_modelo, old_name=f'{campo}_centimos', new_name=campo,
+        ))
+    return operaciones
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0008_resultado_indices_particiones'),
+    ]
+
+    operations = _campos_dinero() + [
+        # mes y anio pasan a derivarse de fecha
+        migrations.AlterField(
+            model_name='resultado',
+            name='mes',
+            field=models.CharField(default='', max_length=20),
+        ),
+        migrations.AlterField(
+            model_name='resultado',
+            name='anio',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(migrations.RunPython.noop, rellenar_mes_anio),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='anio',
+        ),
+        migrations.RemoveField(
+            model_name='resultado',
+            name='mes',
+        ),
+        # Índice que cubre la serie de capital (usuario, fecha) -> capital_mes
+        migrations.RemoveIndex(
+            model_name='resultado',
+            name='appKairos_r_usuario_8e73fb_idx',
+        ),
+        migrations.AddIndex(
+            model_name='resultado',
+            index=models.Index(fields=['usuario', 'fecha', 'capital_mes'], name='appKairos_r_usuario_3c5375_idx'),
+        ),
+    ]
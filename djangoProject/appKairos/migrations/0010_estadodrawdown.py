@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-19 04:49
+
+import appKairos.dinero
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0009_importes_en_centimos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoDrawdown',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('maximo', appKairos.dinero.CampoDinero(default=0, help_text='High-water mark: capital máximo alcanzado en euros')),
+                ('drawdown_actual', models.DecimalField(decimal_places=4, default=0, help_text='Porcentaje del último capital por debajo del máximo', max_digits=7)),
+                ('drawdown_maximo', models.DecimalField(decimal_places=4, default=0, help_text='Mayor caída porcentual desde un máximo', max_digits=7)),
+                ('ultima_fecha', models.DateField(blank=True, null=True)),
+                ('resultados', models.PositiveIntegerField(default=0)),
+                ('pendiente', models.BooleanField(default=False, help_text='Se recalcula desde cero en la próxima lectura (borrados o resultados con fecha anterior)')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('producto_contratado', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='estados_drawdown', to='appKairos.productocontratado')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='estados_drawdown', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Estado de Drawdown',
+                'verbose_name_plural': 'Estados de Drawdown',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='estadodrawdown',
+            constraint=models.UniqueConstraint(fields=('usuario', 'producto_contratado'), name='drawdown_contrato_unico'),
+        ),
+        migrations.AddConstraint(
+            model_name='estadodrawdown',
+            constraint=models.UniqueConstraint(condition=models.Q(('producto_contratado__isnull', True)), fields=('usuario',), name='drawdown_usuario_unico'),
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 4.2.26 on 2026-10-19 04:53
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0010_estadodrawdown'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadisticasMoviles',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimos', models.JSONField(default=list, help_text='Últimos porcentajes de cambio (tantos como la ventana mayor), del más antiguo al más reciente')),
+                ('n_3', models.PositiveSmallIntegerField(default=0)),
+                ('media_3', models.FloatField(default=0)),
+                ('m2_3', models.FloatField(default=0)),
+                ('n_6', models.PositiveSmallIntegerField(default=0)),
+                ('media_6', models.FloatField(default=0)),
+                ('m2_6', models.FloatField(default=0)),
+                ('n_12', models.PositiveSmallIntegerField(default=0)),
+                ('media_12', models.FloatField(default=0)),
+                ('m2_12', models.FloatField(default=0)),
+                ('ultima_fecha', models.DateField(blank=True, null=True)),
+                ('pendiente', models.BooleanField(default=False, help_text='Se recalcula desde cero en la próxima lectura (borrados o resultados con fecha anterior)')),
+                ('fecha_actualizacion', models.DateTimeField(auto_now=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_moviles', to='appKairos.producto')),
+                ('producto_contratado', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='estadisticas_moviles', to='appKairos.productocontratado')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='estadisticas_moviles', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Estadísticas Móviles',
+                'verbose_name_plural': 'Estadísticas Móviles',
+                'indexes': [models.Index(fields=['producto'], name='appKairos_e_product_ba7f7a_idx')],
+            },
+        ),
+    ]
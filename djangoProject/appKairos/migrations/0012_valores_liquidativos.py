@@ -0,0 +1,87 @@
+# Generated by Django 4.2.26 on 2026-10-19 05:13
+
+from django.db import migrations, models, router
+from django.db.models import ExpressionWrapper, F, Value
+from django.db.models.functions import Cast, Round
+from django.utils import timezone
+import django.db.models.deletion
+
+
+def _filas(apps, schema_editor, nombre_modelo):
+    modelo = apps.get_model('appKairos', nombre_modelo)
+    alias = schema_editor.connection.alias
+    if router.allow_migrate_model(alias, modelo):
+        return modelo._base_manager.using(alias)
+    return None
+
+
+def derivar_participaciones(apps, schema_editor):
+    """
+    Cada producto empieza con un valor liquidativo de 1, así que las
+    participaciones de un contrato son su capital actual en euros
+    """
+    productos = _filas(apps, schema_editor, 'producto')
+    if productos is not None:
+        hoy = timezone.now().date()
+        _filas(apps, schema_editor, 'valorliquidativo').bulk_create([
+            apps.get_model('appKairos', 'ValorLiquidativo')(producto_id=pk, fecha=hoy, valor=1)
+            for pk in productos.order_by('pk').values_list('pk', flat=True)
+        ])
+    contratos = _filas(apps, schema_editor, 'productocontratado')
+    if contratos is not None:
+        contratos.update(participaciones=ExpressionWrapper(
+            # 100.0: con un entero SQLite haría división entera
+            F('capital_actual') / Value(100.0), output_field=models.DecimalField(max_digits=20, decimal_places=6)
+        ))
+
+
+def restaurar_capital(apps, schema_editor):
+    contratos = _filas(apps, schema_editor, 'productocontratado')
+    if contratos is None:
+        return
+    productos = apps.get_model('appKairos', 'Producto')._base_manager.using(schema_editor.connection.alias)
+    for producto_id, valor in productos.values_list('pk', 'valor_liquidativo'):
+        contratos.filter(producto_id=producto_id).update(capital_actual=Cast(
+            Round(F('participaciones') * Value(valor * 100)), output_field=models.BigIntegerField()
+        ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0011_estadisticasmoviles'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='valor_liquidativo',
+            field=models.DecimalField(decimal_places=6, default=1, help_text='Valor liquidativo por participación: el más reciente de su serie', max_digits=18),
+        ),
+        migrations.CreateModel(
+            name='ValorLiquidativo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('valor', models.DecimalField(decimal_places=6, max_digits=18)),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='valores_liquidativos', to='appKairos.producto')),
+            ],
+            options={
+                'verbose_name': 'Valor Liquidativo',
+                'verbose_name_plural': 'Valores Liquidativos',
+                'unique_together': {('producto', 'fecha')},
+            },
+        ),
+        migrations.AddField(
+            model_name='productocontratado',
+            name='participaciones',
+            field=models.DecimalField(decimal_places=6, default=0, help_text='Participaciones del producto asignadas al contratar', max_digits=20),
+            preserve_default=False,
+        ),
+        migrations.RunPython(derivar_participaciones, restaurar_capital),
+        migrations.RemoveField(
+            model_name='productocontratado',
+            name='capital_actual',
+        ),
+    ]
@@ -0,0 +1,101 @@
+# Generated by Django 4.2.26 on 2026-10-19 05:25
+
+import appKairos.dinero
+from django.conf import settings
+from django.db import migrations, models, router
+from django.utils import timezone
+import django.db.models.deletion
+import django.utils.timezone
+
+
+LOTE = 500
+
+
+def libro_inicial(apps, schema_editor):
+    """
+    Libro de los contratos existentes: su aportación inicial, una valoración
+    por cada resultado del contrato y la valoración de hoy (o, si está
+    cancelado, la retirada de su capital al cancelarse)
+    """
+    alias = schema_editor.connection.alias
+    Movimiento = apps.get_model('appKairos', 'MovimientoCapital')
+    if not router.allow_migrate_model(alias, Movimiento):
+        return
+    contratos = apps.get_model('appKairos', 'ProductoContratado')._base_manager.using(alias)
+    resultados = apps.get_model('appKairos', 'Resultado')._base_manager.using(alias)
+    hoy = timezone.localdate()
+
+    ids = list(contratos.order_by('pk').values_list('pk', flat=True))
+    for inicio in range(0, len(ids), LOTE):
+        lote = contratos.filter(pk__in=ids[inicio:inicio + LOTE]).select_related('producto').order_by('pk')
+        valoraciones = {}
+        for contrato_id, fecha, capital in resultados.filter(
+            producto_contratado_id__in=ids[inicio:inicio + LOTE]
+        ).order_by('fecha', 'pk').values_list('producto_contratado_id', 'fecha', 'capital_mes'):
+            valoraciones.setdefault(contrato_id, []).append((fecha, capital))
+
+        movimientos = []
+        for contrato in lote:
+            def movimiento(tipo, fecha, importe):
+                movimientos.append(Movimiento(
+                    usuario_id=contrato.usuario_id, producto_contratado_id=contrato.pk, tipo=tipo,
+                    fecha=fecha, importe=importe, observaciones='Libro inicial',
+                ))
+            desde = timezone.localtime(contrato.fecha_inicio).date()
+            cancelado = contrato.estado == 'cancelado'
+            hasta = timezone.localtime(contrato.fecha_fin).date() if cancelado and contrato.fecha_fin else hoy
+            capital = contrato.participaciones * contrato.producto.valor_liquidativo
+
+            movimiento('aportacion', desde, contrato.monto_invertido)
+            for fecha, importe in valoraciones.get(contrato.pk, ()):
+                if desde <= fecha <= hasta:
+                    movimiento('valoracion', fecha, importe)
+            movimiento('retirada' if cancelado else 'valoracion', hasta, capital)
+        Movimiento.objects.using(alias).bulk_create(movimientos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0012_valores_liquidativos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MovimientoCapital',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('aportacion', 'Aportación'), ('retirada', 'Retirada'), ('valoracion', 'Valoración')], max_length=20)),
+                ('fecha', models.DateField(default=django.utils.timezone.now)),
+                ('importe', appKairos.dinero.CampoDinero(help_text='Euros aportados o retirados, o capital del contrato en una valoración')),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('observaciones', models.TextField(blank=True, null=True)),
+                ('producto_contratado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='movimientos_capital', to='appKairos.productocontratado')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='movimientos_capital', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Movimiento de Capital',
+                'verbose_name_plural': 'Movimientos de Capital',
+                'indexes': [models.Index(fields=['producto_contratado', 'fecha'], name='appKairos_m_product_282a69_idx'), models.Index(fields=['usuario', 'fecha'], name='appKairos_m_usuario_4a2afb_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='InstantaneaSaldo',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField()),
+                ('saldo', appKairos.dinero.CampoDinero(help_text='Capital del contrato al final de la fecha en euros')),
+                ('aportado_neto', appKairos.dinero.CampoDinero(help_text='Aportaciones menos retiradas hasta la fecha en euros')),
+                ('movimientos', models.PositiveIntegerField(default=0, help_text='Movimientos del libro reproducidos hasta la fecha')),
+                ('fecha_registro', models.DateTimeField(auto_now_add=True)),
+                ('producto_contratado', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='instantaneas_saldo', to='appKairos.productocontratado')),
+                ('usuario', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='instantaneas_saldo', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Instantánea de Saldo',
+                'verbose_name_plural': 'Instantáneas de Saldo',
+                'unique_together': {('producto_contratado', 'fecha')},
+            },
+        ),
+        migrations.RunPython(libro_inicial, migrations.RunPython.noop),
+    ]
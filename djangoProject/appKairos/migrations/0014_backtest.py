@@ -0,0 +1,61 @@
+# Generated by Django 4.2.26 on 2026-10-19 05:40
+
+from django.db import migrations, models, router
+import django.db.models.deletion
+import django.utils.timezone
+
+
+# Productos de load_initial_data y la estrategia que describen
+ESTRATEGIAS_INICIALES = {'MPT': 'momentum', 'GOLDEN': 'ruptura', 'MULTI': 'tendencia'}
+
+
+def asignar_estrategias(apps, schema_editor):
+    producto = apps.get_model('appKairos', 'Producto')
+    alias = schema_editor.connection.alias
+    if router.allow_migrate_model(alias, producto):
+        for codigo, estrategia in ESTRATEGIAS_INICIALES.items():
+            producto._base_manager.using(alias).filter(codigo=codigo).update(estrategia=estrategia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('appKairos', '0013_libro_capital'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='estrategia',
+            field=models.CharField(choices=[('momentum', 'Momentum'), ('ruptura', 'Ruptura de canal'), ('tendencia', 'Seguimiento de tendencia')], default='tendencia', max_length=20),
+        ),
+        migrations.CreateModel(
+            name='ResultadoBacktest',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('estrategia', models.CharField(choices=[('momentum', 'Momentum'), ('ruptura', 'Ruptura de canal'), ('tendencia', 'Seguimiento de tendencia')], max_length=20)),
+                ('parametros', models.JSONField()),
+                ('mercados', models.JSONField(help_text='Códigos de los mercados con cotizaciones en el periodo')),
+                ('resolucion', models.CharField(max_length=10)),
+                ('desde', models.DateField()),
+                ('hasta', models.DateField()),
+                ('rendimiento_total', models.FloatField()),
+                ('rendimiento_anual', models.FloatField(blank=True, null=True)),
+                ('volatilidad', models.FloatField()),
+                ('ratio_sharpe', models.FloatField()),
+                ('drawdown_maximo', models.FloatField()),
+                ('operaciones', models.PositiveIntegerField(default=0)),
+                ('mejor', models.BooleanField(default=False)),
+                ('curva', models.JSONField(blank=True, help_text='Capital (base 100) a fin de cada mes', null=True)),
+                ('fecha_calculo', models.DateTimeField(default=django.utils.timezone.now)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='backtests', to='appKairos.producto')),
+            ],
+            options={
+                'verbose_name': 'Resultado de Backtest',
+                'verbose_name_plural': 'Resultados de Backtest',
+                'ordering': ['-fecha_calculo', '-ratio_sharpe'],
+                'indexes': [models.Index(fields=['producto', 'mejor', '-fecha_calculo'], name='appKairos_r_product_85db16_idx')],
+            },
+        ),
+        migrations.RunPython(asignar_estrategias, migrations.RunPython.noop),
+    ]
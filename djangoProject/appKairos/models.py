@@ -1,9 +1,16 @@
+from decimal import Decimal
+
 from django.db import models
+from django.db.models.functions import Cast, Round
 from django.contrib.auth.models import AbstractUser
 from django.utils import timezone
-from decimal import Decimal
 import secrets
 
+from .cache.querysets import QuerySetCacheable
+from .db.shards import QuerySetShard
+from .dinero import CampoDinero, Dinero
+from .series import QuerySetSerie
+
 
 class Usuario(AbstractUser):
     """
@@ -21,9 +28,7 @@ class Usuario(AbstractUser):
     # Campos adicionales de perfil
     telefono = models.CharField(max_length=20, blank=True, null=True)
     fecha_registro = models.DateTimeField(auto_now_add=True)
-    capital_total = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2, 
+    capital_total = CampoDinero(
         default=0,
         help_text="Capital total del usuario en euros"
     )
@@ -76,7 +81,7 @@ class Usuario(AbstractUser):
         """Calcula el capital total sumando todos los productos contratados"""
         total = self.productos_contratados.filter(estado='activo').aggregate(
             total=models.Sum('capital_actual')
-        )['total'] or Decimal('0')
+        )['total'] or Dinero(0)
         self.capital_total = total
         self.save()
         return total
@@ -96,6 +101,8 @@ class Mercado(models.Model):
     descripcion = models.TextField(blank=True, null=True)
     activo = models.BooleanField(default=True)
     
+    objects = QuerySetCacheable.as_manager()
+    
     class Meta:
         verbose_name = 'Mercado'
         verbose_name_plural = 'Mercados'
@@ -120,6 +127,21 @@ class Producto(models.Model):
         related_name='productos',
         help_text="Mercados en los que opera este producto"
     )
+    valor_liquidativo = models.DecimalField(
+        max_digits=18,
+        decimal_places=6,
+        default=1,
+        help_text="Valor liquidativo por participación: el más reciente de su serie"
+    )
+    # Estrategia que simula el backtesting (appKairos/backtest/estrategias.py)
+    ESTRATEGIA_CHOICES = [
+        ('momentum', 'Momentum'),
+        ('ruptura', 'Ruptura de canal'),
+        ('tendencia', 'Seguimiento de tendencia'),
+    ]
+    estrategia = models.CharField(max_length=20, choices=ESTRATEGIA_CHOICES, default='tendencia')
+    
+    objects = QuerySetCacheable.as_manager()
     
     class Meta:
         verbose_name = 'Producto'
@@ -128,6 +150,117 @@ class Producto(models.Model):
     
     def __str__(self):
         return self.nombre
+    
+    def capital_de(self, participaciones):
+        """Capital de esas participaciones al valor liquidativo actual"""
+        return Dinero(Decimal(participaciones) * self.valor_liquidativo)
+    
+    def participaciones_para(self, importe):
+        """Participaciones que se adquieren con un importe al valor liquidativo actual"""
+        return (Dinero(importe).importe / self.valor_liquidativo).quantize(PRECISION_PARTICIPACIONES)
+    
+    def registrar_valor_liquidativo(self, fecha, valor):
+        """
+        Guarda el valor liquidativo de una fecha (lo sustituye si ya había
+        uno) y, si es el más reciente, lo deja como valor actual
+        """
+        ValorLiquidativo.objects.update_or_create(producto=self, fecha=fecha, defaults={'valor': valor})
+        actual = self.valores_liquidativos.order_by('-fecha').values_list('valor', flat=True).first()
+        if actual != self.valor_liquidativo:
+            self.valor_liquidativo = actual
+            self.save(update_fields=['valor_liquidativo'])
+
+
+PRECISION_PARTICIPACIONES = Decimal('0.000001')
+
+
+class ValorLiquidativo(models.Model):
+    """
+    Serie del valor liquidativo (NAV) por participación de un producto.
+    Forma parte del catálogo: se escribe en 'default' y se replica en los
+    shards, junto a los contratos que lo usan.
+    """
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='valores_liquidativos'
+    )
+    fecha = models.DateField()
+    valor = models.DecimalField(max_digits=18, decimal_places=6)
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+    
+    objects = QuerySetCacheable.as_manager()
+    
+    class Meta:
+        verbose_name = 'Valor Liquidativo'
+        verbose_name_plural = 'Valores Liquidativos'
+        unique_together = ('producto', 'fecha')
+    
+    def __str__(self):
+        return f"{self.producto.nombre} - {self.fecha}: {self.valor}"
+
+
+class ResultadoBacktest(models.Model):
+    """
+    Métricas de una combinación de parámetros de la estrategia de un producto
+    sobre las cotizaciones de sus mercados (appKairos/backtest). Cada barrido
+    guarda todas sus combinaciones con la misma fecha_calculo y marca la de
+    mejor Sharpe, la única con su curva de capital.
+    """
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='backtests'
+    )
+    estrategia = models.CharField(max_length=20, choices=Producto.ESTRATEGIA_CHOICES)
+    parametros = models.JSONField()
+    mercados = models.JSONField(help_text="Códigos de los mercados con cotizaciones en el periodo")
+    resolucion = models.CharField(max_length=10)
+    desde = models.DateField()
+    hasta = models.DateField()
+
+    # Porcentajes, salvo el ratio de Sharpe (anualizados según las barras)
+    rendimiento_total = models.FloatField()
+    rendimiento_anual = models.FloatField(null=True, blank=True)
+    volatilidad = models.FloatField()
+    ratio_sharpe = models.FloatField()
+    drawdown_maximo = models.FloatField()
+    operaciones = models.PositiveIntegerField(default=0)
+
+    mejor = models.BooleanField(default=False)
+    curva = models.JSONField(null=True, blank=True, help_text="Capital (base 100) a fin de cada mes")
+    fecha_calculo = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        verbose_name = 'Resultado de Backtest'
+        verbose_name_plural = 'Resultados de Backtest'
+        ordering = ['-fecha_calculo', '-ratio_sharpe']
+        indexes = [
+            models.Index(fields=['producto', 'mejor', '-fecha_calculo']),
+        ]
+
+    def __str__(self):
+        return f"{self.producto.nombre} ({self.estrategia}) {self.parametros}: {self.rendimiento_total:.2f}%"
+
+
+def capital_por_participaciones(valor_liquidativo=None):
+    """
+    Capital de un contrato en céntimos, calculado en SQL: participaciones ×
+    valor liquidativo (por defecto el actual de su producto, con un JOIN)
+    """
+    if valor_liquidativo is None:
+        valor_liquidativo = models.F('producto__valor_liquidativo')
+    return Cast(
+        Round(models.F('participaciones') * valor_liquidativo * models.Value(100)),
+        output_field=CampoDinero()
+    )
+
+
+class ProductoContratadoManager(models.Manager.from_queryset(QuerySetShard)):
+    """Las consultas de contratos traen su capital_actual calculado en la propia consulta"""
+
+    def get_queryset(self):
+        return super().get_queryset().annotate(capital_actual=capital_por_participaciones())
 
 
 class ProductoContratado(models.Model):
@@ -142,9 +275,12 @@ class ProductoContratado(models.Model):
         ('pendiente', 'Pendiente'),
     ]
     
+    # Sin restricción en BD: con sharding el contrato vive en el shard del
+    # usuario y Usuario en 'default'. Se borra con él en signals.py.
     usuario = models.ForeignKey(
         Usuario,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='productos_contratados'
     )
     producto = models.ForeignKey(
@@ -152,16 +288,13 @@ class ProductoContratado(models.Model):
         on_delete=models.CASCADE,
         related_name='contrataciones'
     )
-    monto_invertido = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
+    monto_invertido = CampoDinero(
         help_text="Monto invertido inicial en euros"
     )
-    capital_actual = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
-        default=0,
-        help_text="Capital actual en euros"
+    participaciones = models.DecimalField(
+        max_digits=20,
+        decimal_places=6,
+        help_text="Participaciones del producto asignadas al contratar"
     )
     estado = models.CharField(
         max_length=20,
@@ -173,6 +306,8 @@ class ProductoContratado(models.Model):
     fecha_fin = models.DateTimeField(null=True, blank=True)
     fecha_actualizacion = models.DateTimeField(auto_now=True)
     
+    objects = ProductoContratadoManager()
+    
     class Meta:
         verbose_name = 'Producto Contratado'
         verbose_name_plural = 'Productos Contratados'
@@ -184,6 +319,84 @@ class ProductoContratado(models.Model):
     
     def __str__(self):
         return f"{self.usuario.email} - {self.producto.nombre} (€{self.monto_invertido})"
+    
+    @property
+    def capital_actual(self):
+        """
+        Participaciones × valor liquidativo actual del producto. Las consultas
+        del manager ya lo traen calculado; si no, se calcula aquí.
+        """
+        leido = self.__dict__.get('_capital_leido')
+        if leido is not None and leido[0] == self.participaciones:
+            return leido[1]
+        return self.producto.capital_de(self.participaciones)
+    
+    @capital_actual.setter
+    def capital_actual(self, valor):
+        # Lo asigna la anotación del manager. El capital de un contrato se
+        # cambia con sus participaciones o con el valor liquidativo.
+        self._capital_leido = (self.participaciones, Dinero(valor))
+
+    def save(self, *args, **kwargs):
+        if self.participaciones is None:
+            # Al contratar: las que compra el importe invertido al valor liquidativo del día
+            self.participaciones = self.producto.participaciones_para(self.monto_invertido)
+        super().save(*args, **kwargs)
+
+    def refresh_from_db(self, using=None, fields=None):
+        # _base_manager no trae la anotación: el capital leído antes quedaría viejo
+        self.__dict__.pop('_capital_leido', None)
+        super().refresh_from_db(using=using, fields=fields)
+
+
+MESES = (
+    'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+    'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre',
+)
+
+
+class ResultadoQuerySet(QuerySetShard, QuerySetCacheable, QuerySetSerie):
+    """
+    Las escrituras en bloque no emiten señales: tras ellas se recalculan los
+    cambios de las series afectadas (appKairos/analitica/cambios.py)
+    """
+    CAMPOS_SERIE = {'usuario', 'producto_contratado', 'fecha', 'capital_mes'}
+
+    def update(self, **kwargs):
+        campos = {self.model._meta.get_field(campo).name for campo in kwargs}
+        if not campos & self.CAMPOS_SERIE:
+            return super().update(**kwargs)
+        from .analitica import cambios
+        alias = self.db
+        usuarios = set(self.order_by().values_list('usuario_id', flat=True).distinct())
+        nuevo = kwargs.get('usuario', kwargs.get('usuario_id'))
+        if nuevo is not None and not hasattr(nuevo, 'resolve_expression'):
+            usuarios.add(getattr(nuevo, 'pk', nuevo))
+        filas = super().update(**kwargs)
+        cambios.tras_edicion(alias, usuarios)
+        return filas
+
+    update.alters_data = True
+
+    def del_usuario(self):
+        """
+        Resultados de la serie de capital total de cada usuario: sus totales
+        (sin contrato), que guarda el cierre mensual, o todos sus resultados
+        si aún no tiene ninguno. Mezclar ambos sumaría cada mes dos veces.
+        """
+        totales = Resultado.objects.filter(
+            usuario_id=models.OuterRef('usuario_id'), producto_contratado__isnull=True
+        )
+        return self.filter(models.Q(producto_contratado__isnull=True) | ~models.Exists(totales))
+
+    def bulk_create(self, objs, *args, **kwargs):
+        from .analitica import cambios
+        objs = super().bulk_create(objs, *args, **kwargs)
+        if objs:
+            fecha = self.model._meta.get_field('fecha')
+            desde = min(fecha.to_python(obj.fecha) for obj in objs)
+            cambios.tras_edicion(self.db, (obj.usuario_id for obj in objs), desde=desde)
+        return objs
 
 
 class Resultado(models.Model):
@@ -193,7 +406,8 @@ class Resultado(models.Model):
     """
     usuario = models.ForeignKey(
         Usuario,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='resultados'
     )
     producto_contratado = models.ForeignKey(
@@ -208,16 +422,10 @@ class Resultado(models.Model):
         default=timezone.now,
         help_text="Fecha del resultado"
     )
-    mes = models.CharField(max_length=20, help_text="Ej: Enero, Febrero, etc.")
-    anio = models.IntegerField()
-    capital_mes = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
+    capital_mes = CampoDinero(
         help_text="Capital en ese mes en euros"
     )
-    cambio_mensual = models.DecimalField(
-        max_digits=12, 
-        decimal_places=2,
+    cambio_mensual = CampoDinero(
         default=0,
         help_text="Cambio respecto al mes anterior en euros"
     )
@@ -230,11 +438,31 @@ class Resultado(models.Model):
     fecha_registro = models.DateTimeField(auto_now_add=True)
     observaciones = models.TextField(blank=True, null=True)
     
+    objects = ResultadoQuerySet.as_manager()
+    
     class Meta:
         verbose_name = 'Resultado'
         verbose_name_plural = 'Resultados'
-        ordering = ['anio', 'fecha']
+        # Sin ordering por defecto: cada consulta pide el suyo y no se ordena
+        # de más. En PostgreSQL la tabla puede estar particionada por fecha
+        # (appKairos/db/particiones.py).
         unique_together = ('usuario', 'producto_contratado', 'fecha')
+        indexes = [
+            # Cubre la serie de capital de un usuario: se lee solo del índice.
+            # capital_mes va como columna de la clave y no con include=, que
+            # SQLite no admite.
+            models.Index(fields=['usuario', 'fecha', 'capital_mes']),
+            models.Index(fields=['fecha']),
+        ]
+    
+    @property
+    def mes(self):
+        """Nombre del mes de `fecha` (Enero, Febrero...)"""
+        return MESES[self.fecha.month - 1]
+    
+    @property
+    def anio(self):
+        return self.fecha.year
     
     def __str__(self):
         if self.producto_contratado:
@@ -242,8 +470,12 @@ class Resultado(models.Model):
         return f"{self.usuario.email} - Total - {self.mes} {self.anio}"
     
     def calcular_cambios(self, capital_anterior):
-        """Calcula el cambio mensual y porcentaje"""
+        """
+        Calcula el cambio mensual y porcentaje de esta instancia. Para
+        corregir series ya guardadas: analitica.cambios.recalcular()
+        """
         if capital_anterior and capital_anterior > 0:
+            capital_anterior = Dinero(capital_anterior)
             self.cambio_mensual = self.capital_mes - capital_anterior
             self.porcentaje_cambio = (self.cambio_mensual / capital_anterior) * 100
         else:
@@ -251,13 +483,283 @@ class Resultado(models.Model):
             self.porcentaje_cambio = 0
 
 
+class EstadoDrawdown(models.Model):
+    """
+    High-water mark y drawdown de la serie de resultados de un contrato, o
+    de todos los resultados del usuario si producto_contratado está vacío.
+    Se mantiene al insertar cada Resultado (appKairos/analitica/drawdown.py)
+    y vive en el mismo shard que ellos.
+    """
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='estados_drawdown'
+    )
+    producto_contratado = models.ForeignKey(
+        ProductoContratado,
+        on_delete=models.CASCADE,
+        related_name='estados_drawdown',
+        null=True,
+        blank=True
+    )
+    maximo = CampoDinero(
+        default=0,
+        help_text="High-water mark: capital máximo alcanzado en euros"
+    )
+    drawdown_actual = models.DecimalField(
+        max_digits=7,
+        decimal_places=4,
+        default=0,
+        help_text="Porcentaje del último capital por debajo del máximo"
+    )
+    drawdown_maximo = models.DecimalField(
+        max_digits=7,
+        decimal_places=4,
+        default=0,
+        help_text="Mayor caída porcentual desde un máximo"
+    )
+    ultima_fecha = models.DateField(null=True, blank=True)
+    resultados = models.PositiveIntegerField(default=0)
+    pendiente = models.BooleanField(
+        default=False,
+        help_text="Se recalcula desde cero en la próxima lectura (borrados o resultados con fecha anterior)"
+    )
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    objects = QuerySetShard.as_manager()
+
+    class Meta:
+        verbose_name = 'Estado de Drawdown'
+        verbose_name_plural = 'Estados de Drawdown'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['usuario', 'producto_contratado'],
+                name='drawdown_contrato_unico'
+            ),
+            # NULL no cuenta para UNIQUE: un solo estado total por usuario
+            models.UniqueConstraint(
+                fields=['usuario'],
+                condition=models.Q(producto_contratado__isnull=True),
+                name='drawdown_usuario_unico'
+            ),
+        ]
+
+    def __str__(self):
+        return f"Drawdown de {self.usuario_id} ({self.producto_contratado_id or 'total'}): {self.drawdown_maximo}%"
+
+
+VENTANAS_MOVILES = (3, 6, 12)
+
+
+class EstadisticasMoviles(models.Model):
+    """
+    Media y volatilidad móviles de porcentaje_cambio de un contrato en los
+    últimos 3, 6 y 12 resultados. Cada ventana guarda sus acumuladores de
+    Welford (n, media, M2), que se actualizan en O(1) al insertar cada
+    Resultado (appKairos/analitica/moviles.py).
+    """
+    producto_contratado = models.OneToOneField(
+        ProductoContratado,
+        on_delete=models.CASCADE,
+        related_name='estadisticas_moviles'
+    )
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='estadisticas_moviles'
+    )
+    # Copia de producto_contratado.producto para agregar por producto
+    producto = models.ForeignKey(
+        Producto,
+        on_delete=models.CASCADE,
+        related_name='estadisticas_moviles'
+    )
+    ultimos = models.JSONField(
+        default=list,
+        help_text="Últimos porcentajes de cambio (tantos como la ventana mayor), del más antiguo al más reciente"
+    )
+    n_3 = models.PositiveSmallIntegerField(default=0)
+    media_3 = models.FloatField(default=0)
+    m2_3 = models.FloatField(default=0)
+    n_6 = models.PositiveSmallIntegerField(default=0)
+    media_6 = models.FloatField(default=0)
+    m2_6 = models.FloatField(default=0)
+    n_12 = models.PositiveSmallIntegerField(default=0)
+    media_12 = models.FloatField(default=0)
+    m2_12 = models.FloatField(default=0)
+    ultima_fecha = models.DateField(null=True, blank=True)
+    pendiente = models.BooleanField(
+        default=False,
+        help_text="Se recalcula desde cero en la próxima lectura (borrados o resultados con fecha anterior)"
+    )
+    fecha_actualizacion = models.DateTimeField(auto_now=True)
+
+    objects = QuerySetShard.as_manager()
+
+    class Meta:
+        verbose_name = 'Estadísticas Móviles'
+        verbose_name_plural = 'Estadísticas Móviles'
+        indexes = [
+            models.Index(fields=['producto']),
+        ]
+
+    def __str__(self):
+        return f"Estadísticas móviles del contrato {self.producto_contratado_id}"
+
+    def media(self, ventana):
+        """Media de porcentaje_cambio en la ventana, o None sin datos"""
+        return getattr(self, f'media_{ventana}') if getattr(self, f'n_{ventana}') else None
+
+    def volatilidad(self, ventana):
+        """Desviación típica muestral de porcentaje_cambio en la ventana"""
+        n = getattr(self, f'n_{ventana}')
+        if n < 2:
+            return None
+        return (max(getattr(self, f'm2_{ventana}'), 0) / (n - 1)) ** 0.5
+
+
+class MovimientoCapitalQuerySet(QuerySetShard, QuerySetSerie):
+    """
+    El libro es solo de inserción: no se modifican movimientos guardados.
+    Insertar uno con fecha ya cubierta por una instantánea la borra.
+    """
+
+    def update(self, **kwargs):
+        raise ValueError('Los movimientos de capital no se modifican: registre uno nuevo')
+
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        objs = super().bulk_create(objs, *args, **kwargs)
+        desde = {}
+        for obj in objs:
+            fecha = self.model._meta.get_field('fecha').to_python(obj.fecha)
+            desde[obj.producto_contratado_id] = min(fecha, desde.get(obj.producto_contratado_id, fecha))
+        if desde:
+            InstantaneaSaldo.objects.using(self.db).invalidar(desde)
+        return objs
+
+
+class MovimientoCapital(models.Model):
+    """
+    Libro de capital de un contrato: aportaciones y retiradas del usuario y
+    valoraciones de su capital, en el orden (fecha, id). Solo se insertan;
+    el saldo a cualquier fecha sale de reproducirlos desde la instantánea
+    más cercana (appKairos/analitica/libro.py).
+    """
+    TIPO_CHOICES = [
+        ('aportacion', 'Aportación'),
+        ('retirada', 'Retirada'),
+        ('valoracion', 'Valoración'),
+    ]
+
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='movimientos_capital'
+    )
+    producto_contratado = models.ForeignKey(
+        ProductoContratado,
+        on_delete=models.CASCADE,
+        related_name='movimientos_capital'
+    )
+    tipo = models.CharField(max_length=20, choices=TIPO_CHOICES)
+    fecha = models.DateField(default=timezone.now)
+    importe = CampoDinero(
+        help_text="Euros aportados o retirados, o capital del contrato en una valoración"
+    )
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+    observaciones = models.TextField(blank=True, null=True)
+
+    objects = MovimientoCapitalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Movimiento de Capital'
+        verbose_name_plural = 'Movimientos de Capital'
+        indexes = [
+            models.Index(fields=['producto_contratado', 'fecha']),
+            models.Index(fields=['usuario', 'fecha']),
+        ]
+
+    def __str__(self):
+        return f"{self.get_tipo_display()} de {self.importe} € en el contrato {self.producto_contratado_id} ({self.fecha})"
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError('Los movimientos de capital no se modifican: registre uno nuevo')
+        super().save(*args, **kwargs)
+        fecha = self._meta.get_field('fecha').to_python(self.fecha)
+        InstantaneaSaldo.objects.using(self._state.db).invalidar({self.producto_contratado_id: fecha})
+
+
+class InstantaneaSaldoQuerySet(QuerySetShard):
+
+    def invalidar(self, desde):
+        """Borra las instantáneas de {contrato_id: fecha} desde esa fecha, que ya no cuadran"""
+        por_fecha = {}
+        for contrato_id, fecha in desde.items():
+            por_fecha.setdefault(fecha, []).append(contrato_id)
+        # Un DELETE por fecha: un OR por contrato no cabe en SQLite con miles
+        return sum(
+            self.filter(producto_contratado_id__in=contratos, fecha__gte=fecha).delete()[0]
+            for fecha, contratos in por_fecha.items()
+        )
+
+
+class InstantaneaSaldo(models.Model):
+    """
+    Saldo de un contrato y lo aportado neto al final de un día, según su
+    libro de capital. Las guarda periódicamente guardar_instantaneas para
+    no reproducir el libro desde el principio.
+    """
+    usuario = models.ForeignKey(
+        Usuario,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name='instantaneas_saldo'
+    )
+    producto_contratado = models.ForeignKey(
+        ProductoContratado,
+        on_delete=models.CASCADE,
+        related_name='instantaneas_saldo'
+    )
+    fecha = models.DateField()
+    saldo = CampoDinero(
+        help_text="Capital del contrato al final de la fecha en euros"
+    )
+    aportado_neto = CampoDinero(
+        help_text="Aportaciones menos retiradas hasta la fecha en euros"
+    )
+    movimientos = models.PositiveIntegerField(
+        default=0,
+        help_text="Movimientos del libro reproducidos hasta la fecha"
+    )
+    fecha_registro = models.DateTimeField(auto_now_add=True)
+
+    objects = InstantaneaSaldoQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Instantánea de Saldo'
+        verbose_name_plural = 'Instantáneas de Saldo'
+        unique_together = ('producto_contratado', 'fecha')
+
+    def __str__(self):
+        return f"Saldo del contrato {self.producto_contratado_id} a {self.fecha}: {self.saldo} €"
+
+
 class TokenVerificacionEmail(models.Model):
     """
     Modelo para tokens de verificación de email
     """
+    # Sin restricción en BD: la tabla puede vivir en la base de datos de
+    # auditoría (appKairos.db.routers.AuditoriaRouter)
     usuario = models.ForeignKey(
         Usuario,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='tokens_verificacion'
     )
     token = models.CharField(max_length=100, unique=True)
@@ -268,6 +770,20 @@ class TokenVerificacionEmail(models.Model):
     class Meta:
         verbose_name = 'Token de Verificación'
         verbose_name_plural = 'Tokens de Verificación'
+        # Índices parciales: solo indexan tokens pendientes, que son los que
+        # consultan las vistas, aunque la tabla acumule tokens usados
+        indexes = [
+            models.Index(
+                fields=['usuario'],
+                condition=models.Q(usado=False),
+                name='tokver_usuario_pend_idx'
+            ),
+            models.Index(
+                fields=['expira_en'],
+                condition=models.Q(usado=False),
+                name='tokver_expira_pend_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"Token para {self.usuario.email}"
@@ -281,9 +797,12 @@ class TokenRecuperacionPassword(models.Model):
     """
     Modelo para tokens de recuperación de contraseña
     """
+    # Sin restricción en BD: la tabla puede vivir en la base de datos de
+    # auditoría (appKairos.db.routers.AuditoriaRouter)
     usuario = models.ForeignKey(
         Usuario,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='tokens_recuperacion'
     )
     token = models.CharField(max_length=100, unique=True)
@@ -294,6 +813,18 @@ class TokenRecuperacionPassword(models.Model):
     class Meta:
         verbose_name = 'Token de Recuperación de Contraseña'
         verbose_name_plural = 'Tokens de Recuperación de Contraseña'
+        indexes = [
+            models.Index(
+                fields=['usuario'],
+                condition=models.Q(usado=False),
+                name='tokrec_usuario_pend_idx'
+            ),
+            models.Index(
+                fields=['expira_en'],
+                condition=models.Q(usado=False),
+                name='tokrec_expira_pend_idx'
+            ),
+        ]
     
     def __str__(self):
         return f"Token de recuperación para {self.usuario.email}"
@@ -307,9 +838,11 @@ class SesionSeguridad(models.Model):
     """
     Modelo para registrar intentos de login y actividad de seguridad
     """
+    # Sin restricción en BD: ver TokenVerificacionEmail.usuario
     usuario = models.ForeignKey(
         Usuario,
-        on_delete=models.CASCADE,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
         related_name='sesiones_seguridad',
         null=True,
         blank=True
@@ -332,4 +865,21 @@ class SesionSeguridad(models.Model):
     def __str__(self):
         estado = "Exitoso" if self.exitoso else "Fallido"
         email = self.usuario.email if self.usuario else "Desconocido"
-        return f"{email} - {estado} - {self.fecha_intento}"
\ No newline at end of file
+        return f"{email} - {estado} - {self.fecha_intento}"
+
+
+class VersionCache(models.Model):
+    """
+    Versión de cada espacio de nombres de la caché (appKairos.cache.bus)
+    Subir la versión invalida en todos los workers las entradas del espacio
+    """
+    espacio = models.CharField(max_length=100, unique=True)
+    version = models.BigIntegerField()
+    fecha_actualizacion = models.DateTimeField(auto_now=True, db_index=True)
+    
+    class Meta:
+        verbose_name = 'Versión de Caché'
+        verbose_name_plural = 'Versiones de Caché'
+    
+    def __str__(self):
+        return f"{self.espacio} v{self.version}"
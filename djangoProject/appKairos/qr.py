@@ -0,0 +1,67 @@
+"""
+Servicio de renderizado de códigos QR para la activación de 2FA
+
+Genera SVG compacto (un único <path>) con la factoría SVG de qrcode y,
+como alternativa, PNG mediante PyPNG. Ninguno de los dos caminos usa
+Pillow. El resultado se memoriza por URI de aprovisionamiento en un LRU
+acotado, así recargar la página de activación no vuelve a renderizar.
+"""
+from functools import lru_cache
+import hashlib
+import io
+
+from django.conf import settings
+import pyotp
+
+
+FORMATOS_QR = {
+    'svg': 'image/svg+xml',
+    'png': 'image/png',
+}
+
+EMISOR_2FA = 'Proyecto Kairos'
+
+
+def uri_aprovisionamiento(usuario):
+    """Devuelve la URI otpauth:// que codifica el QR de Google Authenticator"""
+    totp = pyotp.TOTP(usuario.secreto_2fa)
+    return totp.provisioning_uri(name=usuario.email, issuer_name=EMISOR_2FA)
+
+
+def etag_qr(uri, formato):
+    """ETag estable para un QR sin exponer el secreto que contiene"""
+    return hashlib.sha256(f'{formato}:{uri}'.encode()).hexdigest()[:32]
+
+
+def renderizar_qr(uri, formato='svg'):
+    """
+    Devuelve (contenido en bytes, content type) del QR para la URI dada.
+    Lanza ValueError si el formato no está soportado.
+    """
+    if formato not in FORMATOS_QR:
+        raise ValueError(f'Formato de QR no soportado: {formato}')
+    return _renderizar_qr_cacheado(uri, formato), FORMATOS_QR[formato]
+
+
+@lru_cache(maxsize=getattr(settings, 'QR_CACHE_TAMANO', 256))
+def _renderizar_qr_cacheado(uri, formato):
+    # Import diferido: solo se paga la carga de qrcode al renderizar el primer QR
+    import qrcode
+
+    if formato == 'svg':
+        from qrcode.image.svg import SvgPathImage as fabrica
+    else:
+        from qrcode.image.pure import PyPNGImage as fabrica
+
+    qr = qrcode.QRCode(box_size=10, border=4, image_factory=fabrica)
+    qr.add_data(uri)
+    qr.make(fit=True)
+
+    buffer = io.BytesIO()
+    qr.make_image().save(buffer)
+    return buffer.getvalue()
+
+
+def estadisticas_cache_qr():
+    """Aciertos/fallos del LRU de QR (útil para depuración)"""
+    return _renderizar_qr_cacheado.cache_info()
@@ -0,0 +1,193 @@
+"""
+Revalorización de los productos
+
+Aplica a cada producto el rendimiento del periodo, en porcentaje:
+
+    informe = revalorizar({producto.pk: Decimal('2.5')}, date(2025, 1, 31))
+    informe = revalorizar(rendimientos, fecha, simular=True)   # no guarda nada
+
+El capital de un contrato es participaciones × valor liquidativo de su
+producto, así que revalorizar es escribir un valor liquidativo por producto:
+el anterior a `fecha` × (1 + r/100). Repetir la misma fecha no lo compone
+dos veces. Además, por cada producto y base de datos:
+- Un resultado por contrato activo con su capital en `fecha`, escrito con
+  bulk_create (si ya había uno ese día se actualiza su capital); los
+  cambios respecto al mes anterior los rellena ResultadoQuerySet.
+- Una valoración por contrato activo en su libro de capital
+  (analitica/libro.py), de la que salen sus rentabilidades. Al repetir la
+  fecha solo se añade si cambia el capital de la última valoración del día.
+- Usuario.capital_total de los afectados vuelve a ser la suma de sus
+  contratos activos: un UPDATE con subconsulta si comparten base de datos
+  o, con sharding, las sumas del shard escritas con bulk_update.
+
+Todo va en una transacción por base de datos, abiertas todas a la vez. Con
+simular=True se ejecuta igual y se deshacen todas al final, así que el
+informe es el de la ejecución real.
+"""
+from contextlib import ExitStack
+from decimal import Decimal
+
+from django.db import router, transaction
+from django.db.models import BigIntegerField, DecimalField, OuterRef, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
+
+from .db.shards import shards, sharding_activo
+from .dinero import Dinero
+from .models import (
+    MovimientoCapital, Producto, ProductoContratado, Resultado, Usuario, capital_por_participaciones
+)
+
+
+TAMANO_LOTE = 1000
+PRECISION_VALOR = Decimal('0.000001')
+# Todos los productos empiezan ahí (migración 0012 y valor por defecto)
+VALOR_INICIAL = Decimal(1)
+
+
+class Simulacion(Exception):
+    """Deshace la transacción de una revalorización simulada"""
+
+
+def factor(rendimiento):
+    """Multiplicador del valor liquidativo para un rendimiento en %"""
+    rendimiento = Decimal(rendimiento)
+    if rendimiento < -100:
+        raise ValueError(f'Un rendimiento no puede ser menor que -100%: {rendimiento}')
+    return 1 + rendimiento / 100
+
+
+def _valor_anterior(producto, fecha):
+    """Valor liquidativo vigente justo antes de `fecha`; antes de la serie, el inicial"""
+    anterior = producto.valores_liquidativos.filter(fecha__lt=fecha).order_by('-fecha').values_list(
+        'valor', flat=True
+    ).first()
+    return VALOR_INICIAL if anterior is None else anterior
+
+
+def _capital(valor):
+    return capital_por_participaciones(Value(valor, output_field=DecimalField()))
+
+
+def _actualizar_totales(alias, usuarios):
+    """Usuario.capital_total = suma de los contratos activos de cada usuario"""
+    activos = ProductoContratado.objects.using(alias).filter(estado='activo')
+    base_usuarios = router.db_for_write(Usuario)
+    if base_usuarios == alias:
+        suma = activos.filter(usuario_id=OuterRef('pk')).order_by().values('usuario_id').annotate(
+            total=Sum('capital_actual')
+        ).values('total')
+        Usuario.objects.using(alias).filter(pk__in=usuarios).update(
+            capital_total=Coalesce(Subquery(suma), Value(0), output_field=BigIntegerField())
+        )
+        return
+
+    for inicio in range(0, len(usuarios), TAMANO_LOTE):
+        lote = usuarios[inicio:inicio + TAMANO_LOTE]
+        totales = dict(activos.filter(usuario_id__in=lote).order_by().values('usuario_id').annotate(
+            total=Sum('capital_actual')
+        ).values_list('usuario_id', 'total'))
+        Usuario.objects.using(base_usuarios).bulk_update(
+            [Usuario(pk=pk, capital_total=totales.get(pk, Dinero(0))) for pk in lote], ['capital_total']
+        )
+
+
+def _revalorizar_producto(alias, producto, anterior, nuevo, fecha, observaciones):
+    contratos = ProductoContratado.objects.using(alias).filter(producto_id=producto.pk, estado='activo')
+    filas = list(contratos.annotate(capital_nuevo=_capital(nuevo)).order_by('pk').values_list(
+        'pk', 'usuario_id', 'capital_nuevo'
+    ))
+    if not filas:
+        return None, set()
+
+    resultados = [
+        Resultado(
+            usuario_id=usuario_id, producto_contratado_id=contrato_id, fecha=fecha,
+            capital_mes=capital, observaciones=observaciones,
+        )
+        for contrato_id, usuario_id, capital in filas
+    ]
+    Resultado.objects.using(alias).bulk_create(
+        resultados, batch_size=TAMANO_LOTE, update_conflicts=True,
+        unique_fields=['usuario', 'producto_contratado', 'fecha'],
+        update_fields=['capital_mes', 'observaciones'],
+    )
+    # El libro es solo de inserción: al repetir la fecha se añade una
+    # valoración únicamente si corrige la última de ese día
+    valoradas = dict(MovimientoCapital.objects.using(alias).filter(
+        producto_contratado_id__in=[contrato_id for contrato_id, _, _ in filas],
+        tipo='valoracion', fecha=fecha,
+    ).order_by('producto_contratado_id', 'pk').values_list('producto_contratado_id', 'importe'))
+    MovimientoCapital.objects.using(alias).bulk_create([
+        MovimientoCapital(
+            usuario_id=usuario_id, producto_contratado_id=contrato_id, tipo='valoracion',
+            fecha=fecha, importe=capital, observaciones=observaciones,
+        )
+        for contrato_id, usuario_id, capital in filas
+        if valoradas.get(contrato_id) != capital
+    ], batch_size=TAMANO_LOTE)
+    usuarios = {resultado.usuario_id for resultado in resultados}
+    sumas = contratos.aggregate(antes=Sum(_capital(anterior)), despues=Sum(_capital(nuevo)))
+    return {
+        'alias': alias,
+        'producto_id': producto.pk,
+        'valor_anterior': anterior,
+        'valor_liquidativo': nuevo,
+        'contratos': len(filas),
+        'usuarios': len(usuarios),
+        'capital_antes': sumas['antes'] or Dinero(0),
+        'capital_despues': sumas['despues'] or Dinero(0),
+    }, usuarios
+
+
+def revalorizar(rendimientos, fecha, alias=None, simular=False, observaciones='Revalorización'):
+    """
+    Aplica {producto o id: rendimiento en %} y devuelve una entrada del
+    informe por producto y base de datos con contratos activos
+    """
+    factores = {getattr(producto, 'pk', producto): factor(r) for producto, r in rendimientos.items()}
+    base_catalogo = router.db_for_write(Producto)
+    productos = Producto.objects.using(base_catalogo).in_bulk(list(factores))
+    if len(productos) != len(factores):
+        raise ValueError(f'Productos inexistentes: {sorted(set(factores) - set(productos))}')
+    if alias is None:
+        alias = shards() if sharding_activo() else [router.db_for_write(ProductoContratado)]
+    elif isinstance(alias, str):
+        alias = [alias]
+
+    informe = []
+    try:
+        # Todas las transacciones abiertas a la vez: la excepción de una
+        # simulación las deshace todas, también las de los shards
+        with ExitStack() as transacciones:
+            for nombre in dict.fromkeys([base_catalogo, router.db_for_write(Usuario), *alias]):
+                transacciones.enter_context(transaction.atomic(using=nombre))
+
+            valores = {}
+            for pk, producto in sorted(productos.items()):
+                anterior = _valor_anterior(producto, fecha)
+                nuevo = (anterior * factores[pk]).quantize(PRECISION_VALOR)
+                # La única escritura por producto que cambia el capital de sus contratos
+                producto.registrar_valor_liquidativo(fecha, nuevo)
+                valores[pk] = (anterior, nuevo)
+
+            for nombre in alias:
+                usuarios = set()
+                if nombre != base_catalogo:
+                    # La copia del catálogo del shard se replica al confirmar;
+                    # hasta entonces se actualiza aquí para que los JOIN la vean
+                    for pk, producto in productos.items():
+                        Producto.objects.using(nombre).filter(pk=pk).update(
+                            valor_liquidativo=producto.valor_liquidativo
+                        )
+                for pk, producto in sorted(productos.items()):
+                    fila, afectados = _revalorizar_producto(nombre, producto, *valores[pk], fecha, observaciones)
+                    if fila is not None:
+                        informe.append(fila)
+                        usuarios |= afectados
+                # Una vez por usuario aunque tenga contratos de varios productos
+                _actualizar_totales(nombre, sorted(usuarios))
+            if simular:
+                raise Simulacion
+    except Simulacion:
+        pass
+    return informe
@@ -0,0 +1,127 @@
+"""
+Lectura de series temporales por columnas
+
+QuerySetSerie.serie() devuelve las columnas pedidas de una consulta sin
+crear instancias del modelo ni convertir valores fila a fila en Python:
+
+    columnas = Resultado.objects.para_usuario(usuario).order_by('fecha').serie(
+        'fecha', 'capital_mes', 'porcentaje_cambio', arrays=True
+    )
+    columnas['capital_mes']         # array int64 de céntimos
+
+- Los importes (CampoDinero) se leen como céntimos enteros, tal como están
+  guardados (int64 con arrays=True; dinero.a_euros() para las gráficas).
+- Los DecimalField se convierten a float en la propia consulta (CAST), que
+  es lo que necesitan gráficas y cálculos (float64).
+- Las fechas son date (datetime64[D] con arrays=True); el resto de campos,
+  el valor de la columna. Se admiten rutas con '__' (producto_contratado__producto).
+- Con .cacheado() las filas salen de la caché de querysets; si no, se leen
+  con iterator() sin guardarlas en el queryset.
+
+serie_shards() hace lo mismo con una consulta repartida entre shards
+(consultar_shards), p. ej. los últimos resultados de todos los usuarios.
+"""
+import numpy as np
+from django.core.exceptions import FieldDoesNotExist
+from django.db import models
+from django.db.models import ExpressionWrapper, F
+from django.db.models.functions import Cast
+
+from .db.shards import consultar_shards
+from .dinero import CampoDinero
+
+
+TAMANO_BLOQUE = 2000
+
+
+def _campo(modelo, ruta):
+    """Campo del modelo al que apunta una ruta con '__'"""
+    partes = ruta.split('__')
+    for parte in partes[:-1]:
+        modelo = modelo._meta.get_field(parte).related_model
+    if partes[-1] == 'pk':
+        return modelo._meta.pk
+    return modelo._meta.get_field(partes[-1])
+
+
+def _columna(modelo, ruta):
+    """(expresión de la columna, dtype de NumPy)"""
+    try:
+        campo = _campo(modelo, ruta)
+    except (FieldDoesNotExist, AttributeError):
+        raise ValueError(f'{modelo.__name__} no tiene el campo {ruta!r}')
+    if campo.is_relation:
+        campo = campo.target_field
+
+    if isinstance(campo, CampoDinero):
+        # Sin from_db_value: céntimos tal cual, sin crear un Dinero por fila
+        expresion = ExpressionWrapper(F(ruta), output_field=models.BigIntegerField())
+        dtype = np.int64
+    elif isinstance(campo, (models.DecimalField, models.FloatField)):
+        expresion = Cast(ruta, output_field=models.FloatField())
+        dtype = np.float64
+    elif isinstance(campo, models.DateTimeField):
+        # Con zona horaria: datetime de Python
+        expresion, dtype = F(ruta), object
+    elif isinstance(campo, models.DateField):
+        expresion, dtype = F(ruta), 'datetime64[D]'
+    elif isinstance(campo, (models.IntegerField, models.AutoField)):
+        expresion, dtype = F(ruta), np.int64
+    else:
+        expresion, dtype = F(ruta), object
+    if campo.null and dtype is np.int64:
+        # NULL no cabe en int64
+        dtype = object
+    return expresion, dtype
+
+
+def _a_columnas(campos, dtypes, filas, arrays):
+    """Traspone las filas en {campo: lista o array}"""
+    columnas = list(zip(*filas)) or [()] * len(campos)
+    if not arrays:
+        return {campo: list(columna) for campo, columna in zip(campos, columnas)}
+    resultado = {}
+    for campo, dtype, columna in zip(campos, dtypes, columnas):
+        if dtype in (np.int64, np.float64):
+            resultado[campo] = np.fromiter(
+                (np.nan if valor is None else valor for valor in columna) if dtype is np.float64 else columna,
+                dtype=dtype, count=len(columna)
+            )
+        else:
+            resultado[campo] = np.array(columna, dtype=dtype)
+    return resultado
+
+
+class QuerySetSerie(models.QuerySet):
+    """QuerySet de modelos que se leen como series temporales"""
+
+    def serie(self, *campos, arrays=False):
+        """
+        {campo: columna} con las filas de la consulta en su orden. Las
+        columnas son listas, o arrays de NumPy si arrays=True.
+        """
+        if not campos:
+            raise ValueError('serie() necesita al menos un campo')
+        expresiones, dtypes = zip(*(_columna(self.model, campo) for campo in campos))
+        consulta = self.values_list(*expresiones)
+        if getattr(self, '_ttl_cache', None) is not None:
+            # Marcado con cacheado() (QuerySetCacheable): las filas van a la caché
+            filas = list(consulta)
+        else:
+            filas = list(consulta.iterator(chunk_size=TAMANO_BLOQUE))
+        return _a_columnas(campos, dtypes, filas, arrays)
+
+
+def serie_shards(queryset, *campos, fin=None, arrays=False):
+    """serie() de un queryset ejecutado en todos los shards (consultar_shards)"""
+    if not campos:
+        raise ValueError('serie_shards() necesita al menos un campo')
+    expresiones, dtypes = zip(*(_columna(queryset.model, campo) for campo in campos))
+    alias = {f'serie_{indice}': expresion for indice, expresion in enumerate(expresiones)}
+    # Los campos del ORDER BY también, con su nombre, para mezclar los shards
+    orden = [
+        elemento.lstrip('-') for elemento in queryset.query.order_by
+        if isinstance(elemento, str) and elemento != '?'
+    ]
+    filas = consultar_shards(queryset.values(*orden, **alias), fin=fin)
+    return _a_columnas(campos, dtypes, ([fila[nombre] for nombre in alias] for fila in filas), arrays)
@@ -0,0 +1,176 @@
+"""
+Señales de appKairos
+
+Invalidación de caché: cualquier cambio en el catálogo (Producto, Mercado
+o la relación entre ambos), también desde ProductoAdmin y MercadoAdmin,
+sube la versión del espacio 'catalogo' en todos los workers.
+
+Los modelos con QuerySetCacheable suben además la versión de su tabla, que
+invalida los resultados de .cacheado() que la leen.
+
+Auditoría y sharding: los logs, tokens, contratos y resultados no tienen
+clave foránea real hacia Usuario (pueden estar en otra base de datos), así
+que se borran aquí con él.
+
+Sharding: el catálogo se escribe en 'default' y, al confirmar la
+transacción, se copia a los demás shards (appKairos/db/shards.py).
+
+Métricas: cada Resultado insertado actualiza el drawdown de su contrato y
+de su usuario y las estadísticas móviles de su contrato; editarlo o
+borrarlo las deja pendientes de recalcular (appKairos/analitica/).
+"""
+import copy
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_save, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .analitica import drawdown, moviles
+from .cache import obtener_cache
+from .cache.querysets import es_cacheable, invalidar_tablas
+from .db.shards import shard_de, shards, sharding_activo
+from .models import (
+    EstadisticasMoviles, EstadoDrawdown, InstantaneaSaldo, Mercado, MovimientoCapital, Producto,
+    ProductoContratado, Resultado, Usuario, SesionSeguridad, TokenVerificacionEmail,
+    TokenRecuperacionPassword, ValorLiquidativo
+)
+
+
+ESPACIO_CATALOGO = 'catalogo'
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_delete, sender=Producto)
+@receiver(post_save, sender=Mercado)
+@receiver(post_delete, sender=Mercado)
+def invalidar_catalogo(sender, **kwargs):
+    obtener_cache().invalidar(ESPACIO_CATALOGO)
+
+
+@receiver(m2m_changed, sender=Producto.mercados.through)
+def invalidar_catalogo_mercados(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        obtener_cache().invalidar(ESPACIO_CATALOGO)
+
+
+def invalidar_tabla(sender, using, **kwargs):
+    invalidar_tablas([sender._meta.db_table], using=using)
+
+
+def invalidar_tabla_intermedia(sender, action, using, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        invalidar_tablas([sender._meta.db_table], using=using)
+
+
+def conectar_invalidacion_tablas():
+    """
+    Conecta invalidar_tabla a cada modelo cacheable y invalidar_tabla_intermedia
+    a sus M2M (AppConfig.ready). Un post_delete sin sender escucharía todos los
+    modelos y Django dejaría de borrar en bloque (fast delete) en cualquiera.
+    """
+    for modelo in apps.get_models():
+        if not es_cacheable(modelo):
+            continue
+        post_save.connect(invalidar_tabla, sender=modelo, dispatch_uid='invalidar_tabla')
+        post_delete.connect(invalidar_tabla, sender=modelo, dispatch_uid='invalidar_tabla')
+        for campo in modelo._meta.local_many_to_many:
+            m2m_changed.connect(
+                invalidar_tabla_intermedia, sender=campo.remote_field.through,
+                dispatch_uid='invalidar_tabla_intermedia'
+            )
+
+
+@receiver(post_delete, sender=Usuario)
+def borrar_auditoria_usuario(sender, instance, **kwargs):
+    for modelo in (SesionSeguridad, TokenVerificacionEmail, TokenRecuperacionPassword):
+        modelo.objects.filter(usuario_id=instance.pk).delete()
+
+
+@receiver(post_delete, sender=Usuario)
+def borrar_datos_usuario(sender, instance, **kwargs):
+    alias = shard_de(instance)
+    for modelo in (
+        Resultado, EstadoDrawdown, EstadisticasMoviles, InstantaneaSaldo, MovimientoCapital, ProductoContratado
+    ):
+        modelo.objects.using(alias).filter(usuario_id=instance.pk).delete()
+
+
+# ----------------------------------------------------------------------
+# Métricas incrementales de los resultados
+# ----------------------------------------------------------------------
+
+@receiver(post_save, sender=Resultado)
+def actualizar_metricas(sender, instance, created, raw, using, **kwargs):
+    if created and not raw:
+        drawdown.registrar(instance, using)
+        moviles.registrar(instance, using)
+    else:
+        # Edición o copia en bruto (loaddata, preparar_shards): la serie cambia
+        metricas_pendientes(sender, instance, using)
+
+
+@receiver(post_delete, sender=Resultado)
+def metricas_pendientes(sender, instance, using, **kwargs):
+    drawdown.marcar_pendiente(instance.usuario_id, instance.producto_contratado_id, using)
+    moviles.marcar_pendiente(instance.producto_contratado_id, using)
+
+
+# ----------------------------------------------------------------------
+# Réplica del catálogo en los shards
+# ----------------------------------------------------------------------
+
+def _otros_shards():
+    return [alias for alias in shards() if alias != DEFAULT_DB_ALIAS]
+
+
+@receiver(post_save, sender=Producto)
+@receiver(post_save, sender=Mercado)
+@receiver(post_save, sender=ValorLiquidativo)
+def replicar_catalogo(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_activo():
+        return
+    copia = copy.copy(instance)
+
+    def replicar():
+        for alias in _otros_shards():
+            # raw: se copian los valores tal cual (fechas auto_now incluidas)
+            copy.copy(copia).save_base(raw=True, using=alias)
+    transaction.on_commit(replicar, using=using)
+
+
+@receiver(post_delete, sender=Producto)
+@receiver(post_delete, sender=Mercado)
+@receiver(post_delete, sender=ValorLiquidativo)
+def borrar_catalogo_replicado(sender, instance, using, **kwargs):
+    if using != DEFAULT_DB_ALIAS or not sharding_activo():
+        return
+    pk = instance.pk
+
+    def borrar():
+        for alias in _otros_shards():
+            sender._base_manager.using(alias).filter(pk=pk).delete()
+    transaction.on_commit(borrar, using=using)
+
+
+@receiver(m2m_changed, sender=Producto.mercados.through)
+def replicar_mercados(sender, instance, action, reverse, pk_set, using, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if using != DEFAULT_DB_ALIAS or not sharding_activo():
+        return
+    propio, otro = ('mercado_id', 'producto_id') if reverse else ('producto_id', 'mercado_id')
+    filtro = {propio: instance.pk}
+    if action == 'post_remove':
+        filtro[f'{otro}__in'] = list(pk_set)
+    filas = [{propio: instance.pk, otro: pk} for pk in pk_set or ()]
+
+    def replicar():
+        for alias in _otros_shards():
+            if action == 'post_add':
+                sender.objects.using(alias).bulk_create(
+                    [sender(**fila) for fila in filas], ignore_conflicts=True
+                )
+            else:
+                sender.objects.using(alias).filter(**filtro).delete()
+    transaction.on_commit(replicar, using=using)
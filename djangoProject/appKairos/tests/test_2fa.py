@@ -82,6 +82,74 @@ class Activar2FAViewTest(TestCase):
         self.assertEqual(response.status_code, 302)
 
 
+class QR2FAViewTest(TestCase):
+    """Tests para la vista que sirve la imagen QR de activación"""
+    
+    def setUp(self):
+        self.client = Client()
+        self.usuario = Usuario.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='TestPass123!',
+            is_active=True
+        )
+        self.usuario.secreto_2fa = pyotp.random_base32()
+        self.usuario.save()
+        self.url = reverse('appKairos:qr_2fa', kwargs={'formato': 'svg'})
+        self.client.login(username='testuser', password='TestPass123!')
+    
+    def test_qr_svg(self):
+        """El QR se sirve como SVG cacheable solo en el navegador del usuario"""
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'image/svg+xml')
+        self.assertIn(b'<svg', response.content)
+        self.assertIn('private', response['Cache-Control'])
+        self.assertTrue(response.has_header('ETag'))
+    
+    def test_qr_png(self):
+        """PNG disponible como alternativa"""
+        response = self.client.get(reverse('appKairos:qr_2fa', kwargs={'formato': 'png'}))
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.content.startswith(b'\x89PNG'))
+    
+    def test_qr_etag_devuelve_304(self):
+        """Con If-None-Match válido no se reenvía la imagen"""
+        etag = self.client.get(self.url)['ETag']
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+    
+    def test_qr_memorizado(self):
+        """Renderizar dos veces la misma URI usa el LRU"""
+        from appKairos.qr import renderizar_qr, estadisticas_cache_qr
+        renderizar_qr('otpauth://totp/test?secret=ABCDEFGH', 'svg')
+        aciertos = estadisticas_cache_qr().hits
+        renderizar_qr('otpauth://totp/test?secret=ABCDEFGH', 'svg')
+        self.assertEqual(estadisticas_cache_qr().hits, aciertos + 1)
+    
+    def test_qr_requiere_sesion(self):
+        """Sin sesión redirige al login"""
+        self.client.logout()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 302)
+    
+    def test_qr_no_disponible_con_2fa_activo(self):
+        """Una vez activado el 2FA el secreto deja de servirse"""
+        etag = self.client.get(self.url)['ETag']
+        self.usuario.tiene_2fa_activo = True
+        self.usuario.save()
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+        # Ni siquiera como 304 a quien aún guarda el ETag
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 404)
+    
+    def test_formato_no_soportado(self):
+        """Formatos desconocidos devuelven 404"""
+        response = self.client.get(reverse('appKairos:qr_2fa', kwargs={'formato': 'gif'}))
+        self.assertEqual(response.status_code, 404)
+
+
 class Verificar2FAViewTest(TestCase):
     """Tests para la vista de verificación 2FA durante login"""
     
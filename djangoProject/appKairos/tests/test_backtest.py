@@ -0,0 +1,116 @@
+"""
+Tests del backtesting de estrategias (appKairos.backtest)
+"""
+import shutil
+import tempfile
+from io import StringIO
+
+import numpy as np
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from appKairos import backtest, cotizaciones
+from appKairos.backtest import estrategias
+from appKairos.backtest.productos import backtest_producto, ultimo_backtest
+from appKairos.models import Mercado, Producto, ResultadoBacktest, Usuario
+
+
+def dias(codigo, cierres, inicio='2020-01-01'):
+    """Barras diarias con esos cierres"""
+    barras = np.zeros(len(cierres), dtype=cotizaciones.BARRA)
+    barras['fecha'] = np.datetime64(inicio, 's') + np.arange(len(cierres)) * np.timedelta64(86400, 's')
+    for campo in ('apertura', 'maximo', 'minimo', 'cierre'):
+        barras[campo] = cierres
+    cotizaciones.obtener_almacen().agregar(codigo, 'dia', barras)
+
+
+class EstrategiasTest(TestCase):
+    """Tests de señales y P&L vectorizados, sin base de datos"""
+
+    def test_senales(self):
+        subida = np.linspace(100, 200, 50)[:, None]
+        self.assertTrue((estrategias.momentum(subida, ventana=5)[5:] == 1).all())
+        self.assertTrue((estrategias.momentum(subida, ventana=5)[:5] == 0).all())
+        self.assertTrue((estrategias.tendencia(subida, rapida=3, lenta=10)[9:] == 1).all())
+        self.assertTrue((estrategias.tendencia(subida, rapida=3, lenta=10)[:9] == 0).all())
+
+        # La ruptura mantiene la posición hasta la ruptura contraria
+        cierres = np.array([10, 11, 12, 13, 12.5, 12, 9, 10, 11], dtype=float)[:, None]
+        self.assertEqual(estrategias.ruptura(cierres, ventana=2).ravel().tolist(), [0, 0, 1, 1, 1, -1, -1, -1, 1])
+
+    def test_simular(self):
+        cierres = np.array([[100, 50], [110, 50], [121, 40]], dtype=float)
+        posiciones = np.array([[1, -1], [1, -1], [0, 0]])
+        rendimientos, operaciones = backtest.simular(cierres, posiciones, coste=0)
+        # La posición se aplica desde la barra siguiente; cartera a partes iguales
+        self.assertEqual(np.round(rendimientos, 6).tolist(), [0, 0.05, 0.15])
+        self.assertEqual(operaciones, 2)
+        con_coste, _ = backtest.simular(cierres, posiciones, coste=0.01)
+        self.assertEqual(np.round(con_coste, 6).tolist(), [0, 0.04, 0.15])
+
+    def test_combinaciones_validas(self):
+        combinaciones = backtest.combinaciones('tendencia', {'rapida': [10, 50], 'lenta': [20, 50]})
+        self.assertEqual(combinaciones, [{'rapida': 10, 'lenta': 20}, {'rapida': 10, 'lenta': 50}])
+
+
+class BacktestProductoTest(TestCase):
+    """Tests de barridos sobre cotizaciones guardadas y de su persistencia"""
+
+    def setUp(self):
+        directorio = tempfile.mkdtemp()
+        ajustes = override_settings(COTIZACIONES_DIR=directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+
+        t = np.arange(400)
+        dias('SP500', 100 + t * 0.1 + 10 * np.sin(t / 15))
+        dias('NasdaQ', 200 + 20 * np.sin(t / 40), inicio='2020-03-01')
+        self.producto = Producto.objects.create(nombre='MultiMarkets', codigo='MULTI', estrategia='tendencia')
+        self.producto.mercados.add(
+            Mercado.objects.create(nombre='S&P 500', codigo='SP500'),
+            Mercado.objects.create(nombre='NASDAQ', codigo='NasdaQ'),
+            Mercado.objects.create(nombre='Gold', codigo='XAAUSD'),
+        )
+
+    def test_precios_alineados(self):
+        fechas, cierres, mercados = backtest.precios(['NasdaQ', 'SP500', 'XAAUSD'])
+        self.assertEqual(mercados, ['NasdaQ', 'SP500'])
+        self.assertEqual(cierres.shape, (len(fechas), 2))
+        # NasdaQ empieza dos meses después: NaN hasta su primera cotización
+        self.assertTrue(np.isnan(cierres[0, 0]))
+        self.assertFalse(np.isnan(cierres[-1]).any())
+
+    def test_pool_da_lo_mismo_que_un_proceso(self):
+        fechas, cierres, _ = backtest.precios(['NasdaQ', 'SP500'])
+        rejilla = backtest.REJILLAS['tendencia']
+        en_proceso = backtest.barrido('tendencia', rejilla, fechas, cierres, trabajadores=1)
+        en_pool = backtest.barrido('tendencia', rejilla, fechas, cierres, trabajadores=2)
+        self.assertEqual(en_pool, en_proceso)
+
+    def test_guarda_el_barrido(self):
+        resultados = backtest_producto(self.producto, rejilla={'rapida': [5, 10], 'lenta': [20, 50]}, trabajadores=1)
+        self.assertEqual(ResultadoBacktest.objects.filter(producto=self.producto).count(), 4)
+        mejor = ultimo_backtest(self.producto)
+        self.assertEqual(mejor.ratio_sharpe, max(resultado.ratio_sharpe for resultado in resultados))
+        self.assertEqual(mejor.mercados, ['NasdaQ', 'SP500'])
+        self.assertEqual(mejor.curva['fechas'][0], '2020-01')
+        self.assertEqual(ResultadoBacktest.objects.exclude(curva=None).count(), 1)
+
+        with self.assertRaises(ValueError):
+            backtest_producto(self.producto, rejilla={'ventana': [10]}, guardar=False)
+
+        usuario = Usuario.objects.create_user(username='backtest', email='backtest@example.com')
+        self.client.force_login(usuario)
+        respuesta = self.client.get(reverse('appKairos:contratar_producto', args=[self.producto.pk]))
+        self.assertEqual(respuesta.context['backtest'], mejor)
+        self.assertContains(respuesta, 'Sharpe')
+
+    def test_comando(self):
+        salida = StringIO()
+        call_command(
+            'backtest', 'MULTI', parametro=['rapida=5,10', 'lenta=50'], trabajadores=1, stdout=salida
+        )
+        self.assertIn('✓ MULTI (tendencia): 2 combinación(es) · mejor rapida=', salida.getvalue())
+        self.assertEqual(ResultadoBacktest.objects.filter(mejor=True).count(), 1)
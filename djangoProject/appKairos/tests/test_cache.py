@@ -0,0 +1,274 @@
+"""
+Tests para el subsistema de caché (appKairos.cache)
+"""
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete
+from django.core.cache import caches
+from django.utils import timezone
+from datetime import timedelta
+from unittest.mock import patch
+import tempfile
+import threading
+import time
+import os
+
+from appKairos.cache import LRUCache, CacheMultinivel
+from appKairos.cache.bus import BusInvalidacion
+from appKairos.models import Mercado, Producto, TokenVerificacionEmail, VersionCache
+
+
+class LRUCacheTest(SimpleTestCase):
+    """Tests del nivel en memoria"""
+
+    def test_expulsa_la_menos_usada(self):
+        lru = LRUCache(max_entradas=2)
+        lru.set('a', 1)
+        lru.set('b', 2)
+        lru.get('a')
+        lru.set('c', 3)
+
+        self.assertEqual(lru.get('a'), 1)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.expulsiones, 1)
+
+    def test_ttl_por_clave(self):
+        lru = LRUCache()
+        lru.set('corta', 1, ttl=0.01)
+        lru.set('larga', 2, ttl=60)
+        time.sleep(0.02)
+
+        self.assertIsNone(lru.get('corta'))
+        self.assertEqual(lru.get('larga'), 2)
+
+    def test_borrar_prefijo(self):
+        lru = LRUCache()
+        lru.set('ns:1', 1)
+        lru.set('ns:2', 2)
+        lru.set('otro', 3)
+
+        self.assertEqual(lru.borrar_prefijo('ns:'), 2)
+        self.assertEqual(len(lru), 1)
+
+
+class CacheTestMixin:
+    """Configura un nivel compartido SQLite en un directorio temporal"""
+
+    def setUp(self):
+        self.directorio = tempfile.TemporaryDirectory()
+        self.ajustes = override_settings(CACHES={
+            'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'},
+            'pruebas': {
+                'BACKEND': 'appKairos.cache.sqlite.SQLiteCache',
+                'LOCATION': os.path.join(self.directorio.name, 'cache.sqlite3'),
+            },
+        })
+        self.ajustes.enable()
+
+    def tearDown(self):
+        self.ajustes.disable()
+        self.directorio.cleanup()
+
+
+class SQLiteCacheTest(CacheTestMixin, SimpleTestCase):
+    """Tests del backend SQLite compartido"""
+
+    def test_operaciones_basicas(self):
+        cache = caches['pruebas']
+        cache.set('clave', {'a': 1}, 60)
+        self.assertEqual(cache.get('clave'), {'a': 1})
+        self.assertTrue(cache.has_key('clave'))
+        self.assertFalse(cache.add('clave', 'otro'))
+        self.assertTrue(cache.add('contador', 1))
+        self.assertEqual(cache.incr('contador', 5), 6)
+        self.assertTrue(cache.delete('clave'))
+        self.assertIsNone(cache.get('clave'))
+        self.assertEqual(cache.get_many(['contador', 'nada']), {'contador': 6})
+
+    def test_caducidad(self):
+        cache = caches['pruebas']
+        cache.set('efimera', 1, 0.01)
+        time.sleep(0.02)
+        self.assertIsNone(cache.get('efimera'))
+        # add() reutiliza una clave expirada
+        self.assertTrue(cache.add('efimera', 2, 60))
+        self.assertEqual(cache.get('efimera'), 2)
+
+
+class CacheMultinivelTest(CacheTestMixin, SimpleTestCase):
+    """Tests de la caché de dos niveles"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CacheMultinivel(alias='pruebas', ttl_versiones=60)
+
+    def test_aciertos_por_nivel(self):
+        self.cache.set('clave', 'valor', ttl=60)
+        self.assertEqual(self.cache.get('clave'), 'valor')
+
+        # Otro proceso solo comparte L2
+        otro = CacheMultinivel(alias='pruebas')
+        self.assertEqual(otro.get('clave'), 'valor')
+        self.assertIsNone(otro.get('inexistente'))
+
+        self.assertEqual(self.cache.metricas()['aciertos_l1'], 1)
+        metricas = otro.metricas()
+        self.assertEqual(metricas['aciertos_l2'], 1)
+        self.assertEqual(metricas['fallos'], 1)
+
+    def test_invalidar_espacio(self):
+        catalogo = self.cache.espacio('catalogo')
+        catalogo.set('productos', [1, 2])
+        version = catalogo.version()
+
+        self.assertGreater(catalogo.invalidar(), version)
+        self.assertIsNone(catalogo.get('productos'))
+
+    def test_single_flight(self):
+        """Con varios hilos pidiendo la misma clave, solo uno la calcula"""
+        llamadas = []
+
+        def calcular():
+            llamadas.append(1)
+            time.sleep(0.1)
+            return 'caro'
+
+        resultados = []
+        hilos = [
+            threading.Thread(target=lambda: resultados.append(self.cache.get_or_set('caro', calcular, ttl=60)))
+            for _ in range(5)
+        ]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(resultados, ['caro'] * 5)
+        self.assertEqual(len(llamadas), 1)
+        self.assertEqual(self.cache.metricas()['calculos'], 1)
+
+
+class BusInvalidacionTest(CacheTestMixin, TestCase):
+    """Tests del bus de invalidación entre procesos (modo sondeo)"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = self.crear_cache()
+
+    def crear_cache(self):
+        cache = CacheMultinivel(alias='pruebas')
+        cache.bus = BusInvalidacion(cache, escuchar=False)
+        return cache
+
+    def test_publicar_sube_version_y_vacia_l1(self):
+        catalogo = self.cache.espacio('catalogo')
+        version = catalogo.version()
+        catalogo.set('productos', [1, 2])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            nueva = catalogo.invalidar()
+
+        self.assertEqual(nueva, version + 1)
+        self.assertEqual(catalogo.version(), nueva)
+        self.assertIsNone(catalogo.get('productos'))
+        self.assertEqual(VersionCache.objects.get(espacio='catalogo').version, nueva)
+
+    def test_sondeo_aplica_cambios_de_otro_proceso(self):
+        otro = self.crear_cache()
+        otro.bus.intervalo = 0.05
+        version = self.cache.version('catalogo')
+        self.assertEqual(otro.version('catalogo'), version)
+        # Espacio creado hace tiempo: su fecha queda fuera del margen del sondeo
+        VersionCache.objects.filter(espacio='catalogo').update(
+            fecha_actualizacion=timezone.now() - timedelta(minutes=5)
+        )
+        otro.bus.sondear()
+        time.sleep(2 * otro.bus.intervalo)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cache.invalidar('catalogo')
+
+        # Sin sondear, el otro proceso sigue con la versión que conocía
+        self.assertEqual(otro.version('catalogo'), version)
+        otro.bus.sondear()
+        self.assertEqual(otro.version('catalogo'), version + 1)
+
+    def test_senales_del_catalogo(self):
+        """Guardar un producto o cambiar sus mercados publica una nueva versión"""
+        with patch('appKairos.signals.obtener_cache', return_value=self.cache):
+            version = self.cache.version('catalogo')
+            producto = Producto.objects.create(nombre='Kairos Gold', codigo='KG01')
+            mercado = Mercado.objects.create(nombre='XAUUSD', codigo='XAUUSD')
+            producto.mercados.add(mercado)
+
+        self.assertEqual(VersionCache.objects.get(espacio='catalogo').version, version + 3)
+
+    def test_receptores_solo_de_modelos_cacheables(self):
+        """Los demás modelos conservan el borrado en bloque de Django"""
+        self.assertTrue(post_delete.has_listeners(Producto))
+        self.assertFalse(post_delete.has_listeners(TokenVerificacionEmail))
+        self.assertTrue(m2m_changed.has_listeners(Producto.mercados.through))
+
+
+class QuerySetCacheableTest(CacheTestMixin, TransactionTestCase):
+    """Tests de .cacheado(): fuera de transacción, como en una petición normal"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CacheMultinivel(alias='pruebas')
+        self.parche = patch('appKairos.cache._cache', self.cache)
+        self.parche.start()
+        self.producto = Producto.objects.create(nombre='Kairos Gold', codigo='KG01')
+
+    def tearDown(self):
+        self.parche.stop()
+        super().tearDown()
+
+    def test_segunda_lectura_sin_consulta(self):
+        self.assertEqual(list(Producto.objects.filter(activo=True).cacheado()), [self.producto])
+        with self.assertNumQueries(0):
+            self.assertEqual(list(Producto.objects.filter(activo=True).cacheado()), [self.producto])
+
+    def test_guardar_invalida(self):
+        list(Producto.objects.filter(activo=True).cacheado())
+        self.producto.activo = False
+        self.producto.save()
+        self.assertEqual(list(Producto.objects.filter(activo=True).cacheado()), [])
+
+    def test_update_invalida(self):
+        list(Producto.objects.filter(activo=True).cacheado())
+        Producto.objects.update(activo=False)
+        self.assertEqual(list(Producto.objects.filter(activo=True).cacheado()), [])
+
+    def test_version_sube_al_confirmar(self):
+        """Una lectura durante la transacción no puede guardar filas antiguas con la versión nueva"""
+        espacio = 'tabla:' + Producto._meta.db_table
+        version = self.cache.version(espacio)
+        with transaction.atomic():
+            Producto.objects.update(activo=False)
+            self.assertEqual(self.cache.version(espacio), version)
+        self.assertGreater(self.cache.version(espacio), version)
+        self.assertEqual(list(Producto.objects.filter(activo=True).cacheado()), [])
+
+    def test_subconsulta_sobre_tabla_cacheable(self):
+        """Cambiar los mercados de un producto invalida las consultas que los filtran"""
+        mercado = Mercado.objects.create(nombre='XAUUSD', codigo='XAUUSD')
+        consulta = lambda: list(
+            Producto.objects.filter(id__in=Mercado.objects.filter(codigo='XAUUSD').values('productos')).cacheado()
+        )
+        self.assertEqual(consulta(), [])
+        self.producto.mercados.add(mercado)
+        self.assertEqual(consulta(), [self.producto])
+
+    def test_sin_cache_en_transaccion(self):
+        list(Producto.objects.cacheado())
+        with transaction.atomic():
+            with self.assertNumQueries(1):
+                list(Producto.objects.cacheado())
+
+    def test_sin_cache_con_tablas_no_cacheables(self):
+        """Una consulta que lee ProductoContratado no se cachea: sus cambios no se notifican"""
+        consulta = Producto.objects.exclude(contrataciones__estado='activo').cacheado()
+        list(consulta)
+        with self.assertNumQueries(1):
+            list(consulta.all())
@@ -0,0 +1,95 @@
+"""
+Tests de la calculadora de crecimiento Monte Carlo (appKairos.analitica.calculadora)
+"""
+from datetime import date
+from decimal import Decimal
+from unittest.mock import patch
+
+import numpy as np
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+
+from appKairos.analitica import calculadora
+from appKairos.cache import CacheMultinivel
+from appKairos.models import Producto, ProductoContratado, Resultado, Usuario
+from appKairos.tests.test_cache import CacheTestMixin
+
+
+class SimulacionTest(SimpleTestCase):
+    """Tests de la simulación vectorizada, sin base de datos"""
+
+    def test_rendimiento_constante(self):
+        bandas, perdida = calculadora.simular([0.01], 12, caminos=100)
+        self.assertEqual(bandas.shape, (len(calculadora.PERCENTILES), 13))
+        np.testing.assert_allclose(bandas[:, -1], 1.01 ** 12, rtol=1e-5)
+        self.assertEqual(perdida.max(), 0.0)
+
+    def test_bandas_ordenadas_y_reproducibles(self):
+        rendimientos = [0.05, -0.04, 0.02, -0.01, 0.03]
+        bandas, perdida = calculadora.simular(rendimientos, 24, caminos=2000, semilla=(1, 24))
+        self.assertTrue((np.diff(bandas[:, 1:], axis=0) >= 0).all())
+        self.assertGreater(perdida[-1], 0)
+        self.assertLess(perdida[-1], 1)
+        otra, _ = calculadora.simular(rendimientos, 24, caminos=2000, semilla=(1, 24))
+        np.testing.assert_array_equal(bandas, otra)
+
+
+class CalculadoraTest(CacheTestMixin, TestCase):
+    """Tests de la proyección con el historial de Resultado y su caché"""
+
+    def setUp(self):
+        super().setUp()
+        self.cache = CacheMultinivel(alias='pruebas')
+        parche = patch('appKairos.cache._cache', self.cache)
+        parche.start()
+        self.addCleanup(parche.stop)
+
+        self.usuario = Usuario.objects.create_user(username='calculadora', email='calculadora@example.com')
+        self.producto = Producto.objects.create(nombre='Producto', codigo='CAL001')
+        self.contrato = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=self.producto, monto_invertido=Decimal('1000'), estado='activo'
+        )
+        # Resultado inicial del contrato, sin cambio: no cuenta como rendimiento
+        self.resultado(date(2024, 1, 31), '0')
+        for mes, porcentaje in enumerate(['2.00', '-1.00', '3.00'], start=2):
+            self.resultado(date(2024, mes, 28), porcentaje)
+
+    def resultado(self, fecha, porcentaje):
+        return Resultado.objects.create(
+            usuario=self.usuario, producto_contratado=self.contrato, fecha=fecha, capital_mes=Decimal('1000'),
+            cambio_mensual=Decimal(porcentaje) * 10, porcentaje_cambio=Decimal(porcentaje)
+        )
+
+    def test_rendimientos_mensuales(self):
+        np.testing.assert_allclose(calculadora.rendimientos_mensuales(self.producto), [0.02, -0.01, 0.03])
+
+    def test_proyeccion_cacheada_y_lineal_en_el_importe(self):
+        proyeccion = calculadora.proyectar(self.producto, 1000, 12)
+        self.assertEqual(proyeccion['meses'], list(range(13)))
+        self.assertEqual(proyeccion['historial_meses'], 3)
+        self.assertEqual(proyeccion['percentiles']['p50'][0], 1000)
+
+        # Otro importe u horizonte: sin consultas ni simulación
+        with self.assertNumQueries(0), patch.object(calculadora, 'simular') as simular:
+            doble = calculadora.proyectar(self.producto, 2000, 12)
+            self.assertEqual(len(calculadora.proyectar(self.producto, 1000, 360)['meses']), 361)
+        simular.assert_not_called()
+        np.testing.assert_allclose(doble['percentiles']['p95'], np.multiply(proyeccion['percentiles']['p95'], 2), atol=0.01)
+
+        # Un resultado nuevo deja obsoleta la proyección
+        with self.captureOnCommitCallbacks(execute=True):
+            self.resultado(date(2024, 5, 31), '1.00')
+        self.assertEqual(calculadora.proyectar(self.producto, 1000, 12)['historial_meses'], 4)
+
+    def test_vista(self):
+        self.client.force_login(self.usuario)
+        url = reverse('appKairos:calculadora', args=[self.producto.pk])
+        respuesta = self.client.get(url, {'importe': '5000', 'meses': '24'})
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(len(respuesta.json()['percentiles']['p5']), 25)
+        self.assertEqual(self.client.get(url, {'meses': '0'}).status_code, 400)
+        self.assertEqual(self.client.get(url, {'importe': 'mucho'}).status_code, 400)
+
+        sin_historial = Producto.objects.create(nombre='Nuevo', codigo='CAL002')
+        respuesta = self.client.get(reverse('appKairos:calculadora', args=[sin_historial.pk]))
+        self.assertEqual(respuesta.status_code, 404)
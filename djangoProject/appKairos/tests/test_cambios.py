@@ -0,0 +1,144 @@
+"""
+Tests del recálculo en bloque de los cambios (appKairos.analitica.cambios)
+"""
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.admin.sites import AdminSite
+from django.core.management import call_command
+from django.test import RequestFactory, TestCase
+
+from appKairos.admin import ResultadoAdmin
+from appKairos.analitica import cambios
+from appKairos.dinero import Dinero
+from appKairos.models import EstadisticasMoviles, EstadoDrawdown, Producto, ProductoContratado, Resultado, Usuario
+
+
+class RecalculoCambiosTest(TestCase):
+    """Tests del UPDATE con LAG() por usuario y contrato"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='cambios', email='cambios@example.com')
+        self.producto = Producto.objects.create(nombre='Producto', codigo='CAM001')
+        self.contrato = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=self.producto, monto_invertido=Decimal('1000')
+        )
+
+    def crear(self, mes, capital, contrato=None, usuario=None):
+        # Los cambios se dejan a 0, como los dejaría una importación
+        return Resultado.objects.create(
+            usuario=usuario or self.usuario, producto_contratado=contrato,
+            fecha=date(2024, mes, 1), capital_mes=Decimal(capital)
+        )
+
+    def cambios_de(self, **filtro):
+        return list(Resultado.objects.filter(**filtro).order_by('fecha').values_list(
+            'cambio_mensual', 'porcentaje_cambio'
+        ))
+
+    def test_series_por_contrato_y_total(self):
+        """Cada serie se compara con su propio resultado anterior"""
+        for mes, capital in ((1, '1000'), (2, '1100'), (3, '990')):
+            self.crear(mes, capital, contrato=self.contrato)
+        for mes, capital in ((1, '5000'), (2, '4000')):
+            self.crear(mes, capital)
+
+        self.assertEqual(cambios.recalcular('default'), 3)  # los primeros ya valen 0
+        self.assertEqual(self.cambios_de(producto_contratado=self.contrato), [
+            (Dinero(0), Decimal('0')), (Dinero('100'), Decimal('10.00')), (Dinero('-110'), Decimal('-10.00')),
+        ])
+        self.assertEqual(self.cambios_de(producto_contratado__isnull=True), [
+            (Dinero(0), Decimal('0')), (Dinero('-1000'), Decimal('-20.00')),
+        ])
+        # Ya están bien: no se reescribe nada
+        self.assertEqual(cambios.recalcular('default'), 0)
+
+    def test_igual_que_calcular_cambios(self):
+        """Coincide con el cálculo de una instancia, redondeo incluido"""
+        capitales = ['1000', '1033.33', '1033.34', '0', '250', '251.57']
+        for mes, capital in enumerate(capitales, start=1):
+            self.crear(mes, capital, contrato=self.contrato)
+        cambios.recalcular('default', contrato=self.contrato.pk)
+
+        esperado, anterior = [], None
+        for capital in capitales:
+            resultado = Resultado(capital_mes=Decimal(capital))
+            resultado.calcular_cambios(anterior)
+            esperado.append((resultado.cambio_mensual, Decimal(resultado.porcentaje_cambio).quantize(Decimal('0.01'))))
+            anterior = resultado.capital_mes
+        self.assertEqual(self.cambios_de(producto_contratado=self.contrato), esperado)
+
+    def test_rango_de_fechas_usa_el_anterior(self):
+        """Con desde/hasta solo cambian esas filas, comparadas con el mes previo"""
+        for mes, capital in ((1, '1000'), (2, '1200'), (3, '600'), (4, '300')):
+            self.crear(mes, capital, contrato=self.contrato)
+
+        cambios.recalcular('default', usuarios=[self.usuario.pk], desde=date(2024, 2, 1), hasta=date(2024, 3, 1))
+        self.assertEqual([porcentaje for _, porcentaje in self.cambios_de(producto_contratado=self.contrato)], [
+            Decimal('0'), Decimal('20.00'), Decimal('-50.00'), Decimal('0'),
+        ])
+
+    def test_usuarios_por_lotes(self):
+        """Con lotes de un usuario no se mezclan las series de usuarios distintos"""
+        otro = Usuario.objects.create_user(username='otro', email='otro@example.com')
+        for usuario in (self.usuario, otro):
+            self.crear(1, '100', usuario=usuario)
+            self.crear(2, '150', usuario=usuario)
+        self.assertEqual(cambios.recalcular('default', tamano_lote=1), 2)
+        self.assertEqual(
+            sorted(Resultado.objects.values_list('porcentaje_cambio', flat=True)),
+            [Decimal('0'), Decimal('0'), Decimal('50.00'), Decimal('50.00')],
+        )
+
+    def test_update_y_bulk_create_recalculan(self):
+        """Las escrituras en bloque dejan los cambios bien y las métricas pendientes"""
+        Resultado.objects.bulk_create([
+            Resultado(usuario=self.usuario, producto_contratado=self.contrato,
+                      fecha=date(2024, mes, 1), capital_mes=Decimal(capital))
+            for mes, capital in ((1, '1000'), (2, '1500'))
+        ])
+        self.assertEqual(self.cambios_de(producto_contratado=self.contrato)[1], (Dinero('500'), Decimal('50.00')))
+
+        self.crear(3, '1500', contrato=self.contrato)
+        Resultado.objects.filter(fecha=date(2024, 2, 1)).update(capital_mes=Dinero('2000'))
+        self.assertEqual(self.cambios_de(producto_contratado=self.contrato), [
+            (Dinero(0), Decimal('0')), (Dinero('1000'), Decimal('100.00')), (Dinero('-500'), Decimal('-25.00')),
+        ])
+        self.assertTrue(EstadoDrawdown.objects.get(producto_contratado=self.contrato).pendiente)
+        self.assertTrue(EstadisticasMoviles.objects.get(producto_contratado=self.contrato).pendiente)
+
+    def test_correccion_en_admin(self):
+        """Corregir un capital desde el admin recalcula el mes siguiente"""
+        for mes, capital in ((1, '1000'), (2, '1100'), (3, '1210')):
+            self.crear(mes, capital, contrato=self.contrato)
+        cambios.recalcular('default')
+
+        superusuario = Usuario.objects.create_superuser(
+            username='admin', email='admin@example.com', password=None
+        )
+        request = RequestFactory().post('/')
+        request.user = superusuario
+        admin = ResultadoAdmin(Resultado, AdminSite())
+        resultado = Resultado.objects.get(fecha=date(2024, 2, 1))
+        formulario = admin.get_form(request, resultado, change=True)(
+            instance=resultado,
+            data={'usuario': self.usuario.pk, 'producto_contratado': self.contrato.pk,
+                  'fecha': '2024-02-01', 'capital_mes': '1210'},
+        )
+        self.assertTrue(formulario.is_valid(), formulario.errors)
+        admin.save_model(request, formulario.save(commit=False), formulario, change=True)
+        self.assertEqual([porcentaje for _, porcentaje in self.cambios_de(producto_contratado=self.contrato)], [
+            Decimal('0'), Decimal('21.00'), Decimal('0'),
+        ])
+
+        admin.delete_model(request, Resultado.objects.get(fecha=date(2024, 2, 1)))
+        self.assertEqual(self.cambios_de(producto_contratado=self.contrato)[1], (Dinero('210'), Decimal('21.00')))
+
+    def test_comando(self):
+        self.crear(1, '100', contrato=self.contrato)
+        self.crear(2, '110', contrato=self.contrato)
+        salida = StringIO()
+        call_command('recalcular_cambios', '--contrato', str(self.contrato.pk), stdout=salida)
+        self.assertIn('default: 1 resultado(s) actualizados', salida.getvalue())
+        self.assertEqual(self.cambios_de(producto_contratado=self.contrato)[1], (Dinero('10'), Decimal('10.00')))
@@ -0,0 +1,258 @@
+"""
+Tests para los comandos de gestión de appKairos
+"""
+from django.test import TestCase
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+import secrets
+
+from appKairos.models import (
+    Usuario, TokenVerificacionEmail, TokenRecuperacionPassword,
+    EstadisticasMoviles, InstantaneaSaldo, MovimientoCapital, Producto, ProductoContratado, Resultado
+)
+
+
+class PurgarTokensCommandTest(TestCase):
+    """Tests para el comando purgar_tokens"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='TestPass123!'
+        )
+        ahora = timezone.now()
+        self.vigente = self.crear_token(TokenVerificacionEmail, ahora + timedelta(hours=24))
+        self.expirado_reciente = self.crear_token(TokenVerificacionEmail, ahora - timedelta(days=1))
+        self.expirado_antiguo = self.crear_token(TokenVerificacionEmail, ahora - timedelta(days=30))
+        self.usado_antiguo = self.crear_token(TokenRecuperacionPassword, ahora + timedelta(hours=1), usado=True)
+        TokenRecuperacionPassword.objects.filter(pk=self.usado_antiguo.pk).update(
+            fecha_creacion=ahora - timedelta(days=30)
+        )
+        self.usado_reciente = self.crear_token(TokenRecuperacionPassword, ahora + timedelta(hours=1), usado=True)
+
+    def crear_token(self, modelo, expira_en, usado=False):
+        return modelo.objects.create(
+            usuario=self.usuario,
+            token=secrets.token_urlsafe(32),
+            expira_en=expira_en,
+            usado=usado
+        )
+
+    def test_purga_respeta_periodo_de_gracia(self):
+        """Solo se borran los tokens usados/expirados fuera del periodo de gracia"""
+        call_command('purgar_tokens', '--dias-gracia', '7', '--pausa', '0', stdout=StringIO())
+
+        self.assertTrue(TokenVerificacionEmail.objects.filter(pk=self.vigente.pk).exists())
+        self.assertTrue(TokenVerificacionEmail.objects.filter(pk=self.expirado_reciente.pk).exists())
+        self.assertFalse(TokenVerificacionEmail.objects.filter(pk=self.expirado_antiguo.pk).exists())
+        self.assertFalse(TokenRecuperacionPassword.objects.filter(pk=self.usado_antiguo.pk).exists())
+        self.assertTrue(TokenRecuperacionPassword.objects.filter(pk=self.usado_reciente.pk).exists())
+
+    def test_purga_por_lotes(self):
+        """Con lotes de una fila se borra todo igualmente"""
+        ahora = timezone.now()
+        for _ in range(5):
+            self.crear_token(TokenVerificacionEmail, ahora - timedelta(days=30))
+
+        call_command(
+            'purgar_tokens', '--dias-gracia', '0', '--tamano-lote', '1', '--pausa', '0',
+            stdout=StringIO()
+        )
+
+        self.assertEqual(TokenVerificacionEmail.objects.filter(usado=False, expira_en__lt=ahora).count(), 0)
+        self.assertTrue(TokenVerificacionEmail.objects.filter(pk=self.vigente.pk).exists())
+
+    def test_simular_no_borra(self):
+        """--simular solo informa"""
+        salida = StringIO()
+        call_command('purgar_tokens', '--simular', stdout=salida)
+
+        self.assertEqual(TokenVerificacionEmail.objects.count(), 3)
+        self.assertEqual(TokenRecuperacionPassword.objects.count(), 2)
+        self.assertIn('2 token(s) se borrarían', salida.getvalue())
+
+
+class CalibrarHashersCommandTest(TestCase):
+    """Tests para el comando calibrar_hashers"""
+
+    def test_calibrar_genera_variables(self):
+        salida = StringIO()
+        call_command(
+            'calibrar_hashers', '--objetivo-ms', '20', '--memoria-mb', '8',
+            '--hashers', 'pbkdf2,scrypt', '--repeticiones', '1', stdout=salida
+        )
+        self.assertIn('PASSWORD_PBKDF2_ITERACIONES=', salida.getvalue())
+        self.assertIn('PASSWORD_SCRYPT_N=', salida.getvalue())
+
+    def test_hasher_desconocido(self):
+        with self.assertRaises(CommandError):
+            call_command('calibrar_hashers', '--hashers', 'md5', stdout=StringIO())
+
+
+class ReconciliarEstadisticasCommandTest(TestCase):
+    """Tests para el comando reconciliar_estadisticas"""
+
+    def setUp(self):
+        usuario = Usuario.objects.create_user(username='testuser', email='test@example.com')
+        producto = Producto.objects.create(nombre='Producto', codigo='REC001')
+        self.contrato = ProductoContratado.objects.create(
+            usuario=usuario, producto=producto, monto_invertido=Decimal('1000')
+        )
+        self.sin_resultados = ProductoContratado.objects.create(
+            usuario=Usuario.objects.create_user(username='otro', email='otro@example.com'),
+            producto=producto, monto_invertido=Decimal('500')
+        )
+        for mes, porcentaje in enumerate(['1', '-2', '3', '5']):
+            Resultado.objects.create(
+                usuario=usuario, producto_contratado=self.contrato, fecha=date(2025, mes + 1, 1),
+                capital_mes=Decimal('1000'), porcentaje_cambio=Decimal(porcentaje)
+            )
+
+    def test_sin_diferencias(self):
+        """Lo mantenido al insertar coincide con el recálculo"""
+        EstadisticasMoviles.objects.create(
+            producto_contratado=self.sin_resultados, usuario_id=self.sin_resultados.usuario_id,
+            producto_id=self.sin_resultados.producto_id
+        )
+        out = StringIO()
+        call_command('reconciliar_estadisticas', stdout=out)
+        self.assertIn('0 con diferencias, 0 sin estadísticas', out.getvalue())
+
+    def test_corregir(self):
+        """Corrige las estadísticas alteradas y crea las que faltan"""
+        EstadisticasMoviles.objects.filter(producto_contratado=self.contrato).update(media_3=99, n_6=1)
+        out = StringIO()
+        call_command('reconciliar_estadisticas', stdout=out)
+        self.assertIn('1 con diferencias, 1 sin estadísticas', out.getvalue())
+        self.assertEqual(EstadisticasMoviles.objects.get(producto_contratado=self.contrato).media_3, 99)
+
+        call_command('reconciliar_estadisticas', corregir=True, stdout=StringIO())
+        estadisticas = EstadisticasMoviles.objects.get(producto_contratado=self.contrato)
+        self.assertAlmostEqual(estadisticas.media_3, 2.0)
+        self.assertEqual(estadisticas.n_6, 4)
+        self.assertEqual(EstadisticasMoviles.objects.get(producto_contratado=self.sin_resultados).n_12, 0)
+
+
+class CierreMensualCommandTest(TestCase):
+    """Tests para el comando cierre_mensual"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='testuser', email='test@example.com')
+        productos = [
+            Producto.objects.create(nombre=f'Producto {indice}', codigo=f'CIE00{indice}') for indice in range(3)
+        ]
+        inicio = timezone.make_aware(timezone.datetime(2025, 1, 10))
+        self.contratos = [
+            ProductoContratado.objects.create(
+                usuario=self.usuario, producto=producto, monto_invertido=Decimal('1000'),
+                participaciones=Decimal(capital), fecha_inicio=inicio
+            )
+            for producto, capital in zip(productos, ('1100', '400'))
+        ]
+        ProductoContratado.objects.create(
+            usuario=self.usuario, producto=productos[2], monto_invertido=Decimal('300'),
+            participaciones=Decimal('300'), estado='inactivo', fecha_inicio=inicio
+        )
+        Resultado.objects.create(
+            usuario=self.usuario, producto_contratado=self.contratos[0],
+            fecha=date(2025, 1, 31), capital_mes=Decimal('1000')
+        )
+
+    def test_cierre_con_cambios_y_totales(self):
+        """Un resultado por contrato activo y el total del usuario, con sus cambios"""
+        out = StringIO()
+        call_command('cierre_mensual', mes='2025-02', procesos=1, stdout=out)
+        self.assertIn('2 resultado(s) de contratos y 1 total(es) de usuario', out.getvalue())
+
+        cierre = Resultado.objects.filter(fecha=date(2025, 2, 28))
+        primero = cierre.get(producto_contratado=self.contratos[0])
+        self.assertEqual(primero.capital_mes, Decimal('1100'))
+        self.assertEqual(primero.cambio_mensual, Decimal('100'))
+        self.assertEqual(primero.porcentaje_cambio, Decimal('10.00'))
+        self.assertEqual(cierre.get(producto_contratado=self.contratos[1]).cambio_mensual, 0)
+        self.assertEqual(cierre.get(producto_contratado__isnull=True).capital_mes, Decimal('1500'))
+
+    def test_repetir_no_duplica(self):
+        call_command('cierre_mensual', mes='2025-02', procesos=1, tamano_lote=1, stdout=StringIO())
+        out = StringIO()
+        call_command('cierre_mensual', mes='2025-02', procesos=1, stdout=out)
+        self.assertIn('0 resultado(s) de contratos y 0 total(es) de usuario', out.getvalue())
+        self.assertEqual(Resultado.objects.filter(fecha=date(2025, 2, 28)).count(), 3)
+
+    def test_valor_liquidativo_de_la_fecha_de_cierre(self):
+        """Un mes pasado se cierra con el NAV de entonces, no con el de hoy"""
+        producto = self.contratos[0].producto
+        producto.registrar_valor_liquidativo(date(2025, 2, 20), Decimal('1.5'))
+        producto.registrar_valor_liquidativo(date(2025, 3, 31), Decimal('2'))
+        call_command('cierre_mensual', mes='2025-02', procesos=1, stdout=StringIO())
+
+        cierre = Resultado.objects.filter(fecha=date(2025, 2, 28))
+        self.assertEqual(cierre.get(producto_contratado=self.contratos[0]).capital_mes, Decimal('1650'))
+        # Sin serie hasta esa fecha: el valor actual
+        self.assertEqual(cierre.get(producto_contratado=self.contratos[1]).capital_mes, Decimal('400'))
+        self.assertEqual(cierre.get(producto_contratado__isnull=True).capital_mes, Decimal('2050'))
+
+    def test_contratos_posteriores_no_entran(self):
+        out = StringIO()
+        call_command('cierre_mensual', mes='2024-12', procesos=1, stdout=out)
+        self.assertIn('0 resultado(s) de contratos y 0 total(es) de usuario', out.getvalue())
+
+
+class RevalorizarCommandTest(TestCase):
+    """Tests para el comando revalorizar"""
+
+    def setUp(self):
+        usuario = Usuario.objects.create_user(username='testuser', email='test@example.com')
+        Producto.objects.create(nombre='Producto', codigo='REV001')
+        self.contrato = ProductoContratado.objects.create(
+            usuario=usuario, producto=Producto.objects.get(codigo='REV001'),
+            monto_invertido=Decimal('1000'), participaciones=Decimal('1000')
+        )
+
+    def test_informe_y_simulacion(self):
+        out = StringIO()
+        call_command('revalorizar', rendimiento=['REV001=3'], fecha=date(2025, 3, 31), simular=True, stdout=out)
+        self.assertIn('REV001 1.000000 → 1.030000 · 1 contrato(s), 1 usuario(s) · 1,000.00 € → 1,030.00 €', out.getvalue())
+        self.contrato.refresh_from_db()
+        self.assertEqual(self.contrato.capital_actual, Decimal('1000'))
+
+        call_command('revalorizar', rendimiento=['REV001=3'], fecha=date(2025, 3, 31), stdout=StringIO())
+        self.contrato.refresh_from_db()
+        self.assertEqual(self.contrato.capital_actual, Decimal('1030'))
+
+    def test_producto_desconocido(self):
+        with self.assertRaises(CommandError):
+            call_command('revalorizar', rendimiento=['NOEXISTE=1'], stdout=StringIO())
+
+
+class GuardarInstantaneasCommandTest(TestCase):
+    """Tests para el comando guardar_instantaneas"""
+
+    def setUp(self):
+        usuario = Usuario.objects.create_user(username='testuser', email='test@example.com')
+        contrato = ProductoContratado.objects.create(
+            usuario=usuario, producto=Producto.objects.create(nombre='Producto', codigo='INS001'),
+            monto_invertido=Decimal('1000')
+        )
+        for tipo, fecha, importe in (('aportacion', date(2025, 1, 2), '1000'), ('valoracion', date(2025, 1, 31), '990')):
+            MovimientoCapital.objects.create(
+                usuario=usuario, producto_contratado=contrato, tipo=tipo, fecha=fecha, importe=Decimal(importe)
+            )
+
+    def test_guarda_y_repite(self):
+        for _ in range(2):
+            out = StringIO()
+            call_command('guardar_instantaneas', fecha=date(2025, 1, 31), stdout=out)
+            self.assertIn('1 instantánea(s) a 2025-01-31', out.getvalue())
+        instantanea = InstantaneaSaldo.objects.get()
+        self.assertEqual((instantanea.saldo, instantanea.aportado_neto), (Decimal('990'), Decimal('1000')))
+
+    def test_sin_movimientos_hasta_la_fecha(self):
+        out = StringIO()
+        call_command('guardar_instantaneas', fecha=date(2024, 12, 31), stdout=out)
+        self.assertIn('0 instantánea(s)', out.getvalue())
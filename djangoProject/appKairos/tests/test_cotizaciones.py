@@ -0,0 +1,152 @@
+"""
+Tests del almacén de cotizaciones OHLC (appKairos.cotizaciones)
+"""
+import shutil
+import tempfile
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from pathlib import Path
+
+import numpy as np
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from appKairos import cotizaciones
+from appKairos.cotizaciones import almacen as modulo_almacen
+from appKairos.models import Mercado, Producto, ProductoContratado, Usuario
+
+
+def minutos(inicio, n, precio=100.0):
+    """n barras de minuto desde inicio, con cierres que suben de uno en uno"""
+    barras = np.empty(n, dtype=cotizaciones.BARRA)
+    barras['fecha'] = np.datetime64(inicio, 's') + np.arange(n) * np.timedelta64(60, 's')
+    barras['apertura'] = precio + np.arange(n)
+    barras['cierre'] = barras['apertura'] + 1
+    barras['maximo'] = barras['cierre'] + 0.5
+    barras['minimo'] = barras['apertura'] - 0.5
+    barras['volumen'] = 1
+    return barras
+
+
+class CotizacionesTestCase(TestCase):
+    """Cada test con su propio directorio de cotizaciones"""
+
+    def setUp(self):
+        self.directorio = tempfile.mkdtemp()
+        ajustes = override_settings(COTIZACIONES_DIR=self.directorio)
+        ajustes.enable()
+        self.addCleanup(ajustes.disable)
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        self.almacen = cotizaciones.obtener_almacen()
+
+
+class AlmacenTest(CotizacionesTestCase):
+    """Tests de escritura, lectura por rangos y agregación"""
+
+    def test_remuestrear(self):
+        barras = np.concatenate([minutos('2024-01-31T23:58', 2), minutos('2024-02-01T00:00', 3, precio=200)])
+        dias = cotizaciones.remuestrear(barras, 'dia')
+        self.assertEqual(dias['fecha'].astype('M8[D]').astype(str).tolist(), ['2024-01-31', '2024-02-01'])
+        self.assertEqual(dias['apertura'].tolist(), [100, 200])
+        self.assertEqual(dias['cierre'].tolist(), [102, 203])
+        self.assertEqual(dias['maximo'].tolist(), [102.5, 203.5])
+        self.assertEqual(dias['minimo'].tolist(), [99.5, 199.5])
+        self.assertEqual(dias['volumen'].tolist(), [2, 3])
+        self.assertEqual(len(cotizaciones.remuestrear(barras, 'mes')), 2)
+
+    def test_rangos_entre_bloques(self):
+        n = modulo_almacen.BLOQUE * 3 + 10
+        self.almacen.agregar('SP500', 'minuto', minutos('2024-01-01', n))
+        desde = np.datetime64('2024-01-01T00:00', 's') + np.timedelta64(60 * 1500, 's')
+        hasta = desde + np.timedelta64(60 * 1100, 's')
+        rango = self.almacen.barras('SP500', 'minuto', desde, hasta)
+        self.assertEqual((len(rango), rango['fecha'][0], rango['fecha'][-1]), (1101, desde, hasta))
+        # Es una vista del fichero, no una copia
+        self.assertIsInstance(rango.base, np.memmap)
+        self.assertEqual(len(self.almacen.barras('SP500', 'minuto', hasta='2023-12-31')), 0)
+        self.assertEqual(len(self.almacen.barras('SP500', 'minuto', desde='2024-02-01')), 0)
+        self.assertEqual(len(self.almacen.barras('NasdaQ', 'minuto')), 0)
+
+        # Otro proceso (otra instancia) lee lo mismo, con el índice del disco
+        otro = cotizaciones.AlmacenCotizaciones(self.directorio)
+        self.assertEqual(len(otro.barras('SP500', 'minuto', desde, hasta)), 1101)
+
+    def test_solo_anexado(self):
+        self.almacen.agregar('SP500', 'minuto', minutos('2024-01-01T10:00', 5))
+        nuevas = self.almacen.agregar('SP500', 'minuto', minutos('2024-01-01T10:03', 5))
+        self.assertEqual(len(nuevas), 3)
+        self.assertEqual(len(self.almacen.barras('SP500', 'minuto')), 8)
+        with self.assertRaises(ValueError):
+            self.almacen.agregar('SP500', 'minuto', minutos('2024-01-02', 3)[::-1])
+        with self.assertRaises(ValueError):
+            self.almacen.barras('../SP500', 'minuto')
+
+    def test_importar_completa_el_dia_en_curso(self):
+        cotizaciones.importar(self.almacen, 'SP500', minutos('2024-01-01T10:00', 3))
+        guardadas = cotizaciones.importar(self.almacen, 'SP500', minutos('2024-01-01T10:00', 6))
+        self.assertEqual(guardadas, {'minuto': 3, 'hora': 1, 'dia': 1, 'mes': 1})
+        # Reimportar lo mismo no suma otra vez el volumen
+        cotizaciones.importar(self.almacen, 'SP500', minutos('2024-01-01T10:00', 6))
+        dia = self.almacen.barras('SP500', 'dia')
+        self.assertEqual(len(dia), 1)
+        self.assertEqual((dia['apertura'][0], dia['cierre'][0], dia['volumen'][0]), (100, 106, 6))
+
+
+class ImportarCotizacionesCommandTest(CotizacionesTestCase):
+    """Tests del comando importar_cotizaciones y de las vistas que leen cotizaciones"""
+
+    def setUp(self):
+        super().setUp()
+        self.mercado = Mercado.objects.create(nombre='S&P 500', codigo='SP500')
+        self.csv = Path(self.directorio) / 'sp500.csv'
+        self.csv.write_text(
+            'Date\tOpen\tHigh\tLow\tClose\tVolume\n'
+            '2024.01.02 09:30\t100\t101\t99\t100.5\t10\n'
+            '2024.01.02 09:31\t100.5\t102\t100\t101\t5\n'
+            '2024.01.31 16:00\t104\t106\t103\t105\t1\n'
+            '2024.02.01 09:30\t105\t111\t104\t110\t2\n'
+        )
+
+    def test_importa_y_agrega(self):
+        salida = StringIO()
+        call_command('importar_cotizaciones', str(self.csv), mercado='SP500', stdout=salida)
+        self.assertIn('✓ SP500: minuto: 4 · hora: 3 · dia: 3 · mes: 2', salida.getvalue())
+        meses = cotizaciones.barras('SP500', 'mes')
+        self.assertEqual(meses['cierre'].tolist(), [105, 110])
+        self.assertEqual(meses['maximo'].tolist(), [106, 111])
+        self.assertEqual(cotizaciones.rendimiento('SP500', date(2024, 2, 1)), 4.76)
+
+    def test_vistas(self):
+        call_command('importar_cotizaciones', str(self.csv), mercado='SP500', agregar=['dia'], stdout=StringIO())
+        usuario = Usuario.objects.create_user(username='cotizaciones', email='cotizaciones@example.com')
+        self.client.force_login(usuario)
+
+        respuesta = self.client.get(
+            reverse('appKairos:cotizaciones_mercado', args=['SP500']), {'desde': '2024-01-03'}
+        )
+        self.assertEqual(respuesta.json()['fechas'], ['2024-01-31', '2024-02-01'])
+        self.assertEqual(respuesta.json()['cierre'], [105, 110])
+        respuesta = self.client.get(reverse('appKairos:cotizaciones_mercado', args=['SP500']), {'resolucion': 'año'})
+        self.assertEqual(respuesta.status_code, 400)
+
+        producto = Producto.objects.create(nombre='Producto', codigo='COT001')
+        producto.mercados.add(self.mercado)
+        ProductoContratado.objects.create(
+            usuario=usuario, producto=producto, monto_invertido=Decimal('1000'), estado='activo'
+        )
+        respuesta = self.client.get(reverse('appKairos:dashboard'))
+        # Contratado hoy: no hay cotizaciones del periodo
+        self.assertEqual(respuesta.context['comparativas'], [])
+
+        # Un código que el almacén no admite no rompe el dashboard
+        producto.mercados.add(Mercado.objects.create(nombre='EUR/USD', codigo='EUR/USD'))
+        respuesta = self.client.get(reverse('appKairos:dashboard'))
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.context['comparativas'], [])
+
+    def test_mercado_inexistente(self):
+        with self.assertRaises(CommandError):
+            call_command('importar_cotizaciones', str(self.csv), mercado='DAX', stdout=StringIO())
@@ -0,0 +1,612 @@
+"""
+Tests para el acceso a base de datos (appKairos.db): réplicas, auditoría,
+shards, pool de conexiones y SQLite
+"""
+from django.test import SimpleTestCase, TestCase, RequestFactory, override_settings
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connections, router, transaction
+from django.db.backends.postgresql import base as postgresql
+from django.http import HttpResponse
+from django.urls import reverse
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+from unittest.mock import patch
+import tempfile
+import threading
+import time
+import os
+
+from appKairos.analitica import drawdown, libro
+from appKairos.db import particiones, pool as pool_modulo, routers
+from appKairos.db.middleware import ReplicaStickyMiddleware, COOKIE_PRIMARIA
+from appKairos.db.pool import PoolAgotado, PoolConexiones
+from appKairos.db.routers import en_replica
+from appKairos.db.shards import RANGO_IDS, consultar_shards, contar_shards, shard_de
+from appKairos.models import (
+    EstadisticasMoviles, EstadoDrawdown, InstantaneaSaldo, Mercado, MovimientoCapital, Producto,
+    ProductoContratado, Resultado, Usuario, SesionSeguridad, TokenVerificacionEmail,
+    TokenRecuperacionPassword, ValorLiquidativo
+)
+from appKairos.revalorizacion import revalorizar
+from appKairos.series import serie_shards
+
+
+class BaseDatosExtraMixin:
+    """Permite añadir bases de datos SQLite en ficheros temporales durante el test"""
+
+    def setUp(self):
+        super().setUp()
+        self.directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directorio.cleanup)
+
+    def agregar_bd(self, alias, nombre, modelos=(), **ajustes):
+        ruta = os.path.join(self.directorio.name, nombre)
+        connections.settings[alias] = {**connections.settings['default'], 'NAME': ruta, **ajustes}
+        self.addCleanup(self.quitar_bd, alias)
+        if modelos:
+            with connections[alias].schema_editor() as editor:
+                for modelo in modelos:
+                    editor.create_model(modelo)
+
+    def quitar_bd(self, alias):
+        connections[alias].close()
+        del connections[alias]
+        del connections.settings[alias]
+
+
+class ReplicaSQLiteMixin(BaseDatosExtraMixin):
+    """Añade una réplica 'replica' en un segundo fichero SQLite con la tabla de mercados"""
+
+    def setUp(self):
+        super().setUp()
+        self.agregar_bd('replica', 'replica.sqlite3', [Mercado])
+        routers._salud.clear()
+        self.addCleanup(routers._salud.clear)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRouterTest(ReplicaSQLiteMixin, TestCase):
+    """Tests del router con dos ficheros SQLite"""
+
+    def setUp(self):
+        super().setUp()
+        Mercado.objects.create(nombre='En primaria', codigo='PRI')
+        Mercado.objects.using('replica').create(nombre='En réplica', codigo='REP')
+
+    def test_lecturas_normales_en_primaria(self):
+        self.assertEqual(Mercado.objects.get().codigo, 'PRI')
+
+    def test_lecturas_de_solo_lectura_en_replica(self):
+        with en_replica():
+            mercado = Mercado.objects.get()
+        self.assertEqual(mercado.codigo, 'REP')
+        self.assertEqual(mercado._state.db, 'replica')
+
+    def test_guardar_instancia_de_replica_escribe_en_primaria(self):
+        with en_replica():
+            mercado = Mercado.objects.get()
+            mercado.pk = None
+            mercado.save()
+        self.assertTrue(Mercado.objects.using('default').filter(codigo='REP').exists())
+
+    def test_pegado_a_primaria(self):
+        with en_replica(), routers.pegado_a_primaria():
+            self.assertEqual(Mercado.objects.get().codigo, 'PRI')
+
+    @override_settings(DATABASE_REPLICAS=['rota', 'replica'])
+    def test_replica_caida(self):
+        """Una réplica que no responde se excluye del reparto"""
+        self.agregar_bd('rota', os.path.join('no-existe', 'rota.sqlite3'))
+        with self.assertLogs('appKairos.db.routers', 'WARNING'):
+            self.assertFalse(routers.replica_sana('rota'))
+        with en_replica():
+            for _ in range(5):
+                self.assertEqual(Mercado.objects.get().codigo, 'REP')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'], DATABASE_REPLICA_STICKY_SEGUNDOS=60)
+class ReplicaStickyMiddlewareTest(TestCase):
+    """Tests de la lectura tras escritura"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.pegados = []
+
+        def vista(request):
+            self.pegados.append(routers._pegado_primaria.get())
+            return HttpResponse()
+        self.middleware = ReplicaStickyMiddleware(vista)
+
+    def test_escritura_fija_cookie(self):
+        response = self.middleware(self.factory.post('/dashboard/'))
+        self.assertIn(COOKIE_PRIMARIA, response.cookies)
+        self.assertEqual(self.pegados, [True])
+
+    def test_cookie_lee_de_primaria(self):
+        cookie = self.middleware(self.factory.post('/dashboard/')).cookies[COOKIE_PRIMARIA].value
+
+        request = self.factory.get('/dashboard/')
+        request.COOKIES[COOKIE_PRIMARIA] = cookie
+        self.middleware(request)
+        self.middleware(self.factory.get('/dashboard/'))
+
+        self.assertEqual(self.pegados, [True, True, False])
+
+
+@override_settings(DATABASE_AUDITORIA='auditoria')
+class AuditoriaRouterTest(BaseDatosExtraMixin, TestCase):
+    """Logs y tokens en un segundo fichero SQLite, usuarios en 'default'"""
+
+    def setUp(self):
+        super().setUp()
+        self.agregar_bd(
+            'auditoria', 'auditoria.sqlite3',
+            [SesionSeguridad, TokenVerificacionEmail, TokenRecuperacionPassword]
+        )
+        self.usuario = Usuario.objects.create_user(
+            username='testuser', email='test@example.com', password='TestPass123!'
+        )
+        self.sesion = SesionSeguridad.objects.create(usuario=self.usuario, ip_address='127.0.0.1', exitoso=True)
+
+    def test_modelos_en_auditoria(self):
+        self.assertEqual(self.sesion._state.db, 'auditoria')
+        self.assertEqual(SesionSeguridad.objects.using('auditoria').count(), 1)
+        # El usuario se resuelve en la base de datos principal
+        self.assertEqual(SesionSeguridad.objects.get().usuario, self.usuario)
+
+    def test_migraciones(self):
+        self.assertTrue(router.allow_migrate_model('auditoria', SesionSeguridad))
+        self.assertFalse(router.allow_migrate_model('default', SesionSeguridad))
+        self.assertFalse(router.allow_migrate_model('auditoria', Usuario))
+        self.assertFalse(router.allow_migrate('auditoria', 'auth'))
+
+    def test_busqueda_admin_por_email(self):
+        admin = site._registry[SesionSeguridad]
+        SesionSeguridad.objects.create(ip_address='10.0.0.1')
+        resultados, _ = admin.get_search_results(None, SesionSeguridad.objects.all(), 'test@')
+        self.assertEqual(list(resultados), [self.sesion])
+
+    def test_borrar_usuario_borra_auditoria(self):
+        self.usuario.delete()
+        self.assertFalse(SesionSeguridad.objects.exists())
+
+
+SHARDS = ['default', 'shard_1', 'shard_2']
+
+
+@override_settings(DATABASE_SHARDS=SHARDS)
+class ShardRouterTest(BaseDatosExtraMixin, TestCase):
+    """Tres shards: 'default' y dos ficheros SQLite con contratos, resultados y catálogo"""
+
+    def setUp(self):
+        super().setUp()
+        for alias in SHARDS[1:]:
+            self.agregar_bd(alias, f'{alias}.sqlite3', [
+                Mercado, Producto, ValorLiquidativo, ProductoContratado, Resultado, EstadoDrawdown,
+                EstadisticasMoviles, MovimientoCapital, InstantaneaSaldo
+            ])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.mercado = Mercado.objects.create(nombre='Oro', codigo='XAUUSD')
+            self.producto = Producto.objects.create(nombre='Kairos Gold', codigo='KGOLD')
+
+        # Un usuario en cada shard
+        self.usuarios = {}
+        n = 0
+        while len(self.usuarios) < len(SHARDS):
+            n += 1
+            # Sin contraseña: no hace falta el hash, que es lento a propósito
+            usuario = Usuario.objects.create_user(username=f'user{n}', email=f'user{n}@example.com')
+            self.usuarios.setdefault(shard_de(usuario), usuario)
+
+    def contratar(self, alias, monto):
+        return ProductoContratado.objects.create(
+            usuario=self.usuarios[alias], producto=self.producto, monto_invertido=Decimal(monto)
+        )
+
+    def test_hash_estable_y_repartido(self):
+        self.assertEqual(shard_de(12345), shard_de(12345))
+        repartidos = [shard_de(usuario_id) for usuario_id in range(3000)]
+        for alias in SHARDS:
+            self.assertGreater(repartidos.count(alias), 800)
+
+    def test_datos_en_el_shard_del_usuario(self):
+        contrato = self.contratar('shard_2', 100)
+        resultado = Resultado.objects.create(
+            usuario=self.usuarios['shard_2'], producto_contratado=contrato,
+            capital_mes=Decimal('100')
+        )
+        self.assertEqual((contrato._state.db, resultado._state.db), ('shard_2', 'shard_2'))
+        self.assertFalse(ProductoContratado.objects.using('default').exists())
+
+        usuario = self.usuarios['shard_2']
+        self.assertEqual(list(usuario.productos_contratados.all()), [contrato])
+        self.assertEqual(list(Resultado.objects.para_usuario(usuario)), [resultado])
+        # JOIN con el catálogo replicado dentro del shard y usuario desde 'default'
+        leido = ProductoContratado.objects.para_usuario(usuario).select_related('producto').get()
+        self.assertEqual(leido.producto.nombre, 'Kairos Gold')
+        self.assertEqual(leido.usuario, usuario)
+        # Participaciones × valor liquidativo del catálogo replicado en el shard
+        self.assertEqual(usuario.calcular_capital_total(), Decimal('100'))
+
+    def test_catalogo_replicado(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.nombre = 'Kairos Oro'
+            self.producto.save()
+            self.producto.mercados.add(self.mercado)
+        for alias in SHARDS[1:]:
+            copia = Producto.objects.using(alias).get(pk=self.producto.pk)
+            self.assertEqual(copia.nombre, 'Kairos Oro')
+            self.assertEqual(list(copia.mercados.values_list('codigo', flat=True)), ['XAUUSD'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.producto.mercados.clear()
+            self.mercado.delete()
+        for alias in SHARDS[1:]:
+            self.assertFalse(Mercado.objects.using(alias).exists())
+            self.assertFalse(Producto.mercados.through.objects.using(alias).exists())
+
+    def test_valor_liquidativo_en_los_shards(self):
+        contrato = self.contratar('shard_1', 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            informe = revalorizar({self.producto: '10'}, date(2025, 1, 31))
+        self.assertEqual([fila['alias'] for fila in informe], ['shard_1'])
+        self.assertEqual(ProductoContratado.objects.using('shard_1').get(pk=contrato.pk).capital_actual, Decimal('110'))
+        for alias in SHARDS[1:]:
+            self.assertEqual(ValorLiquidativo.objects.using(alias).get().valor, Decimal('1.1'))
+        self.assertEqual(Usuario.objects.get(pk=self.usuarios['shard_1'].pk).capital_total, Decimal('110'))
+
+    def test_simulacion_no_escribe_en_los_shards(self):
+        contrato = self.contratar('shard_1', 100)
+        with self.captureOnCommitCallbacks(execute=True):
+            informe = revalorizar({self.producto: '50'}, date(2025, 1, 31), simular=True)
+        self.assertEqual(informe[0]['capital_despues'], Decimal('150'))
+        self.assertEqual(ProductoContratado.objects.using('shard_1').get(pk=contrato.pk).capital_actual, Decimal('100'))
+        self.assertFalse(Resultado.objects.using('shard_1').exists())
+        self.assertFalse(MovimientoCapital.objects.using('shard_1').filter(tipo='valoracion').exists())
+        for alias in SHARDS:
+            self.assertEqual(Producto.objects.using(alias).get(pk=self.producto.pk).valor_liquidativo, Decimal('1'))
+            self.assertFalse(ValorLiquidativo.objects.using(alias).exists())
+
+    def test_consulta_repartida_ordenada(self):
+        for alias, monto in (('shard_1', 300), ('default', 100), ('shard_2', 200), ('shard_1', 50)):
+            otro = Producto.objects.using(alias).get(pk=self.producto.pk)
+            otro.pk = None
+            otro.codigo = f'P{monto}'
+            otro.save(using=alias)
+            ProductoContratado.objects.create(
+                usuario=self.usuarios[alias], producto=otro, monto_invertido=Decimal(monto)
+            )
+        consulta = ProductoContratado.objects.order_by('-monto_invertido')
+        self.assertEqual(contar_shards(consulta), 4)
+        montos = [c.monto_invertido for c in consultar_shards(consulta)]
+        self.assertEqual(montos, [300, 200, 100, 50])
+        self.assertEqual([c.monto_invertido for c in consultar_shards(consulta, 1, 3)], [200, 100])
+
+    def test_serie_repartida_ordenada(self):
+        for alias, anio in (('shard_1', 2023), ('default', 2025), ('shard_2', 2024)):
+            Resultado.objects.create(usuario=self.usuarios[alias], fecha=date(anio, 1, 1), capital_mes=anio)
+        serie = serie_shards(Resultado.objects.order_by('-fecha'), 'capital_mes', fin=2)
+        self.assertEqual(serie, {'capital_mes': [202500, 202400]})
+
+    def test_admin_lista_todos_los_shards(self):
+        # Con los rangos de ids reservados, el id dice en qué shard está cada contrato
+        call_command('preparar_shards', stdout=StringIO())
+        for alias in SHARDS:
+            self.contratar(alias, 100)
+        self.client.force_login(Usuario.objects.create_superuser(username='admin', email='admin@example.com'))
+
+        respuesta = self.client.get(reverse('admin:appKairos_productocontratado_changelist'))
+        self.assertEqual(respuesta.status_code, 200)
+        for usuario in self.usuarios.values():
+            self.assertContains(respuesta, usuario.email)
+
+        contrato = ProductoContratado.objects.using('shard_1').get()
+        respuesta = self.client.get(reverse('admin:appKairos_productocontratado_change', args=[contrato.pk]))
+        self.assertContains(respuesta, contrato.usuario.email)
+
+    def test_rangos_de_ids(self):
+        call_command('preparar_shards', stdout=StringIO())
+        contrato = self.contratar('shard_2', 100)
+        self.assertEqual(contrato.pk, 2 * RANGO_IDS)
+        self.assertEqual(self.contratar('default', 100).pk // RANGO_IDS, 0)
+
+    def test_mover_filas_mal_ubicadas(self):
+        # Datos creados antes de activar el sharding: todo en 'default'
+        usuario = self.usuarios['shard_1']
+        contrato = ProductoContratado.objects.using('default').create(
+            usuario=usuario, producto=self.producto, monto_invertido=Decimal('100')
+        )
+        Resultado.objects.using('default').create(
+            usuario=usuario, producto_contratado=contrato, capital_mes=Decimal('100')
+        )
+        libro.aportar(contrato, contrato.monto_invertido)
+        call_command('preparar_shards', mover=True, stdout=StringIO())
+        self.assertFalse(ProductoContratado.objects.using('default').exists())
+        self.assertEqual(ProductoContratado.objects.para_usuario(usuario).get().pk, contrato.pk)
+        self.assertEqual(Resultado.objects.para_usuario(usuario).count(), 1)
+        self.assertFalse(MovimientoCapital.objects.using('default').exists())
+        self.assertEqual(libro.rendimientos(usuario)['saldo'], Decimal('100'))
+        # El estado de drawdown se rehace en el shard del usuario
+        self.assertFalse(EstadoDrawdown.objects.using('default').exists())
+        self.assertEqual(drawdown.estado(usuario).resultados, 1)
+
+    def test_borrar_usuario_borra_sus_datos(self):
+        self.contratar('shard_1', 100)
+        self.usuarios['shard_1'].delete()
+        self.assertFalse(ProductoContratado.objects.using('shard_1').exists())
+
+    def test_migraciones(self):
+        self.assertTrue(router.allow_migrate_model('shard_1', ProductoContratado))
+        self.assertTrue(router.allow_migrate_model('shard_1', Producto))
+        self.assertFalse(router.allow_migrate_model('shard_1', Usuario))
+        self.assertFalse(router.allow_migrate_model('shard_1', SesionSeguridad))
+        self.assertTrue(router.allow_migrate_model('default', ProductoContratado))
+
+
+class ParticionesResultadoTest(SimpleTestCase):
+    """Particionado por fecha de Resultado: periodos y SQL generado (PostgreSQL)"""
+
+    def setUp(self):
+        self.conexion = postgresql.DatabaseWrapper({**connections.settings['default'], 'NAME': 'kairos'}, 'pruebas_pg')
+
+    def test_periodos(self):
+        mensuales = [s for s, _, _ in particiones.periodos('mensual', date(2024, 11, 15), date(2025, 2, 1))]
+        self.assertEqual(mensuales, ['p2024_11', 'p2024_12', 'p2025_01', 'p2025_02'])
+        anuales = list(particiones.periodos('anual', date(2024, 6, 1), date(2025, 1, 1)))
+        self.assertEqual(anuales, [
+            ('p2024', date(2024, 1, 1), date(2025, 1, 1)),
+            ('p2025', date(2025, 1, 1), date(2026, 1, 1)),
+        ])
+        self.assertEqual(particiones.fin_adelante('mensual', 12, date(2025, 3, 10)), date(2026, 3, 1))
+
+    def test_sql_crear_particiones(self):
+        sentencias = particiones.sql_crear_particiones(
+            self.conexion, 'appKairos_resultado', 'anual', date(2025, 5, 1), date(2025, 5, 1)
+        )
+        self.assertEqual(sentencias, [(
+            'CREATE TABLE IF NOT EXISTS "appKairos_resultado_p2025" PARTITION OF "appKairos_resultado" '
+            'FOR VALUES FROM (%s) TO (%s)',
+            [date(2025, 1, 1), date(2026, 1, 1)],
+        )])
+
+    def test_restricciones_incluyen_columna_de_particion(self):
+        base = {'primary_key': False, 'unique': False, 'foreign_key': None, 'check': False, 'index': False}
+        restricciones = {
+            'pk': {**base, 'columns': ['id'], 'primary_key': True, 'unique': True},
+            'unico': {**base, 'columns': ['usuario_id', 'producto_contratado_id', 'fecha'], 'unique': True},
+            'fk': {**base, 'columns': ['producto_contratado_id'],
+                   'foreign_key': ('appKairos_productocontratado', 'id')},
+            'idx': {**base, 'columns': ['usuario_id', 'fecha'], 'index': True, 'type': 'idx', 'orders': ['ASC', 'DESC']},
+        }
+        sentencias = particiones.sql_restricciones(self.conexion, 'r', restricciones)
+        self.assertEqual(sentencias, [
+            'ALTER TABLE "r" ADD CONSTRAINT "fk" FOREIGN KEY ("producto_contratado_id") '
+            'REFERENCES "appKairos_productocontratado" ("id") DEFERRABLE INITIALLY DEFERRED',
+            'CREATE INDEX "idx" ON "r" ("usuario_id", "fecha" DESC)',
+            'ALTER TABLE "r" ADD CONSTRAINT "pk" PRIMARY KEY ("id", "fecha")',
+            'ALTER TABLE "r" ADD CONSTRAINT "unico" UNIQUE ("usuario_id", "producto_contratado_id", "fecha")',
+        ])
+
+    def test_anio_de_particion(self):
+        self.assertEqual(particiones.anio_de_particion('appKairos_resultado', 'appKairos_resultado_p2023'), 2023)
+        self.assertEqual(particiones.anio_de_particion('appKairos_resultado', 'appKairos_resultado_p2023_07'), 2023)
+        self.assertIsNone(particiones.anio_de_particion('appKairos_resultado', 'appKairos_resultado_pdefault'))
+
+    def test_comando_requiere_postgresql(self):
+        with self.assertRaisesMessage(CommandError, 'no está activado'):
+            call_command('particiones_resultado', stdout=StringIO())
+        with override_settings(RESULTADO_PARTICIONES='anual'):
+            with self.assertRaisesMessage(CommandError, 'PostgreSQL'):
+                call_command('particiones_resultado', stdout=StringIO())
+
+
+class ConsultasResultadoTest(TestCase):
+    """Consultas de Resultado que pueden aprovechar la poda de particiones"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='testuser', email='test@example.com')
+        for anio in (2023, 2024, 2025):
+            Resultado.objects.create(
+                usuario=self.usuario, fecha=date(anio, 6, 30), capital_mes=Decimal('100')
+            )
+
+    def test_sin_orden_por_defecto(self):
+        self.assertEqual(Resultado._meta.ordering, [])
+        self.assertNotIn('ORDER BY', str(Resultado.objects.filter(usuario=self.usuario).query))
+
+    def test_filtro_de_anio_por_rango_de_fecha(self):
+        self.client.force_login(Usuario.objects.create_superuser(username='admin', email='admin@example.com'))
+        url = reverse('admin:appKairos_resultado_changelist')
+        respuesta = self.client.get(url, {'anio': '2024'})
+        self.assertEqual([r.anio for r in respuesta.context['cl'].result_list], [2024])
+        self.assertIn('BETWEEN', str(respuesta.context['cl'].queryset.query))
+        # Los años ofrecidos salen del rango de fechas
+        respuesta = self.client.get(url)
+        filtro = respuesta.context['cl'].filter_specs[0]
+        self.assertEqual([valor for valor, _ in filtro.lookup_choices], ['2025', '2024', '2023'])
+
+
+class CursorFalso:
+
+    def __init__(self, conexion):
+        self.conexion = conexion
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+    def execute(self, sql, params=None):
+        if not self.conexion.sana:
+            raise OSError('conexión caída')
+
+
+class ConexionFalsa:
+    """Sustituto de una conexión DB-API para probar el pool sin servidor"""
+
+    def __init__(self):
+        self.closed = False
+        self.sana = True
+        self.autocommit = True
+
+    def cursor(self):
+        return CursorFalso(self)
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+class PoolConexionesTest(SimpleTestCase):
+    """Tests del pool genérico con conexiones simuladas"""
+
+    def crear_pool(self, **opciones):
+        self.abiertas = []
+
+        def fabrica():
+            conexion = ConexionFalsa()
+            self.abiertas.append(conexion)
+            return conexion
+        return PoolConexiones(fabrica, **opciones)
+
+    def test_reutiliza_conexiones(self):
+        pool = self.crear_pool()
+        conexion = pool.obtener()
+        pool.devolver(conexion)
+        self.assertIs(pool.obtener(), conexion)
+        self.assertEqual(pool.metricas()['creadas'], 1)
+
+    def test_maximo_y_timeout(self):
+        pool = self.crear_pool(maximo=2, timeout=0.05)
+        pool.obtener()
+        pool.obtener()
+        with self.assertRaises(PoolAgotado):
+            pool.obtener()
+        metricas = pool.metricas()
+        self.assertEqual((metricas['en_uso'], metricas['timeouts']), (2, 1))
+
+    def test_espera_conexion_libre(self):
+        pool = self.crear_pool(maximo=1, timeout=5)
+        conexion = pool.obtener()
+        temporizador = threading.Timer(0.05, pool.devolver, [conexion])
+        temporizador.start()
+        self.assertIs(pool.obtener(), conexion)
+        temporizador.join()
+        self.assertEqual(pool.metricas()['esperas'], 1)
+
+    def test_verificacion_al_entregar(self):
+        """Una conexión caída mientras estaba libre se sustituye por otra"""
+        pool = self.crear_pool(verificar_tras=0)
+        conexion = pool.obtener()
+        pool.devolver(conexion)
+        conexion.sana = False
+
+        nueva = pool.obtener()
+        self.assertIsNot(nueva, conexion)
+        self.assertTrue(conexion.closed)
+        self.assertEqual(pool.metricas()['verificaciones_fallidas'], 1)
+
+    def test_calentar_y_cerrar(self):
+        pool = self.crear_pool(minimo=3, maximo=5)
+        pool.calentar()
+        self.assertEqual(pool.metricas()['libres'], 3)
+        pool.cerrar()
+        self.assertTrue(all(conexion.closed for conexion in self.abiertas))
+        with self.assertRaises(PoolAgotado):
+            pool.obtener()
+
+
+class BackendPoolTest(SimpleTestCase):
+    """El backend postgresql_pool sobre conexiones simuladas"""
+
+    def setUp(self):
+        from appKairos.db.backends.postgresql_pool.base import DatabaseWrapper
+        ajustes = {
+            **connections.settings['default'],
+            'ENGINE': 'appKairos.db.backends.postgresql_pool',
+            'NAME': 'kairos', 'USER': 'kairos', 'PASSWORD': '', 'HOST': 'localhost', 'PORT': '',
+            'OPTIONS': {'pool_max': '1', 'pool_timeout': '0.01', 'sslmode': 'disable'},
+        }
+        self.wrapper = DatabaseWrapper(ajustes, 'pruebas_pool')
+        parche = patch.object(postgresql.DatabaseWrapper, 'get_new_connection', side_effect=lambda p: ConexionFalsa())
+        parche.start()
+        self.addCleanup(parche.stop)
+        self.addCleanup(lambda: pool_modulo._pools.clear())
+
+    def test_opciones_del_pool_no_llegan_a_psycopg(self):
+        params = self.wrapper.get_connection_params()
+        self.assertNotIn('pool_max', params)
+        self.assertEqual(params['sslmode'], 'disable')
+        self.assertEqual(self.wrapper.opciones_pool(), {'maximo': 1, 'timeout': 0.01})
+
+    def test_cerrar_devuelve_al_pool(self):
+        params = self.wrapper.get_connection_params()
+        self.wrapper.connection = self.wrapper.get_new_connection(params)
+        with self.assertRaises(self.wrapper.Database.OperationalError):
+            self.wrapper.get_new_connection(params)
+
+        conexion = self.wrapper.connection
+        self.wrapper._close()
+        self.assertFalse(conexion.closed)
+        self.assertIs(self.wrapper.get_new_connection(params), conexion)
+
+
+class PerfilSQLiteTest(BaseDatosExtraMixin, SimpleTestCase):
+    """PRAGMA de producción y cola de escritura sobre ficheros SQLite"""
+
+    def test_pragmas_en_conexion_nueva(self):
+        self.agregar_bd('sqlite_perfil', 'perfil.sqlite3')
+        with connections['sqlite_perfil'].cursor() as cursor:
+            valores = {}
+            for pragma in ('journal_mode', 'synchronous', 'busy_timeout', 'temp_store'):
+                cursor.execute(f'PRAGMA {pragma}')
+                valores[pragma] = cursor.fetchone()[0]
+        self.assertEqual(valores, {'journal_mode': 'wal', 'synchronous': 1, 'busy_timeout': 5000, 'temp_store': 2})
+
+    def test_escrituras_concurrentes_en_cola(self):
+        """Varias transacciones que escriben a la vez se ejecutan de una en una, sin bloqueos"""
+        self.agregar_bd(
+            'sqlite_escritor', 'escritor.sqlite3',
+            ENGINE='appKairos.db.backends.sqlite_escritor', OPTIONS={'timeout': 10},
+        )
+        with connections['sqlite_escritor'].cursor() as cursor:
+            cursor.execute('CREATE TABLE apuntes (id INTEGER PRIMARY KEY, hilo INTEGER)')
+
+        dentro, maximo, errores = [0], [0], []
+        contador = threading.Lock()
+
+        def escribir(hilo):
+            try:
+                with transaction.atomic(using='sqlite_escritor'):
+                    with contador:
+                        dentro[0] += 1
+                        maximo[0] = max(maximo[0], dentro[0])
+                    with connections['sqlite_escritor'].cursor() as cursor:
+                        cursor.execute('SELECT COUNT(*) FROM apuntes')
+                        cursor.execute('INSERT INTO apuntes (hilo) VALUES (%s)', [hilo])
+                        time.sleep(0.02)
+                        cursor.execute('INSERT INTO apuntes (hilo) VALUES (%s)', [hilo])
+                    with contador:
+                        dentro[0] -= 1
+            except Exception as exc:
+                errores.append(exc)
+            finally:
+                connections['sqlite_escritor'].close()
+
+        hilos = [threading.Thread(target=escribir, args=(i,)) for i in range(6)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+
+        self.assertEqual(errores, [])
+        self.assertEqual(maximo[0], 1)
+        with connections['sqlite_escritor'].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM apuntes')
+            self.assertEqual(cursor.fetchone()[0], 12)
@@ -0,0 +1,96 @@
+"""
+Tests de los importes en céntimos (appKairos.dinero)
+"""
+from decimal import Decimal
+import pickle
+
+import numpy as np
+from django.db import connection
+from django.db.models import Sum
+from django.test import SimpleTestCase, TestCase
+
+from appKairos.dinero import Dinero, a_euros, a_numpy, de_numpy
+from appKairos.models import Producto, ProductoContratado, Usuario
+
+
+class DineroTest(SimpleTestCase):
+    """Tests del tipo Dinero"""
+
+    def test_conversion_desde_euros(self):
+        """Los números se interpretan como euros y se redondean al céntimo"""
+        self.assertEqual(Dinero(Decimal('12.34')).centimos, 1234)
+        self.assertEqual(Dinero('0.005').centimos, 1)
+        self.assertEqual(Dinero(7).centimos, 700)
+        self.assertEqual(Dinero(0.1).centimos, 10)
+        self.assertEqual(Dinero(-1.005).centimos, -101)
+        self.assertEqual(Dinero.de_centimos(1234), Dinero('12.34'))
+        with self.assertRaises(ValueError):
+            Dinero(float('nan'))
+
+    def test_aritmetica_exacta(self):
+        """Sumar y restar no acumula error; sum() funciona"""
+        total = sum([Dinero('0.10')] * 3)
+        self.assertEqual(total, Decimal('0.30'))
+        self.assertEqual(Dinero('10') - Dinero('0.01'), Dinero('9.99'))
+        self.assertEqual(0 - Dinero('5'), Dinero('-5'))
+        self.assertEqual(Dinero('10') * Decimal('0.333'), Dinero('3.33'))
+        self.assertEqual(Dinero('10') / 3, Dinero('3.33'))
+        self.assertEqual(Dinero('200') / Dinero('1000'), Decimal('0.2'))
+
+    def test_comparacion_y_hash(self):
+        """Compara igual que el Decimal equivalente"""
+        self.assertEqual(Dinero('1200'), Decimal('1200.00'))
+        self.assertEqual(hash(Dinero('1200')), hash(Decimal('1200.00')))
+        self.assertLess(Dinero('1'), 2)
+        self.assertGreater(Dinero('0.01'), 0)
+        self.assertFalse(Dinero(0))
+        with self.assertRaises(AttributeError):
+            Dinero(1).centimos = 5
+
+    def test_formato(self):
+        """str() y format() se comportan como el importe Decimal"""
+        self.assertEqual(str(Dinero('1234.5')), '1234.50')
+        self.assertEqual(f'{Dinero("1234567.891"):,.2f}', '1,234,567.89')
+        self.assertEqual(repr(Dinero('-0.05')), "Dinero('-0.05')")
+        self.assertEqual(float(Dinero('2.50')), 2.5)
+        self.assertEqual(pickle.loads(pickle.dumps(Dinero('3.21'))), Dinero('3.21'))
+
+    def test_numpy_sin_perdida(self):
+        """a_numpy da céntimos int64 exactos y de_numpy los recupera"""
+        importes = [Dinero('0.01'), Dinero('92233720368547.75'), Dinero('-3.10')]
+        array = a_numpy(importes)
+        self.assertEqual(array.dtype, np.int64)
+        self.assertEqual(array.tolist(), [1, 9223372036854775, -310])
+        self.assertEqual(de_numpy(array), importes)
+        self.assertEqual(a_euros(array[[0, 2]]).tolist(), [0.01, -3.1])
+
+
+class CampoDineroTest(TestCase):
+    """Tests del campo que guarda céntimos en la base de datos"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='dinero', email='dinero@example.com')
+        self.producto = Producto.objects.create(nombre='Producto', codigo='DIN001')
+
+    def test_guarda_centimos_y_devuelve_dinero(self):
+        """La columna es un entero de céntimos; la instancia tiene Dinero"""
+        contrato = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=self.producto,
+            monto_invertido=Decimal('1000.05'), participaciones='1000.10'
+        )
+        self.assertIsInstance(contrato.monto_invertido, Dinero)
+
+        fila = ProductoContratado.objects.filter(pk=contrato.pk).values_list(
+            'monto_invertido', 'capital_actual'
+        ).get()
+        self.assertEqual(fila, (Dinero('1000.05'), Dinero('1000.10')))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f'SELECT monto_invertido FROM {connection.ops.quote_name(ProductoContratado._meta.db_table)} WHERE id = %s', [contrato.pk]
+            )
+            self.assertEqual(cursor.fetchone()[0], 100005)
+        self.assertTrue(ProductoContratado.objects.filter(capital_actual__gt=1000).exists())
+        self.assertFalse(ProductoContratado.objects.filter(capital_actual__gt=Decimal('1000.10')).exists())
+
+        total = ProductoContratado.objects.aggregate(total=Sum('capital_actual'))['total']
+        self.assertEqual(total, Dinero('1000.10'))
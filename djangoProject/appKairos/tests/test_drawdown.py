@@ -0,0 +1,112 @@
+"""
+Tests del drawdown incremental (appKairos.analitica.drawdown)
+"""
+from datetime import date
+from decimal import Decimal
+import random
+
+from django.test import TestCase
+from django.urls import reverse
+
+from appKairos.analitica import drawdown
+from appKairos.models import EstadoDrawdown, Producto, ProductoContratado, Resultado, Usuario
+
+
+def drawdown_maximo(capitales):
+    """Cálculo de referencia: recorrido completo de la serie"""
+    pico, peor = capitales[0], Decimal(0)
+    for capital in capitales:
+        pico = max(pico, capital)
+        if pico > 0:
+            peor = max(peor, (pico - capital) * 100 / pico)
+    return peor.quantize(Decimal('0.0001'))
+
+
+class DrawdownIncrementalTest(TestCase):
+    """Tests del estado de drawdown mantenido al insertar resultados"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='dd', email='dd@example.com')
+        producto = Producto.objects.create(nombre='Producto', codigo='DD001')
+        self.contrato = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=producto, monto_invertido=Decimal('1000')
+        )
+
+    def crear(self, fecha, capital, contrato=None):
+        return Resultado.objects.create(
+            usuario=self.usuario, producto_contratado=contrato, fecha=fecha, capital_mes=Decimal(capital)
+        )
+
+    def test_incremental_igual_que_recorrido_completo(self):
+        """Insertando en orden, el estado coincide con recorrer la serie"""
+        aleatorio = random.Random(7)
+        capitales = [Decimal(aleatorio.randint(50000, 150000)) / 100 for _ in range(24)]
+        for mes, capital in enumerate(capitales):
+            self.crear(date(2023 + mes // 12, mes % 12 + 1, 1), capital, self.contrato)
+
+        estado = EstadoDrawdown.objects.get(producto_contratado=self.contrato)
+        self.assertEqual(estado.resultados, 24)
+        self.assertEqual(estado.maximo, max(capitales))
+        self.assertEqual(estado.drawdown_maximo, drawdown_maximo(capitales))
+        self.assertEqual(estado.ultima_fecha, date(2024, 12, 1))
+        # La serie total del usuario es la misma (no tiene otros resultados)
+        self.assertEqual(drawdown.estado(self.usuario).drawdown_maximo, estado.drawdown_maximo)
+
+    def test_lectura_de_una_fila(self):
+        self.crear(date(2025, 1, 1), '1000')
+        self.crear(date(2025, 2, 1), '800')
+        with self.assertNumQueries(1):
+            estado = drawdown.estado(self.usuario)
+        self.assertEqual(estado.drawdown_maximo, Decimal('20'))
+        self.assertEqual(estado.drawdown_actual, Decimal('20'))
+
+    def test_insercion_con_fecha_anterior_recalcula(self):
+        self.crear(date(2025, 1, 1), '1000')
+        self.crear(date(2025, 3, 1), '900')
+        self.crear(date(2025, 2, 1), '2000')
+        estado = drawdown.estado(self.usuario)
+        self.assertEqual(estado.maximo, Decimal('2000'))
+        self.assertEqual(estado.drawdown_maximo, Decimal('55'))
+        self.assertEqual(estado.ultima_fecha, date(2025, 3, 1))
+
+    def test_totales_sustituyen_a_los_contratos(self):
+        """Con resultados totales, la serie del usuario son solo ellos"""
+        otro = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=Producto.objects.create(nombre='Otro', codigo='DD002'),
+            monto_invertido=Decimal('400')
+        )
+        self.crear(date(2025, 1, 31), '1000', self.contrato)
+        self.crear(date(2025, 1, 31), '400', otro)
+        self.assertEqual(drawdown.estado(self.usuario).drawdown_maximo, Decimal('60'))
+
+        self.crear(date(2025, 1, 31), '1400')
+        self.crear(date(2025, 2, 28), '500', otro)
+        estado = drawdown.estado(self.usuario)
+        self.assertEqual((estado.resultados, estado.drawdown_maximo), (1, 0))
+        self.assertEqual(drawdown.estado(self.usuario, otro).resultados, 2)
+
+    def test_borrado_deja_pendiente(self):
+        """Borrar resultados recalcula en la siguiente lectura"""
+        self.crear(date(2025, 1, 1), '1000')
+        peor = self.crear(date(2025, 2, 1), '500')
+        self.crear(date(2025, 3, 1), '900')
+        peor.delete()
+        self.assertTrue(EstadoDrawdown.objects.get(producto_contratado=None).pendiente)
+        estado = drawdown.estado(self.usuario)
+        self.assertFalse(estado.pendiente)
+        self.assertEqual(estado.drawdown_maximo, Decimal('10'))
+
+    def test_borrar_historial(self):
+        self.crear(date(2025, 1, 1), '1000', self.contrato)
+        self.crear(date(2025, 2, 1), '500', self.contrato)
+        self.client.force_login(self.usuario)
+        self.client.post(reverse('appKairos:borrar_historial'))
+        estado = drawdown.estado(self.usuario, self.contrato)
+        self.assertEqual((estado.resultados, estado.drawdown_maximo), (0, 0))
+
+    def test_dashboard_lee_el_estado(self):
+        self.crear(date(2025, 1, 1), '1000')
+        self.crear(date(2025, 2, 1), '750')
+        self.client.force_login(self.usuario)
+        respuesta = self.client.get(reverse('appKairos:dashboard'))
+        self.assertEqual(respuesta.context['max_drawdown'], Decimal('25'))
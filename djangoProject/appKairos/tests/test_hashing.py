@@ -0,0 +1,112 @@
+"""
+Tests para el servicio de hashing de contraseñas (appKairos.hashing)
+"""
+from django.test import TestCase, override_settings
+from django.contrib.auth.hashers import make_password, check_password
+from asgiref.sync import async_to_sync
+
+from appKairos import hashing
+from appKairos.models import Usuario
+
+
+class PoolHashingTest(TestCase):
+    """Tests del pool y sus métricas"""
+
+    def test_hacer_hash_y_verificar(self):
+        """El hash calculado en el pool es compatible con check_password"""
+        encoded = hashing.hacer_hash('Secreto123!')
+        self.assertTrue(check_password('Secreto123!', encoded))
+        self.assertTrue(hashing.verificar('Secreto123!', encoded))
+        self.assertFalse(hashing.verificar('Otro123!', encoded))
+        self.assertFalse(hashing.verificar('Secreto123!', None))
+
+    def test_buscar_coincidencia(self):
+        """Devuelve el índice del hash que coincide"""
+        encodeds = hashing.hacer_hashes(['AAAA1111', 'BBBB2222', 'CCCC3333'])
+        self.assertEqual(hashing.buscar_coincidencia('BBBB2222', encodeds), 1)
+        self.assertIsNone(hashing.buscar_coincidencia('ZZZZ9999', encodeds))
+
+    def test_metricas(self):
+        """Las métricas reflejan las tareas completadas y la cola vacía"""
+        antes = hashing.metricas()['completadas']
+        hashing.hacer_hashes(['a', 'b', 'c'])
+        metricas = hashing.metricas()
+        self.assertEqual(metricas['completadas'], antes + 3)
+        self.assertEqual(metricas['pendientes'], 0)
+        self.assertEqual(metricas['en_cola'], 0)
+        self.assertGreaterEqual(metricas['max_pendientes'], 1)
+
+    def test_api_asincrona(self):
+        """Las variantes async devuelven lo mismo que las síncronas"""
+        encoded = async_to_sync(hashing.ahacer_hash)('Secreto123!')
+        self.assertTrue(async_to_sync(hashing.averificar)('Secreto123!', encoded))
+        idx = async_to_sync(hashing.abuscar_coincidencia)('Secreto123!', ['', encoded])
+        self.assertEqual(idx, 1)
+
+
+class VerificarUsuarioTest(TestCase):
+    """Tests de verificación de contraseñas de usuario"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='TestPass123!'
+        )
+
+    def test_verificar_usuario(self):
+        self.assertTrue(hashing.verificar_usuario(self.usuario, 'TestPass123!'))
+        self.assertFalse(hashing.verificar_usuario(self.usuario, 'Incorrecta1!'))
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_rehash_hash_obsoleto(self):
+        """Un hash con hasher no preferido se recalcula al verificar"""
+        self.usuario.password = make_password('TestPass123!', hasher='md5')
+        self.usuario.save()
+
+        self.assertTrue(hashing.verificar_usuario(self.usuario, 'TestPass123!'))
+
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$'))
+
+    def test_async_verificar_usuario(self):
+        self.assertTrue(async_to_sync(hashing.averificar_usuario)(self.usuario, 'TestPass123!'))
+
+
+class HashersCalibradosTest(TestCase):
+    """Tests de los hashers con coste configurable (appKairos.hashers)"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(
+            username='testuser',
+            email='test@example.com',
+            password='TestPass123!'
+        )
+
+    def test_pbkdf2_usa_iteraciones_configuradas(self):
+        with self.settings(PASSWORD_PBKDF2_ITERACIONES=120000):
+            encoded = make_password('Secreto123!')
+        self.assertTrue(encoded.startswith('pbkdf2_sha256$120000$'))
+
+    def test_rehash_al_cambiar_iteraciones(self):
+        """Al recalibrar, el siguiente login correcto recalcula el hash"""
+        with self.settings(PASSWORD_PBKDF2_ITERACIONES=110000):
+            self.assertTrue(hashing.verificar_usuario(self.usuario, 'TestPass123!'))
+        self.usuario.refresh_from_db()
+        self.assertTrue(self.usuario.password.startswith('pbkdf2_sha256$110000$'))
+        self.assertTrue(self.usuario.check_password('TestPass123!'))
+
+    def test_scrypt_calibrado(self):
+        """Con scrypt preferido los hashes PBKDF2 existentes se migran al verificar"""
+        hashers = [
+            'appKairos.hashers.ScryptCalibradoHasher',
+            'appKairos.hashers.PBKDF2CalibradoHasher',
+        ]
+        with self.settings(PASSWORD_HASHERS=hashers, PASSWORD_SCRYPT_N=2 ** 12):
+            self.assertTrue(hashing.verificar_usuario(self.usuario, 'TestPass123!'))
+            self.usuario.refresh_from_db()
+            self.assertTrue(self.usuario.password.startswith('scrypt$4096$'))
+            self.assertTrue(hashing.verificar('TestPass123!', self.usuario.password))
@@ -0,0 +1,116 @@
+"""
+Tests del libro de capital y sus rentabilidades (appKairos.analitica.libro)
+"""
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.test import TestCase
+from django.urls import reverse
+
+from appKairos.analitica import libro
+from appKairos.dinero import Dinero
+from appKairos.models import InstantaneaSaldo, MovimientoCapital, Producto, ProductoContratado, Usuario
+from appKairos.revalorizacion import revalorizar
+
+
+class ReproduccionTest(TestCase):
+    """Tests de la reproducción vectorizada, sin base de datos"""
+
+    def test_valoraciones_fijan_y_flujos_suman(self):
+        contratos = np.array([1, 2, 1, 1, 2, 1])
+        tipos = np.array(['aportacion', 'aportacion', 'valoracion', 'aportacion', 'retirada', 'retirada'], dtype=object)
+        importes = np.array([1000, 500, 1100, 200, 100, 300])
+        saldos, cambios = libro.reproducir(contratos, tipos, importes, {2: 50})
+        self.assertEqual(saldos.tolist(), [1000, 550, 1100, 1300, 450, 1000])
+        self.assertEqual(cambios.tolist(), [1000, 500, 100, 200, -100, -300])
+
+    def test_tir(self):
+        self.assertAlmostEqual(libro.tir([-1000, 1100], [0, 1]), 0.10, places=9)
+        self.assertAlmostEqual(libro.tir([-1000, -1000, 2152.5], [0, 1, 2]), 0.05, places=9)
+        self.assertIsNone(libro.tir([-1000, -10], [0, 1]))
+        self.assertIsNone(libro.tir([-1000, 1100], [0, 0]))
+
+
+class LibroCapitalTest(TestCase):
+    """Tests del libro guardado: saldos, instantáneas y rentabilidades"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='libro', email='libro@example.com')
+        self.producto = Producto.objects.create(nombre='Producto', codigo='LIB001')
+        self.contrato = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=self.producto, monto_invertido=Decimal('1000')
+        )
+
+    def movimiento(self, tipo, fecha, importe):
+        return MovimientoCapital.objects.create(
+            usuario=self.usuario, producto_contratado=self.contrato, tipo=tipo, fecha=fecha, importe=Decimal(importe)
+        )
+
+    def test_twr_no_cuenta_los_flujos(self):
+        self.movimiento('aportacion', date(2024, 1, 1), '1000')
+        self.movimiento('valoracion', date(2024, 7, 1), '1100')
+        self.movimiento('aportacion', date(2024, 7, 1), '1000')
+        self.movimiento('valoracion', date(2025, 1, 1), '2205')
+        medidas = libro.rendimientos(self.usuario, hasta=date(2025, 1, 1))
+        # 1100 / 1000 · 2205 / 2100
+        self.assertEqual(medidas['twr'], 15.5)
+        self.assertEqual((medidas['saldo'], medidas['aportado_neto']), (Dinero('2205'), Dinero('2000')))
+        # La TIR pesa más el segundo semestre, que rinde menos y con el doble de dinero
+        self.assertGreater(medidas['mwr'], 10)
+        self.assertLess(medidas['mwr'], 15.5)
+
+    def test_instantaneas_y_saldo(self):
+        self.movimiento('aportacion', date(2025, 1, 1), '1000')
+        self.movimiento('valoracion', date(2025, 1, 31), '1050')
+        self.assertEqual(libro.guardar_instantaneas('default', date(2025, 1, 31)), 1)
+        instantanea = InstantaneaSaldo.objects.get()
+        self.assertEqual(
+            (instantanea.saldo, instantanea.aportado_neto, instantanea.movimientos), (Dinero('1050'), Dinero('1000'), 2)
+        )
+
+        self.movimiento('retirada', date(2025, 2, 10), '50')
+        self.assertEqual(libro.saldo(self.contrato, date(2025, 1, 15)), Dinero('1000'))
+        self.assertEqual(libro.saldo(self.contrato, date(2025, 2, 28)), Dinero('1000'))
+        libro.guardar_instantaneas('default', date(2025, 2, 28))
+        self.assertEqual(InstantaneaSaldo.objects.get(fecha=date(2025, 2, 28)).movimientos, 3)
+
+        # Un movimiento anterior borra las instantáneas que ya no cuadran
+        self.movimiento('aportacion', date(2025, 2, 1), '10')
+        self.assertEqual(list(InstantaneaSaldo.objects.values_list('fecha', flat=True)), [date(2025, 1, 31)])
+        self.assertEqual(libro.saldo(self.contrato, date(2025, 2, 28)), Dinero('1010'))
+        medidas = libro.rendimientos(self.usuario, desde=date(2025, 1, 31), hasta=date(2025, 2, 28))
+        self.assertEqual((medidas['saldo'], medidas['aportado_neto']), (Dinero('1010'), Dinero('-40')))
+
+    def test_solo_insercion(self):
+        movimiento = self.movimiento('aportacion', date(2025, 1, 1), '1000')
+        movimiento.importe = Decimal('2000')
+        with self.assertRaises(ValueError):
+            movimiento.save()
+        with self.assertRaises(ValueError):
+            MovimientoCapital.objects.update(importe=0)
+        self.assertEqual(MovimientoCapital.objects.get().importe, Dinero('1000'))
+
+    def test_revalorizar_valora_el_libro(self):
+        libro.aportar(self.contrato, self.contrato.monto_invertido, fecha=date(2025, 1, 1))
+        revalorizar({self.producto: '10'}, date(2025, 12, 31))
+        self.assertEqual(libro.saldo(self.contrato, date(2025, 12, 31)), Dinero('1100'))
+        medidas = libro.rendimientos(self.usuario, hasta=date(2025, 12, 31))
+        self.assertEqual(medidas['twr'], 10.0)
+        self.assertAlmostEqual(medidas['mwr'], 10.04, places=2)  # 10% en 364 días, anualizado
+
+    def test_contratar_y_cancelar_desde_las_vistas(self):
+        self.client.force_login(self.usuario)
+        otro = Producto.objects.create(nombre='Otro', codigo='LIB002')
+        self.client.post(reverse('appKairos:contratar_producto', args=[otro.pk]), {
+            'producto': otro.pk, 'monto_invertido': '500', 'acepto_riesgos': 'on',
+        })
+        contrato = ProductoContratado.objects.get(producto=otro)
+        self.assertEqual(
+            list(contrato.movimientos_capital.values_list('tipo', 'importe')), [('aportacion', Dinero('500'))]
+        )
+        self.client.post(reverse('appKairos:cancelar_producto', args=[contrato.pk]))
+        self.assertEqual(libro.saldo(contrato), Dinero(0))
+
+        respuesta = self.client.get(reverse('appKairos:dashboard'))
+        self.assertEqual(respuesta.context['twr'], 0.0)
@@ -5,7 +5,7 @@ from django.test import TestCase
 from django.utils import timezone
 from django.core.exceptions import ValidationError
 from decimal import Decimal
-from datetime import timedelta
+from datetime import date, timedelta
 import secrets
 
 from appKairos.models import (
@@ -63,7 +63,7 @@ class UsuarioModelTest(TestCase):
             usuario=self.usuario,
             producto=producto,
             monto_invertido=Decimal('1000.00'),
-            capital_actual=Decimal('1200.00'),
+            participaciones=Decimal('1200.00'),
             estado='activo'
         )
         
@@ -163,7 +163,7 @@ class ProductoContratadoModelTest(TestCase):
             usuario=self.usuario,
             producto=self.producto,
             monto_invertido=Decimal('1000.00'),
-            capital_actual=Decimal('1000.00'),
+            participaciones=Decimal('1000.00'),
             estado='activo'
         )
         
@@ -177,7 +177,7 @@ class ProductoContratadoModelTest(TestCase):
             usuario=self.usuario,
             producto=self.producto,
             monto_invertido=Decimal('1000.00'),
-            capital_actual=Decimal('1000.00')
+            participaciones=Decimal('1000.00')
         )
         
         with self.assertRaises(Exception):
@@ -185,10 +185,29 @@ class ProductoContratadoModelTest(TestCase):
                 usuario=self.usuario,
                 producto=self.producto,
                 monto_invertido=Decimal('2000.00'),
-                capital_actual=Decimal('2000.00')
+                participaciones=Decimal('2000.00')
             )
 
 
+    def test_participaciones_y_valor_liquidativo(self):
+        """Se compran participaciones al valor del día; el capital sigue al valor actual"""
+        self.producto.registrar_valor_liquidativo(date(2025, 1, 31), Decimal('2.5'))
+        contrato = ProductoContratado.objects.create(
+            usuario=self.usuario, producto=self.producto, monto_invertido=Decimal('1000.00')
+        )
+        self.assertEqual(contrato.participaciones, Decimal('400'))
+        self.assertEqual(contrato.capital_actual, Decimal('1000.00'))
+
+        self.producto.registrar_valor_liquidativo(date(2025, 2, 28), Decimal('2.75'))
+        self.assertEqual(ProductoContratado.objects.get(pk=contrato.pk).capital_actual, Decimal('1100.00'))
+        contrato.refresh_from_db()
+        self.assertEqual(contrato.capital_actual, Decimal('1100.00'))
+        # Un valor de una fecha anterior se guarda en la serie sin cambiar el actual
+        self.producto.registrar_valor_liquidativo(date(2024, 12, 31), Decimal('2'))
+        self.assertEqual(Producto.objects.get(pk=self.producto.pk).valor_liquidativo, Decimal('2.75'))
+        self.assertEqual(self.producto.valores_liquidativos.count(), 3)
+
+
 class ResultadoModelTest(TestCase):
     """Tests para el modelo Resultado"""
     
@@ -205,7 +224,7 @@ class ResultadoModelTest(TestCase):
             usuario=self.usuario,
             producto=self.producto,
             monto_invertido=Decimal('1000.00'),
-            capital_actual=Decimal('1000.00')
+            participaciones=Decimal('1000.00')
         )
     
     def test_crear_resultado(self):
@@ -213,14 +232,13 @@ class ResultadoModelTest(TestCase):
         resultado = Resultado.objects.create(
             usuario=self.usuario,
             producto_contratado=self.contrato,
-            fecha=timezone.now().date(),
-            mes='Enero',
-            anio=2024,
+            fecha=date(2024, 1, 31),
             capital_mes=Decimal('1200.00')
         )
         
         self.assertEqual(resultado.capital_mes, Decimal('1200.00'))
         self.assertEqual(resultado.mes, 'Enero')
+        self.assertEqual(resultado.anio, 2024)
         self.assertIn('test@example.com', str(resultado))
     
     def test_calcular_cambios(self):
@@ -229,8 +247,6 @@ class ResultadoModelTest(TestCase):
             usuario=self.usuario,
             producto_contratado=self.contrato,
             fecha=timezone.now().date(),
-            mes='Enero',
-            anio=2024,
             capital_mes=Decimal('1200.00')
         )
         
@@ -0,0 +1,100 @@
+"""
+Tests de las estadísticas móviles (appKairos.analitica.moviles)
+"""
+from datetime import date
+from decimal import Decimal
+import random
+import statistics
+
+from django.test import TestCase
+
+from appKairos.analitica import moviles
+from appKairos.models import EstadisticasMoviles, Producto, ProductoContratado, Resultado, Usuario
+
+
+class EstadisticasMovilesTest(TestCase):
+    """Tests de los acumuladores por ventana mantenidos al insertar resultados"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='moviles', email='moviles@example.com')
+        self.producto = Producto.objects.create(nombre='Producto', codigo='MOV001')
+        self.contrato = self.contratar(self.usuario)
+
+    def contratar(self, usuario):
+        return ProductoContratado.objects.create(
+            usuario=usuario, producto=self.producto, monto_invertido=Decimal('1000')
+        )
+
+    def crear(self, contrato, mes, porcentaje):
+        return Resultado.objects.create(
+            usuario=contrato.usuario, producto_contratado=contrato, fecha=date(2020 + mes // 12, mes % 12 + 1, 1),
+            capital_mes=Decimal('1000'), porcentaje_cambio=Decimal(porcentaje)
+        )
+
+    def test_ventanas_iguales_que_calculo_directo(self):
+        """Tras 30 inserciones cada ventana coincide con la cola de la serie"""
+        aleatorio = random.Random(3)
+        porcentajes = [round(aleatorio.uniform(-8, 8), 2) for _ in range(30)]
+        for mes, porcentaje in enumerate(porcentajes):
+            self.crear(self.contrato, mes, str(porcentaje))
+
+        estadisticas = EstadisticasMoviles.objects.get(producto_contratado=self.contrato)
+        self.assertEqual(estadisticas.ultimos, porcentajes[-12:])
+        for ventana in (3, 6, 12):
+            cola = porcentajes[-ventana:]
+            self.assertAlmostEqual(estadisticas.media(ventana), statistics.mean(cola), places=9)
+            self.assertAlmostEqual(estadisticas.volatilidad(ventana), statistics.stdev(cola), places=9)
+
+    def test_aplica_el_porcentaje_redondeado(self):
+        """Se aplica el porcentaje con los decimales que se guardan, como en un recálculo"""
+        self.crear(self.contrato, 0, '1')
+        resultado = Resultado(
+            usuario=self.usuario, producto_contratado=self.contrato, fecha=date(2020, 2, 1),
+            capital_mes=Decimal('1000')
+        )
+        resultado.calcular_cambios(Decimal('3000'))
+        resultado.save()
+        self.assertEqual(EstadisticasMoviles.objects.get().ultimos, [1.0, -66.67])
+
+    def test_ventana_incompleta(self):
+        self.crear(self.contrato, 0, '2')
+        estadisticas = moviles.estadisticas(self.contrato)
+        self.assertEqual(estadisticas.media(3), 2)
+        self.assertIsNone(estadisticas.volatilidad(3))
+        self.assertEqual(estadisticas.n_12, 1)
+
+    def test_fecha_anterior_y_borrado(self):
+        """Fuera de orden recalcula; el borrado deja pendiente hasta leer"""
+        for mes, porcentaje in ((0, '1'), (2, '3'), (1, '5')):
+            self.crear(self.contrato, mes, porcentaje)
+        estadisticas = moviles.estadisticas(self.contrato)
+        self.assertEqual(estadisticas.ultimos, [1.0, 5.0, 3.0])
+
+        Resultado.objects.filter(fecha=date(2020, 2, 1)).delete()
+        self.assertTrue(EstadisticasMoviles.objects.get().pendiente)
+        self.assertEqual(moviles.estadisticas(self.contrato).ultimos, [1.0, 3.0])
+
+    def test_por_producto_combina_contratos(self):
+        """La combinación de acumuladores equivale a juntar las colas de todos"""
+        otro = self.contratar(Usuario.objects.create_user(username='otro', email='otro@example.com'))
+        series = {self.contrato: ['1', '2', '4', '8'], otro: ['-3', '0']}
+        for contrato, porcentajes in series.items():
+            for mes, porcentaje in enumerate(porcentajes):
+                self.crear(contrato, mes, porcentaje)
+
+        agregadas = moviles.por_producto(self.producto)
+        colas = [2.0, 4.0, 8.0, -3.0, 0.0]
+        self.assertAlmostEqual(agregadas[3][0], statistics.mean(colas))
+        self.assertAlmostEqual(agregadas[3][1], statistics.stdev(colas))
+        self.assertEqual(moviles.por_producto(Producto.objects.create(nombre='Vacío', codigo='V'))[6], (None, None))
+
+    def test_recalculo_vectorizado(self):
+        """recalcular_shard da lo mismo que el mantenimiento incremental"""
+        for mes, porcentaje in enumerate(['1.5', '-2', '0.25', '4', '3', '-1', '2', '7']):
+            self.crear(self.contrato, mes, porcentaje)
+        campos = moviles.recalcular_shard('default')[self.contrato.pk]
+        estadisticas = EstadisticasMoviles.objects.get()
+        for campo in ('n_3', 'n_12', 'ultima_fecha', 'ultimos'):
+            self.assertEqual(campos[campo], getattr(estadisticas, campo))
+        for campo in ('media_3', 'm2_3', 'media_6', 'm2_6', 'media_12', 'm2_12'):
+            self.assertAlmostEqual(campos[campo], getattr(estadisticas, campo), places=9)
@@ -0,0 +1,107 @@
+"""
+Tests de la revalorización por producto (appKairos.revalorizacion)
+"""
+from datetime import date
+from decimal import Decimal
+
+from django.test import TestCase
+
+from appKairos.dinero import Dinero
+from appKairos.models import (
+    InstantaneaSaldo, MovimientoCapital, Producto, ProductoContratado, Resultado, Usuario, ValorLiquidativo
+)
+from appKairos.revalorizacion import revalorizar
+
+
+class RevalorizacionTest(TestCase):
+    """Tests del valor liquidativo por producto y de lo que se escribe con él"""
+
+    def setUp(self):
+        self.ana = Usuario.objects.create_user(username='ana', email='ana@example.com')
+        self.luis = Usuario.objects.create_user(username='luis', email='luis@example.com')
+        self.fondo = Producto.objects.create(nombre='Fondo', codigo='REV001')
+        self.bono = Producto.objects.create(nombre='Bono', codigo='REV002')
+        self.contratos = {
+            (usuario.username, producto.codigo): ProductoContratado.objects.create(
+                usuario=usuario, producto=producto, monto_invertido=Decimal(capital),
+                participaciones=Decimal(capital)
+            )
+            for usuario, producto, capital in (
+                (self.ana, self.fondo, '1000'), (self.ana, self.bono, '500.01'), (self.luis, self.fondo, '200'),
+            )
+        }
+        ProductoContratado.objects.filter(pk=self.contratos['luis', 'REV001'].pk).update(estado='inactivo')
+        Resultado.objects.create(
+            usuario=self.ana, producto_contratado=self.contratos['ana', 'REV001'],
+            fecha=date(2025, 1, 31), capital_mes=Decimal('1000')
+        )
+
+    def capital(self, clave):
+        return ProductoContratado.objects.get(pk=self.contratos[clave].pk).capital_actual
+
+    def test_aplica_rendimientos_a_contratos_activos(self):
+        informe = revalorizar({self.fondo: Decimal('2.5'), self.bono.pk: '-10'}, date(2025, 2, 28))
+
+        self.assertEqual(self.capital(('ana', 'REV001')), Dinero('1025'))
+        self.assertEqual(self.capital(('ana', 'REV002')), Dinero('450.01'))  # 450.009 redondeado
+        # También sigue al valor liquidativo, pero no cuenta en el capital total
+        self.assertEqual(self.capital(('luis', 'REV001')), Dinero('205'))
+        self.assertEqual(Usuario.objects.get(pk=self.ana.pk).capital_total, Dinero('1475.01'))
+        self.assertEqual(Producto.objects.get(pk=self.fondo.pk).valor_liquidativo, Decimal('1.025'))
+        self.assertEqual(ValorLiquidativo.objects.filter(fecha=date(2025, 2, 28)).count(), 2)
+
+        fondo = next(fila for fila in informe if fila['producto_id'] == self.fondo.pk)
+        self.assertEqual((fondo['contratos'], fondo['capital_antes'], fondo['capital_despues']),
+                         (1, Dinero('1000'), Dinero('1025')))
+
+        resultado = Resultado.objects.get(producto_contratado=self.contratos['ana', 'REV001'], fecha=date(2025, 2, 28))
+        self.assertEqual((resultado.capital_mes, resultado.porcentaje_cambio), (Dinero('1025'), Decimal('2.50')))
+
+    def test_misma_fecha_no_compone(self):
+        """Repetir el mismo día sustituye su valor liquidativo y su resultado"""
+        revalorizar({self.fondo: '1'}, date(2025, 2, 28))
+        revalorizar({self.fondo: '1'}, date(2025, 2, 28))
+        filas = Resultado.objects.filter(fecha=date(2025, 2, 28))
+        self.assertEqual(filas.count(), 1)
+        self.assertEqual(filas.get().capital_mes, Dinero('1010'))
+        self.assertEqual(self.fondo.valores_liquidativos.get().valor, Decimal('1.01'))
+
+    def test_misma_fecha_no_duplica_valoraciones(self):
+        """Repetir el día no añade valoraciones al libro salvo para corregirlas"""
+        contrato = ProductoContratado.objects.get(usuario=self.ana, producto=self.fondo)
+        valoraciones = MovimientoCapital.objects.filter(producto_contratado=contrato, tipo='valoracion')
+        revalorizar({self.fondo: '1'}, date(2025, 2, 28))
+        InstantaneaSaldo.objects.create(
+            producto_contratado=contrato, usuario=self.ana, fecha=date(2025, 2, 28),
+            saldo=Dinero('1010'), aportado_neto=Dinero('1000')
+        )
+        revalorizar({self.fondo: '1'}, date(2025, 2, 28))
+        self.assertEqual(valoraciones.count(), 1)
+        self.assertTrue(InstantaneaSaldo.objects.filter(producto_contratado=contrato).exists())
+
+        revalorizar({self.fondo: '2'}, date(2025, 2, 28))
+        importes = list(valoraciones.order_by('pk').values_list('importe', flat=True))
+        self.assertEqual(importes, [Dinero('1010'), Dinero('1020')])
+        revalorizar({self.fondo: '1'}, date(2025, 2, 28))
+        self.assertEqual(valoraciones.count(), 3)
+
+    def test_fechas_sucesivas_componen(self):
+        revalorizar({self.fondo: '10'}, date(2025, 2, 28))
+        revalorizar({self.fondo: '10'}, date(2025, 3, 31))
+        self.assertEqual(self.capital(('ana', 'REV001')), Dinero('1210'))
+        # Corregir un día pasado no cambia el valor actual, que es el más reciente
+        revalorizar({self.fondo: '20'}, date(2025, 2, 28))
+        self.assertEqual(self.capital(('ana', 'REV001')), Dinero('1210'))
+
+    def test_simular_no_guarda(self):
+        informe = revalorizar({self.fondo: '50'}, date(2025, 2, 28), simular=True)
+        self.assertEqual(informe[0]['capital_despues'], Dinero('1500'))
+        self.assertEqual(self.capital(('ana', 'REV001')), Dinero('1000'))
+        self.assertFalse(ValorLiquidativo.objects.exists())
+        self.assertFalse(Resultado.objects.filter(fecha=date(2025, 2, 28)).exists())
+        self.assertEqual(Usuario.objects.get(pk=self.ana.pk).capital_total, Dinero(0))
+
+    def test_rendimiento_imposible(self):
+        with self.assertRaises(ValueError):
+            revalorizar({self.fondo: '-101'}, date(2025, 2, 28))
+        self.assertEqual(self.capital(('ana', 'REV001')), Dinero('1000'))
@@ -0,0 +1,56 @@
+"""
+Tests de la lectura de series por columnas (appKairos.series)
+"""
+from datetime import date
+from decimal import Decimal
+
+import numpy as np
+from django.test import TestCase
+
+from appKairos.models import Resultado, Usuario
+
+
+class SerieTest(TestCase):
+    """Tests de Resultado.objects.serie()"""
+
+    def setUp(self):
+        self.usuario = Usuario.objects.create_user(username='serie', email='serie@example.com')
+        for mes, capital, porcentaje in ((3, '1100.10', '10.01'), (1, '1000.00', '0'), (2, '1000.05', '-0.5')):
+            Resultado.objects.create(
+                usuario=self.usuario, fecha=date(2025, mes, 1),
+                capital_mes=Decimal(capital), porcentaje_cambio=Decimal(porcentaje)
+            )
+        self.consulta = Resultado.objects.para_usuario(self.usuario).order_by('fecha')
+
+    def test_columnas_como_listas(self):
+        """Listas en el orden de la consulta; los importes en céntimos"""
+        with self.assertNumQueries(1):
+            serie = self.consulta.serie('fecha', 'capital_mes', 'porcentaje_cambio', 'usuario')
+        self.assertEqual(serie['fecha'], [date(2025, 1, 1), date(2025, 2, 1), date(2025, 3, 1)])
+        self.assertEqual(serie['capital_mes'], [100000, 100005, 110010])
+        self.assertEqual(serie['porcentaje_cambio'], [0.0, -0.5, 10.01])
+        self.assertEqual(serie['usuario'], [self.usuario.pk] * 3)
+
+    def test_columnas_como_arrays(self):
+        """Arrays de NumPy con el tipo de cada columna"""
+        serie = self.consulta.serie('fecha', 'capital_mes', 'porcentaje_cambio', arrays=True)
+        self.assertEqual(serie['fecha'].dtype, np.dtype('datetime64[D]'))
+        self.assertEqual(serie['capital_mes'].dtype, np.int64)
+        self.assertEqual(serie['porcentaje_cambio'].dtype, np.float64)
+        self.assertEqual(serie['capital_mes'].tolist(), [100000, 100005, 110010])
+        self.assertEqual(str(serie['fecha'][-1]), '2025-03-01')
+
+    def test_cacheado_y_vacio(self):
+        """Con cacheado() da lo mismo; sin filas, columnas vacías"""
+        self.assertEqual(
+            self.consulta.cacheado().serie('capital_mes'), self.consulta.serie('capital_mes')
+        )
+        vacia = self.consulta.none().serie('fecha', 'capital_mes', arrays=True)
+        self.assertEqual(len(vacia['fecha']), 0)
+        self.assertEqual(vacia['capital_mes'].dtype, np.int64)
+
+    def test_campo_inexistente(self):
+        with self.assertRaises(ValueError):
+            self.consulta.serie('no_existe')
+        with self.assertRaises(ValueError):
+            self.consulta.serie()
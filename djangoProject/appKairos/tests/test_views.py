@@ -2,14 +2,17 @@
 Tests para las vistas de la aplicación appKairos
 """
 from django.test import TestCase, Client
+from django.core.management import call_command
 from django.urls import reverse
 from django.utils import timezone
-from datetime import timedelta
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
 import secrets
 
 from appKairos.models import (
     Usuario, TokenVerificacionEmail, TokenRecuperacionPassword,
-    Mercado, Producto
+    Mercado, Producto, ProductoContratado, Resultado
 )
 
 
@@ -243,6 +246,38 @@ class DashboardViewTest(TestCase):
         self.assertEqual(response.status_code, 200)
         self.assertTemplateUsed(response, 'dashboard_en.html')
         self.assertIn('usuario', response.context)
+    
+    def test_dashboard_con_historial(self):
+        """Las gráficas y el historial salen de la serie de resultados"""
+        for mes, capital in ((1, '1000.00'), (2, '1200.50')):
+            Resultado.objects.create(
+                usuario=self.usuario, fecha=date(2025, mes, 1), capital_mes=Decimal(capital)
+            )
+        self.client.force_login(self.usuario)
+        response = self.client.get(self.url)
+        
+        self.assertEqual(response.context['fechas'], ['2025-01', '2025-02'])
+        self.assertEqual(response.context['capitales'], [1000.0, 1200.5])
+        self.assertContains(response, '€ 1200.50')
+
+    def test_dashboard_tras_cierre_mensual(self):
+        """Con totales del cierre, la serie del usuario no mezcla los de cada contrato"""
+        inicio = timezone.make_aware(timezone.datetime(2025, 1, 10))
+        for indice, capital in enumerate(('1000', '400')):
+            contrato = ProductoContratado.objects.create(
+                usuario=self.usuario, producto=Producto.objects.create(nombre=f'P{indice}', codigo=f'DSH00{indice}'),
+                monto_invertido=Decimal(capital), participaciones=Decimal(capital), fecha_inicio=inicio
+            )
+            Resultado.objects.create(
+                usuario=self.usuario, producto_contratado=contrato, fecha=inicio, capital_mes=Decimal(capital)
+            )
+        call_command('cierre_mensual', mes='2025-01', procesos=1, stdout=StringIO())
+        self.client.force_login(self.usuario)
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.context['fechas'], ['2025-01'])
+        self.assertEqual(response.context['capitales'], [1400.0])
+        self.assertEqual(response.context['max_drawdown'], 0)
 
 
 class PerfilViewTest(TestCase):
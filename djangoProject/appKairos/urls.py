@@ -29,6 +29,7 @@ urlpatterns = [
     
     # 2FA
     path('activar-2fa/', views.activar_2fa_view, name='activar_2fa'),
+    path('activar-2fa/qr.<str:formato>', views.qr_2fa_view, name='qr_2fa'),
     path('mostrar-codigos-respaldo/', views.mostrar_codigos_respaldo_view, name='mostrar_codigos_respaldo'),
     path('verificar-2fa/', views.verificar_2fa_view, name='verificar_2fa'),
     path('desactivar-2fa/', views.desactivar_2fa_view, name='desactivar_2fa'),
@@ -36,10 +37,14 @@ urlpatterns = [
     # Dashboard y perfil
     path('dashboard/', views.dashboard_view, name='dashboard'),
     path('borrar-historial/', views.borrar_historial_view, name='borrar_historial'), # Nueva ruta
+    path('calculadora/<int:producto_id>/', views.calculadora_view, name='calculadora'),
     path('perfil/', views.perfil_view, name='perfil'),
     path('cambiar-password/', views.cambiar_password_view, name='cambiar_password'),
     
     # Productos
     path('contratar-producto/<int:producto_id>/', views.contratar_producto_view, name='contratar_producto'),
     path('cancelar-producto/<int:contrato_id>/', views.cancelar_producto_view, name='cancelar_producto'),
+
+    # Mercados
+    path('mercados/<str:codigo>/cotizaciones/', views.cotizaciones_mercado_view, name='cotizaciones_mercado'),
 ]
\ No newline at end of file
@@ -1,20 +1,18 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth import login, logout, authenticate
+from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
 from django.db.models import Sum, Q
-from django.http import JsonResponse
-from django.views.decorators.http import require_http_methods
+from django.http import JsonResponse, HttpResponse, Http404
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import require_http_methods, condition
 from django.urls import reverse
 import secrets
 import pyotp
-import qrcode
-import io
-import base64
-from datetime import datetime, timedelta
+from datetime import date, datetime, timedelta
 
 from .models import (
     Usuario, Mercado, Producto, ProductoContratado, 
@@ -26,6 +24,14 @@ from .forms import (
     ContratarProductoForm, ActualizarPerfilForm, CambiarPasswordForm,
     SolicitarRecuperacionPasswordForm, ResetPasswordForm, Desactivar2FAForm
 )
+from . import hashing
+from .qr import FORMATOS_QR, uri_aprovisionamiento, renderizar_qr, etag_qr
+from .db.routers import solo_lectura
+from .analitica import calculadora, drawdown, libro
+from .backtest.productos import ultimo_backtest
+from . import cotizaciones
+from .dinero import Dinero, a_euros
+from .series import serie_shards
 
 
 # ============================================================================
@@ -108,12 +114,8 @@ def login_view(request):
             password = form.cleaned_data.get('password')
             recordarme = form.cleaned_data.get('recordarme', False)
             
-            # Buscar usuario por email
-            try:
-                usuario = Usuario.objects.get(email=email)
-                user = authenticate(request, username=usuario.username, password=password)
-            except Usuario.DoesNotExist:
-                user = None
+            # El formulario ya autenticó al validar: reutilizarlo evita un segundo hash
+            user = form.get_user()
             
             if user is not None:
                 # Registrar intento de login exitoso
@@ -348,7 +350,7 @@ def reset_password_view(request, token):
                 nueva_password = form.cleaned_data['password_nueva']
                 
                 # Cambiar contraseña
-                usuario.set_password(nueva_password)
+                hashing.establecer_password(usuario, nueva_password)
                 usuario.save()
                 
                 # Marcar token como usado
@@ -395,8 +397,7 @@ def activar_2fa_view(request):
                 codigos_respaldo = Usuario.generar_codigos_respaldo()
                 
                 # Guardar códigos encriptados (separados por comas)
-                from django.contrib.auth.hashers import make_password
-                codigos_encriptados = [make_password(codigo) for codigo in codigos_respaldo]
+                codigos_encriptados = hashing.hacer_hashes(codigos_respaldo)
                 usuario.codigos_respaldo_2fa = ','.join(codigos_encriptados)
                 
                 # Activar 2FA
@@ -420,33 +421,41 @@ def activar_2fa_view(request):
             usuario.save()
         
         form = Activar2FAForm()
-        
-        # Generar código QR
-        totp = pyotp.TOTP(usuario.secreto_2fa)
-        provisioning_uri = totp.provisioning_uri(
-            name=usuario.email,
-            issuer_name='Proyecto Kairos'
-        )
-        
-        # Crear imagen QR
-        qr = qrcode.QRCode(version=1, box_size=10, border=5)
-        qr.add_data(provisioning_uri)
-        qr.make(fit=True)
-        img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convertir a base64
-        buffer = io.BytesIO()
-        img.save(buffer, format='PNG')
-        qr_code_base64 = base64.b64encode(buffer.getvalue()).decode()
     
+    # El QR se sirve desde su propia URL cacheable (qr_2fa_view), no inline en base64
     context = {
         'form': form,
-        'qr_code': qr_code_base64,
+        'qr_code': reverse('appKairos:qr_2fa', kwargs={'formato': 'svg'}),
         'secret_key': usuario.secreto_2fa
     }
     return render(request, 'activar_2fa.html', context)
 
 
+def _etag_qr_2fa(request, formato):
+    # Las mismas condiciones que la vista: sin ETag no hay 304 y se llega al 404
+    usuario = request.user
+    if (not usuario.is_authenticated or usuario.tiene_2fa_activo or not usuario.secreto_2fa
+            or formato not in FORMATOS_QR):
+        return None
+    return etag_qr(uri_aprovisionamiento(usuario), formato)
+
+
+@login_required
+@cache_control(private=True, max_age=300)
+@condition(etag_func=_etag_qr_2fa)
+def qr_2fa_view(request, formato):
+    """
+    Sirve la imagen QR de activación de 2FA (SVG por defecto, PNG opcional)
+    Solo accesible con sesión iniciada y mientras el 2FA esté pendiente de activar
+    """
+    usuario = request.user
+    if usuario.tiene_2fa_activo or not usuario.secreto_2fa or formato not in FORMATOS_QR:
+        raise Http404
+    
+    contenido, content_type = renderizar_qr(uri_aprovisionamiento(usuario), formato)
+    return HttpResponse(contenido, content_type=content_type)
+
+
 @login_required
 def mostrar_codigos_respaldo_view(request):
     """Vista para mostrar los códigos de respaldo 2FA"""
@@ -509,18 +518,17 @@ def verificar_2fa_view(request):
             
             # Verificar código de respaldo
             elif codigo_respaldo and usuario.codigos_respaldo_2fa:
-                from django.contrib.auth.hashers import check_password
                 codigos_encriptados = usuario.codigos_respaldo_2fa.split(',')
                 
-                for idx, codigo_encriptado in enumerate(codigos_encriptados):
-                    if check_password(codigo_respaldo, codigo_encriptado):
-                        # Código de respaldo válido - eliminarlo
-                        codigos_encriptados.pop(idx)
-                        usuario.codigos_respaldo_2fa = ','.join(codigos_encriptados)
-                        usuario.save()
-                        verificacion_exitosa = True
-                        messages.info(request, 'Has usado un código de respaldo. Te quedan {} códigos.'.format(len(codigos_encriptados)))
-                        break
+                # Los códigos se comprueban en paralelo en el pool de hashing
+                idx = hashing.buscar_coincidencia(codigo_respaldo, codigos_encriptados)
+                if idx is not None:
+                    # Código de respaldo válido - eliminarlo
+                    codigos_encriptados.pop(idx)
+                    usuario.codigos_respaldo_2fa = ','.join(codigos_encriptados)
+                    usuario.save()
+                    verificacion_exitosa = True
+                    messages.info(request, 'Has usado un código de respaldo. Te quedan {} códigos.'.format(len(codigos_encriptados)))
             
             if verificacion_exitosa:
                 # Login exitoso - especificar backend explícitamente
@@ -587,7 +595,7 @@ def desactivar_2fa_view(request):
             password = form.cleaned_data['password']
             
             # Verificar contraseña
-            if usuario.check_password(password):
+            if hashing.verificar_usuario(usuario, password):
                 # Desactivar 2FA
                 usuario.tiene_2fa_activo = False
                 usuario.secreto_2fa = None
@@ -612,6 +620,7 @@ def desactivar_2fa_view(request):
 # ============================================================================
 
 @login_required
+@solo_lectura
 def dashboard_view(request):
     """
     Vista principal del dashboard del usuario
@@ -620,8 +629,8 @@ def dashboard_view(request):
     usuario = request.user
     
     # 1. Obtener productos contratados (activos, pendientes, cancelados)
-    productos_todos = ProductoContratado.objects.filter(
-        usuario=usuario
+    productos_todos = ProductoContratado.objects.para_usuario(
+        usuario
     ).select_related('producto').prefetch_related('producto__mercados').order_by('-fecha_contratacion')
     
     # Calcular ganancias
@@ -636,26 +645,35 @@ def dashboard_view(request):
         estado='activo'
     ).aggregate(
         total=Sum('capital_actual')
-    )['total'] or 0
+    )['total'] or Dinero(0)
     
     # Actualizar capital total del usuario en BD
     usuario.capital_total = capital_total
     usuario.save()
     
-    # 3. Obtener resultados mensuales para gráficas
-    resultados = Resultado.objects.filter(
-        usuario=usuario
-    ).order_by('fecha')
+    # 3. Obtener resultados mensuales para gráficas (por columnas, sin instancias)
+    serie = Resultado.objects.para_usuario(
+        usuario
+    ).del_usuario().order_by('fecha', 'pk').cacheado().serie(
+        'fecha', 'capital_mes', 'cambio_mensual', 'porcentaje_cambio', arrays=True
+    )
     
     # 4. Preparar datos para gráficas
     fechas = []
     capitales = []
     porcentajes = []
+    historial_resultados = []
     
-    if resultados.exists():
-        fechas = [r.fecha.strftime('%Y-%m') for r in resultados]
-        capitales = [float(r.capital_mes) for r in resultados]
-        porcentajes = [float(r.porcentaje_cambio) for r in resultados]
+    if len(serie['fecha']):
+        fechas = serie['fecha'].astype('datetime64[M]').astype(str).tolist()
+        capitales = a_euros(serie['capital_mes']).tolist()
+        porcentajes = serie['porcentaje_cambio'].tolist()
+        historial_resultados = [
+            {'fecha': fecha, 'capital_mes': capital, 'cambio_mensual': cambio, 'porcentaje_cambio': porcentaje}
+            for fecha, capital, cambio, porcentaje in zip(
+                serie['fecha'].tolist(), capitales, serie['cambio_mensual'].tolist(), porcentajes
+            )
+        ]
     else:
         # Lógica de línea recta si no hay historial
         if capital_total > 0:
@@ -664,23 +682,18 @@ def dashboard_view(request):
             capitales = [float(capital_total), float(capital_total)]
             porcentajes = [0, 0]
 
-    # 5. Cálculo de Drawdown
-    max_drawdown = 0
-    if capitales:
-        peak = capitales[0]
-        for value in capitales:
-            if value > peak:
-                peak = value
-            dd = (peak - value) / peak if peak > 0 else 0
-            if dd > max_drawdown:
-                max_drawdown = dd
-    
-    max_drawdown_percent = max_drawdown * 100
+    # 5. Drawdown: estado mantenido al insertar cada resultado (una fila)
+    max_drawdown_percent = drawdown.estado(usuario).drawdown_maximo if len(serie['fecha']) else 0
+    # Rentabilidades ponderadas por tiempo y por dinero, del libro de capital
+    rentabilidad = libro.rendimientos(usuario)
+    # Mercados de los productos activos en el mismo periodo, de las cotizaciones locales
+    comparativas = _comparativas_mercados(productos_todos, serie['fecha'][0] if len(serie['fecha']) else None)
 
     # 6. Productos Disponibles
-    productos_ocupados_ids = productos_todos.filter(
+    # Lista y no subconsulta: los contratos pueden estar en otro shard
+    productos_ocupados_ids = list(productos_todos.filter(
         Q(estado='activo') | Q(estado='pendiente')
-    ).values_list('producto_id', flat=True)
+    ).values_list('producto_id', flat=True))
     
     productos_disponibles = Producto.objects.filter(activo=True).exclude(
         id__in=productos_ocupados_ids
@@ -689,7 +702,7 @@ def dashboard_view(request):
     # 7. Estadísticas Generales
     inversion_activa = productos_todos.filter(estado='activo').aggregate(
         total=Sum('monto_invertido')
-    )['total'] or 0
+    )['total'] or Dinero(0)
     
     ganancia_total = capital_total - inversion_activa
     porcentaje_ganancia = (ganancia_total / inversion_activa * 100) if inversion_activa > 0 else 0
@@ -706,14 +719,60 @@ def dashboard_view(request):
         'capitales': capitales,
         'porcentajes': porcentajes,
         'max_drawdown': max_drawdown_percent,
+        'twr': rentabilidad['twr'],
+        'mwr': rentabilidad['mwr'],
+        'comparativas': comparativas,
         'productos_disponibles': productos_disponibles,
-        'historial_resultados': resultados,
+        'productos_calculadora': Producto.objects.filter(activo=True),
+        'historial_resultados': historial_resultados,
         'historial_productos': productos_todos,
     }
     
     return render(request, 'dashboard_en.html', context)
 
 
+def _comparativas_mercados(contratos, desde):
+    """Rendimiento de los mercados de los contratos activos desde la primera fecha del usuario"""
+    activos = [contrato for contrato in contratos if contrato.estado == 'activo']
+    if desde is None:
+        if not activos:
+            return []
+        desde = min(timezone.localdate(contrato.fecha_contratacion) for contrato in activos)
+    mercados = {
+        mercado.codigo: mercado for contrato in activos for mercado in contrato.producto.mercados.all()
+    }
+    comparativas = []
+    for codigo, mercado in sorted(mercados.items()):
+        try:
+            rendimiento = cotizaciones.rendimiento(codigo, desde)
+        except ValueError:
+            # Código que no puede ser carpeta del almacén (p. ej. 'EUR/USD'): sin cotizaciones
+            continue
+        if rendimiento is not None:
+            comparativas.append({'mercado': mercado.nombre, 'codigo': codigo, 'rendimiento': rendimiento})
+    return comparativas
+
+
+@login_required
+@require_http_methods(["GET"])
+def calculadora_view(request, producto_id):
+    """
+    Calculadora del dashboard: bandas de percentiles del capital de un depósito
+    en el producto, proyectadas con su historial mensual (analitica/calculadora.py)
+    Parámetros GET: importe (euros) y meses
+    """
+    producto = get_object_or_404(Producto, id=producto_id, activo=True)
+    try:
+        importe = float(request.GET.get('importe', 1000))
+        meses = int(request.GET.get('meses', 60))
+        proyeccion = calculadora.proyectar(producto, importe, meses)
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+    if proyeccion is None:
+        return JsonResponse({'error': 'El producto aún no tiene historial suficiente.'}, status=404)
+    return JsonResponse({'producto': producto.codigo, 'importe': importe, **proyeccion})
+
+
 @login_required
 @require_http_methods(["POST"])
 def borrar_historial_view(request):
@@ -724,10 +783,10 @@ def borrar_historial_view(request):
     usuario = request.user
     
     # Borrar resultados históricos
-    Resultado.objects.filter(usuario=usuario).delete()
+    Resultado.objects.para_usuario(usuario).delete()
     
     # Opcional: Borrar productos cancelados del historial visual si se desea limpiar todo
-    # ProductoContratado.objects.filter(usuario=usuario, estado='cancelado').delete()
+    # ProductoContratado.objects.para_usuario(usuario).filter(estado='cancelado').delete()
     
     messages.success(request, 'History cleared successfully.')
     return redirect('appKairos:dashboard')
@@ -748,15 +807,13 @@ def contratar_producto_view(request, producto_id):
             contrato = form.save(commit=False)
             contrato.usuario = request.user
             contrato.producto = producto
-            contrato.capital_actual = contrato.monto_invertido
             contrato.save()
+            libro.aportar(contrato, contrato.monto_invertido, fecha=contrato.fecha_inicio)
             
             # Crear un registro inicial en Resultado para que la gráfica empiece
             Resultado.objects.create(
                 usuario=request.user,
                 producto_contratado=contrato,
-                mes=timezone.now().strftime('%B'),
-                anio=timezone.now().year,
                 capital_mes=contrato.capital_actual,
                 fecha=timezone.now()
             )
@@ -769,7 +826,8 @@ def contratar_producto_view(request, producto_id):
     
     context = {
         'form': form,
-        'producto': producto
+        'producto': producto,
+        'backtest': ultimo_backtest(producto),
     }
     return render(request, 'contratar_producto.html', context)
 
@@ -777,12 +835,13 @@ def contratar_producto_view(request, producto_id):
 @login_required
 def cancelar_producto_view(request, contrato_id):
     """Vista para cancelar un producto contratado"""
-    contrato = get_object_or_404(ProductoContratado, id=contrato_id, usuario=request.user)
+    contrato = get_object_or_404(ProductoContratado.objects.para_usuario(request.user), id=contrato_id)
     
     if request.method == 'POST':
         contrato.estado = 'cancelado'
         contrato.fecha_fin = timezone.now()
         contrato.save()
+        libro.retirar([contrato], fecha=contrato.fecha_fin, observaciones='Cancelación')
         
         # Actualizar capital total del usuario
         request.user.calcular_capital_total()
@@ -793,6 +852,40 @@ def cancelar_producto_view(request, contrato_id):
     return render(request, 'cancelar_producto.html', {'contrato': contrato})
 
 
+# ============================================================================
+# VISTAS DE MERCADOS
+# ============================================================================
+
+# Barras máximas por respuesta (las últimas del rango): las de minuto son muchas
+LIMITE_BARRAS_JSON = 5000
+
+
+@login_required
+@cache_control(private=True, max_age=60)
+def cotizaciones_mercado_view(request, codigo):
+    """
+    Barras OHLC de un mercado en JSON, por columnas, para las gráficas
+    Parámetros GET: resolucion (minuto, hora, dia, mes; por defecto dia), desde y hasta (AAAA-MM-DD)
+    """
+    mercado = get_object_or_404(Mercado, codigo=codigo, activo=True)
+    resolucion = request.GET.get('resolucion', 'dia')
+    try:
+        desde, hasta = (
+            date.fromisoformat(request.GET[nombre]) if request.GET.get(nombre) else None
+            for nombre in ('desde', 'hasta')
+        )
+        barras = cotizaciones.barras(mercado.codigo, resolucion, desde, hasta)[-LIMITE_BARRAS_JSON:]
+    except ValueError as error:
+        return JsonResponse({'error': str(error)}, status=400)
+
+    unidad = cotizaciones.RESOLUCIONES[resolucion]
+    datos = {'mercado': mercado.codigo, 'resolucion': resolucion}
+    datos['fechas'] = barras['fecha'].astype(f'datetime64[{unidad}]').astype(str).tolist()
+    for campo in ('apertura', 'maximo', 'minimo', 'cierre', 'volumen'):
+        datos[campo] = barras[campo].tolist()
+    return JsonResponse(datos)
+
+
 # ============================================================================
 # VISTAS DE PERFIL
 # ============================================================================
@@ -823,8 +916,8 @@ def cambiar_password_view(request):
             password_nueva = form.cleaned_data['password_nueva']
             
             # Verificar contraseña actual
-            if request.user.check_password(password_actual):
-                request.user.set_password(password_nueva)
+            if hashing.verificar_usuario(request.user, password_actual):
+                hashing.establecer_password(request.user, password_nueva)
                 request.user.save()
                 
                 # Actualizar sesión para no cerrar sesión
@@ -847,16 +940,19 @@ def cambiar_password_view(request):
 # VISTAS PÚBLICAS
 # ============================================================================
 
+@solo_lectura
 def index_view(request):
     """
     Vista de la página principal
     Conecta con: index_en.html
     """
     # Obtener productos destacados
-    productos = Producto.objects.filter(activo=True)[:3]
+    productos = Producto.objects.filter(activo=True).cacheado()[:3]
     
     # Obtener últimos resultados para mostrar en gráfica
-    resultados_recientes = Resultado.objects.all().order_by('-fecha')[:12]
+    resultados_recientes = serie_shards(
+        Resultado.objects.order_by('-fecha').cacheado(), 'fecha', 'capital_mes', fin=12
+    )
     
     context = {
         'productos': productos,
@@ -48,6 +48,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'appKairos.db.middleware.ReplicaStickyMiddleware',  # Lectura tras escritura con réplicas
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -84,6 +85,181 @@ DATABASES = {
     )
 }
 
+# Réplicas de lectura (URLs separadas por comas). Las usan las vistas y los
+# listados del admin marcados como de solo lectura (appKairos/db/routers.py).
+# En los tests apuntan a la base de datos principal.
+DATABASE_REPLICAS = []
+for _n, _url in enumerate(config('DATABASE_REPLICA_URLS', default='', cast=Csv()), start=1):
+    DATABASES[f'replica_{_n}'] = {
+        **dj_database_url.parse(_url, conn_max_age=600),
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{_n}')
+
+# Base de datos de auditoría (SesionSeguridad y tokens). Sin URL se usa 'default'.
+# Tras configurarla: python manage.py migrate --database=auditoria
+DATABASE_AUDITORIA = 'default'
+_AUDITORIA_URL = config('DATABASE_AUDITORIA_URL', default='')
+if _AUDITORIA_URL:
+    DATABASES['auditoria'] = dj_database_url.parse(_AUDITORIA_URL, conn_max_age=600)
+    DATABASE_AUDITORIA = 'auditoria'
+
+# Sharding por usuario (appKairos/db/shards.py): URLs de los shards extra,
+# separadas por comas. 'default' es siempre el primer shard. Tras
+# configurarlos: migrate --database=shard_N y preparar_shards.
+# El número de shards no se puede cambiar sin preparar_shards --mover.
+DATABASE_SHARDS = []
+_SHARD_URLS = config('DATABASE_SHARD_URLS', default='', cast=Csv())
+if _SHARD_URLS:
+    DATABASE_SHARDS = ['default']
+    for _n, _url in enumerate(_SHARD_URLS, start=1):
+        DATABASES[f'shard_{_n}'] = dj_database_url.parse(_url, conn_max_age=600)
+        DATABASE_SHARDS.append(f'shard_{_n}')
+
+DATABASE_ROUTERS = [
+    'appKairos.db.routers.AuditoriaRouter',
+    'appKairos.db.routers.ShardRouter',
+    'appKairos.db.routers.ReplicaRouter',
+]
+
+# Pool de conexiones para PostgreSQL: se activa con opciones pool_* en la URL
+# (p. ej. ?pool_min=2&pool_max=20&pool_timeout=5, ver appKairos/db/backends).
+# Django devuelve la conexión al pool al terminar cada petición.
+for _bd in DATABASES.values():
+    if _bd['ENGINE'] == 'django.db.backends.postgresql' and any(
+        opcion.startswith('pool_') for opcion in _bd.get('OPTIONS', {})
+    ):
+        _bd['ENGINE'] = 'appKairos.db.backends.postgresql_pool'
+        _bd['CONN_MAX_AGE'] = 0
+
+# SQLite (instalaciones de un solo servidor): PRAGMA aplicados a cada conexión
+# (appKairos/db/sqlite.py). SQLITE_PERFIL=False los desactiva.
+SQLITE_PERFIL = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': config('SQLITE_BUSY_TIMEOUT_MS', default=5000, cast=int),
+    'cache_size': -config('SQLITE_CACHE_KIB', default=20000, cast=int),
+    'mmap_size': config('SQLITE_MMAP_MB', default=128, cast=int) * 1024 * 1024,
+    'temp_store': 'MEMORY',
+} if config('SQLITE_PERFIL', default=True, cast=bool) else {}
+
+# Serializa las escrituras de cada proceso en una cola en lugar de competir
+# por el bloqueo del fichero (appKairos/db/backends/sqlite_escritor)
+SQLITE_ESCRITOR_UNICO = config('SQLITE_ESCRITOR_UNICO', default=False, cast=bool)
+if SQLITE_ESCRITOR_UNICO:
+    for _bd in DATABASES.values():
+        if _bd['ENGINE'] == 'django.db.backends.sqlite3':
+            _bd['ENGINE'] = 'appKairos.db.backends.sqlite_escritor'
+
+# Segundos que un usuario lee de la primaria después de escribir
+DATABASE_REPLICA_STICKY_SEGUNDOS = config('DATABASE_REPLICA_STICKY_SEGUNDOS', default=10, cast=int)
+# Cada cuántos segundos se comprueba la salud de una réplica
+DATABASE_REPLICA_SALUD_TTL = 10
+# Retraso de replicación máximo (s) en PostgreSQL antes de dejar de usar la réplica
+DATABASE_REPLICA_RETRASO_MAX = config('DATABASE_REPLICA_RETRASO_MAX', default=30, cast=int)
+
+# Particionado por fecha de Resultado en PostgreSQL (appKairos/db/particiones.py):
+# '' (desactivado), 'anual' o 'mensual', y cuántos periodos futuros se crean
+# por adelantado. Mantenimiento periódico: python manage.py particiones_resultado
+RESULTADO_PARTICIONES = config('RESULTADO_PARTICIONES', default='')
+RESULTADO_PARTICIONES_ADELANTE = config('RESULTADO_PARTICIONES_ADELANTE', default=12, cast=int)
+
+
+# Pool de hashing de contraseñas (appKairos/hashing.py): número máximo de
+# hashes simultáneos por proceso y tipo de pool ('hilos' o 'procesos')
+HASHING_TRABAJADORES = config('HASHING_TRABAJADORES', default=0, cast=int) or None
+HASHING_EJECUTOR = config('HASHING_EJECUTOR', default='hilos')
+
+# Procesos del pool de los barridos de backtesting (appKairos/backtest);
+# 0: los núcleos disponibles, hasta 4
+BACKTEST_TRABAJADORES = config('BACKTEST_TRABAJADORES', default=0, cast=int) or None
+
+# ==============================================================================
+#  HASHING DE CONTRASEÑAS (coste calibrado con `manage.py calibrar_hashers`)
+# ==============================================================================
+
+# Algoritmo preferido para hashes nuevos: pbkdf2 | scrypt | argon2 (requiere argon2-cffi)
+PASSWORD_HASHER = config('PASSWORD_HASHER', default='pbkdf2')
+_HASHERS_CALIBRADOS = {
+    'pbkdf2': 'appKairos.hashers.PBKDF2CalibradoHasher',
+    'scrypt': 'appKairos.hashers.ScryptCalibradoHasher',
+    'argon2': 'appKairos.hashers.Argon2CalibradoHasher',
+}
+# El primero se usa para hashes nuevos; el resto solo para verificar (y rehashear) los antiguos
+PASSWORD_HASHERS = [_HASHERS_CALIBRADOS[PASSWORD_HASHER]] + [
+    ruta for nombre, ruta in _HASHERS_CALIBRADOS.items() if nombre != PASSWORD_HASHER
+] + [
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+]
+
+# Parámetros de coste; 0 = valor por defecto de Django
+PASSWORD_PBKDF2_ITERACIONES = config('PASSWORD_PBKDF2_ITERACIONES', default=0, cast=int)
+PASSWORD_SCRYPT_N = config('PASSWORD_SCRYPT_N', default=0, cast=int)
+PASSWORD_SCRYPT_R = config('PASSWORD_SCRYPT_R', default=0, cast=int)
+PASSWORD_SCRYPT_P = config('PASSWORD_SCRYPT_P', default=0, cast=int)
+PASSWORD_ARGON2_TIEMPO = config('PASSWORD_ARGON2_TIEMPO', default=0, cast=int)
+PASSWORD_ARGON2_MEMORIA_KIB = config('PASSWORD_ARGON2_MEMORIA_KIB', default=0, cast=int)
+PASSWORD_ARGON2_PARALELISMO = config('PASSWORD_ARGON2_PARALELISMO', default=0, cast=int)
+
+# ==============================================================================
+#  CACHÉ (LRU por proceso + nivel compartido entre workers, ver appKairos/cache)
+# ==============================================================================
+
+# Sin CACHE_URL se usa un fichero SQLite en modo WAL, compartido por todos los
+# workers de la máquina. Con redis://... o memcached://... se usa ese servicio.
+CACHE_URL = config('CACHE_URL', default='')
+
+if CACHE_URL.startswith(('redis://', 'rediss://')):
+    _CACHE_COMPARTIDA = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': CACHE_URL,
+    }
+elif CACHE_URL.startswith('memcached://'):
+    _CACHE_COMPARTIDA = {
+        'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+        'LOCATION': CACHE_URL[len('memcached://'):],
+    }
+else:
+    _CACHE_COMPARTIDA = {
+        'BACKEND': 'appKairos.cache.sqlite.SQLiteCache',
+        'LOCATION': CACHE_URL[len('sqlite://'):] if CACHE_URL else str(BASE_DIR / 'cache' / 'kairos_cache.sqlite3'),
+        'OPTIONS': {'MAX_ENTRIES': 100000},
+    }
+
+CACHES = {
+    'default': {**_CACHE_COMPARTIDA, 'TIMEOUT': 300},
+}
+
+# Nivel en memoria de cada proceso
+CACHE_LOCAL_MAX_ENTRADAS = config('CACHE_LOCAL_MAX_ENTRADAS', default=1000, cast=int)
+# Segundos máximos que una entrada vive en memoria local
+CACHE_LOCAL_TTL = config('CACHE_LOCAL_TTL', default=60, cast=int)
+# Segundos que cada proceso memoriza la versión de un espacio de nombres
+CACHE_VERSIONES_TTL = config('CACHE_VERSIONES_TTL', default=5, cast=int)
+
+# Bus de invalidación entre workers (LISTEN/NOTIFY en PostgreSQL, sondeo de la
+# tabla VersionCache en el resto). Sustituye a CACHE_VERSIONES_TTL si está activo.
+# Desactivado por defecto: arranca un hilo de escucha en cada proceso, también en
+# los comandos de gestión y los tests. Actívelo (CACHE_BUS_ACTIVO=True en el
+# entorno) solo en despliegues con varios workers que comparten la caché.
+CACHE_BUS_ACTIVO = config('CACHE_BUS_ACTIVO', default=False, cast=bool)
+# Segundos entre sondeos (y retraso máximo de invalidación sin PostgreSQL)
+CACHE_BUS_INTERVALO = config('CACHE_BUS_INTERVALO', default=2.0, cast=float)
+# Base de datos donde vive la tabla VersionCache
+CACHE_BUS_ALIAS_BD = 'default'
+
+# TTL (segundos) de los resultados de QuerySet.cacheado() por modelo
+CACHE_QUERYSETS_TTL = {
+    'appKairos.Mercado': 3600,
+    'appKairos.Producto': 300,
+    'appKairos.Resultado': 60,
+}
+CACHE_QUERYSETS_TTL_DEFECTO = 60
+
+# Cotizaciones OHLC por mercado (appKairos.cotizaciones): un directorio por
+# código de Mercado con ficheros binarios de solo anexado leídos con mmap
+COTIZACIONES_DIR = config('COTIZACIONES_DIR', default=str(BASE_DIR / 'datos' / 'cotizaciones'))
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -146,6 +322,10 @@ LOGIN_URL = '/login/'
 LOGIN_REDIRECT_URL = '/dashboard/'
 LOGOUT_REDIRECT_URL = '/'
 
+# Días que se conservan los tokens usados/expirados antes de que
+# `manage.py purgar_tokens` los elimine
+TOKENS_DIAS_GRACIA = config('TOKENS_DIAS_GRACIA', default=7, cast=int)
+
 
 # ==============================================================================
 #  CONFIGURACIÓN DE EMAIL (SMTP REAL)